@@ -0,0 +1,355 @@
+"""
+Contrôle d'admission des endpoints coûteux (synchronisations Google Sheets,
+maintenance de la base, recalcul des quantités, exports, statistiques).
+
+Middleware ASGI, une politique par famille de routes (POLICIES):
+- single-flight: une requête identique à une requête en cours (méthode,
+  chemin, paramètres, corps; même utilisateur, ou même rôle pour les
+  statistiques) attend et reçoit la même réponse au lieu de relancer le
+  travail. Un double-clic sur « Synchroniser » ne lance qu'une
+  synchronisation, N onglets du tableau de bord un seul calcul;
+- seaux à jetons par utilisateur et par route (tous utilisateurs): au-delà,
+  429 avec Retry-After;
+- plafond de requêtes simultanées: les suivantes attendent une place dans
+  une file bornée (max_queue, queue_timeout), sinon 429.
+L'utilisateur est identifié par les claims du token (cache des tokens
+vérifiés, sans requête base), à défaut par l'adresse IP. Limites par
+processus: avec plusieurs workers, chacun applique les siennes.
+ADMISSION_CONTROL_ENABLED=false désactive le middleware.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .auth import decode_token_claims, extract_token
+from .services.token_revocation import token_revocations
+
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+# Réponses partagées en single-flight jusqu'à cette taille (au-delà, chaque requête s'exécute)
+SINGLE_FLIGHT_MAX_BYTES = int(os.getenv("SINGLE_FLIGHT_MAX_BYTES", str(2 * 1024 * 1024)))
+_MAX_BUCKETS = 10000
+
+
+@dataclass(frozen=True)
+class AdmissionPolicy:
+    name: str
+    methods: FrozenSet[str]
+    # Expressions régulières sur le chemin complet
+    paths: Tuple[str, ...]
+    # Requêtes par minute (0 = illimité) et rafale tolérée
+    user_rate: float = 0.0
+    user_burst: int = 0
+    route_rate: float = 0.0
+    route_burst: int = 0
+    # Requêtes simultanées (0 = illimité), file d'attente et attente max (s)
+    max_concurrent: int = 0
+    max_queue: int = 0
+    queue_timeout: float = 0.0
+    # Clé de partage des requêtes identiques: "user", "role" ou None (pas de partage)
+    single_flight: Optional[str] = None
+
+
+POLICIES: Tuple[AdmissionPolicy, ...] = (
+    # Synchronisations Google Sheets: une à la fois, pas de file (plusieurs minutes)
+    AdmissionPolicy(
+        name="sheets_sync",
+        methods=frozenset({"POST"}),
+        paths=(r"/api/google-sheets/sync", r"/api/google-sheets/sync-stock-to-sheets",
+               r"/api/google-sheets/auto-sync/trigger"),
+        user_rate=6, user_burst=2, max_concurrent=1, single_flight="user",
+    ),
+    # Maintenance et recalculs complets: une à la fois
+    AdmissionPolicy(
+        name="maintenance",
+        methods=frozenset({"POST"}),
+        paths=(r"/api/dashboard/optimize", r"/api/dashboard/retention",
+               r"/api/stock-movements/recompute-quantities", r"/api/stock-movements/ledger/checkpoints"),
+        user_rate=6, user_burst=2, max_concurrent=1, single_flight="user",
+    ),
+    # Exports en flux: chaque export tient une connexion DB jusqu'à la fin du fichier
+    AdmissionPolicy(
+        name="exports",
+        methods=frozenset({"GET"}),
+        paths=(r"/api/exports/.+",),
+        user_rate=10, user_burst=3, max_concurrent=2, max_queue=4, queue_timeout=30,
+    ),
+    # Tableau de bord et statistiques: calcul partagé entre onglets / utilisateurs de même rôle
+    AdmissionPolicy(
+        name="stats",
+        methods=frozenset({"GET"}),
+        paths=(r"/api/dashboard/(stats|sales-trend|sales-by-category)", r"/api/reports/.+",
+               r"/api/products/stats(/consistency)?", r"/api/stock-movements/stats",
+               r"/api/[a-z-]+/stats/summary", r"/api/daily-recap/stats"),
+        user_rate=120, user_burst=30, max_concurrent=4, max_queue=32, queue_timeout=15,
+        single_flight="role",
+    ),
+)
+
+
+class TokenBucket:
+    """rate jetons/minute, capacité burst; take() -> 0 si accordé, sinon secondes avant le prochain jeton"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(max(1, burst or int(per_minute)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def give_back(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class _PolicyState:
+    def __init__(self, policy: AdmissionPolicy):
+        self.policy = policy
+        self.pattern = re.compile("|".join(f"(?:{p})" for p in policy.paths))
+        self.route_bucket = TokenBucket(policy.route_rate, policy.route_burst) if policy.route_rate else None
+        self.user_buckets: Dict[str, TokenBucket] = {}
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.flights: Dict[str, asyncio.Future] = {}
+        self.counts = {"admitted": 0, "shared": 0, "queued": 0, "rate_limited": 0, "busy": 0}
+
+    def take_tokens(self, user_key: str) -> float:
+        policy = self.policy
+        user_bucket = None
+        if policy.user_rate:
+            user_bucket = self.user_buckets.get(user_key)
+            if user_bucket is None:
+                if len(self.user_buckets) >= _MAX_BUCKETS:
+                    now = time.monotonic()
+                    self.user_buckets = {k: b for k, b in self.user_buckets.items() if not b.idle(now)}
+                user_bucket = self.user_buckets[user_key] = TokenBucket(policy.user_rate, policy.user_burst)
+            wait = user_bucket.take()
+            if wait:
+                return wait
+        if self.route_bucket is not None:
+            wait = self.route_bucket.take()
+            if wait:
+                if user_bucket is not None:
+                    user_bucket.give_back()
+                return wait
+        return 0.0
+
+    async def acquire_slot(self) -> bool:
+        policy = self.policy
+        if not policy.max_concurrent:
+            return True
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(policy.max_concurrent)
+        if self.semaphore.locked():
+            if self.waiting >= policy.max_queue:
+                return False
+            self.counts["queued"] += 1
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=policy.queue_timeout or None)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release_slot(self) -> None:
+        if self.policy.max_concurrent and self.semaphore is not None:
+            self.active -= 1
+            self.semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counts,
+            "active": self.active,
+            "waiting": self.waiting,
+            "in_flight": len(self.flights),
+            "max_concurrent": self.policy.max_concurrent,
+            "tracked_users": len(self.user_buckets),
+        }
+
+
+def _identity(scope: Scope) -> Tuple[str, str]:
+    """(clé utilisateur, rôle) depuis le token (cache des tokens vérifiés), sinon l'adresse IP"""
+    conn = HTTPConnection(scope)
+    token = extract_token(conn.headers.get("authorization"), conn.cookies.get("gt_access"))
+    claims = decode_token_claims(token) if token else None
+    if claims and not token_revocations.is_revoked(claims):
+        return f"user:{claims.get('user_id') or claims.get('username')}", str(claims.get("role") or "user")
+    client = scope.get("client")
+    return f"ip:{client[0] if client else '-'}", "anonymous"
+
+
+def _too_many(detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=429,
+        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+    )
+
+
+class AdmissionControl:
+    """État des politiques (seaux, places, requêtes en cours) partagé par le middleware et /api/dashboard/admission"""
+
+    def __init__(self, policies: Tuple[AdmissionPolicy, ...] = POLICIES, enabled: bool = ADMISSION_CONTROL_ENABLED):
+        self.enabled = enabled
+        self.states = [_PolicyState(p) for p in policies]
+
+    def match(self, scope: Scope) -> Optional[_PolicyState]:
+        if not self.enabled or scope["type"] != "http":
+            return None
+        method, path = scope["method"], scope["path"]
+        for state in self.states:
+            if method in state.policy.methods and state.pattern.fullmatch(path):
+                return state
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "policies": {s.policy.name: s.stats() for s in self.states}}
+
+
+admission_control = AdmissionControl()
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp, control: AdmissionControl = admission_control):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        state = self.control.match(scope)
+        if state is None:
+            await self.app(scope, receive, send)
+            return
+        user_key, role = _identity(scope)
+        policy = state.policy
+
+        flight_key = None
+        if policy.single_flight:
+            body, receive = await _read_body(receive)
+            owner = user_key if policy.single_flight == "user" else f"role:{role}"
+            digest = hashlib.sha1(body).hexdigest() if body else ""
+            flight_key = f"{owner}|{scope['method']}|{scope['path']}|{scope.get('query_string', b'').decode('latin-1')}|{digest}"
+            leader = state.flights.get(flight_key)
+            if leader is not None:
+                messages = await asyncio.shield(leader)
+                if messages is not None:
+                    state.counts["shared"] += 1
+                    await _replay(messages, send)
+                    return
+                flight_key = None  # réponse non partageable: exécution propre
+
+        wait = state.take_tokens(user_key)
+        if wait:
+            state.counts["rate_limited"] += 1
+            await _too_many(f"Trop de requêtes, réessayez dans {int(wait + 0.999)} s", wait)(scope, receive, send)
+            return
+
+        future: Optional[asyncio.Future] = None
+        if flight_key is not None:
+            # Enregistré avant l'attente d'une place: les doublons arrivés pendant la file la partagent
+            future = asyncio.get_running_loop().create_future()
+            state.flights[flight_key] = future
+        recorder = _Recorder(send) if future is not None else None
+        try:
+            if not await state.acquire_slot():
+                state.counts["busy"] += 1
+                await _too_many("Opération déjà en cours, réessayez plus tard", policy.queue_timeout or 30)(
+                    scope, receive, recorder.send if recorder else send
+                )
+                return
+            state.counts["admitted"] += 1
+            try:
+                await self.app(scope, receive, recorder.send if recorder else send)
+            finally:
+                state.release_slot()
+        finally:
+            if future is not None:
+                state.flights.pop(flight_key, None)
+                future.set_result(recorder.messages if recorder.complete else None)
+
+
+class _Recorder:
+    """Transmet la réponse du meneur et la garde pour les requêtes identiques en attente"""
+
+    def __init__(self, send: Send):
+        self._send = send
+        self.messages: Optional[List[Message]] = []
+        self.size = 0
+        self.complete = False
+
+    async def send(self, message: Message) -> None:
+        if self.messages is not None:
+            if message["type"] == "http.response.body":
+                self.size += len(message.get("body", b""))
+                if self.size > SINGLE_FLIGHT_MAX_BYTES:
+                    self.messages = None
+            if self.messages is not None:
+                self.messages.append(message)
+                if message["type"] == "http.response.body" and not message.get("more_body", False):
+                    self.complete = True
+        await self._send(message)
+
+
+async def _read_body(receive: Receive) -> Tuple[bytes, Receive]:
+    """Corps complet de la requête (clé single-flight) et receive qui le rejoue à l'application"""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            # Déconnexion avant la fin du corps: transmise telle quelle
+            pending = [message]
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            pending = []
+            break
+    body = b"".join(chunks)
+    replayed = False
+
+    async def replay() -> Message:
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        if pending:
+            return pending.pop(0)
+        return await receive()
+
+    return body, replay
+
+
+async def _replay(messages: List[Message], send: Send) -> None:
+    for message in messages:
+        if message["type"] == "http.response.start":
+            # Cookies propres au meneur (session, lecture sur le primaire) non recopiés
+            headers = [(k, v) for k, v in message.get("headers", []) if k.lower() != b"set-cookie"]
+            headers.append((b"x-single-flight", b"shared"))
+            message = {**message, "headers": headers}
+        await send(message)
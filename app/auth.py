@@ -1,11 +1,16 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status, Header, Cookie
-from sqlalchemy.orm import Session
-from .database import get_db, User
+from fastapi import Depends, HTTPException, status, Header, Cookie, Request
+from .database import User
+from .services.token_revocation import token_revocations
+import hashlib
 import os
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,11 +21,26 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 # Feature flag: trust JWT claims and avoid DB dependency for auth
 AUTH_TRUST_JWT_CLAIMS = str(os.getenv("AUTH_TRUST_JWT_CLAIMS", "false")).lower() == "true"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Coût bcrypt (2^rounds itérations). Un hash d'un autre coût est recalculé à la connexion suivante.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Tokens déjà vérifiés gardés en mémoire jusqu'à leur expiration (0 = désactivé)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """(mot de passe valide, nouveau hash si le coût BCRYPT_ROUNDS a changé, sinon None)"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
@@ -31,6 +51,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    # iat (précis à la microseconde) et jti: révocation avant expiration (services/token_revocation)
+    to_encode.setdefault("iat", time.time())
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -44,48 +67,79 @@ def verify_token(token: str):
     except JWTError:
         return None
 
+class TokenCache:
+    """LRU des claims de tokens déjà vérifiés, clé = sha256 du token, valable jusqu'à son exp"""
+
+    def __init__(self, maxsize: int = AUTH_TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        if self.maxsize <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+        return None
+
+    def put(self, token: str, claims: Dict[str, Any], expires_at: float) -> None:
+        if self.maxsize <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache()
+
 class AuthUser:
     """Lightweight user built from JWT claims when DB-free auth is enabled."""
     def __init__(self, **kwargs):
         for k, v in kwargs.items():
             setattr(self, k, v)
 
-def get_current_user(
-    authorization: Optional[str] = Header(None),
-    gt_access: Optional[str] = Cookie(None),
-    db: Session = Depends(get_db)
-):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-
-    # Extraire le token d'abord depuis le cookie HttpOnly "gt_access" (source de vérité),
-    # puis éventuellement depuis l'en-tête Authorization si présent et valide.
-    token: Optional[str] = None
-    if gt_access:
-        token = gt_access
-    elif authorization and authorization.startswith("Bearer "):
-        possible = authorization.split(" ", 1)[1]
-        # Ignorer les placeholders hérités comme "cookie-based"
-        if possible and possible.lower() != "cookie-based":
-            token = possible
-
-    if not token:
-        raise credentials_exception
-
+def decode_token_claims(token: str) -> Optional[Dict[str, Any]]:
+    """Claims utiles d'un token valide (cache, sinon vérification de la signature), None sinon"""
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-
+        return None
+    if payload.get("sub") is None:
+        return None
     # Utiliser les informations du JWT directement sans vérifier la base de données
     # Cela accélère considérablement le chargement des listes (produits, devis, factures)
-    # On garde cette méthode rapide par défaut maintenant
     claims = {
         "username": payload.get("sub"),
         "user_id": payload.get("user_id"),
@@ -93,14 +147,60 @@ def get_current_user(
         "full_name": payload.get("full_name"),
         "role": payload.get("role", "user"),
         "is_active": payload.get("is_active", True),
+        "jti": payload.get("jti"),
+        "iat": payload.get("iat"),
+        "exp": payload.get("exp"),
     }
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        token_cache.put(token, claims, float(exp))
+    return claims
+
+def extract_token(authorization: Optional[str], gt_access: Optional[str]) -> Optional[str]:
+    # Extraire le token d'abord depuis le cookie HttpOnly "gt_access" (source de vérité),
+    # puis éventuellement depuis l'en-tête Authorization si présent et valide.
+    if gt_access:
+        return gt_access
+    if authorization and authorization.startswith("Bearer "):
+        possible = authorization.split(" ", 1)[1]
+        # Ignorer les placeholders hérités comme "cookie-based"
+        if possible and possible.lower() != "cookie-based":
+            return possible
+    return None
+
+async def get_current_user(
+    request: Request,
+    authorization: Optional[str] = Header(None),
+    gt_access: Optional[str] = Cookie(None),
+):
+    # Même requête: require_role, require_any_role, ... réutilisent l'utilisateur déjà résolu
+    cached = getattr(request.state, "current_user", None)
+    if cached is not None:
+        return cached
+
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    token = extract_token(authorization, gt_access)
+    if not token:
+        raise credentials_exception
+
+    claims = decode_token_claims(token)
     # Minimal active check
-    if not bool(claims.get("is_active", True)):
+    if claims is None or not bool(claims.get("is_active", True)):
+        raise credentials_exception
+    # Révocation (déconnexion, compte désactivé, ...): contrôle en mémoire, sans requête base
+    if token_revocations.is_revoked(claims):
         raise credentials_exception
-    return AuthUser(**claims)
+    user = AuthUser(**claims)
+    request.state.current_user = user
+    return user
 
 def require_role(required_role: str):
-    def role_checker(current_user: User = Depends(get_current_user)):
+    async def role_checker(current_user: User = Depends(get_current_user)):
         if current_user.role != required_role and current_user.role != "admin":
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -109,7 +209,7 @@ def require_role(required_role: str):
         return current_user
     return role_checker
 
-def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_active_user(current_user: User = Depends(get_current_user)):
     # Works for both ORM User and AuthUser (claims)
     if not getattr(current_user, "is_active", True):
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -117,7 +217,7 @@ def get_current_active_user(current_user: User = Depends(get_current_user)):
 
 def require_any_role(roles: list[str]):
     """Authorize if user's role is in roles OR user is admin."""
-    def checker(current_user: User = Depends(get_current_user)):
+    async def checker(current_user: User = Depends(get_current_user)):
         r = getattr(current_user, "role", "user")
         if r == "admin":
             return current_user
@@ -0,0 +1,171 @@
+"""
+Compression des réponses HTTP (brotli ou gzip selon Accept-Encoding).
+
+Middleware ASGI:
+- encodage choisi par accepted_encodings(): valeurs q (q=0 refuse), `*`,
+  puis brotli (si le module est installé) préféré à gzip à q égal; même
+  analyse pour les assets pré-compressés (static_assets);
+- seuil COMPRESSION_MIN_SIZE (octets, 1024 par défaut): les petites réponses
+  partent telles quelles;
+- déjà encodées (assets .br/.gz pré-générés) ou types déjà compressés
+  (images, xlsx, zip) et flux SSE: ignorés;
+- réponses en flux (exports CSV): chaque bloc est compressé et vidé
+  immédiatement, le premier octet n'attend pas la fin du flux.
+Niveaux: COMPRESSION_GZIP_LEVEL (6), COMPRESSION_BROTLI_QUALITY (4): un
+compromis débit/CPU pour des réponses dynamiques.
+"""
+
+from __future__ import annotations
+
+import os
+import zlib
+from typing import Iterable, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    brotli = None  # type: ignore
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+_SKIP_TYPES = ("image/", "video/", "audio/", "font/woff", "application/zip", "application/gzip",
+               "application/vnd.openxmlformats", "application/pdf", "text/event-stream")
+
+
+def accepted_encodings(accept_encoding: str, supported: Iterable[str] = ("br", "gzip")) -> List[str]:
+    """Encodages de `supported` acceptés (q > 0), par q décroissant puis ordre de `supported`"""
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value.strip())
+                except ValueError:
+                    q = 0.0
+        weights[token] = q
+    wildcard = weights.get("*", 0.0)
+    ranked = [(weights.get(enc, wildcard), rank, enc) for rank, enc in enumerate(supported)]
+    return [enc for q, _rank, enc in sorted(ranked, key=lambda t: (-t[0], t[1])) if q > 0]
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Encodage retenu parmi br/gzip selon l'en-tête Accept-Encoding"""
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+    encodings = accepted_encodings(accept_encoding, supported)
+    return encodings[0] if encodings else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._gz = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _Responder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _Responder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Send = None  # type: ignore[assignment]
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+        # Début du corps retenu tant que le seuil n'est pas atteint (les middlewares
+        # http de l'application renvoient toujours le corps en plusieurs messages)
+        self.buffer = bytearray()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self._send)
+
+    async def _send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "").lower()
+            self.passthrough = "content-encoding" in headers or content_type.startswith(_SKIP_TYPES)
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            if self.passthrough:
+                start, self.start_message = self.start_message, None
+                await self.send(start)
+                await self.send(message)
+                return
+            self.buffer.extend(body)
+            if more_body and len(self.buffer) < self.minimum_size:
+                return
+            start, self.start_message = self.start_message, None
+            body, self.buffer = bytes(self.buffer), bytearray()
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+            self.compressor = _Compressor(self.encoding)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            body = self.compressor.compress(body, final=not more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            if "etag" in headers:
+                # Représentation différente: ETag faible (reste valide pour If-None-Match)
+                etag = headers["etag"]
+                if not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+            await self.send(start)
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        if self.passthrough or self.compressor is None:
+            await self.send(message)
+            return
+        await self.send({
+            "type": "http.response.body",
+            "body": self.compressor.compress(body, final=not more_body),
+            "more_body": more_body,
+        })
@@ -0,0 +1,79 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) des listes et fiches de l'API.
+
+L'ETag est dérivé, sans exécuter la requête principale, de:
+- la version des ressources dont dépend la réponse (services/resource_versions);
+- le chemin et les paramètres de requête (hors anti-cache `_ts` / `_`);
+- une portée propre à l'appelant (rôle: prix d'achat masqués, ...);
+- la version de l'application (un déploiement change le format des réponses).
+If-None-Match (prioritaire) ou If-Modified-Since valide: 304 immédiat. Les
+réponses portent Cache-Control: private, no-cache: le navigateur garde le corps
+et revalide à chaque appel (fetch renvoie alors le corps en cache, statut 200).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .page_cache import _etag_matches, asset_version
+from .services import resource_versions
+
+_IGNORED_PARAMS = {"_ts", "_"}
+
+
+class ConditionalGet:
+    """Validateurs d'une réponse GET calculés à partir des versions de ressources"""
+
+    def __init__(self, request: Request, db, resources: Iterable[str], scope: str = ""):
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.not_modified = False
+        # Sans la table (PostgreSQL: une requête en échec annulerait la transaction), pas de validateurs
+        if not resource_versions.ensure_resource_versions_table():
+            return
+        try:
+            versions = resource_versions.get_versions(db, resources)
+        except Exception as e:
+            logging.warning(f"Versions de ressources indisponibles (pas d'ETag): {e}")
+            return
+        params = sorted((k, v) for k, v in request.query_params.multi_items() if k not in _IGNORED_PARAMS)
+        vector = ",".join(f"{name}:{version}" for name, (version, _) in versions.items())
+        raw = f"{request.url.path}|{params}|{scope}|{asset_version.value}|{vector}"
+        self.etag = '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+        stamps = [ts for _, ts in versions.values() if ts is not None]
+        modified = max(stamps).replace(tzinfo=timezone.utc, microsecond=0) if stamps else None
+        if modified is not None:
+            self.last_modified = format_datetime(modified, usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            self.not_modified = _etag_matches(if_none_match, self.etag)
+        elif modified is not None and request.headers.get("if-modified-since"):
+            try:
+                since = parsedate_to_datetime(request.headers["if-modified-since"])
+                self.not_modified = since is not None and modified <= since.astimezone(timezone.utc)
+            except (TypeError, ValueError):
+                self.not_modified = False
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        if self.etag is None:
+            return {}
+        headers = {"ETag": self.etag, "Cache-Control": "private, no-cache"}
+        if self.last_modified:
+            headers["Last-Modified"] = self.last_modified
+        return headers
+
+    def not_modified_response(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
+
+
+def conditional_get(request: Request, db, resources: Iterable[str], scope: str = "") -> ConditionalGet:
+    return ConditionalGet(request, db, resources, scope=scope)
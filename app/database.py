@@ -1,10 +1,16 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, UniqueConstraint, Index, Numeric, Date
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, UniqueConstraint, Index, Numeric, Date, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
 from datetime import datetime
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from starlette.requests import Request
+
+from .db_pool import InstrumentedQueuePool, instrument_engine
 
 load_dotenv()
 
@@ -51,25 +57,53 @@ _max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "10"))
 _pool_timeout = int(os.getenv("DB_POOL_TIMEOUT", "30"))
 _pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 30 min
 
-engine_kwargs = {
-    "pool_pre_ping": True,
-}
-if _is_sqlite:
-    engine_kwargs["connect_args"] = {"check_same_thread": False}
-else:
-    engine_kwargs.update({
-        "pool_size": _pool_size,
-        "max_overflow": _max_overflow,
-        "pool_timeout": _pool_timeout,
-        "pool_recycle": _pool_recycle,
-    })
-
-engine = create_engine(
-    DATABASE_URL,
-    **engine_kwargs,
-)
+# Pool séparé pour les tâches de fond (migrations, rappels, Google Sheets, maintenance):
+# elles ne peuvent pas épuiser le pool des requêtes HTTP
+_background_pool_size = int(os.getenv("DB_BACKGROUND_POOL_SIZE", "2"))
+_background_max_overflow = int(os.getenv("DB_BACKGROUND_MAX_OVERFLOW", "3"))
+
+# Réplique en lecture optionnelle (rapports, tableau de bord, exports)
+DATABASE_READ_URL = _normalize_db_url(os.getenv("DATABASE_READ_URL", ""))
+_read_pool_size = int(os.getenv("DB_READ_POOL_SIZE", str(_pool_size)))
+_read_max_overflow = int(os.getenv("DB_READ_MAX_OVERFLOW", str(_max_overflow)))
+# Lecture de ses propres écritures: après une écriture, le client lit sur le primaire pendant ce délai
+DB_READ_STICKY_SECONDS = float(os.getenv("DB_READ_STICKY_SECONDS", "5"))
+DB_READ_STICKY_COOKIE = "db_primary_until"
+# Réplique injoignable: primaire pendant ce délai avant une nouvelle tentative
+_read_retry_seconds = float(os.getenv("DB_READ_RETRY_SECONDS", "30"))
+
+def _create_engine(pool_size: int, max_overflow: int, url: str = DATABASE_URL):
+    # Pas de pool_pre_ping (un aller-retour par emprunt): test seulement après inactivité, voir db_pool
+    engine_kwargs = {}
+    if "sqlite" in url:
+        engine_kwargs["connect_args"] = {"check_same_thread": False}
+        if ":memory:" not in url:
+            engine_kwargs.update({"poolclass": InstrumentedQueuePool, "pool_size": pool_size, "max_overflow": max_overflow})
+    else:
+        engine_kwargs.update({
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": _pool_timeout,
+            "pool_recycle": _pool_recycle,
+        })
+    return create_engine(
+        url,
+        **engine_kwargs,
+    )
+
+engine = instrument_engine(_create_engine(_pool_size, _max_overflow), "web")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+background_engine = instrument_engine(_create_engine(_background_pool_size, _background_max_overflow), "background")
+BackgroundSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=background_engine)
+
+read_engine = None
+ReadSessionLocal = None
+if DATABASE_READ_URL and DATABASE_READ_URL != DATABASE_URL:
+    read_engine = instrument_engine(_create_engine(_read_pool_size, _read_max_overflow, DATABASE_READ_URL), "read")
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 Base = declarative_base()
 
 # Modèles de base de données basés sur le schéma PostgreSQL original
@@ -102,6 +136,10 @@ class Client(Base):
     tax_number = Column(String(50))
     notes = Column(Text)
 
+    __table_args__ = (
+        Index('idx_clients_name', 'name'),
+    )
+
 # Créances clients (dettes clients manuelles)
 class ClientDebt(Base):
     __tablename__ = "client_debts"
@@ -122,6 +160,10 @@ class ClientDebt(Base):
     # Relations
     client = relationship("Client")
 
+    __table_args__ = (
+        Index('idx_client_debts_due_date', 'due_date'),
+    )
+
 class ClientDebtPayment(Base):
     __tablename__ = "client_debt_payments"
 
@@ -236,6 +278,14 @@ class Product(Base):
     stock_movements = relationship("StockMovement", back_populates="product")
     variants = relationship("ProductVariant", back_populates="product", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('idx_products_quantity', 'quantity'),
+        Index('idx_products_brand', 'brand'),
+        Index('idx_products_model', 'model'),
+        # Clé normalisée (espaces retirés) pour les scans par lot
+        Index('idx_products_barcode_norm', func.trim(barcode)),
+    )
+
 class ProductSerialNumber(Base):
     __tablename__ = "product_serial_numbers"
     
@@ -266,6 +316,14 @@ class ProductVariant(Base):
     product = relationship("Product", back_populates="variants")
     attributes = relationship("ProductVariantAttribute", back_populates="variant", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('idx_product_variants_product', 'product_id'),
+        Index('idx_product_variants_product_sold', 'product_id', 'is_sold'),
+        Index('idx_product_variants_condition', 'condition'),
+        Index('idx_product_variants_barcode_norm', func.trim(barcode)),
+        Index('idx_product_variants_imei_norm', func.trim(imei_serial)),
+    )
+
 class ProductVariantAttribute(Base):
     __tablename__ = "product_variant_attributes"
     
@@ -293,6 +351,14 @@ class StockMovement(Base):
     # Relations
     product = relationship("Product", back_populates="stock_movements")
 
+    __table_args__ = (
+        Index('idx_stock_movements_created_at', 'created_at'),
+        Index('idx_stock_movements_product_date', 'product_id', 'created_at'),
+        Index('idx_stock_movements_reference', 'reference_type', 'reference_id'),
+        # Parcours de la queue du journal après un point de contrôle (movement_id > last_movement_id)
+        Index('idx_stock_movements_product_movement', 'product_id', 'movement_id'),
+    )
+
 # --- Bank Transactions ---
 class BankTransaction(Base):
     __tablename__ = "bank_transactions"
@@ -441,6 +507,12 @@ class Quotation(Base):
     client = relationship("Client")
     items = relationship("QuotationItem", back_populates="quotation", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('idx_quotations_date', 'date'),
+        Index('idx_quotations_created_at', 'created_at'),
+        Index('idx_quotations_status', 'status'),
+    )
+
 class QuotationItem(Base):
     __tablename__ = "quotation_items"
     
@@ -484,6 +556,17 @@ class Invoice(Base):
     items = relationship("InvoiceItem", back_populates="invoice", cascade="all, delete-orphan")
     payments = relationship("InvoicePayment", back_populates="invoice", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('idx_invoices_date_status', 'date', 'status'),
+        Index('idx_invoices_status', 'status'),
+        Index('idx_invoices_date', 'date'),
+        Index('idx_invoices_created_at', 'created_at'),
+        Index('idx_invoices_client_date', 'client_id', 'date'),
+        Index('idx_invoices_number', 'invoice_number'),
+        Index('idx_invoices_client_id', 'client_id'),
+        Index('idx_invoices_remaining_amount', 'remaining_amount'),
+    )
+
 class InvoiceItem(Base):
     __tablename__ = "invoice_items"
     
@@ -499,6 +582,11 @@ class InvoiceItem(Base):
     invoice = relationship("Invoice", back_populates="items")
     product = relationship("Product")
 
+    __table_args__ = (
+        Index('idx_invoice_items_invoice_id', 'invoice_id'),
+        Index('idx_invoice_items_product_name', 'product_name'),
+    )
+
 class InvoicePayment(Base):
     __tablename__ = "invoice_payments"
     
@@ -513,6 +601,12 @@ class InvoicePayment(Base):
     # Relations
     invoice = relationship("Invoice", back_populates="payments")
 
+    __table_args__ = (
+        Index('idx_invoice_payments_date', 'payment_date'),
+        Index('idx_invoice_payments_method_date', 'payment_method', 'payment_date'),
+        Index('idx_invoice_payments_invoice_id', 'invoice_id'),
+    )
+
 class DeliveryNote(Base):
     __tablename__ = "delivery_notes"
     
@@ -588,6 +682,11 @@ class ScanHistory(Base):
     # Relations
     user = relationship("User")
 
+    __table_args__ = (
+        # Purge de la rétention par date
+        Index('idx_scan_history_scanned_at', 'scanned_at'),
+    )
+
 class AppCache(Base):
     __tablename__ = "app_cache"
     
@@ -598,6 +697,142 @@ class AppCache(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+# Agrégat journalier du chiffre d'affaires (jours clos uniquement)
+class SalesDailyRollup(Base):
+    __tablename__ = "sales_daily_rollup"
+
+    day = Column(Date, primary_key=True)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)  # somme des factures payées du jour
+    invoice_count = Column(Integer, nullable=False, default=0)
+    computed_at = Column(DateTime, default=func.now())
+
+# Résumé de stock des produits à variantes (une ligne par produit ayant au moins une variante)
+class ProductStockSummary(Base):
+    __tablename__ = "product_stock_summary"
+
+    product_id = Column(Integer, ForeignKey("products.product_id", ondelete="CASCADE"), primary_key=True)
+    total_variants = Column(Integer, nullable=False, default=0)
+    available_variants = Column(Integer, nullable=False, default=0)  # variantes non vendues
+    condition_counts = Column(Text)  # JSON {condition: variantes disponibles}
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index('idx_product_stock_summary_available', 'available_variants'),
+    )
+
+# Compteurs de la page Produits par catégorie (maintenus de façon incrémentale)
+class ProductStatsCounter(Base):
+    __tablename__ = "product_stats_counters"
+
+    category = Column(String(50), primary_key=True)  # '' pour les produits sans catégorie
+    total = Column(Integer, nullable=False, default=0)
+    with_variants = Column(Integer, nullable=False, default=0)
+    in_stock = Column(Integer, nullable=False, default=0)
+    out_of_stock = Column(Integer, nullable=False, default=0)
+    with_barcode = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# Points de contrôle du journal de stock: solde d'un produit jusqu'au mouvement last_movement_id inclus
+class StockLedgerCheckpoint(Base):
+    __tablename__ = "stock_ledger_checkpoints"
+
+    product_id = Column(Integer, ForeignKey("products.product_id", ondelete="CASCADE"), primary_key=True)
+    last_movement_id = Column(Integer, nullable=False, default=0)
+    balance = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# Solde des mouvements archivés (retirés de stock_movements) par produit: base du journal de stock
+class StockLedgerArchiveBalance(Base):
+    __tablename__ = "stock_ledger_archive_balances"
+
+    product_id = Column(Integer, ForeignKey("products.product_id", ondelete="CASCADE"), primary_key=True)
+    balance = Column(Integer, nullable=False, default=0)
+    archived_movements = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# Nombre de lignes des tables en ajout seul (évite COUNT(*) sur toute la table)
+class TableRowCounter(Base):
+    __tablename__ = "table_row_counters"
+
+    table_name = Column(String(64), primary_key=True)
+    row_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# Version des ressources exposées par l'API (ETag / Last-Modified des listes et fiches)
+class ResourceVersion(Base):
+    __tablename__ = "resource_versions"
+
+    resource = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
+
+# Tokens révoqués avant leur expiration (déconnexion), identifiés par leur jti
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(Integer, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)  # UTC: purgé une fois expiré
+    revoked_at = Column(DateTime, nullable=False)
+
+# Par utilisateur: tokens émis avant not_before refusés (désactivation, mot de passe, rôle)
+class UserTokenWatermark(Base):
+    __tablename__ = "user_token_watermarks"
+
+    user_id = Column(Integer, primary_key=True)
+    not_before = Column(Float, nullable=False)  # horodatage epoch, comparé au claim iat
+    updated_at = Column(DateTime, nullable=False)
+
+# Clés d'idempotence des imports en masse de produits (clé fournie par le client -> produit)
+class ProductImportKey(Base):
+    __tablename__ = "product_import_keys"
+
+    client_key = Column(String(128), primary_key=True)
+    # NULL: clé réservée par un import dont la transaction n'est pas encore validée
+    product_id = Column(Integer, ForeignKey("products.product_id", ondelete="CASCADE"), nullable=True, index=True)
+    payload_hash = Column(String(64), nullable=False)  # sha256 du dernier contenu appliqué
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# Sessions d'inventaire (comptage physique du stock)
+class StockCountSession(Base):
+    __tablename__ = "stock_count_sessions"
+
+    session_id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(200), nullable=False)
+    category = Column(String(50), nullable=True)  # périmètre optionnel (sinon tous les produits)
+    status = Column(String(20), nullable=False, default="open")  # open | closed | cancelled
+    notes = Column(Text)
+    created_by = Column(Integer, ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    closed_at = Column(DateTime, nullable=True)
+    adjustments_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_stock_count_sessions_status', 'status'),
+    )
+
+# Quantités attendues figées à l'ouverture de la session
+class StockCountExpected(Base):
+    __tablename__ = "stock_count_expected"
+
+    session_id = Column(Integer, ForeignKey("stock_count_sessions.session_id", ondelete="CASCADE"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.product_id", ondelete="CASCADE"), primary_key=True)
+    expected_quantity = Column(Integer, nullable=False, default=0)
+    has_variants = Column(Boolean, nullable=False, default=False)
+
+# Lots de codes scannés reçus (chunk_id fourni par le client => renvoi idempotent)
+class StockCountChunk(Base):
+    __tablename__ = "stock_count_chunks"
+
+    session_id = Column(Integer, ForeignKey("stock_count_sessions.session_id", ondelete="CASCADE"), primary_key=True)
+    chunk_id = Column(String(64), primary_key=True)
+    device_id = Column(String(64), nullable=True)
+    codes = Column(Text, nullable=False)  # JSON: liste des codes bruts
+    code_count = Column(Integer, nullable=False, default=0)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True)
+    received_at = Column(DateTime, default=func.now())
+
 # Demandes quotidiennes des clients
 class DailyClientRequest(Base):
     __tablename__ = "daily_client_requests"
@@ -646,6 +881,7 @@ class DailySale(Base):
 
     __table_args__ = (
         Index('ix_daily_sales_date_client', 'sale_date', 'client_id'),
+        Index('idx_daily_sales_invoice_id', 'invoice_id'),
     )
 
 # Migrations de données
@@ -683,6 +919,11 @@ class MigrationLog(Base):
     # Relations
     migration = relationship("Migration", back_populates="logs")
 
+    __table_args__ = (
+        # Purge de la rétention par date
+        Index('idx_migration_logs_timestamp', 'timestamp'),
+    )
+
 # Fonction pour créer les tables
 def create_tables():
     Base.metadata.create_all(bind=engine)
@@ -707,6 +948,76 @@ def get_db():
                 pass
 
 
+_replica_down_until = 0.0
+_replica_lock = threading.Lock()
+
+
+def _mark_replica_down(error: Exception) -> None:
+    global _replica_down_until
+    with _replica_lock:
+        if time.monotonic() < _replica_down_until:
+            return
+        _replica_down_until = time.monotonic() + _read_retry_seconds
+    logging.warning(f"Réplique en lecture indisponible, bascule sur le primaire ({_read_retry_seconds:.0f}s): {error}")
+
+
+def read_replica_status() -> dict:
+    """Configuration et disponibilité de la réplique en lecture"""
+    remaining = _replica_down_until - time.monotonic()
+    return {
+        "configured": read_engine is not None,
+        "available": read_engine is not None and remaining <= 0,
+        "retry_in_s": round(remaining, 1) if remaining > 0 else 0,
+        "sticky_seconds": DB_READ_STICKY_SECONDS,
+    }
+
+
+def _wants_primary(request) -> bool:
+    """Vrai si le client a écrit récemment (cookie posé par le middleware après une écriture)"""
+    if request is None:
+        return False
+    raw = request.cookies.get(DB_READ_STICKY_COOKIE)
+    if not raw:
+        return False
+    try:
+        return float(raw) > time.time()
+    except ValueError:
+        return False
+
+
+def _open_read_session(request=None):
+    """Session sur la réplique si disponible, sinon sur le primaire"""
+    if ReadSessionLocal is None or _wants_primary(request) or time.monotonic() < _replica_down_until:
+        return SessionLocal()
+    db = ReadSessionLocal()
+    try:
+        # Emprunt immédiat: une réplique injoignable est détectée avant la requête métier
+        db.connection()
+        return db
+    except Exception as e:
+        try:
+            db.close()
+        except Exception:
+            pass
+        _mark_replica_down(e)
+        return SessionLocal()
+
+
+# Fonction pour obtenir une session en lecture seule (rapports, tableau de bord, exports)
+def get_read_db(request: Request):
+    db = _open_read_session(request)
+    try:
+        yield db
+    finally:
+        try:
+            db.close()
+        except Exception:
+            try:
+                db.rollback()
+            except Exception:
+                pass
+
+
 # ==================== MODÈLES BOUTIQUE EN LIGNE ====================
 # Importer les modèles de la boutique pour créer les tables
 try:
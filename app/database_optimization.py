@@ -1,174 +1,247 @@
 """
 Script d'optimisation de la base de données pour améliorer les performances du dashboard
+
+Les index génériques sont déclarés sur les modèles (`__table_args__` dans
+database.py) et créés par `create_all`. Ce module vérifie au démarrage que la
+base réelle les possède (rapport index manquants / inutilisés / redondants),
+crée ceux qui manquent si DB_AUTO_CREATE_INDEXES=true, et exécute les
+opérations lourdes (index, ANALYZE) dans un job en arrière-plan dont la
+progression est consultable.
 """
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text, inspect
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Incrémenter à chaque modification des index déclarés ou de POSTGRES_INDEXES
+INDEX_SET_VERSION = 6
+
+# Index spécifiques PostgreSQL (trigram et fonctionnels): non exprimables de façon portable sur les modèles
+POSTGRES_INDEXES: List[Tuple[str, str, str]] = [
+    # Trigram pour recherches ILIKE sur produits
+    ("idx_products_name_trgm", "products", "CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING gin (name gin_trgm_ops)"),
+    ("idx_products_brand_trgm", "products", "CREATE INDEX IF NOT EXISTS idx_products_brand_trgm ON products USING gin (brand gin_trgm_ops)"),
+    ("idx_products_model_trgm", "products", "CREATE INDEX IF NOT EXISTS idx_products_model_trgm ON products USING gin (model gin_trgm_ops)"),
+    ("idx_products_barcode_trgm", "products", "CREATE INDEX IF NOT EXISTS idx_products_barcode_trgm ON products USING gin (barcode gin_trgm_ops)"),
+    # Trigram pour variantes (scan et recherche)
+    ("idx_product_variants_barcode_trgm", "product_variants", "CREATE INDEX IF NOT EXISTS idx_product_variants_barcode_trgm ON product_variants USING gin (barcode gin_trgm_ops)"),
+    ("idx_product_variants_imei_trgm", "product_variants", "CREATE INDEX IF NOT EXISTS idx_product_variants_imei_trgm ON product_variants USING gin (imei_serial gin_trgm_ops)"),
+    # Index fonctionnel pour filtres/agrégations sur condition insensible à la casse/espaces
+    ("idx_product_variants_condition_norm", "product_variants", "CREATE INDEX IF NOT EXISTS idx_product_variants_condition_norm ON product_variants (lower(btrim(condition)))"),
+]
+
+# Anciens index doublant l'index d'une contrainte UNIQUE: supprimés par le job d'optimisation
+REDUNDANT_INDEXES: List[Tuple[str, str]] = [
+    ("idx_products_barcode", "products"),
+    ("idx_product_variants_barcode", "product_variants"),
+    ("idx_product_variants_imei", "product_variants"),
+    ("idx_quotations_number", "quotations"),
+]
+
+# Tables dont les statistiques sont rafraîchies par ANALYZE
+ANALYZE_TABLES = [
+    "invoices",
+    "invoice_items",
+    "invoice_payments",
+    "quotations",
+    "products",
+    "product_variants",
+    "stock_movements",
+]
+
 def get_optimized_engine():
     """Récupère le moteur de base de données avec les optimisations"""
-    from .database import DATABASE_URL, engine_kwargs
-    return create_engine(DATABASE_URL, **engine_kwargs)
-
-def create_performance_indexes(engine):
-    """Crée les index nécessaires pour optimiser les performances (génériques)"""
-    
-    indexes_to_create = [
-        # Index pour les factures (optimise les calculs dashboard)
-        "CREATE INDEX IF NOT EXISTS idx_invoices_date_status ON invoices(date, status)",
-        "CREATE INDEX IF NOT EXISTS idx_invoices_status ON invoices(status)",
-        "CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(date)",
-        "CREATE INDEX IF NOT EXISTS idx_invoices_created_at ON invoices(created_at)",
-        "CREATE INDEX IF NOT EXISTS idx_invoices_client_date ON invoices(client_id, date)",
-        "CREATE INDEX IF NOT EXISTS idx_invoices_number ON invoices(invoice_number)",
-        
-        # Index pour les paiements de factures
-        "CREATE INDEX IF NOT EXISTS idx_invoice_payments_date ON invoice_payments(payment_date)",
-        "CREATE INDEX IF NOT EXISTS idx_invoice_payments_method_date ON invoice_payments(payment_method, payment_date)",
-        
-        # Index pour les articles de factures (top produits)
-        "CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice_id ON invoice_items(invoice_id)",
-        "CREATE INDEX IF NOT EXISTS idx_invoice_items_product_name ON invoice_items(product_name)",
-        
-        # Index pour les devis
-        "CREATE INDEX IF NOT EXISTS idx_quotations_date ON quotations(date)",
-        "CREATE INDEX IF NOT EXISTS idx_quotations_created_at ON quotations(created_at)",
-        "CREATE INDEX IF NOT EXISTS idx_quotations_number ON quotations(quotation_number)",
-        "CREATE INDEX IF NOT EXISTS idx_quotations_status ON quotations(status)",
-        
-        # Index pour les produits (filtres stock et catégorie)
-        "CREATE INDEX IF NOT EXISTS idx_products_quantity ON products(quantity)",
-        "CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)",
-        "CREATE INDEX IF NOT EXISTS idx_products_brand ON products(brand)",
-        "CREATE INDEX IF NOT EXISTS idx_products_model ON products(model)",
-        "CREATE INDEX IF NOT EXISTS idx_products_barcode ON products(barcode)",
-        
-        # Index pour les variantes (accélère résumés et recherches)
-        "CREATE INDEX IF NOT EXISTS idx_product_variants_product ON product_variants(product_id)",
-        "CREATE INDEX IF NOT EXISTS idx_product_variants_product_sold ON product_variants(product_id, is_sold)",
-        "CREATE INDEX IF NOT EXISTS idx_product_variants_condition ON product_variants(condition)",
-        "CREATE INDEX IF NOT EXISTS idx_product_variants_barcode ON product_variants(barcode)",
-        "CREATE INDEX IF NOT EXISTS idx_product_variants_imei ON product_variants(imei_serial)",
-        
-        # Index pour les mouvements de stock
-        "CREATE INDEX IF NOT EXISTS idx_stock_movements_created_at ON stock_movements(created_at)",
-        "CREATE INDEX IF NOT EXISTS idx_stock_movements_product_date ON stock_movements(product_id, created_at)",
-        
-        # Index pour les clients actifs
-        "CREATE INDEX IF NOT EXISTS idx_invoices_client_id ON invoices(client_id)",
-        "CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(name)",
-    ]
-    
+    # Même configuration de pool que l'application (pool des tâches de fond)
+    from .database import background_engine
+    return background_engine
+
+def _is_postgres(engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+def declared_indexes():
+    """Index déclarés sur les modèles, par table: [(table, Index)]."""
+    from .database import Base
+    result = []
+    for table in Base.metadata.sorted_tables:
+        for idx in sorted(table.indexes, key=lambda i: i.name or ""):
+            result.append((table.name, idx))
+    return result
+
+def _unused_indexes(engine) -> Optional[List[Dict[str, Any]]]:
+    """Index jamais utilisés depuis la dernière remise à zéro des statistiques (PostgreSQL)."""
+    if not _is_postgres(engine):
+        return None
+    sql = text(
+        """
+        SELECT s.relname AS table_name, s.indexrelname AS index_name, s.idx_scan,
+               pg_relation_size(s.indexrelid) AS size_bytes
+        FROM pg_stat_user_indexes s
+        JOIN pg_index i ON i.indexrelid = s.indexrelid
+        WHERE s.idx_scan = 0 AND NOT i.indisunique AND NOT i.indisprimary
+        ORDER BY pg_relation_size(s.indexrelid) DESC
+        """
+    )
     with engine.connect() as conn:
-        for index_sql in indexes_to_create:
-            try:
-                print(f"Création de l'index: {index_sql}")
-                conn.execute(text(index_sql))
-                conn.commit()
-                print("✅ Index créé avec succès")
-            except Exception as e:
-                print(f"⚠️ Erreur lors de la création de l'index (peut-être déjà existant): {e}")
-                conn.rollback()
+        return [
+            {"table": r.table_name, "name": r.index_name, "scans": int(r.idx_scan or 0), "size_bytes": int(r.size_bytes or 0)}
+            for r in conn.execute(sql)
+        ]
+
+def verify_indexes(engine) -> Dict[str, Any]:
+    """Compare les index déclarés (modèles + PostgreSQL) à ceux présents en base."""
+    insp = inspect(engine)
+    existing_tables = set(insp.get_table_names())
+    existing: Dict[str, set] = {}
+
+    def names_for(table_name: str) -> set:
+        if table_name not in existing:
+            if engine.dialect.name == "sqlite":
+                # L'inspecteur SQLite ignore les index sur expression (ex: trim(barcode))
+                with engine.connect() as conn:
+                    rows = conn.execute(
+                        text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"),
+                        {"t": table_name},
+                    )
+                    existing[table_name] = {r[0] for r in rows}
+            else:
+                existing[table_name] = {ix.get("name") for ix in insp.get_indexes(table_name)}
+        return existing[table_name]
+
+    missing: List[Dict[str, Any]] = []
+    present = 0
+    for table_name, idx in declared_indexes():
+        if table_name not in existing_tables:
+            continue
+        if idx.name in names_for(table_name):
+            present += 1
+        else:
+            missing.append({"name": idx.name, "table": table_name, "columns": [c.name for c in idx.columns]})
+
+    if _is_postgres(engine):
+        for name, table_name, _ddl in POSTGRES_INDEXES:
+            if table_name not in existing_tables:
+                continue
+            if name in names_for(table_name):
+                present += 1
+            else:
+                missing.append({"name": name, "table": table_name, "columns": None})
+
+    redundant = [
+        {"name": name, "table": table_name}
+        for name, table_name in REDUNDANT_INDEXES
+        if table_name in existing_tables and name in names_for(table_name)
+    ]
+
+    try:
+        unused = _unused_indexes(engine)
+    except Exception as e:
+        print(f"⚠️ Statistiques d'utilisation des index indisponibles: {e}")
+        unused = None
+
+    return {
+        "version": INDEX_SET_VERSION,
+        "dialect": engine.dialect.name,
+        "present": present,
+        "missing": missing,
+        "redundant": redundant,
+        "unused": unused,  # None si non supporté (SQLite)
+        "checked_at": datetime.now().isoformat(),
+    }
+
+def _create_index(engine, table_name: str, idx) -> None:
+    ddl = str(CreateIndex(idx, if_not_exists=True).compile(dialect=engine.dialect))
+    if _is_postgres(engine):
+        # CONCURRENTLY: ne bloque pas les écritures, mais interdit dans une transaction
+        ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(ddl))
+
+def _drop_index(engine, name: str) -> None:
+    ddl = f"DROP INDEX IF EXISTS {name}"
+    if _is_postgres(engine):
+        ddl = f"DROP INDEX CONCURRENTLY IF EXISTS {name}"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(ddl))
+
+def create_performance_indexes(engine, only_missing: Optional[List[str]] = None):
+    """Crée les index déclarés sur les modèles qui manquent en base"""
+    for table_name, idx in declared_indexes():
+        if only_missing is not None and idx.name not in only_missing:
+            continue
+        try:
+            print(f"Création de l'index: {idx.name} ON {table_name}")
+            _create_index(engine, table_name, idx)
+            print("✅ Index créé avec succès")
+        except Exception as e:
+            print(f"⚠️ Erreur lors de la création de l'index {idx.name}: {e}")
 
 
 def create_postgres_specific_indexes(engine):
     """Crée les index spécifiques PostgreSQL (trigram et fonctionnels)."""
-    try:
-        with engine.connect() as conn:
-            version = conn.execute(text("SELECT version()"))
-            version_str = version.scalar() or ''
-            if 'PostgreSQL' not in version_str:
-                print("📊 Base de données non-PostgreSQL: index spécifiques ignorés")
-                return
-            print("🐘 PostgreSQL détecté: création d'index spécifiques (pg_trgm, fonctionnels)...")
-            # Activer l'extension trigram
+    if not _is_postgres(engine):
+        print("📊 Base de données non-PostgreSQL: index spécifiques ignorés")
+        return
+    print("🐘 PostgreSQL détecté: création d'index spécifiques (pg_trgm, fonctionnels)...")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # Activer l'extension trigram
+        try:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except Exception as e:
+            print(f"ℹ️ Extension pg_trgm: {e}")
+        for name, _table, ddl in POSTGRES_INDEXES:
             try:
-                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
-                conn.commit()
+                print(f"Création index PostgreSQL: {name}")
+                conn.execute(text(ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)))
+                print("✅ Index PostgreSQL créé")
             except Exception as e:
-                print(f"ℹ️ Extension pg_trgm: {e}")
-                conn.rollback()
-            
-            pg_indexes = [
-                # Trigram pour recherches ILIKE sur produits
-                "CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING gin (name gin_trgm_ops)",
-                "CREATE INDEX IF NOT EXISTS idx_products_brand_trgm ON products USING gin (brand gin_trgm_ops)",
-                "CREATE INDEX IF NOT EXISTS idx_products_model_trgm ON products USING gin (model gin_trgm_ops)",
-                "CREATE INDEX IF NOT EXISTS idx_products_barcode_trgm ON products USING gin (barcode gin_trgm_ops)",
-                
-                # Trigram pour variantes (scan et recherche)
-                "CREATE INDEX IF NOT EXISTS idx_product_variants_barcode_trgm ON product_variants USING gin (barcode gin_trgm_ops)",
-                "CREATE INDEX IF NOT EXISTS idx_product_variants_imei_trgm ON product_variants USING gin (imei_serial gin_trgm_ops)",
-                
-                # Index fonctionnel pour filtres/agrégations sur condition insensible à la casse/espaces
-                "CREATE INDEX IF NOT EXISTS idx_product_variants_condition_norm ON product_variants (lower(btrim(condition)))",
-            ]
-            for idx in pg_indexes:
-                try:
-                    print(f"Création index PostgreSQL: {idx}")
-                    conn.execute(text(idx))
-                    conn.commit()
-                    print("✅ Index PostgreSQL créé")
-                except Exception as e:
-                    print(f"⚠️ Erreur index PostgreSQL: {e}")
-                    conn.rollback()
-    except Exception as e:
-        print(f"❌ Erreur create_postgres_specific_indexes: {e}")
+                print(f"⚠️ Erreur index PostgreSQL {name}: {e}")
 
 def optimize_postgresql_settings(engine):
-    """Applique des optimisations spécifiques à PostgreSQL"""
-    
+    """Applique des optimisations spécifiques à PostgreSQL (statistiques étendues)"""
+
     postgresql_optimizations = [
         # Augmenter les statistiques pour de meilleures estimations
         "ALTER TABLE invoices ALTER COLUMN date SET STATISTICS 1000",
         "ALTER TABLE invoices ALTER COLUMN status SET STATISTICS 1000",
         "ALTER TABLE invoice_payments ALTER COLUMN payment_date SET STATISTICS 1000",
-        
-        # Analyser les tables pour mettre à jour les statistiques
-        "ANALYZE invoices",
-        "ANALYZE invoice_items",
-        "ANALYZE invoice_payments", 
-        "ANALYZE quotations",
-        "ANALYZE products",
-        "ANALYZE stock_movements",
     ]
-    
-    try:
-        with engine.connect() as conn:
-            # Vérifier si c'est PostgreSQL
-            result = conn.execute(text("SELECT version()"))
-            version = result.scalar()
-            
-            if 'PostgreSQL' in version:
-                print("🐘 Optimisations PostgreSQL détectées")
-                for optimization_sql in postgresql_optimizations:
-                    try:
-                        print(f"Exécution: {optimization_sql}")
-                        conn.execute(text(optimization_sql))
-                        conn.commit()
-                        print("✅ Optimisation appliquée")
-                    except Exception as e:
-                        print(f"⚠️ Erreur optimisation PostgreSQL: {e}")
-                        conn.rollback()
-            else:
-                print("📊 Base de données non-PostgreSQL détectée, optimisations spécifiques ignorées")
-                
-    except Exception as e:
-        print(f"❌ Erreur lors de la vérification de la base: {e}")
+
+    if not _is_postgres(engine):
+        print("📊 Base de données non-PostgreSQL détectée, optimisations spécifiques ignorées")
+        return
+    with engine.connect() as conn:
+        for optimization_sql in postgresql_optimizations:
+            try:
+                print(f"Exécution: {optimization_sql}")
+                conn.execute(text(optimization_sql))
+                conn.commit()
+                print("✅ Optimisation appliquée")
+            except Exception as e:
+                print(f"⚠️ Erreur optimisation PostgreSQL: {e}")
+                conn.rollback()
+
+def analyze_table(engine, table_name: Optional[str] = None):
+    """Met à jour les statistiques du planificateur (une table, ou toute la base)"""
+    sql = f"ANALYZE {table_name}" if table_name else "ANALYZE"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(sql))
 
 def add_missing_columns(engine):
     """Ajoute les colonnes manquantes si nécessaire"""
-    
+
     column_additions = [
         # S'assurer que les colonnes condition existent
         "ALTER TABLE products ADD COLUMN IF NOT EXISTS condition VARCHAR(50) DEFAULT 'neuf'",
         "ALTER TABLE product_variants ADD COLUMN IF NOT EXISTS condition VARCHAR(50)",
     ]
-    
+
     with engine.connect() as conn:
         for column_sql in column_additions:
             try:
@@ -181,36 +254,146 @@ def add_missing_columns(engine):
                 print(f"ℹ️ Colonne probablement déjà existante: {e}")
                 conn.rollback()
 
+
+class DatabaseOptimizer:
+    """Exécute l'optimisation en arrière-plan (une seule à la fois) et expose sa progression"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._status: Dict[str, Any] = {"state": "idle", "done": 0, "total": 0, "step": None, "log": []}
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._status)
+            st["log"] = list(self._status.get("log") or [])
+        total = st.get("total") or 0
+        st["percent"] = int(100 * (st.get("done") or 0) / total) if total else 0
+        return st
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _plan(self, engine, create_indexes: bool, analyze: bool) -> List[Tuple[str, Callable[[], None]]]:
+        steps: List[Tuple[str, Callable[[], None]]] = [("Vérification des colonnes", lambda: add_missing_columns(engine))]
+        if create_indexes:
+            report = verify_indexes(engine)
+            self.last_report = report
+            generic = {m["name"] for m in report["missing"] if m["columns"] is not None}
+            for table_name, idx in declared_indexes():
+                if idx.name in generic:
+                    steps.append((f"Index {idx.name}", lambda t=table_name, i=idx: _create_index(engine, t, i)))
+            if any(m["columns"] is None for m in report["missing"]):
+                steps.append(("Index spécifiques PostgreSQL", lambda: create_postgres_specific_indexes(engine)))
+            for r in report["redundant"]:
+                steps.append((f"Suppression de l'index redondant {r['name']}", lambda n=r["name"]: _drop_index(engine, n)))
+        if analyze:
+            if _is_postgres(engine):
+                steps.append(("Statistiques étendues PostgreSQL", lambda: optimize_postgresql_settings(engine)))
+                for table_name in ANALYZE_TABLES:
+                    steps.append((f"ANALYZE {table_name}", lambda t=table_name: analyze_table(engine, t)))
+            else:
+                steps.append(("ANALYZE", lambda: analyze_table(engine)))
+        return steps
+
+    def _log(self, message: str):
+        print(message)
+        with self._lock:
+            log = self._status.setdefault("log", [])
+            log.append(message)
+            del log[:-50]
+
+    def run(self, engine=None, create_indexes: bool = True, analyze: bool = True) -> Dict[str, Any]:
+        """Exécute l'optimisation de façon synchrone en mettant à jour la progression"""
+        if engine is None:
+            from .database import background_engine as app_engine
+            engine = app_engine
+        with self._lock:
+            self._status = {
+                "state": "running", "done": 0, "total": 0, "step": "Préparation",
+                "started_at": datetime.now().isoformat(), "finished_at": None, "error": None, "log": [],
+            }
+        try:
+            steps = self._plan(engine, create_indexes, analyze)
+            with self._lock:
+                self._status["total"] = len(steps)
+            for label, action in steps:
+                with self._lock:
+                    self._status["step"] = label
+                try:
+                    action()
+                    self._log(f"✅ {label}")
+                except Exception as e:
+                    self._log(f"⚠️ {label}: {e}")
+                with self._lock:
+                    self._status["done"] += 1
+            if create_indexes:
+                self.last_report = verify_indexes(engine)
+            with self._lock:
+                self._status.update({"state": "completed", "step": None, "finished_at": datetime.now().isoformat()})
+        except Exception as e:
+            self._log(f"❌ Erreur lors de l'optimisation: {e}")
+            with self._lock:
+                self._status.update({"state": "failed", "error": str(e), "finished_at": datetime.now().isoformat()})
+        return self.status()
+
+    def start(self, create_indexes: bool = True, analyze: bool = True) -> Dict[str, Any]:
+        """Lance l'optimisation dans un thread; ne fait rien si une optimisation est déjà en cours"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return {**self._status, "already_running": True}
+            self._status = {"state": "running", "done": 0, "total": 0, "step": "Préparation", "log": []}
+            self._thread = threading.Thread(
+                target=self.run,
+                kwargs={"create_indexes": create_indexes, "analyze": analyze},
+                name="DatabaseOptimizer",
+                daemon=True,
+            )
+            self._thread.start()
+        return self.status()
+
+    def verify_on_startup(self):
+        """Vérifie les index en arrière-plan; crée les manquants si DB_AUTO_CREATE_INDEXES=true (désactivé par défaut)"""
+        def _worker():
+            from .database import background_engine as app_engine
+            try:
+                report = verify_indexes(app_engine)
+                self.last_report = report
+                missing = report["missing"]
+                unused = report["unused"] or []
+                redundant = report["redundant"]
+                print(f"🔍 Index: {report['present']} présents, {len(missing)} manquants, {len(unused)} inutilisés, "
+                      f"{len(redundant)} redondants")
+                for m in missing:
+                    print(f"   ⚠️ Index manquant: {m['name']} ON {m['table']}")
+                for r in redundant:
+                    print(f"   ℹ️ Index redondant (contrainte UNIQUE): {r['name']} ON {r['table']}")
+                if not (missing or redundant):
+                    return
+                # Construction d'index sur de grosses tables: à décider par l'exploitant
+                if os.getenv("DB_AUTO_CREATE_INDEXES", "false").lower() == "true":
+                    self.start(create_indexes=True, analyze=False)
+                else:
+                    print("   ⏭️ DB_AUTO_CREATE_INDEXES!=true → lancer POST /api/dashboard/optimize pour appliquer")
+            except Exception as e:
+                print(f"⚠️ Vérification des index impossible: {e}")
+        threading.Thread(target=_worker, name="IndexVerifier", daemon=True).start()
+
+
+database_optimizer = DatabaseOptimizer()
+
 def optimize_database():
-    """Fonction principale d'optimisation de la base de données"""
+    """Fonction principale d'optimisation de la base de données (exécution synchrone, usage CLI)"""
     print("🚀 Démarrage de l'optimisation de la base de données...")
-    
-    try:
-        engine = get_optimized_engine()
-        print("✅ Connexion à la base de données établie")
-        
-        # 1. Ajouter les colonnes manquantes
-        print("\n📝 Vérification des colonnes...")
-        add_missing_columns(engine)
-        
-        # 2. Créer les index de performance
-        print("\n🔍 Création des index de performance...")
-        create_performance_indexes(engine)
-
-        # 3. Index spécifiques PostgreSQL (trigram + fonctionnels)
-        print("\n🧩 Index spécifiques PostgreSQL...")
-        create_postgres_specific_indexes(engine)
-        
-        # 4. Optimisations spécifiques PostgreSQL
-        print("\n🐘 Optimisations PostgreSQL...")
-        optimize_postgresql_settings(engine)
-        
-        print("\n✅ Optimisation de la base de données terminée avec succès!")
-        print("📊 Le dashboard devrait maintenant être plus rapide")
-        
-    except Exception as e:
-        print(f"❌ Erreur lors de l'optimisation: {e}")
-        raise
+
+    engine = get_optimized_engine()
+    print("✅ Connexion à la base de données établie")
+    status = database_optimizer.run(engine=engine)
+    if status.get("state") == "failed":
+        raise RuntimeError(status.get("error") or "Optimisation échouée")
+    print("\n✅ Optimisation de la base de données terminée avec succès!")
+    print("📊 Le dashboard devrait maintenant être plus rapide")
 
 if __name__ == "__main__":
     optimize_database()
@@ -0,0 +1,89 @@
+"""
+Bornes de dates indexables pour les filtres SQL.
+
+Appliquer func.date() ou extract() à une colonne empêche l'utilisation de ses
+index. Ces helpers convertissent jours, mois et périodes en bornes
+semi-ouvertes [début, suivant) comparées directement à la colonne.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Tuple, Union
+
+from sqlalchemy import Date, and_
+
+DateLike = Union[date, datetime]
+
+
+def _as_day(value: DateLike) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def day_bounds(day: DateLike) -> Tuple[datetime, datetime]:
+    """[00:00 du jour, 00:00 du lendemain)."""
+    d = _as_day(day)
+    start = datetime.combine(d, time.min)
+    return start, start + timedelta(days=1)
+
+
+def month_bounds(day: Optional[DateLike] = None) -> Tuple[datetime, datetime]:
+    """[1er du mois, 1er du mois suivant) du jour donné (aujourd'hui par défaut)."""
+    d = _as_day(day or date.today())
+    first = d.replace(day=1)
+    nxt = (first + timedelta(days=32)).replace(day=1)
+    return datetime.combine(first, time.min), datetime.combine(nxt, time.min)
+
+
+def year_bounds(day: Optional[DateLike] = None) -> Tuple[datetime, datetime]:
+    """[1er janvier, 1er janvier suivant) du jour donné (aujourd'hui par défaut)."""
+    d = _as_day(day or date.today())
+    return datetime(d.year, 1, 1), datetime(d.year + 1, 1, 1)
+
+
+def _is_date_column(column) -> bool:
+    # Les colonnes Date (jour civil) se comparent à des dates, les DateTime à des datetimes
+    return isinstance(getattr(column, "type", None), Date)
+
+
+def _coerce(column, value: datetime):
+    return value.date() if _is_date_column(column) else value
+
+
+def between_clauses(
+    column,
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+) -> List:
+    """Conditions sargables pour start <= jour(column) <= end (bornes incluses, en jours).
+
+    Un datetime passé en `start` est conservé tel quel (ex: "depuis maintenant - 30 j");
+    une date est ramenée à minuit. `end` couvre toujours la journée entière.
+    """
+    clauses = []
+    if start is not None:
+        lower = start if isinstance(start, datetime) else datetime.combine(start, time.min)
+        clauses.append(column >= _coerce(column, lower))
+    if end is not None:
+        clauses.append(column < _coerce(column, day_bounds(end)[1]))
+    return clauses
+
+
+def in_bounds(column, bounds: Tuple[datetime, datetime]):
+    """Condition column ∈ [début, fin)."""
+    start, end = bounds
+    return and_(column >= _coerce(column, start), column < _coerce(column, end))
+
+
+def on_day(column, day: DateLike):
+    """Condition "column tombe le jour donné"."""
+    return in_bounds(column, day_bounds(day))
+
+
+def in_month(column, day: Optional[DateLike] = None):
+    """Condition "column tombe dans le mois du jour donné"."""
+    return in_bounds(column, month_bounds(day))
+
+
+def filter_between(query, column, start: Optional[DateLike] = None, end: Optional[DateLike] = None):
+    """Applique between_clauses() à une requête ORM."""
+    clauses = between_clauses(column, start, end)
+    return query.filter(*clauses) if clauses else query
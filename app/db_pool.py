@@ -0,0 +1,193 @@
+"""
+Pools de connexions instrumentés et vérification de vivacité paresseuse.
+
+- InstrumentedQueuePool mesure l'attente pour obtenir une connexion (total,
+  max, p95 sur un échantillon glissant) et compte les délais dépassés
+  (TimeoutError), en plus des compteurs d'événements du pool: ouvertures,
+  emprunts, restitutions, invalidations et reconnexions (recyclage).
+- pool_pre_ping ajoute un aller-retour à chaque emprunt. À la place, la
+  connexion n'est testée (SELECT 1) que si elle est restée inutilisée plus de
+  DB_PING_IDLE_SECONDS; en cas d'échec, DisconnectionError fait ouvrir une
+  connexion neuve par le pool. 0 = test à chaque emprunt, -1 = jamais.
+- Chaque moteur est enregistré sous un nom ("web", "background"): les
+  tâches de fond ont leur propre pool et ne peuvent pas épuiser celui des
+  requêtes HTTP.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+DB_PING_IDLE_SECONDS = float(os.getenv("DB_PING_IDLE_SECONDS", "30"))
+_WAIT_SAMPLES = 1000
+
+
+class PoolStats:
+    """Compteurs d'un pool (thread-safe)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters: Dict[str, int] = {
+                "connects": 0, "checkouts": 0, "checkins": 0, "timeouts": 0,
+                "invalidations": 0, "recycles": 0,
+                "pings": 0, "pings_skipped": 0, "ping_failures": 0,
+            }
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+    def incr(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += n
+
+    def record_wait(self, elapsed: float) -> None:
+        with self._lock:
+            self.wait_total += elapsed
+            if elapsed > self.wait_max:
+                self.wait_max = elapsed
+            self.waits.append(elapsed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            waits = sorted(self.waits)
+            wait_total, wait_max = self.wait_total, self.wait_max
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        checkouts = counters["checkouts"] or 0
+        return {
+            **counters,
+            "wait_ms": {
+                "avg": round(1000 * wait_total / checkouts, 3) if checkouts else 0.0,
+                "p95": round(1000 * p95, 3),
+                "max": round(1000 * wait_max, 3),
+            },
+        }
+
+
+_registry: Dict[str, Any] = {}
+_registry_lock = threading.Lock()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool mesurant l'attente d'une connexion et les délais dépassés"""
+
+    stats: Optional[PoolStats] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.incr("timeouts")
+            raise
+        if self.stats is not None:
+            self.stats.record_wait(time.perf_counter() - started)
+        return conn
+
+    def recreate(self):
+        # engine.dispose() recrée le pool: conserver les compteurs
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def instrument_engine(engine, name: str, ping_idle_seconds: Optional[float] = None):
+    """Enregistre le moteur sous `name` et branche compteurs et test de vivacité paresseux."""
+    stats = PoolStats(name)
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.stats = stats
+    idle = DB_PING_IDLE_SECONDS if ping_idle_seconds is None else ping_idle_seconds
+    ping = idle >= 0 and engine.dialect.name != "sqlite"
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, record):
+        stats.incr("connects")
+        info = record.record_info
+        # Nouvelle connexion sur un emplacement existant sans invalidation préalable: recyclage (âge)
+        if info.get("connected") and not info.pop("invalidated", False):
+            stats.incr("recycles")
+        info["connected"] = True
+        # Connexion neuve: pas de test au premier emprunt
+        record.info["last_used"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, record, proxy):
+        stats.incr("checkouts")
+        if not ping:
+            return
+        last_used = record.info.get("last_used")
+        if last_used is not None and time.monotonic() - last_used < idle:
+            stats.incr("pings_skipped")
+            return
+        stats.incr("pings")
+        try:
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+        except Exception:
+            stats.incr("ping_failures")
+            # Le pool jette cette connexion et en ouvre une neuve
+            raise exc.DisconnectionError()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, record):
+        stats.incr("checkins")
+        if record is not None:
+            record.info["last_used"] = time.monotonic()
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, record, exception):
+        stats.incr("invalidations")
+        record.record_info["invalidated"] = True
+
+    with _registry_lock:
+        _registry[name] = (engine, stats)
+    return engine
+
+
+def pool_status(name: Optional[str] = None) -> Dict[str, Any]:
+    """État et compteurs des pools enregistrés"""
+    with _registry_lock:
+        items = [(n, v) for n, v in _registry.items() if name is None or n == name]
+    out: Dict[str, Any] = {}
+    for pool_name, (engine, stats) in items:
+        pool = engine.pool
+        entry: Dict[str, Any] = {"dialect": engine.dialect.name, "pool_class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            size = pool.size()
+            checked_out = pool.checkedout()
+            max_overflow = getattr(pool, "_max_overflow", 0)
+            entry.update({
+                "size": size,
+                "max_overflow": max_overflow,
+                "checked_in": pool.checkedin(),
+                "checked_out": checked_out,
+                "overflow": max(0, pool.overflow()),
+                "timeout_s": getattr(pool, "_timeout", None),
+                "recycle_s": getattr(pool, "_recycle", None),
+                # Part de la capacité maximale empruntée
+                "saturation": round(checked_out / (size + max_overflow), 3) if max_overflow >= 0 and size + max_overflow else None,
+            })
+        entry["stats"] = stats.snapshot()
+        out[pool_name] = entry
+    return out
+
+
+def reset_pool_stats() -> None:
+    with _registry_lock:
+        stats = [s for _e, s in _registry.values()]
+    for s in stats:
+        s.reset()
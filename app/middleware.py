@@ -69,3 +69,32 @@ async def timeout_middleware(request: Request, call_next):
     except Exception as e:
         # Laisser les autres erreurs être gérées par le middleware d'erreur
         raise e
+
+async def profiling_middleware(request: Request, call_next):
+    """
+    Middleware de profilage: compte les requêtes SQL et mesure le temps DB par requête HTTP,
+    agrège par route et ajoute l'en-tête Server-Timing
+    """
+    from .profiling import (
+        PROFILING_ENABLED, PROFILING_SERVER_TIMING,
+        profile_registry, server_timing_header, start_request_profile,
+    )
+
+    if not PROFILING_ENABLED or request.url.path.startswith("/static/"):
+        return await call_next(request)
+
+    profile = start_request_profile()
+    started = time.perf_counter()
+    response = await call_next(request)
+    duration = time.perf_counter() - started
+
+    try:
+        # Clé de route = gabarit de chemin (ex: /api/invoices/{invoice_id}) pour borner la cardinalité
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "<non routé>"
+        profile_registry.record(f"{request.method} {path}", duration, profile)
+        if PROFILING_SERVER_TIMING:
+            response.headers["Server-Timing"] = server_timing_header(duration, profile)
+    except Exception as e:
+        logger.debug(f"Profilage ignoré pour {request.url.path}: {e}")
+    return response
@@ -0,0 +1,192 @@
+"""
+Version des assets et coquilles de pages HTML pré-rendues.
+
+- AssetVersion: calculée une fois au démarrage (commit SHA fourni par la
+  plateforme, sinon mtime le plus récent de static/js, static/css et
+  templates). En développement (pas de SHA), un thread surveille ces
+  fichiers toutes les ASSET_WATCH_SECONDS: le rendu et /__live/version ne
+  parcourent plus le disque. ASSET_WATCH=true/false force le choix.
+- PageShellCache: les pages de l'application sont des coquilles (données
+  chargées en JS) qui ne dépendent que du template, de la version des assets,
+  des paramètres société et de l'hôte (url_for). Le HTML rendu est gardé en
+  mémoire par combinaison, avec un ETag: une navigation entre pages ne fait ni
+  accès disque ni requête DB, et un If-None-Match valide renvoie 304.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+
+_COMMIT_SHA = os.getenv("GIT_COMMIT_SHA") or os.getenv("KOYEB_COMMIT_SHA") or os.getenv("ASSET_VERSION")
+_WATCHED = [
+    (os.path.join("static", "js"), (".js",)),
+    (os.path.join("static", "css"), (".css",)),
+    ("templates", (".html",)),
+]
+ASSET_WATCH_SECONDS = float(os.getenv("ASSET_WATCH_SECONDS", "2"))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "256"))
+
+
+def compute_asset_version() -> str:
+    """Commit SHA si disponible, sinon mtime le plus récent des assets et templates"""
+    if _COMMIT_SHA:
+        return _COMMIT_SHA[:12]
+    try:
+        latest_mtime = 0.0
+        for rel, exts in _WATCHED:
+            if os.path.exists(rel):
+                for fn in os.listdir(rel):
+                    if fn.endswith(exts):
+                        try:
+                            latest_mtime = max(latest_mtime, os.path.getmtime(os.path.join(rel, fn)))
+                        except Exception:
+                            pass
+        if latest_mtime > 0:
+            return str(int(latest_mtime))
+    except Exception:
+        pass
+    # Repli: timestamp actuel
+    return str(int(datetime.now().timestamp()))
+
+
+class AssetVersion:
+    """Version courante des assets.
+
+    Utilisable dans les templates comme `{{ ASSET_VERSION() }}` ou `{{ ASSET_VERSION }}`.
+    """
+
+    def __init__(self):
+        self.value = compute_asset_version()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[str], None]] = []
+
+    def __call__(self) -> str:
+        return self.value
+
+    def __str__(self) -> str:
+        return self.value
+
+    @property
+    def watch_enabled(self) -> bool:
+        flag = os.getenv("ASSET_WATCH")
+        if flag is not None:
+            return flag.lower() == "true"
+        return not _COMMIT_SHA
+
+    def on_change(self, callback: Callable[[str], None]) -> None:
+        """Rappel appelé (thread de surveillance) avec la nouvelle version"""
+        self._listeners.append(callback)
+
+    def start_watcher(self) -> bool:
+        if not self.watch_enabled or (self._thread and self._thread.is_alive()):
+            return False
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="AssetVersionWatcher", daemon=True)
+        self._thread.start()
+        print(f"👀 Surveillance des assets activée (toutes les {ASSET_WATCH_SECONDS:.0f}s)")
+        return True
+
+    def stop_watcher(self) -> None:
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.wait(ASSET_WATCH_SECONDS):
+            value = compute_asset_version()
+            if value != self.value:
+                self.value = value
+                for callback in list(self._listeners):
+                    try:
+                        callback(value)
+                    except Exception as e:
+                        print(f"⚠️ Rappel de version des assets en erreur: {e}")
+
+
+asset_version = AssetVersion()
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class PageShellCache:
+    """HTML des pages rendu une fois par (template, version des assets, paramètres, hôte)"""
+
+    def __init__(self, templates, version: AssetVersion = asset_version):
+        self.templates = templates
+        self.version = version
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str, str], Tuple[Any, bytes, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def precompile(self, names: Iterable[str]) -> int:
+        """Compile les templates (et leurs parents) au démarrage"""
+        count = 0
+        for name in names:
+            try:
+                self.templates.env.get_template(name)
+                count += 1
+            except Exception as e:
+                print(f"⚠️ Template {name} non compilé: {e}")
+        # Sans surveillance des fichiers, Jinja n'a plus à vérifier les mtimes à chaque rendu
+        if not self.version.watch_enabled:
+            self.templates.env.auto_reload = False
+        return count
+
+    def render(self, request: Request, name: str, global_settings: Dict[str, Any]) -> Response:
+        # url_for produit des URL absolues: l'hôte fait partie de la clé
+        key = (name, self.version.value, str(request.base_url))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == global_settings:
+            with self._lock:
+                self.hits += 1
+            body, etag = entry[1], entry[2]
+        else:
+            body = self.templates.get_template(name).render(
+                {"request": request, "global_settings": global_settings}
+            ).encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+            with self._lock:
+                self.misses += 1
+                if key not in self._entries and len(self._entries) >= PAGE_CACHE_MAX_ENTRIES:
+                    self._entries.clear()
+                self._entries[key] = (global_settings, body, etag)
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(body, headers=headers)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "asset_version": self.version.value,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
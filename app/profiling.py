@@ -0,0 +1,243 @@
+"""
+Profilage des requêtes: nombre de requêtes SQL, temps DB et requête la plus lente.
+
+Les hooks SQLAlchemy `before_cursor_execute`/`after_cursor_execute` (et
+`handle_error` pour une requête en échec) alimentent
+le profil de la requête HTTP courante (contextvar). Le middleware agrège
+ensuite par route (percentiles p50/p95/p99) et peut journaliser un
+échantillon des requêtes SQL lentes, paramètres masqués.
+"""
+
+import contextvars
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("app.profiling")
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+# Ajoute l'en-tête Server-Timing (visible dans l'onglet Réseau du navigateur)
+PROFILING_SERVER_TIMING = os.getenv("PROFILING_SERVER_TIMING", "true").lower() == "true"
+# Nombre d'échantillons conservés par route pour les percentiles
+PROFILING_SAMPLES_PER_ROUTE = int(os.getenv("PROFILING_SAMPLES_PER_ROUTE", "1000"))
+# Journal des requêtes lentes: seuil en ms (0 = désactivé) et taux d'échantillonnage
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "1.0"))
+
+_MAX_SQL_LENGTH = 500
+
+
+class RequestProfile:
+    """Compteurs SQL d'une requête HTTP"""
+
+    __slots__ = ("query_count", "db_time", "slowest_time", "slowest_sql")
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql: Optional[str] = None
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.query_count += 1
+        self.db_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_sql = statement
+
+
+_current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "request_profile", default=None
+)
+
+
+def start_request_profile() -> RequestProfile:
+    profile = RequestProfile()
+    _current_profile.set(profile)
+    return profile
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+def _shorten(statement: str) -> str:
+    s = " ".join(str(statement or "").split())
+    return s if len(s) <= _MAX_SQL_LENGTH else s[:_MAX_SQL_LENGTH] + "…"
+
+
+def _redacted_params(parameters: Any, executemany: bool) -> str:
+    # Ne jamais journaliser les valeurs liées (données clients, mots de passe...)
+    if executemany and isinstance(parameters, (list, tuple)):
+        return f"<{len(parameters)} lots masqués>"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}=?" for k in parameters) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return f"<{len(parameters)} paramètres masqués>"
+    return "<masqués>"
+
+
+_slow_queries: Deque[Dict[str, Any]] = deque(maxlen=100)
+
+
+def _maybe_log_slow(statement: str, parameters: Any, executemany: bool, elapsed: float) -> None:
+    if SLOW_QUERY_MS <= 0 or elapsed * 1000 < SLOW_QUERY_MS:
+        return
+    if SLOW_QUERY_SAMPLE_RATE < 1.0 and random.random() >= SLOW_QUERY_SAMPLE_RATE:
+        return
+    entry = {
+        "at": datetime.now().isoformat(),
+        "duration_ms": round(elapsed * 1000, 2),
+        "sql": _shorten(statement),
+        "params": _redacted_params(parameters, executemany),
+    }
+    _slow_queries.append(entry)
+    logger.warning(f"Requête SQL lente ({entry['duration_ms']} ms): {entry['sql']} params={entry['params']}")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if PROFILING_ENABLED:
+        conn.info.setdefault("_profiling_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not PROFILING_ENABLED:
+        return
+    starts = conn.info.get("_profiling_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(statement, elapsed)
+    _maybe_log_slow(statement, parameters, executemany, elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_cursor_error(exception_context):
+    # Pas d'after_cursor_execute sur une requête en échec: retirer son départ (pile bornée,
+    # durées des requêtes suivantes justes) et compter quand même le temps passé en base
+    conn = exception_context.connection
+    if conn is None or exception_context.statement is None:
+        return
+    starts = conn.info.get("_profiling_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(exception_context.statement, elapsed)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Rang le plus proche
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class RouteStats:
+    """Échantillons récents d'une route (durée totale, temps DB, nombre de requêtes)"""
+
+    def __init__(self, max_samples: int):
+        self.count = 0
+        self.durations: Deque[float] = deque(maxlen=max_samples)
+        self.db_times: Deque[float] = deque(maxlen=max_samples)
+        self.query_counts: Deque[int] = deque(maxlen=max_samples)
+        self.max_queries = 0
+        self.slowest_sql: Optional[str] = None
+        self.slowest_sql_ms = 0.0
+
+    def add(self, duration: float, profile: RequestProfile) -> None:
+        self.count += 1
+        self.durations.append(duration)
+        self.db_times.append(profile.db_time)
+        self.query_counts.append(profile.query_count)
+        self.max_queries = max(self.max_queries, profile.query_count)
+        if profile.slowest_sql and profile.slowest_time * 1000 > self.slowest_sql_ms:
+            self.slowest_sql_ms = profile.slowest_time * 1000
+            self.slowest_sql = _shorten(profile.slowest_sql)
+
+    def snapshot(self) -> Dict[str, Any]:
+        durations = sorted(self.durations)
+        db_times = sorted(self.db_times)
+        queries = sorted(self.query_counts)
+        n = len(queries) or 1
+        return {
+            "requests": self.count,
+            "samples": len(durations),
+            "latency_ms": {p: round(_percentile(durations, v) * 1000, 2) for p, v in (("p50", 50), ("p95", 95), ("p99", 99))},
+            "db_ms": {p: round(_percentile(db_times, v) * 1000, 2) for p, v in (("p50", 50), ("p95", 95), ("p99", 99))},
+            "queries": {
+                "avg": round(sum(queries) / n, 2),
+                "p95": _percentile([float(q) for q in queries], 95),
+                "max": self.max_queries,
+            },
+            "slowest_sql": self.slowest_sql,
+            "slowest_sql_ms": round(self.slowest_sql_ms, 2),
+        }
+
+
+class ProfileRegistry:
+    """Agrégation par route, partagée par le processus"""
+
+    def __init__(self, max_samples: int = PROFILING_SAMPLES_PER_ROUTE):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, RouteStats] = {}
+        self._max_samples = max_samples
+        self.started_at = datetime.now()
+
+    def record(self, route_key: str, duration: float, profile: RequestProfile) -> None:
+        with self._lock:
+            stats = self._routes.get(route_key)
+            if stats is None:
+                stats = self._routes[route_key] = RouteStats(self._max_samples)
+            stats.add(duration, profile)
+
+    def snapshot(self, sort_by: str = "p95") -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = [{"route": key, **stats.snapshot()} for key, stats in self._routes.items()]
+        if sort_by == "queries":
+            rows.sort(key=lambda r: r["queries"]["avg"], reverse=True)
+        elif sort_by == "requests":
+            rows.sort(key=lambda r: r["requests"], reverse=True)
+        else:
+            rows.sort(key=lambda r: r["latency_ms"].get(sort_by, r["latency_ms"]["p95"]), reverse=True)
+        return rows
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self.started_at = datetime.now()
+        _slow_queries.clear()
+
+
+profile_registry = ProfileRegistry()
+
+
+def slow_queries() -> List[Dict[str, Any]]:
+    return list(_slow_queries)
+
+
+def server_timing_header(duration: float, profile: RequestProfile) -> str:
+    """Valeur de l'en-tête Server-Timing (durées en millisecondes, ASCII uniquement)"""
+    parts = [
+        f'db;dur={profile.db_time * 1000:.1f};desc="{profile.query_count} queries"',
+        f"app;dur={max(0.0, duration - profile.db_time) * 1000:.1f}",
+        f"total;dur={duration * 1000:.1f}",
+    ]
+    if profile.slowest_sql:
+        parts.append(f"db-slowest;dur={profile.slowest_time * 1000:.1f}")
+    return ", ".join(parts)
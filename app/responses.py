@@ -0,0 +1,49 @@
+"""
+Réponse JSON rapide (orjson) et sérialisation légère des listes volumineuses.
+
+- FastJSONResponse: classe de réponse par défaut de l'application. Encode avec
+  orjson (dates ISO, UTF-8) et retombe sur les règles de jsonable_encoder pour
+  les autres types (Decimal → int/float, modèles pydantic). Sans orjson, même
+  comportement que JSONResponse.
+- Listes chaudes (produits, factures, dettes): l'endpoint construit des dicts
+  simples et renvoie directement FastJSONResponse, sans revalidation par le
+  response_model ni passage par jsonable_encoder. Les helpers ci-dessous
+  reproduisent le format JSON de pydantic (Decimal en chaîne).
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, Optional
+
+from fastapi.encoders import decimal_encoder, jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None  # type: ignore
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return decimal_encoder(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return jsonable_encoder(obj)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encodée par orjson"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def model_decimal(value: Any) -> Optional[str]:
+    """Decimal tel que sérialisé par un response_model pydantic (chaîne)"""
+    if value is None:
+        return None
+    return str(value) if isinstance(value, Decimal) else str(Decimal(str(value)))
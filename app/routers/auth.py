@@ -1,16 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Cookie, Depends, Header, HTTPException, status, Response
 from fastapi.security import HTTPBearer
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import timedelta, datetime
+from typing import Optional
 from ..database import get_db, User
 from ..schemas import UserLogin, Token, UserResponse, UserCreate, UserUpdate
 from ..auth import (
-    verify_password,
+    verify_and_update_password,
     get_password_hash,
     create_access_token,
     get_current_user,
+    extract_token,
+    decode_token_claims,
+    token_cache,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
+from ..services.token_revocation import revoke_token, revoke_user_tokens, token_revocations
 import logging
 import os
 from dotenv import load_dotenv
@@ -33,7 +39,13 @@ async def login(user_credentials: UserLogin, response: Response, db: Session = D
         # Chercher l'utilisateur
         user = db.query(User).filter(User.username == user_credentials.username).first()
         
-        if not user or not verify_password(user_credentials.password, user.password_hash):
+        # bcrypt (~250 ms à 12 rounds) hors de la boucle asyncio: les autres requêtes continuent
+        valid, new_hash = False, None
+        if user:
+            valid, new_hash = await run_in_threadpool(
+                verify_and_update_password, user_credentials.password, user.password_hash
+            )
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Nom d'utilisateur ou mot de passe incorrect"
@@ -61,6 +73,9 @@ async def login(user_credentials: UserLogin, response: Response, db: Session = D
         # Mettre à jour la dernière connexion
         from datetime import datetime
         user.last_login = datetime.utcnow()
+        # Hash recalculé au coût BCRYPT_ROUNDS courant (changement de politique transparent)
+        if new_hash:
+            user.password_hash = new_hash
         db.commit()
         
         # Définir un cookie HttpOnly pour persister la session côté navigateur sans stockage JS
@@ -111,8 +126,22 @@ async def verify_token(current_user: User = Depends(get_current_user)):
     )
 
 @router.post("/logout")
-async def logout(response: Response):
-    """Déconnexion: efface le cookie HttpOnly"""
+async def logout(
+    response: Response,
+    authorization: Optional[str] = Header(None),
+    gt_access: Optional[str] = Cookie(None),
+    db: Session = Depends(get_db)
+):
+    """Déconnexion: révoque le token courant et efface le cookie HttpOnly"""
+    token = extract_token(authorization, gt_access)
+    claims = decode_token_claims(token) if token else None
+    if claims and revoke_token(db, claims):
+        try:
+            db.commit()
+            token_cache.discard(token)
+        except Exception as e:
+            db.rollback()
+            logging.warning(f"Révocation du token à la déconnexion échouée: {e}")
     try:
         response.set_cookie(
             key=AUTH_COOKIE_NAME,
@@ -142,7 +171,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Créer le nouvel utilisateur
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await run_in_threadpool(get_password_hash, user_data.password)
     db_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -202,10 +231,14 @@ async def update_user(
         user.email = user_data.email
     if user_data.full_name is not None:
         user.full_name = user_data.full_name
+    # Rôle porté par les tokens déjà émis, ancien mot de passe: ces sessions sont révoquées
+    if user_data.role is not None and user_data.role != user.role:
+        revoke_user_tokens(db, user.user_id)
     if user_data.role is not None:
         user.role = user_data.role
     if user_data.password:
-        user.password_hash = get_password_hash(user_data.password)
+        user.password_hash = await run_in_threadpool(get_password_hash, user_data.password)
+        revoke_user_tokens(db, user.user_id)
     db.commit()
     db.refresh(user)
     return UserResponse.from_orm(user)
@@ -227,6 +260,7 @@ async def delete_user(
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Utilisateur non trouvé")
+    revoke_user_tokens(db, user.user_id)
     db.delete(user)
     db.commit()
     return {"message": "Utilisateur supprimé avec succès"}
@@ -245,7 +279,33 @@ async def update_user_status(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Utilisateur non trouvé")
     is_active = payload.get("is_active")
     if isinstance(is_active, bool):
+        if not is_active and user.is_active:
+            revoke_user_tokens(db, user.user_id)
         user.is_active = is_active
         db.commit()
         db.refresh(user)
     return UserResponse.from_orm(user)
+
+@router.post("/users/{user_id}/revoke-sessions")
+async def revoke_user_sessions(
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Révoquer toutes les sessions ouvertes d'un utilisateur (admin seulement)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès refusé. Droits administrateur requis.")
+    user = db.query(User).filter(User.user_id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Utilisateur non trouvé")
+    if not revoke_user_tokens(db, user.user_id):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Révocation indisponible")
+    db.commit()
+    return {"message": "Sessions révoquées", "user_id": user.user_id}
+
+@router.get("/revocations/status")
+async def revocations_status(current_user: User = Depends(get_current_user)):
+    """État du cache des tokens et des révocations en mémoire (ce processus, admin seulement)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès refusé. Droits administrateur requis.")
+    return {"token_cache": token_cache.stats(), "revocations": token_revocations.stats()}
@@ -5,9 +5,10 @@ from typing import Optional
 from datetime import date
 
 from ..database import (
-    get_db, User, Client, Invoice, InvoiceItem, ClientDebt
+    get_read_db, User, Client, Invoice, InvoiceItem, ClientDebt
 )
 from ..auth import get_current_user
+from ..date_ranges import between_clauses
 
 router = APIRouter(prefix="/api/clients", tags=["client_debts"]) 
 
@@ -18,7 +19,7 @@ async def get_client_debts(
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     cl = db.query(Client).filter(Client.client_id == client_id).first()
     if not cl:
@@ -34,12 +35,12 @@ async def get_client_debts(
     )
     if date_from:
         try:
-            inv_q = inv_q.filter(Invoice.date >= date_from)
+            inv_q = inv_q.filter(*between_clauses(Invoice.date, date.fromisoformat(date_from[:10])))
         except Exception:
             pass
     if date_to:
         try:
-            inv_q = inv_q.filter(Invoice.date <= date_to)
+            inv_q = inv_q.filter(*between_clauses(Invoice.date, None, date.fromisoformat(date_to[:10])))
         except Exception:
             pass
 
@@ -85,12 +86,12 @@ async def get_client_debts(
     )
     if date_from:
         try:
-            cd_q = cd_q.filter(ClientDebt.date >= date_from)
+            cd_q = cd_q.filter(*between_clauses(ClientDebt.date, date.fromisoformat(date_from[:10])))
         except Exception:
             pass
     if date_to:
         try:
-            cd_q = cd_q.filter(ClientDebt.date <= date_to)
+            cd_q = cd_q.filter(*between_clauses(ClientDebt.date, None, date.fromisoformat(date_to[:10])))
         except Exception:
             pass
 
@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from sqlalchemy import func
 from ..database import get_db, Client, Invoice, ClientDebt
 from ..schemas import ClientCreate, ClientUpdate, ClientResponse
 from ..auth import get_current_user, require_any_role
+from ..conditional import conditional_get
 import logging
 
 router = APIRouter(prefix="/api/clients", tags=["clients"])
 
 @router.get("/", response_model=List[ClientResponse])
 async def list_clients(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
@@ -21,6 +24,10 @@ async def list_clients(
     - Trie par défaut: plus récents d'abord (client_id DESC).
     - Recherche sur name/email/phone (ilike).
     """
+    cond = conditional_get(request, db, ("clients",))
+    if cond.not_modified:
+        return cond.not_modified_response()
+    response.headers.update(cond.headers)
     query = db.query(Client)
 
     if search:
@@ -39,10 +46,16 @@ async def list_clients(
 @router.get("/{client_id}", response_model=ClientResponse)
 async def get_client(
     client_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """Obtenir un client par ID"""
+    cond = conditional_get(request, db, ("clients",))
+    if cond.not_modified:
+        return cond.not_modified_response()
+    response.headers.update(cond.headers)
     client = db.query(Client).filter(Client.client_id == client_id).first()
     if not client:
         raise HTTPException(status_code=404, detail="Client non trouvé")
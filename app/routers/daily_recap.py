@@ -6,12 +6,13 @@ from datetime import datetime, date, timedelta
 import logging
 
 from ..database import (
-    get_db, User, Invoice, InvoiceItem, InvoicePayment, 
+    get_read_db, User, Invoice, InvoiceItem, InvoicePayment, 
     Quotation, Product, StockMovement, SupplierInvoice,
     SupplierInvoicePayment, BankTransaction, Client,
     DailyPurchase
 )
 from ..auth import get_current_user
+from ..date_ranges import between_clauses, on_day
 from .dashboard import get_dashboard_stats
 from .debts import get_debts_stats
 
@@ -20,7 +21,7 @@ router = APIRouter(prefix="/api/daily-recap", tags=["daily-recap"])
 @router.get("/stats")
 async def get_daily_recap_stats(
     target_date: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """
@@ -48,7 +49,7 @@ async def get_daily_recap_stats(
                 joinedload(Invoice.client),
                 joinedload(Invoice.payments)
             ).filter(
-                func.date(Invoice.created_at) == recap_date
+                on_day(Invoice.created_at, recap_date)
             ).all()
         except Exception as e:
             logging.error(f"Erreur lors du chargement des factures: {e}")
@@ -59,7 +60,7 @@ async def get_daily_recap_stats(
             payments_received = db.query(InvoicePayment).options(
                 joinedload(InvoicePayment.invoice)
             ).filter(
-                func.date(InvoicePayment.payment_date) == recap_date
+                on_day(InvoicePayment.payment_date, recap_date)
             ).all()
         except Exception as e:
             logging.error(f"Erreur lors du chargement des paiements: {e}")
@@ -71,7 +72,7 @@ async def get_daily_recap_stats(
             quotations_created = db.query(Quotation).options(
                 joinedload(Quotation.client)
             ).filter(
-                func.date(Quotation.created_at) == recap_date
+                on_day(Quotation.created_at, recap_date)
             ).all()
         except Exception as e:
             logging.error(f"Erreur lors du chargement des devis créés: {e}")
@@ -82,7 +83,7 @@ async def get_daily_recap_stats(
             quotations_accepted = db.query(Quotation).options(
                 joinedload(Quotation.client)
             ).filter(
-                func.date(Quotation.created_at) == recap_date,
+                on_day(Quotation.created_at, recap_date),
                 Quotation.status == "accepté"
             ).all()
         except Exception as e:
@@ -95,7 +96,7 @@ async def get_daily_recap_stats(
             stock_in = db.query(StockMovement).options(
                 joinedload(StockMovement.product)
             ).filter(
-                func.date(StockMovement.created_at) == recap_date,
+                on_day(StockMovement.created_at, recap_date),
                 StockMovement.movement_type == "IN"
             ).all()
         except Exception as e:
@@ -107,7 +108,7 @@ async def get_daily_recap_stats(
             stock_out = db.query(StockMovement).options(
                 joinedload(StockMovement.product)
             ).filter(
-                func.date(StockMovement.created_at) == recap_date,
+                on_day(StockMovement.created_at, recap_date),
                 StockMovement.movement_type == "OUT"
             ).all()
         except Exception as e:
@@ -118,7 +119,7 @@ async def get_daily_recap_stats(
         try:
             # Entrées d'argent ce jour
             bank_entries = db.query(BankTransaction).filter(
-                func.date(BankTransaction.date) == recap_date,
+                BankTransaction.date == recap_date,
                 BankTransaction.type == "entry"
             ).all()
         except Exception as e:
@@ -128,7 +129,7 @@ async def get_daily_recap_stats(
         try:
             # Sorties d'argent ce jour
             bank_exits = db.query(BankTransaction).filter(
-                func.date(BankTransaction.date) == recap_date,
+                BankTransaction.date == recap_date,
                 BankTransaction.type == "exit"
             ).all()
         except Exception as e:
@@ -138,7 +139,7 @@ async def get_daily_recap_stats(
         # === ACHATS QUOTIDIENS ===
         try:
             daily_purchases = db.query(DailyPurchase).filter(
-                (DailyPurchase.date == recap_date) | (func.date(DailyPurchase.created_at) == recap_date)
+                (DailyPurchase.date == recap_date) | (on_day(DailyPurchase.created_at, recap_date))
             ).all()
         except Exception as e:
             logging.error(f"Erreur chargement achats quotidiens: {e}")
@@ -149,7 +150,7 @@ async def get_daily_recap_stats(
         try:
             by_cat_rows = (
                 db.query(DailyPurchase.category, func.coalesce(func.sum(DailyPurchase.amount), 0))
-                .filter((DailyPurchase.date == recap_date) | (func.date(DailyPurchase.created_at) == recap_date))
+                .filter((DailyPurchase.date == recap_date) | (on_day(DailyPurchase.created_at, recap_date)))
                 .group_by(DailyPurchase.category)
                 .all()
             )
@@ -335,7 +336,7 @@ async def get_daily_recap_stats(
                 "net_revenue": net_revenue,
                 "bank_entries_list": [
                     {
-                        "id": t.transaction_id,
+                        "id": t.id,
                         "motif": t.motif,
                         "description": t.description,
                         "amount": float(t.amount or 0),
@@ -346,7 +347,7 @@ async def get_daily_recap_stats(
                 ],
                 "bank_exits_list": [
                     {
-                        "id": t.transaction_id,
+                        "id": t.id,
                         "motif": t.motif,
                         "description": t.description,
                         "amount": float(t.amount or 0),
@@ -388,7 +389,7 @@ async def get_daily_recap_stats(
 async def get_period_summary(
     start_date: str,
     end_date: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """
@@ -400,20 +401,17 @@ async def get_period_summary(
         
         # Paiements reçus sur la période
         total_payments = db.query(func.coalesce(func.sum(InvoicePayment.amount), 0)).filter(
-            func.date(InvoicePayment.payment_date) >= start,
-            func.date(InvoicePayment.payment_date) <= end
+            *between_clauses(InvoicePayment.payment_date, start, end)
         ).scalar() or 0
         
         # Factures créées sur la période
         invoices_count = db.query(func.count(Invoice.invoice_id)).filter(
-            func.date(Invoice.created_at) >= start,
-            func.date(Invoice.created_at) <= end
+            *between_clauses(Invoice.created_at, start, end)
         ).scalar() or 0
         
         # Devis créés sur la période
         quotations_count = db.query(func.count(Quotation.quotation_id)).filter(
-            func.date(Quotation.created_at) >= start,
-            func.date(Quotation.created_at) <= end
+            *between_clauses(Quotation.created_at, start, end)
         ).scalar() or 0
         
         return {
@@ -15,21 +15,15 @@ from app.auth import get_current_user
 
 router = APIRouter(prefix="/api/daily-sales", tags=["daily-sales"])
 
-@router.get("/", response_model=List[DailySaleResponse])
-async def get_daily_sales(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000),
-    search: Optional[str] = Query(None),
-    start_date: Optional[date] = Query(None),
-    end_date: Optional[date] = Query(None),
-    payment_method: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+def apply_daily_sales_filters(
+    query,
+    current_user,
+    search: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    payment_method: Optional[str] = None,
 ):
-    """Récupérer la liste des ventes quotidiennes"""
-    query = db.query(DailySale)
-    
-    # Filtres
+    """Filtres de la liste des ventes (partagés avec l'export), y compris la restriction non-admin"""
     if search:
         query = query.filter(
             or_(
@@ -66,6 +60,23 @@ async def get_daily_sales(
                 Invoice.status.in_(["payée", "PAID", "partiellement payée"])  # inclure partiellement payée
             )
         )
+    return query
+
+@router.get("/", response_model=List[DailySaleResponse])
+async def get_daily_sales(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    search: Optional[str] = Query(None),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    payment_method: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Récupérer la liste des ventes quotidiennes"""
+    query = db.query(DailySale)
+    
+    query = apply_daily_sales_filters(query, current_user, search, start_date, end_date, payment_method)
 
     # Tri par date de vente décroissante
     query = query.order_by(desc(DailySale.sale_date), desc(DailySale.created_at))
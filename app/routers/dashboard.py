@@ -7,13 +7,17 @@ from functools import lru_cache
 import time
 import logging
 
-from ..database import get_db, User
+from ..database import get_db, get_read_db, User
 from ..database import (
     Invoice, InvoiceItem, InvoicePayment, Quotation, Product, ProductVariant,
-    Client, StockMovement, SupplierInvoice, SupplierInvoicePayment
+    Client, StockMovement, SupplierInvoice, SupplierInvoicePayment, ProductStockSummary
 )
 from ..database import DailyPurchase
 from ..auth import get_current_user
+from ..date_ranges import between_clauses, in_month
+from ..services.change_feed import change_feed
+from ..services.sales_rollup import BUCKETS, bucket_series, get_daily_revenue_series
+from ..services.stock_summary import ensure_stock_summary_table
 
 router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
 
@@ -29,6 +33,16 @@ def _is_cache_valid(cache_entry):
     """Vérifie si l'entrée de cache est encore valide"""
     return cache_entry and (time.time() - cache_entry['timestamp']) < _cache_duration
 
+# Ressources dont dépendent les stats: une écriture validée vide le cache (flux des changements),
+# le TTL ne sert plus qu'à absorber les rafales de lectures
+_STATS_RESOURCES = {"invoices", "products", "stock_movements", "clients", "debts"}
+
+def _invalidate_on_change(resources):
+    if resources & _STATS_RESOURCES:
+        _cache.clear()
+
+change_feed.add_listener(_invalidate_on_change)
+
 def _get_cached_or_compute(cache_key, compute_func):
     """Récupère depuis le cache ou calcule et met en cache"""
     if cache_key in _cache and _is_cache_valid(_cache[cache_key]):
@@ -45,7 +59,7 @@ def _get_cached_or_compute(cache_key, compute_func):
 @router.get("/stats")
 async def get_dashboard_stats(
     force_refresh: bool = False,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """
@@ -69,21 +83,12 @@ async def get_dashboard_stats(
             # 1. Nombre de produits en stock (pas la somme des quantités)
             # Un produit est "en stock" s'il a une quantité > 0 OU des variantes disponibles
             
-            # Sous-requête: variantes disponibles (non vendues) par produit
-            available_variants_sub = (
-                db.query(
-                    ProductVariant.product_id.label('product_id'),
-                    func.sum(case((ProductVariant.is_sold == False, 1), else_=0)).label('available')
-                )
-                .group_by(ProductVariant.product_id)
-                .subquery()
-            )
-            
-            # Compter les produits en stock: quantité > 0 OU variantes disponibles > 0
+            # Variantes disponibles lues dans le résumé de stock précalculé
+            ensure_stock_summary_table()
             total_stock = (
                 db.query(func.count(Product.product_id))
-                .outerjoin(available_variants_sub, available_variants_sub.c.product_id == Product.product_id)
-                .filter(or_(Product.quantity > 0, available_variants_sub.c.available > 0))
+                .outerjoin(ProductStockSummary, ProductStockSummary.product_id == Product.product_id)
+                .filter(or_(Product.quantity > 0, ProductStockSummary.available_variants > 0))
                 .scalar()
                 or 0
             )
@@ -98,22 +103,17 @@ async def get_dashboard_stats(
             # Chiffre d'affaires mensuel (factures payées)
             paid_statuses = ["payée", "PAID"]
             monthly_revenue_gross = db.query(func.coalesce(func.sum(Invoice.total), 0)).filter(
-                func.extract('month', Invoice.date) == today.month,
-                func.extract('year', Invoice.date) == today.year,
+                in_month(Invoice.date, today),
                 Invoice.status.in_(paid_statuses)
             ).scalar() or 0
             # Achats quotidiens du mois (par date ou created_at)
             monthly_purchases = db.query(func.coalesce(func.sum(DailyPurchase.amount), 0)).filter(
-                or_(
-                    and_(func.extract('month', DailyPurchase.date) == today.month, func.extract('year', DailyPurchase.date) == today.year),
-                    and_(func.extract('month', DailyPurchase.created_at) == today.month, func.extract('year', DailyPurchase.created_at) == today.year),
-                )
+                or_(in_month(DailyPurchase.date, today), in_month(DailyPurchase.created_at, today))
             ).scalar() or 0
             
             # Paiements aux fournisseurs du mois
             monthly_supplier_payments = db.query(func.coalesce(func.sum(SupplierInvoice.paid_amount), 0)).filter(
-                func.extract('month', SupplierInvoice.invoice_date) == today.month,
-                func.extract('year', SupplierInvoice.invoice_date) == today.year
+                in_month(SupplierInvoice.invoice_date, today)
             ).scalar() or 0
             
             # Chiffre d'affaires net = revenus - paiements fournisseurs - achats quotidiens du mois
@@ -153,7 +153,7 @@ async def get_dashboard_stats(
                 Invoice.status.in_(paid_statuses)
             ).scalar() or 0
             purchases_30d = db.query(func.coalesce(func.sum(DailyPurchase.amount), 0)).filter(
-                or_(DailyPurchase.date >= since_30.date(), func.date(DailyPurchase.created_at) >= since_30.date())
+                or_(*between_clauses(DailyPurchase.date, since_30.date()), *between_clauses(DailyPurchase.created_at, since_30.date()))
             ).scalar() or 0
             
             # Paiements aux fournisseurs sur 30 jours
@@ -285,7 +285,7 @@ async def get_dashboard_stats(
 @router.get("/recent-movements")
 async def get_recent_movements(
     limit: int = 5,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """Mouvements de stock récents optimisés"""
@@ -318,7 +318,7 @@ async def get_recent_movements(
 @router.get("/recent-invoices")
 async def get_recent_invoices(
     limit: int = 5,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """Factures récentes optimisées"""
@@ -379,13 +379,11 @@ async def debug_dashboard_stats(
         # Factures du mois
         paid_statuses = ["payée", "PAID"]
         monthly_invoices = db.query(Invoice).filter(
-            func.extract('month', Invoice.date) == today.month,
-            func.extract('year', Invoice.date) == today.year
+            in_month(Invoice.date, today)
         ).all()
         
         monthly_paid_invoices = db.query(Invoice).filter(
-            func.extract('month', Invoice.date) == today.month,
-            func.extract('year', Invoice.date) == today.year,
+            in_month(Invoice.date, today),
             Invoice.status.in_(paid_statuses)
         ).all()
         
@@ -446,33 +444,23 @@ async def get_cache_info(
 @router.get("/sales-trend")
 async def get_sales_trend(
     days: int = 7,
+    bucket: str = "day",
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Tendance des ventes sur les N derniers jours"""
+    """Tendance des ventes sur les N derniers jours (regroupement jour, semaine ou mois)"""
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket invalide (valeurs: {', '.join(BUCKETS)})")
+    days = max(1, min(int(days or 7), 3660))
     try:
-        cache_key = _get_cache_key("sales_trend", days)
+        cache_key = _get_cache_key("sales_trend", date.today().isoformat(), days, bucket)
 
         def compute_trend():
             today = date.today()
-            paid_statuses = ["payée", "PAID"]
-
-            # Calculer les ventes pour chaque jour
-            trend_data = []
-            for i in range(days - 1, -1, -1):
-                target_date = today - timedelta(days=i)
-
-                daily_revenue = db.query(func.coalesce(func.sum(Invoice.total), 0)).filter(
-                    Invoice.date == target_date,
-                    Invoice.status.in_(paid_statuses)
-                ).scalar() or 0
-
-                trend_data.append({
-                    "date": target_date.isoformat(),
-                    "revenue": float(daily_revenue)
-                })
-
-            return trend_data
+            start_day = today - timedelta(days=days - 1)
+            # Une seule requête groupée (jours clos servis par l'agrégat journalier)
+            series = get_daily_revenue_series(db, start_day, today)
+            return bucket_series(series, bucket)
 
         result = _get_cached_or_compute(cache_key, compute_trend)
         return result
@@ -484,7 +472,7 @@ async def get_sales_trend(
 @router.get("/sales-by-category")
 async def get_sales_by_category(
     days: int = 30,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """Répartition des ventes par catégorie"""
@@ -525,32 +513,96 @@ async def get_sales_by_category(
         logging.error(f"Erreur sales by category: {e}")
         return []
 
+def _require_admin(current_user):
+    if not hasattr(current_user, 'role') or current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Accès restreint aux administrateurs")
+
 @router.post("/optimize")
 async def optimize_database(
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    analyze: bool = True,
+    current_user = Depends(get_current_user)
 ):
-    """Déclencher l'optimisation de la base de données (admin seulement)"""
-    # Vérifier les permissions admin
-    if not hasattr(current_user, 'role') or current_user.role != 'admin':
-        raise HTTPException(status_code=403, detail="Accès restreint aux administrateurs")
-    
+    """Déclencher l'optimisation de la base de données en arrière-plan (admin seulement)"""
+    _require_admin(current_user)
+
     try:
-        from ..database_optimization import optimize_database as run_optimization
-        
+        from ..database_optimization import database_optimizer
+
         # Vider le cache avant optimisation
         global _cache
         _cache.clear()
-        
-        # Lancer l'optimisation
-        run_optimization()
-        
+
+        # Lancer l'optimisation (index manquants + ANALYZE) sans bloquer la requête
+        job = database_optimizer.start(create_indexes=True, analyze=analyze)
+
         return {
-            "message": "Optimisation de la base de données terminée avec succès",
+            "message": "Optimisation déjà en cours" if job.get("already_running") else "Optimisation de la base de données démarrée",
             "cache_cleared": True,
+            "job": job,
+            "status_url": "/api/dashboard/optimize/status",
             "timestamp": datetime.now().isoformat()
         }
-        
+
     except Exception as e:
         logging.error(f"Erreur optimisation database: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'optimisation: {str(e)}")
+
+@router.get("/optimize/status")
+async def get_optimize_status(
+    current_user = Depends(get_current_user)
+):
+    """Progression de l'optimisation en cours ou de la dernière exécutée (admin seulement)"""
+    _require_admin(current_user)
+    from ..database_optimization import database_optimizer
+    return database_optimizer.status()
+
+@router.get("/admission")
+async def get_admission_status(
+    current_user = Depends(get_current_user)
+):
+    """Contrôle d'admission: requêtes admises, partagées, en file et refusées par politique (ce processus, admin seulement)"""
+    _require_admin(current_user)
+    from ..admission import admission_control
+    return admission_control.stats()
+
+@router.get("/retention")
+def get_retention_status(
+    current_user = Depends(get_current_user)
+):
+    """Politiques de rétention, lignes à archiver et dernier rapport (admin seulement)"""
+    _require_admin(current_user)
+    from ..services.archival import retention_manager, retention_plan
+    return {
+        "running": retention_manager.is_running(),
+        "tables": retention_plan(),
+        "last_report": retention_manager.last_report,
+    }
+
+@router.post("/retention")
+async def run_retention(
+    table: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
+    """Archiver/purger selon les politiques de rétention, en arrière-plan (admin seulement)"""
+    _require_admin(current_user)
+    from ..services.archival import POLICIES, retention_manager
+    if table and table not in POLICIES:
+        raise HTTPException(status_code=400, detail=f"Table inconnue: {table}")
+    job = retention_manager.start(tables=[table] if table else None)
+    return {**job, "status_url": "/api/dashboard/retention"}
+
+@router.get("/indexes")
+def get_indexes_report(
+    current_user = Depends(get_current_user)
+):
+    """Rapport des index: présents, manquants, inutilisés (admin seulement)"""
+    _require_admin(current_user)
+    try:
+        from ..database import engine
+        from ..database_optimization import database_optimizer, verify_indexes
+        report = verify_indexes(engine)
+        database_optimizer.last_report = report
+        return report
+    except Exception as e:
+        logging.error(f"Erreur rapport index: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la vérification des index: {str(e)}")
@@ -1,16 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import Optional
 from datetime import datetime, date
 
 from ..database import (
-    get_db, User, Invoice, Client, InvoicePayment,
+    get_db, get_read_db, User, Invoice, Client, InvoicePayment,
     Supplier, SupplierDebt, SupplierDebtPayment,
     SupplierInvoice, SupplierInvoicePayment,
     ClientDebt, ClientDebtPayment
 )
 from ..auth import get_current_user
+from ..conditional import conditional_get
+from ..responses import FastJSONResponse
 
 router = APIRouter(prefix="/api/debts", tags=["debts"])
 
@@ -43,15 +45,20 @@ def _coerce_dt(v):
 
 @router.get("/")
 async def get_debts(
+    request: Request,
     skip: int = 0,
     limit: int = 20,
     search: Optional[str] = None,
     type: Optional[str] = None,
     status: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Récupérer les dettes clients et fournisseurs."""
+    # Statut « en retard » calculé à la date du jour: le jour fait partie de l'ETag
+    cond = conditional_get(request, db, ("invoices", "clients", "debts", "suppliers"), scope=date.today().isoformat())
+    if cond.not_modified:
+        return cond.not_modified_response()
     try:
         debts_all = []
         today = date.today()
@@ -191,12 +198,12 @@ async def get_debts(
         total = len(debts_all)
         debts = debts_all[skip: skip + limit]
         
-        return {
+        return FastJSONResponse({
             "debts": debts,
             "total": total,
             "page": (skip // limit) + 1,
             "pages": (total + limit - 1) // limit
-        }
+        }, headers=cond.headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -204,7 +211,7 @@ async def get_debts(
 async def get_debt(
     debt_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Récupérer une dette par ID"""
     # D'abord, chercher une facture client
@@ -660,7 +667,7 @@ async def record_payment(
 @router.get("/stats/summary")
 async def get_debts_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Récupérer les statistiques des dettes"""
     try:
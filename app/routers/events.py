@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from ..auth import get_current_user, require_role
+from ..page_cache import asset_version
+from ..services.change_feed import change_feed
+from ..services.resource_versions import RESOURCES
+
+# Ressources internes (révocations des tokens) non diffusées aux navigateurs
+STREAM_RESOURCES = frozenset(RESOURCES) - {"auth"}
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+CHANGE_FEED_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "20"))
+# Durée max d'un flux: le navigateur se reconnecte (et se ré-authentifie) de lui-même
+CHANGE_FEED_MAX_STREAM_SECONDS = float(os.getenv("CHANGE_FEED_MAX_STREAM_SECONDS", "900"))
+CHANGE_FEED_MAX_SUBSCRIBERS = int(os.getenv("CHANGE_FEED_MAX_SUBSCRIBERS", "500"))
+CHANGE_FEED_RETRY_MS = int(os.getenv("CHANGE_FEED_RETRY_MS", "3000"))
+
+
+def _sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    resources: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
+    """Flux SSE des ressources modifiées (products, invoices, stock_movements, ...).
+
+    `resources`: liste séparée par des virgules pour ne recevoir que certaines ressources.
+    Les changements de version des assets ("assets") sont toujours transmis.
+    """
+    if change_feed.stats()["subscribers"] >= CHANGE_FEED_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Trop de flux ouverts", headers={"Retry-After": "30"})
+    wanted = {r.strip() for r in (resources or "").split(",") if r.strip()} & STREAM_RESOURCES
+    queue = change_feed.subscribe((wanted or STREAM_RESOURCES) | {"assets"})
+
+    async def events():
+        deadline = time.monotonic() + CHANGE_FEED_MAX_STREAM_SECONDS
+        try:
+            yield f"retry: {CHANGE_FEED_RETRY_MS}\n" + _sse("hello", {"v": asset_version.value})
+            while time.monotonic() < deadline:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=CHANGE_FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Commentaire SSE: garde la connexion ouverte à travers les proxys
+                    yield ": ping\n\n"
+                    continue
+                yield _sse("change", item, item.get("id"))
+        finally:
+            change_feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/status")
+async def change_feed_status(
+    current_user = Depends(require_role("admin"))
+):
+    """Abonnés et événements publiés du flux des changements (ce processus)"""
+    return change_feed.stats()
@@ -0,0 +1,168 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import desc, func
+from typing import Optional
+from datetime import date
+
+from ..database import get_read_db, Product, ProductStockSummary, Invoice, Client, StockMovement, DailySale
+from ..auth import get_current_user
+from ..services.exporter import export_response, stream_query
+from ..services.stock_summary import ensure_stock_summary_table
+from .products import apply_product_filters
+from .invoices import apply_invoice_filters, invoice_sort_column
+from .stock_movements import apply_movement_filters
+from .daily_sales import apply_daily_sales_filters
+
+router = APIRouter(prefix="/api/exports", tags=["exports"])
+
+# Exports en flux: mêmes filtres que les listes correspondantes, requêtes sur
+# colonnes (pas d'objets ORM) lues par lots avec un curseur côté serveur.
+
+
+@router.get("/products")
+async def export_products(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    search: Optional[str] = None,
+    category: Optional[str] = None,
+    condition: Optional[str] = None,
+    in_stock: Optional[bool] = None,
+    has_variants: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    brand: Optional[str] = None,
+    model: Optional[str] = None,
+    has_barcode: Optional[bool] = None,
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_user)
+):
+    """Exporter les produits (CSV ou XLSX)"""
+    ensure_stock_summary_table()
+    show_cost = getattr(current_user, "role", "user") in ("admin", "manager")
+    columns = [
+        Product.product_id,
+        Product.name,
+        Product.category,
+        Product.brand,
+        Product.model,
+        Product.barcode,
+        Product.condition,
+        func.coalesce(ProductStockSummary.available_variants, Product.quantity),
+        ProductStockSummary.total_variants,
+        Product.price,
+        Product.wholesale_price,
+    ]
+    header = ["ID", "Nom", "Catégorie", "Marque", "Modèle", "Code-barres", "État", "Stock", "Variantes", "Prix", "Prix de gros"]
+    if show_cost:
+        columns.append(Product.purchase_price)
+        header.append("Prix d'achat")
+    columns.append(Product.created_at)
+    header.append("Créé le")
+
+    query = apply_product_filters(
+        db, db.query(*columns), search=search, category=category, condition=condition, in_stock=in_stock,
+        has_variants=has_variants, min_price=min_price, max_price=max_price, brand=brand, model=model,
+        has_barcode=has_barcode,
+    ).order_by(desc(Product.created_at), desc(Product.product_id))
+    return export_response(format, "produits", header, stream_query(query), sheet_title="Produits")
+
+
+@router.get("/invoices")
+async def export_invoices(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    status_filter: Optional[str] = None,
+    client_search: Optional[str] = None,
+    search: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    sort_by: Optional[str] = Query("created_at"),
+    sort_dir: Optional[str] = Query("desc"),
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_user)
+):
+    """Exporter les factures (CSV ou XLSX)"""
+    query = db.query(
+        Invoice.invoice_number,
+        Invoice.date,
+        Invoice.due_date,
+        Client.name,
+        Invoice.status,
+        Invoice.payment_method,
+        Invoice.subtotal,
+        Invoice.tax_amount,
+        Invoice.total,
+        Invoice.paid_amount,
+        Invoice.remaining_amount,
+        Invoice.notes,
+    ).join(Client, Client.client_id == Invoice.client_id, isouter=True)
+    query = apply_invoice_filters(
+        db, query, status_filter=status_filter, client_search=client_search, search=search,
+        start_date=start_date, end_date=end_date,
+    )
+    sort_col = invoice_sort_column(sort_by)
+    query = query.order_by(sort_col.asc() if (sort_dir or "").lower() == "asc" else sort_col.desc())
+    header = ["Numéro", "Date", "Échéance", "Client", "Statut", "Paiement", "Sous-total", "TVA", "Total", "Payé", "Reste", "Notes"]
+    return export_response(format, "factures", header, stream_query(query), sheet_title="Factures")
+
+
+@router.get("/stock-movements")
+async def export_stock_movements(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    movement_type: Optional[str] = None,
+    product_id: Optional[int] = None,
+    reference_type: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_user)
+):
+    """Exporter les mouvements de stock (CSV ou XLSX)"""
+    query = (
+        db.query(
+            StockMovement.movement_id,
+            StockMovement.created_at,
+            StockMovement.product_id,
+            Product.name,
+            StockMovement.movement_type,
+            StockMovement.quantity,
+            StockMovement.unit_price,
+            StockMovement.reference_type,
+            StockMovement.reference_id,
+            StockMovement.notes,
+        )
+        .join(Product, Product.product_id == StockMovement.product_id)
+        .order_by(desc(StockMovement.created_at), desc(StockMovement.movement_id))
+    )
+    query = apply_movement_filters(query, movement_type, product_id, reference_type, start_date, end_date)
+    header = ["ID", "Date", "ID produit", "Produit", "Type", "Quantité", "Prix unitaire", "Référence", "ID référence", "Notes"]
+    return export_response(format, "mouvements-stock", header, stream_query(query), sheet_title="Mouvements")
+
+
+@router.get("/daily-sales")
+async def export_daily_sales(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    search: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    payment_method: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_user)
+):
+    """Exporter les ventes quotidiennes (CSV ou XLSX)"""
+    query = db.query(
+        DailySale.sale_id,
+        DailySale.sale_date,
+        DailySale.client_name,
+        DailySale.product_name,
+        DailySale.variant_imei,
+        DailySale.variant_condition,
+        DailySale.quantity,
+        DailySale.unit_price,
+        DailySale.total_amount,
+        DailySale.payment_method,
+        DailySale.invoice_id,
+        DailySale.notes,
+    )
+    query = apply_daily_sales_filters(query, current_user, search, start_date, end_date, payment_method)
+    query = query.order_by(desc(DailySale.sale_date), desc(DailySale.created_at))
+    header = ["ID", "Date", "Client", "Produit", "IMEI", "État", "Quantité", "Prix unitaire", "Montant", "Paiement", "Facture", "Notes"]
+    return export_response(format, "ventes", header, stream_query(query), sheet_title="Ventes")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, func, and_, or_
 from typing import List, Optional
@@ -20,6 +20,9 @@ from ..database import (
 from ..database import DailyPurchase
 from ..schemas import InvoiceCreate, InvoiceResponse, InvoiceItemResponse
 from ..auth import get_current_user
+from ..conditional import conditional_get
+from ..responses import FastJSONResponse
+from ..date_ranges import filter_between, in_month
 from ..routers.stock_movements import create_stock_movement
 from ..services.stats_manager import recompute_invoices_stats
 from ..services.google_sheets_sync_helper import sync_product_stock_to_sheets
@@ -101,11 +104,7 @@ async def list_invoices(
     if client_id:
         query = query.filter(Invoice.client_id == client_id)
     
-    if start_date:
-        query = query.filter(func.date(Invoice.date) >= start_date)
-    
-    if end_date:
-        query = query.filter(func.date(Invoice.date) <= end_date)
+    query = filter_between(query, Invoice.date, start_date, end_date)
     
     results = query.offset(skip).limit(limit).all()
     
@@ -142,47 +141,22 @@ async def list_invoices(
 _invoices_cache = {}
 _CACHE_TTL_SECONDS = 30
 
-@router.get("/paginated")
-async def list_invoices_paginated(
-    page: int = Query(1, ge=1),
-    page_size: int = Query(10, ge=1, le=200),
+def apply_invoice_filters(
+    db: Session,
+    query,
     status_filter: Optional[str] = None,
     client_search: Optional[str] = None,
     search: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    sort_by: Optional[str] = Query("created_at"),  # created_at | date | number | total | status | client
-    sort_dir: Optional[str] = Query("desc"),       # asc | desc
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
 ):
-    """Lister les factures avec pagination, filtres et tri pour la liste principale."""
-    # Cache key
-    try:
-        import time, hashlib
-        key_raw = f"p={page}|s={page_size}|sf={status_filter}|cs={client_search}|q={search}|sd={start_date}|ed={end_date}|ob={sort_by}|od={sort_dir}"
-        key = hashlib.md5(key_raw.encode()).hexdigest()
-        entry = _invoices_cache.get(key)
-        if entry and (time.time() - entry['ts']) < _CACHE_TTL_SECONDS:
-            return entry['data']
-    except Exception:
-        key = None
-    # Base avec JOIN client pour récupérer le nom
-    base = db.query(
-        Invoice,
-        Client.name.label('client_name')
-    ).join(Client, Client.client_id == Invoice.client_id, isouter=True)
-
-    # Filtres
+    """Filtres de la liste des factures (partagés avec l'export). La requête doit joindre Client."""
     if status_filter:
-        base = base.filter(Invoice.status == status_filter)
+        query = query.filter(Invoice.status == status_filter)
     if client_search:
         like = f"%{client_search.strip()}%"
-        base = base.filter(Client.name.ilike(like))
-    if start_date:
-        base = base.filter(func.date(Invoice.date) >= start_date)
-    if end_date:
-        base = base.filter(func.date(Invoice.date) <= end_date)
+        query = query.filter(Client.name.ilike(like))
+    query = filter_between(query, Invoice.date, start_date, end_date)
     if search:
         s = search.strip()
 
@@ -226,29 +200,74 @@ async def list_invoices_paginated(
             if product_match_invoice_ids:
                 conditions.append(Invoice.invoice_id.in_(product_match_invoice_ids))
 
-            base = base.filter(or_(*conditions))
+            query = query.filter(or_(*conditions))
         else:
             # Recherche texte: numéro de facture ou IMEI/barcode produit/variante
             conditions = [Invoice.invoice_number.ilike(f"%{s}%")]
             if product_match_invoice_ids:
                 conditions.append(Invoice.invoice_id.in_(product_match_invoice_ids))
-            base = base.filter(or_(*conditions))
+            query = query.filter(or_(*conditions))
+    return query
+
+
+def invoice_sort_column(sort_by: Optional[str]):
+    return {
+        "date": Invoice.date,
+        "number": Invoice.invoice_number,
+        "total": Invoice.total,
+        "status": Invoice.status,
+        "client": Client.name,
+    }.get(sort_by or "", Invoice.created_at)
+
+
+@router.get("/paginated")
+async def list_invoices_paginated(
+    request: Request,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=200),
+    status_filter: Optional[str] = None,
+    client_search: Optional[str] = None,
+    search: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    sort_by: Optional[str] = Query("created_at"),  # created_at | date | number | total | status | client
+    sort_dir: Optional[str] = Query("desc"),       # asc | desc
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Lister les factures avec pagination, filtres et tri pour la liste principale."""
+    # Factures et clients inchangés: 304 sans COUNT ni requête de page
+    cond = conditional_get(request, db, ("invoices", "clients"))
+    if cond.not_modified:
+        return cond.not_modified_response()
+    # Cache key
+    try:
+        import time, hashlib
+        # L'ETag (versions factures/clients) fait partie de la clé: pas de liste périmée sous un ETag récent
+        key_raw = f"p={page}|s={page_size}|sf={status_filter}|cs={client_search}|q={search}|sd={start_date}|ed={end_date}|ob={sort_by}|od={sort_dir}|v={cond.etag}"
+        key = hashlib.md5(key_raw.encode()).hexdigest()
+        entry = _invoices_cache.get(key)
+        if entry and (time.time() - entry['ts']) < _CACHE_TTL_SECONDS:
+            return FastJSONResponse(entry['data'], headers=cond.headers)
+    except Exception:
+        key = None
+    # Base avec JOIN client pour récupérer le nom
+    base = db.query(
+        Invoice,
+        Client.name.label('client_name')
+    ).join(Client, Client.client_id == Invoice.client_id, isouter=True)
+
+    # Filtres
+    base = apply_invoice_filters(
+        db, base, status_filter=status_filter, client_search=client_search, search=search,
+        start_date=start_date, end_date=end_date,
+    )
 
     # Total avant pagination
     total = base.count()
 
     # Tri
-    sort_col = Invoice.created_at
-    if sort_by == "date":
-        sort_col = Invoice.date
-    elif sort_by == "number":
-        sort_col = Invoice.invoice_number
-    elif sort_by == "total":
-        sort_col = Invoice.total
-    elif sort_by == "status":
-        sort_col = Invoice.status
-    elif sort_by == "client":
-        sort_col = Client.name
+    sort_col = invoice_sort_column(sort_by)
 
     if (sort_dir or "").lower() == "asc":
         base = base.order_by(sort_col.asc())
@@ -299,15 +318,21 @@ async def list_invoices_paginated(
     except Exception:
         pass
 
-    return result
+    return FastJSONResponse(result, headers=cond.headers)
 
 @router.get("/{invoice_id}")
 async def get_invoice(
     invoice_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """Obtenir une facture par ID avec items, paiements et nom du client"""
+    cond = conditional_get(request, db, ("invoices", "clients"))
+    if cond.not_modified:
+        return cond.not_modified_response()
+    response.headers.update(cond.headers)
     invoice = db.query(Invoice).filter(Invoice.invoice_id == invoice_id).first()
     if not invoice:
         raise HTTPException(status_code=404, detail="Facture non trouvée")
@@ -1396,23 +1421,18 @@ async def get_invoice_stats(
         
         # Chiffre d'affaires brut du mois
         monthly_revenue_gross = db.query(func.sum(Invoice.total)).filter(
-            func.extract('month', Invoice.date) == today.month,
-            func.extract('year', Invoice.date) == today.year,
+            in_month(Invoice.date, today),
             Invoice.status.in_(["payée", "PAID"])
         ).scalar() or 0
 
         # Achats quotidiens du mois (par date ou created_at)
         monthly_daily_purchases = db.query(func.coalesce(func.sum(DailyPurchase.amount), 0)).filter(
-            or_(
-                and_(func.extract('month', DailyPurchase.date) == today.month, func.extract('year', DailyPurchase.date) == today.year),
-                and_(func.extract('month', DailyPurchase.created_at) == today.month, func.extract('year', DailyPurchase.created_at) == today.year),
-            )
+            or_(in_month(DailyPurchase.date, today), in_month(DailyPurchase.created_at, today))
         ).scalar() or 0
         
         # Paiements aux fournisseurs du mois
         monthly_supplier_payments = db.query(func.sum(SupplierInvoice.paid_amount)).filter(
-            func.extract('month', SupplierInvoice.invoice_date) == today.month,
-            func.extract('year', SupplierInvoice.invoice_date) == today.year
+            in_month(SupplierInvoice.invoice_date, today)
         ).scalar() or 0
         
         # Chiffre d'affaires net du mois (déduction achats quotidiens)
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, UploadFile, File, Request
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import selectinload, load_only
 from sqlalchemy import or_, and_, func, text, exists, case
@@ -9,19 +10,29 @@ import shutil
 from pathlib import Path
 from ..database import (
     get_db, Product, ProductVariant, ProductVariantAttribute, StockMovement, Category,
-    CategoryAttribute, CategoryAttributeValue, UserSettings, DailySale, Invoice, Client
+    CategoryAttribute, CategoryAttributeValue, UserSettings, DailySale, Invoice, Client,
+    ProductStockSummary
 )
+from ..services.stock_summary import ensure_stock_summary_table, load_summaries, rebuild_stock_summary
+from ..services import product_stats, resource_versions
+from ..services.product_stats import check_product_stats, get_product_stats, recompute_product_stats
+from ..services.bulk_products import MAX_ITEMS as BULK_MAX_ITEMS, bulk_upsert_products
+from ..services.scan_batch import MAX_CODES as SCAN_MAX_CODES, scan_codes
+from ..conditional import conditional_get
+from ..responses import FastJSONResponse, model_decimal
+from ..services.settings_cache import DEFAULT_CONDITIONS, DEFAULT_CONDITION_KEY, settings_cache
 from ..schemas import (
     ProductCreate, ProductUpdate, ProductResponse, ProductVariantCreate, StockMovementCreate,
     CategoryAttributeCreate, CategoryAttributeUpdate, CategoryAttributeResponse,
     CategoryAttributeValueCreate, CategoryAttributeValueUpdate, CategoryAttributeValueResponse,
-    ProductListItem, ProductVariantListItem
+    ProductListItem, ProductVariantListItem, ProductBulkResponse, ProductScanBatchRequest
 )
 from ..auth import get_current_user, require_role, require_any_role
 from decimal import Decimal
 from pydantic import BaseModel
 from ..database import InvoiceItem, QuotationItem, DeliveryNoteItem
 from sqlalchemy.exc import IntegrityError
+import json
 import logging
 import time
 
@@ -271,9 +282,6 @@ class CategoryResponse(CategoryBase):
 # Conditions (état des produits)
 # =====================
 
-DEFAULT_CONDITIONS = ["neuf", "occasion", "venant"]
-DEFAULT_CONDITION_KEY = "product_conditions"
-
 def _ensure_condition_columns(db: Session):
     """Ajoute les colonnes condition aux tables si absentes (sans Alembic)."""
     try:
@@ -319,20 +327,8 @@ def _ensure_condition_columns(db: Session):
         logging.error(f"Erreur dans _ensure_condition_columns: {e}")
 
 def _get_allowed_conditions(db: Session) -> dict:
-    """Retourne {options: [...], default: str}. Stocké dans UserSettings (global)."""
-    setting = db.query(UserSettings).filter(
-        UserSettings.user_id.is_(None), UserSettings.setting_key == DEFAULT_CONDITION_KEY
-    ).first()
-    import json
-    if setting and setting.setting_value:
-        try:
-            data = json.loads(setting.setting_value)
-            options = data.get("options") or DEFAULT_CONDITIONS
-            default = data.get("default") or options[0]
-            return {"options": options, "default": default}
-        except Exception:
-            pass
-    return {"options": DEFAULT_CONDITIONS, "default": DEFAULT_CONDITIONS[0]}
+    """Retourne {options: [...], default: str}. Stocké dans UserSettings (global), servi depuis le cache."""
+    return settings_cache.product_conditions(db)
 
 def _set_allowed_conditions(db: Session, options: list[str], default_value: str):
     import json
@@ -368,8 +364,47 @@ async def update_conditions_settings(payload: ConditionsUpdate, db: Session = De
     _set_allowed_conditions(db, options, default_value)
     return {"options": options, "default": default_value}
 
+# Sérialisation légère des listes: dicts au format JSON des response_model (Decimal en chaîne),
+# renvoyés via FastJSONResponse sans revalidation pydantic
+def _variant_payload(v) -> dict:
+    return {
+        "variant_id": v.variant_id,
+        "imei_serial": v.imei_serial,
+        "barcode": v.barcode,
+        "condition": v.condition,
+        "is_sold": bool(v.is_sold),
+        "created_at": v.created_at,
+        "attributes": [
+            {"attribute_id": a.attribute_id, "attribute_name": a.attribute_name, "attribute_value": a.attribute_value}
+            for a in (v.attributes or [])
+        ],
+    }
+
+def _product_payload(p, mask_purchase_price: bool, variants: Optional[list] = None) -> dict:
+    return {
+        "product_id": p.product_id,
+        "name": p.name,
+        "description": p.description,
+        "quantity": p.quantity,
+        "price": model_decimal(p.price),
+        "wholesale_price": model_decimal(p.wholesale_price),
+        "purchase_price": "0" if mask_purchase_price else model_decimal(p.purchase_price),
+        "category": p.category,
+        "brand": p.brand,
+        "model": p.model,
+        "barcode": p.barcode,
+        "condition": p.condition,
+        "has_unique_serial": bool(p.has_unique_serial),
+        "entry_date": p.entry_date,
+        "notes": p.notes,
+        "image_path": p.image_path,
+        "created_at": p.created_at,
+        "variants": [_variant_payload(v) for v in variants] if variants is not None else [],
+    }
+
 @router.get("/", response_model=List[ProductResponse])
 async def list_products(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
@@ -386,6 +421,10 @@ async def list_products(
     current_user = Depends(get_current_user)
 ):
     """Lister les produits avec recherche et filtres"""
+    # Rien de modifié depuis la dernière lecture: 304 sans exécuter la requête
+    cond = conditional_get(request, db, ("products",), scope=getattr(current_user, "role", "user"))
+    if cond.not_modified:
+        return cond.not_modified_response()
     _ensure_condition_columns(db)
     query = db.query(Product)
     
@@ -449,53 +488,48 @@ async def list_products(
     elif has_barcode is False:
         query = query.filter(or_(Product.barcode.is_(None), func.length(func.trim(Product.barcode)) == 0))
 
-    # Existence-based filters
-    pv_exists_available = exists().where(and_(ProductVariant.product_id == Product.product_id, ProductVariant.is_sold == False))
-    pv_exists_any = exists().where(ProductVariant.product_id == Product.product_id)
+    # Filtres stock/variantes via le résumé précalculé (une ligne par produit à variantes)
+    if in_stock is not None or has_variants is not None:
+        ensure_stock_summary_table()
+        query = query.outerjoin(ProductStockSummary, ProductStockSummary.product_id == Product.product_id)
     if in_stock is True:
-        query = query.filter(or_(Product.quantity > 0, pv_exists_available))
+        query = query.filter(or_(Product.quantity > 0, ProductStockSummary.available_variants > 0))
     elif in_stock is False:
-        query = query.filter(and_(Product.quantity <= 0, ~pv_exists_available))
+        query = query.filter(Product.quantity <= 0, func.coalesce(ProductStockSummary.available_variants, 0) <= 0)
 
     if has_variants is True:
-        query = query.filter(pv_exists_any)
+        query = query.filter(ProductStockSummary.product_id.isnot(None))
     elif has_variants is False:
-        query = query.filter(~pv_exists_any)
+        query = query.filter(ProductStockSummary.product_id.is_(None))
     
     # Tri par défaut: dernier produit ajouté en haut
     query = query.order_by(Product.created_at.desc())
     
-    products = query.offset(skip).limit(limit).all()
+    # Variantes et attributs chargés en deux requêtes (pas de chargement paresseux par produit)
+    products = (
+        query.options(selectinload(Product.variants).selectinload(ProductVariant.attributes))
+        .offset(skip).limit(limit).all()
+    )
     # Mask purchase_price for non-manager/admin
-    try:
-        role = getattr(current_user, "role", "user")
-        if role not in ("admin", "manager"):
-            for p in (products or []):
-                try:
-                    p.purchase_price = Decimal(0)
-                except Exception:
-                    pass
-    except Exception:
-        pass
+    mask_purchase_price = getattr(current_user, "role", "user") not in ("admin", "manager")
     # Si un filtre de condition est actif, ne retourner que les variantes correspondant à cette condition
-    if condition:
-        cond_lower = (condition or "").strip().lower()
-        for p in products:
-            try:
-                _ = p.variants  # force load
-                p.variants = [v for v in (p.variants or []) if ((v.condition or "").strip().lower() == cond_lower)]
-            except Exception:
-                pass
-    return products
+    cond_lower = (condition or "").strip().lower() if condition else None
+    payload = []
+    for p in products:
+        variants = p.variants or []
+        if cond_lower is not None:
+            variants = [v for v in variants if (v.condition or "").strip().lower() == cond_lower]
+        payload.append(_product_payload(p, mask_purchase_price, variants))
+    return FastJSONResponse(payload, headers=cond.headers)
 
 class PaginatedProductsResponse(BaseModel):
     items: List[ProductListItem]
     total: int
 
-@router.get("/paginated", response_model=PaginatedProductsResponse)
-async def list_products_paginated(
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=200),
+
+def apply_product_filters(
+    db: Session,
+    query,
     search: Optional[str] = None,
     category: Optional[str] = None,
     condition: Optional[str] = None,
@@ -506,39 +540,8 @@ async def list_products_paginated(
     brand: Optional[str] = None,
     model: Optional[str] = None,
     has_barcode: Optional[bool] = None,
-    sort_by: Optional[str] = Query("created_at"),  # name | category | price | stock | barcode | created_at
-    sort_dir: Optional[str] = Query("desc"),  # asc | desc
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
 ):
-    """Lister les produits avec pagination (retourne items + total)."""
-    _ensure_condition_columns(db)
-    # Eager-load only the necessary columns to speed up list view
-    # Note: nous n'incluons plus le selectinload des variantes pour la liste; un résumé sera calculé séparément
-    base_query = (
-        db.query(Product)
-        .options(
-            load_only(
-                Product.product_id,
-                Product.name,
-                Product.description,
-                Product.quantity,
-                Product.price,
-                Product.purchase_price,
-                Product.category,
-                Product.brand,
-                Product.model,
-                Product.barcode,
-                Product.condition,
-                Product.has_unique_serial,
-                Product.entry_date,
-                Product.notes,
-                Product.image_path,
-                Product.created_at,
-            )
-        )
-    )
-
+    """Filtres de la liste produits (partagés avec l'export). Joint product_stock_summary."""
     if search:
         search_filter = or_(
             Product.name.ilike(f"%{search}%"),
@@ -552,11 +555,11 @@ async def list_products_paginated(
                 ProductVariant.barcode.ilike(f"%{search}%"),
                 ProductVariant.imei_serial.ilike(f"%{search}%")
             )
-        ).subquery()
-        base_query = base_query.filter(or_(search_filter, Product.product_id.in_(variant_search)))
+        )
+        query = query.filter(or_(search_filter, Product.product_id.in_(variant_search)))
 
     if category:
-        base_query = base_query.filter(Product.category == category)
+        query = query.filter(Product.category == category)
 
     if condition:
         # Comparaison insensible à la casse et aux espaces pour produit ET variantes
@@ -568,7 +571,7 @@ async def list_products_paginated(
         )
         
         # Filtrer les produits qui ont soit la condition au niveau produit, soit des variantes avec cette condition
-        base_query = base_query.filter(
+        query = query.filter(
             or_(
                 func.lower(func.trim(Product.condition)) == condition_lower,
                 Product.product_id.in_(variant_condition_subquery)
@@ -576,48 +579,99 @@ async def list_products_paginated(
         )
 
     if min_price is not None:
-        base_query = base_query.filter(Product.price >= Decimal(min_price))
+        query = query.filter(Product.price >= Decimal(min_price))
     if max_price is not None:
-        base_query = base_query.filter(Product.price <= Decimal(max_price))
+        query = query.filter(Product.price <= Decimal(max_price))
 
     if brand:
-        base_query = base_query.filter(Product.brand.ilike(f"%{brand}%"))
+        query = query.filter(Product.brand.ilike(f"%{brand}%"))
     if model:
-        base_query = base_query.filter(Product.model.ilike(f"%{model}%"))
+        query = query.filter(Product.model.ilike(f"%{model}%"))
 
     if has_barcode is True:
-        base_query = base_query.filter(Product.barcode.isnot(None), func.length(func.trim(Product.barcode)) > 0)
+        query = query.filter(Product.barcode.isnot(None), func.length(func.trim(Product.barcode)) > 0)
     elif has_barcode is False:
-        base_query = base_query.filter(or_(Product.barcode.is_(None), func.length(func.trim(Product.barcode)) == 0))
+        query = query.filter(or_(Product.barcode.is_(None), func.length(func.trim(Product.barcode)) == 0))
 
-    pv_exists_available = exists().where(and_(ProductVariant.product_id == Product.product_id, ProductVariant.is_sold == False))
-    pv_exists_any = exists().where(ProductVariant.product_id == Product.product_id)
+    # Stock et variantes via le résumé précalculé: pas d'agrégat sur product_variants
+    query = query.outerjoin(ProductStockSummary, ProductStockSummary.product_id == Product.product_id)
     if in_stock is True:
-        base_query = base_query.filter(or_(Product.quantity > 0, pv_exists_available))
+        query = query.filter(or_(Product.quantity > 0, ProductStockSummary.available_variants > 0))
     elif in_stock is False:
-        base_query = base_query.filter(and_(Product.quantity <= 0, ~pv_exists_available))
+        query = query.filter(Product.quantity <= 0, func.coalesce(ProductStockSummary.available_variants, 0) <= 0)
 
     if has_variants is True:
-        base_query = base_query.filter(pv_exists_any)
+        query = query.filter(ProductStockSummary.product_id.isnot(None))
     elif has_variants is False:
-        base_query = base_query.filter(~pv_exists_any)
+        query = query.filter(ProductStockSummary.product_id.is_(None))
+    return query
+
 
-    # Prepare join for stock sorting: available variants per product (non sold)
-    available_variants_sub = (
-        db.query(
-            ProductVariant.product_id.label('product_id'),
-            func.sum(case((ProductVariant.is_sold == False, 1), else_=0)).label('available')
+@router.get("/paginated", response_model=PaginatedProductsResponse)
+async def list_products_paginated(
+    request: Request,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=200),
+    search: Optional[str] = None,
+    category: Optional[str] = None,
+    condition: Optional[str] = None,
+    in_stock: Optional[bool] = None,
+    has_variants: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    brand: Optional[str] = None,
+    model: Optional[str] = None,
+    has_barcode: Optional[bool] = None,
+    sort_by: Optional[str] = Query("created_at"),  # name | category | price | stock | barcode | created_at
+    sort_dir: Optional[str] = Query("desc"),  # asc | desc
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Lister les produits avec pagination (retourne items + total)."""
+    # COUNT et page évités si les produits n'ont pas changé
+    cond = conditional_get(request, db, ("products",), scope=getattr(current_user, "role", "user"))
+    if cond.not_modified:
+        return cond.not_modified_response()
+    _ensure_condition_columns(db)
+    ensure_stock_summary_table()
+    # Eager-load only the necessary columns to speed up list view
+    # Note: nous n'incluons plus le selectinload des variantes pour la liste; un résumé sera calculé séparément
+    base_query = (
+        db.query(Product)
+        .options(
+            load_only(
+                Product.product_id,
+                Product.name,
+                Product.description,
+                Product.quantity,
+                Product.price,
+                Product.wholesale_price,
+                Product.purchase_price,
+                Product.category,
+                Product.brand,
+                Product.model,
+                Product.barcode,
+                Product.condition,
+                Product.has_unique_serial,
+                Product.entry_date,
+                Product.notes,
+                Product.image_path,
+                Product.created_at,
+            )
         )
-        .group_by(ProductVariant.product_id)
-        .subquery()
     )
-    base_query = base_query.outerjoin(available_variants_sub, available_variants_sub.c.product_id == Product.product_id)
+
+    base_query = apply_product_filters(
+        db, base_query, search=search, category=category, condition=condition, in_stock=in_stock,
+        has_variants=has_variants, min_price=min_price, max_price=max_price, brand=brand, model=model,
+        has_barcode=has_barcode,
+    )
 
     # Apply ordering
     sort_key = (sort_by or "name").strip().lower()
     sort_dir_key = (sort_dir or "asc").strip().lower()
     dir_desc = sort_dir_key == 'desc'
-    stock_expr = func.coalesce(available_variants_sub.c.available, Product.quantity)
+    stock_expr = func.coalesce(ProductStockSummary.available_variants, Product.quantity)
 
     if sort_key == 'price':
         order_expr = Product.price.desc() if dir_desc else Product.price.asc()
@@ -644,90 +698,40 @@ async def list_products_paginated(
     skip = (page - 1) * page_size
     items = base_query.offset(skip).limit(page_size).all()
     # Mask purchase_price for non-manager/admin
-    try:
-        role = getattr(current_user, "role", "user")
-        if role not in ("admin", "manager"):
-            for p in (items or []):
-                try:
-                    p.purchase_price = Decimal(0)
-                except Exception:
-                    pass
-    except Exception:
-        pass
+    mask_purchase_price = getattr(current_user, "role", "user") not in ("admin", "manager")
 
-    # Calcul d'un résumé variantes pour les produits affichés (un seul aller-retour DB)
-    product_ids = [p.product_id for p in items]
-    variant_summary_map = {}
-    if product_ids:
-        # Ensemble des produits qui ont au moins une variante (vendue ou non)
-        variant_any_rows = (
-            db.query(ProductVariant.product_id)
-            .filter(ProductVariant.product_id.in_(product_ids))
-            .group_by(ProductVariant.product_id)
-            .all()
-        )
-        has_variants_set = {r[0] for r in variant_any_rows}
+    # Résumé variantes des produits affichés (lecture directe du résumé précalculé)
+    variant_summary_map = load_summaries(db, [p.product_id for p in items])
 
-        # Compte des variantes disponibles et répartition par condition (uniquement non vendues)
-        rows = (
-            db.query(
-                ProductVariant.product_id,
-                func.lower(func.coalesce(func.trim(ProductVariant.condition), '')).label('cond_key'),
-                func.count(ProductVariant.variant_id).label('available_by_condition')
-            )
-            .filter(
-                ProductVariant.product_id.in_(product_ids),
-                ProductVariant.is_sold == False
-            )
-            .group_by(
-                ProductVariant.product_id,
-                ProductVariant.condition
-            )
-            .all()
-        )
-        # Agréger par produit
-        for pid in product_ids:
-            variant_summary_map[pid] = {
-                'has_variants': pid in has_variants_set,
-                'available': 0,
-                'by_condition': {}
-            }
-        for pid, cond_key, available_by_cond in rows:
-            entry = variant_summary_map.get(pid)
-            if entry is None:
-                entry = {'has_variants': pid in has_variants_set, 'available': 0, 'by_condition': {}}
-                variant_summary_map[pid] = entry
-            key = (cond_key or '').strip() or 'inconnu'
-            count_val = int(available_by_cond or 0)
-            entry['by_condition'][key] = int((entry['by_condition'].get(key, 0)) + count_val)
-            entry['available'] = entry['available'] + count_val
-
-    # Injecter les champs légers dans les objets Product renvoyés (les pydantic ProductListItem les acceptera)
+    # Champs légers de la liste; pas de variantes (la collection n'est pas chargée)
+    payload = []
     for p in items:
-        try:
-            sum_entry = variant_summary_map.get(p.product_id)
-            p.has_variants = bool(sum_entry.get('has_variants')) if sum_entry else False
-            p.variants_available = int(sum_entry.get('available', 0)) if sum_entry else 0
-            p.variant_condition_counts = sum_entry.get('by_condition', {}) if sum_entry else {}
-            # éviter de renvoyer toutes les variantes pour la liste
-            if hasattr(p, 'variants'):
-                p.variants = []
-        except Exception:
-            pass
+        sum_entry = variant_summary_map.get(p.product_id)
+        item = _product_payload(p, mask_purchase_price)
+        item["has_variants"] = bool(sum_entry.get('has_variants')) if sum_entry else False
+        item["variants_available"] = int(sum_entry.get('available', 0)) if sum_entry else 0
+        item["variant_condition_counts"] = sum_entry.get('by_condition', {}) if sum_entry else {}
+        payload.append(item)
 
     fetch_time = time.time()
     logging.info(f"Product query fetch took: {fetch_time - count_time:.4f} seconds")
     logging.info(f"Total paginated request took: {fetch_time - start_time:.4f} seconds")
 
-    return {"items": items, "total": total}
+    return FastJSONResponse({"items": payload, "total": total}, headers=cond.headers)
 
 @router.get("/id/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """Obtenir un produit par ID"""
+    cond = conditional_get(request, db, ("products",), scope=getattr(current_user, "role", "user"))
+    if cond.not_modified:
+        return cond.not_modified_response()
+    response.headers.update(cond.headers)
     _ensure_condition_columns(db)
     product = db.query(Product).filter(Product.product_id == product_id).first()
     if not product:
@@ -884,6 +888,60 @@ async def create_product(
         logging.error(f"Erreur lors de la création du produit: {e}")
         raise HTTPException(status_code=500, detail="Erreur serveur")
 
+@router.post("/bulk", response_model=ProductBulkResponse)
+async def bulk_upsert(
+    request: Request,
+    chunk_size: int = Query(200, ge=1, le=2000),
+    db: Session = Depends(get_db),
+    current_user = Depends(require_any_role(["user", "manager"]))
+):
+    """Créer/mettre à jour des produits et variantes en masse.
+
+    Corps: tableau JSON (ou {"items": [...]}) de ProductBulkItem, ou NDJSON
+    (Content-Type: application/x-ndjson, un produit par ligne). Chaque élément
+    porte une client_key: renvoyer le même lot ne crée rien de plus. Modifier
+    un produit existant (clé déjà connue, contenu différent) exige le rôle manager.
+    """
+    content_type = (request.headers.get("content-type") or "").lower()
+    items = []
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            pending = b""
+            async for chunk in request.stream():
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                items.extend(json.loads(line) for line in lines if line.strip())
+                if len(items) > BULK_MAX_ITEMS:
+                    break
+            if pending.strip():
+                items.append(json.loads(pending))
+        else:
+            body = await request.json()
+            items = body.get("items") if isinstance(body, dict) else body
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Corps JSON/NDJSON invalide")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="Aucun produit à importer")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Maximum {BULK_MAX_ITEMS} produits par requête")
+
+    _ensure_condition_columns(db)
+    cond_cfg = _get_allowed_conditions(db)
+    try:
+        result = bulk_upsert_products(
+            db, items, set(cond_cfg["options"]), cond_cfg["default"], chunk_size=chunk_size,
+            # Mise à jour d'un produit existant: mêmes règles que PUT /id/{product_id}
+            can_update=getattr(current_user, "role", "user") in ("manager", "admin"),
+            is_locked=lambda product_id: is_product_used_in_transactions(db, product_id),
+        )
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Erreur lors de l'import en masse: {e}")
+        raise HTTPException(status_code=500, detail="Erreur serveur")
+    if result["created"] or result["updated"]:
+        _cache.clear()
+    return result
+
 @router.put("/id/{product_id}", response_model=ProductResponse)
 async def update_product(
     product_id: int,
@@ -1141,6 +1199,26 @@ async def delete_product(
         logging.error(f"Erreur lors de la suppression du produit: {e}")
         raise HTTPException(status_code=500, detail="Erreur serveur")
 
+@router.post("/scan/batch")
+async def scan_batch(
+    payload: ProductScanBatchRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Scanner une liste de codes (inventaire): produits/variantes trouvés, codes inconnus,
+    doublons et, si `report`, écart comptage / stock système par produit."""
+    if not payload.codes:
+        raise HTTPException(status_code=400, detail="Aucun code à scanner")
+    if len(payload.codes) > SCAN_MAX_CODES:
+        raise HTTPException(status_code=413, detail=f"Maximum {SCAN_MAX_CODES} codes par requête")
+    try:
+        ensure_stock_summary_table()
+        # Valeurs déjà sérialisables: éviter jsonable_encoder sur des milliers d'entrées
+        return JSONResponse(scan_codes(db, payload.codes, report=payload.report))
+    except Exception as e:
+        logging.error(f"Erreur lors du scan par lot: {e}")
+        raise HTTPException(status_code=500, detail="Erreur serveur")
+
 @router.get("/scan/{barcode}")
 async def scan_barcode(
     barcode: str,
@@ -1405,9 +1483,15 @@ async def update_category(
         category.requires_variants = bool(category_data.requires_variants)
     
     # Mettre à jour tous les produits avec cette catégorie
-    db.query(Product).filter(Product.category == old_name).update(
+    moved_ids = [pid for (pid,) in db.query(Product.product_id).filter(Product.category == old_name)]
+    before_stats = product_stats.aggregate_by_category(db.connection(), moved_ids) if moved_ids else {}
+    renamed = db.query(Product).filter(Product.category == old_name).update(
         {"category": category_data.name}
     )
+    # Mise à jour en masse (hors flush ORM): version et compteurs des produits ne suivent pas automatiquement
+    if renamed:
+        resource_versions.bump(db.connection(), "products")
+        product_stats.apply_stats_delta(db.connection(), before_stats, moved_ids)
     
     db.commit()
     db.refresh(category)
@@ -1711,97 +1795,11 @@ async def get_products_stats(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Endpoint agrégé et mis en cache pour accélérer la page Produits."""
+    """Statistiques de la page Produits, lues dans les compteurs maintenus à chaque écriture."""
     try:
-        cache_key = _get_cache_key("products_stats")
-
-        def compute():
-            total_products = db.query(func.count(Product.product_id)).scalar() or 0
-
-            # Produits avec variantes (distinct product_id)
-            with_variants = db.query(func.count(func.distinct(ProductVariant.product_id))).scalar() or 0
-            without_variants = int(total_products) - int(with_variants)
-
-            # Sous-requête: variantes disponibles (non vendues) par produit
-            available_variants_sub = (
-                db.query(
-                    ProductVariant.product_id.label('product_id'),
-func.sum(case((ProductVariant.is_sold == False, 1), else_=0)).label('available')
-                )
-                .group_by(ProductVariant.product_id)
-                .subquery()
-            )
-
-            # En stock: quantité > 0 OU variantes disponibles > 0
-            in_stock = (
-                db.query(func.count(Product.product_id))
-                .outerjoin(available_variants_sub, available_variants_sub.c.product_id == Product.product_id)
-                .filter(or_(Product.quantity > 0, available_variants_sub.c.available > 0))
-                .scalar()
-                or 0
-            )
-
-            # Rupture de stock: (quantité <= 0 ou NULL) ET (aucune variante disponible)
-            out_of_stock = (
-                db.query(func.count(Product.product_id))
-                .outerjoin(available_variants_sub, available_variants_sub.c.product_id == Product.product_id)
-                .filter(
-                    and_(
-                        or_(Product.quantity <= 0, Product.quantity.is_(None)),
-                        or_(available_variants_sub.c.available == None, available_variants_sub.c.available <= 0)
-                    )
-                )
-                .scalar()
-                or 0
-            )
-
-            # Codes-barres
-            with_barcode = (
-                db.query(func.count(Product.product_id))
-                .filter(Product.barcode.isnot(None), func.length(func.trim(Product.barcode)) > 0)
-                .scalar()
-                or 0
-            )
-            without_barcode = int(total_products) - int(with_barcode)
-
-            # Catégories + compte produits
-            categories_with_count = db.query(
-                Category.category_id.label('id'),
-                Category.name.label('name'),
-                Category.requires_variants.label('requires_variants'),
-                func.count(Product.product_id).label('product_count')
-            ).outerjoin(
-                Product, Category.name == Product.category
-            ).group_by(
-                Category.category_id, Category.name, Category.requires_variants
-            ).all()
-            categories = [
-                {
-                    "id": str(cat.id),
-                    "name": str(cat.name),
-                    "requires_variants": bool(getattr(cat, 'requires_variants', False)),
-                    "product_count": int(cat.product_count or 0),
-                }
-                for cat in categories_with_count
-            ]
-
-            # État/conditions autorisées
-            conditions_cfg = _get_allowed_conditions(db)
-
-            return {
-                "total_products": int(total_products),
-                "with_variants": int(with_variants),
-                "without_variants": int(without_variants),
-                "in_stock": int(in_stock),
-                "out_of_stock": int(out_of_stock),
-                "with_barcode": int(with_barcode),
-                "without_barcode": int(without_barcode),
-                "categories": categories,
-                "allowed_conditions": conditions_cfg,
-                "cached_at": datetime.now().isoformat(),
-            }
-
-        result = _get_cached_or_compute(cache_key, compute)
+        result = get_product_stats(db)
+        result["allowed_conditions"] = _get_allowed_conditions(db)
+        result["cached_at"] = datetime.now().isoformat()
         return result
     except Exception as e:
         logging.error(f"Erreur /products/stats: {e}")
@@ -1824,6 +1822,35 @@ func.sum(case((ProductVariant.is_sold == False, 1), else_=0)).label('available')
         }
 
 
+@router.get("/stats/consistency")
+async def check_products_stats_consistency(
+    repair: bool = False,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_role("admin"))
+):
+    """Comparer les compteurs de /stats au recalcul complet (et les corriger si repair=true)."""
+    try:
+        return check_product_stats(db, repair=repair)
+    except Exception as e:
+        logging.error(f"Erreur vérification compteurs produits: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la vérification des compteurs")
+
+
+@router.post("/stock-summary/rebuild")
+async def rebuild_products_stock_summary(current_user = Depends(require_role("admin"))):
+    """Reconstruire le résumé de stock des variantes (après import SQL ou écriture hors ORM)."""
+    try:
+        ensure_stock_summary_table()
+        started = time.time()
+        rows = rebuild_stock_summary()
+        recompute_product_stats()
+        _cache.clear()
+        return {"products_with_variants": rows, "duration_seconds": round(time.time() - started, 3)}
+    except Exception as e:
+        logging.error(f"Erreur reconstruction résumé de stock: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la reconstruction du résumé de stock")
+
+
 @router.delete("/cache")
 async def clear_products_cache(current_user = Depends(get_current_user)):
     """Vider le cache lié aux endpoints produits (admin recommandé)."""
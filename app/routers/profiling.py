@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, Query
+
+from ..auth import require_role
+from ..database import read_replica_status
+from ..db_pool import DB_PING_IDLE_SECONDS, pool_status, reset_pool_stats
+from ..profiling import (
+    PROFILING_ENABLED, SLOW_QUERY_MS, SLOW_QUERY_SAMPLE_RATE,
+    profile_registry, slow_queries,
+)
+
+router = APIRouter(prefix="/api/profiling", tags=["profiling"])
+
+@router.get("/routes")
+async def get_route_profiles(
+    sort_by: str = Query("p95", pattern="^(p50|p95|p99|queries|requests)$"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user = Depends(require_role("admin"))
+):
+    """Profils par route: latence et temps DB (p50/p95/p99), nombre de requêtes SQL"""
+    routes = profile_registry.snapshot(sort_by=sort_by)
+    return {
+        "enabled": PROFILING_ENABLED,
+        "since": profile_registry.started_at.isoformat(),
+        "total_routes": len(routes),
+        "routes": routes[:limit],
+    }
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    current_user = Depends(require_role("admin"))
+):
+    """Dernières requêtes SQL lentes échantillonnées (paramètres masqués)"""
+    return {
+        "threshold_ms": SLOW_QUERY_MS,
+        "sample_rate": SLOW_QUERY_SAMPLE_RATE,
+        "enabled": SLOW_QUERY_MS > 0,
+        "queries": list(reversed(slow_queries())),
+    }
+
+@router.get("/pools")
+async def get_pool_status(
+    current_user = Depends(require_role("admin"))
+):
+    """Pools de connexions (web / tâches de fond / réplique): occupation, attente, délais dépassés, recyclages"""
+    pools = pool_status()
+    return {
+        "ping_idle_seconds": DB_PING_IDLE_SECONDS,
+        # Pool saturé ou délais dépassés: augmenter DB_POOL_SIZE / DB_MAX_OVERFLOW ou réduire la durée des transactions
+        "healthy": all(not p["stats"]["timeouts"] and (p.get("saturation") or 0) < 1 for p in pools.values()),
+        "pools": pools,
+        "read_replica": read_replica_status(),
+    }
+
+@router.delete("/")
+async def reset_profiles(
+    current_user = Depends(require_role("admin"))
+):
+    """Remettre à zéro les statistiques de profilage"""
+    profile_registry.reset()
+    reset_pool_stats()
+    return {"message": "Statistiques de profilage réinitialisées"}
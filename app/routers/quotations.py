@@ -8,6 +8,7 @@ from ..database import get_db, Quotation, QuotationItem, Client, Product, Invoic
 from ..schemas import QuotationCreate, QuotationResponse
 from ..services.stats_manager import recompute_quotations_stats
 from ..auth import get_current_user
+from ..date_ranges import filter_between
 import logging
 import time
 
@@ -100,11 +101,7 @@ async def list_quotations(
     if client_id:
         query = query.filter(Quotation.client_id == client_id)
     
-    if start_date:
-        query = query.filter(func.date(Quotation.date) >= start_date)
-    
-    if end_date:
-        query = query.filter(func.date(Quotation.date) <= end_date)
+    query = filter_between(query, Quotation.date, start_date, end_date)
     
     quotations = query.offset(skip).limit(limit).all()
     # Attacher l'ID de la facture liée (s'il existe) pour chaque devis
@@ -203,10 +200,7 @@ async def list_quotations_paginated(
     if client_search:
         like = f"%{client_search.strip()}%"
         base = base.filter(Client.name.ilike(like))
-    if start_date:
-        base = base.filter(func.date(Quotation.date) >= start_date)
-    if end_date:
-        base = base.filter(func.date(Quotation.date) <= end_date)
+    base = filter_between(base, Quotation.date, start_date, end_date)
 
     # Compteurs agrégés (basés sur mêmes filtres)
     agg_base = db.query(Quotation)
@@ -214,10 +208,7 @@ async def list_quotations_paginated(
         agg_base = agg_base.filter(Quotation.status == status_filter)
     if client_search:
         agg_base = agg_base.join(Client).filter(Client.name.ilike(f"%{client_search.strip()}%"))
-    if start_date:
-        agg_base = agg_base.filter(func.date(Quotation.date) >= start_date)
-    if end_date:
-        agg_base = agg_base.filter(func.date(Quotation.date) <= end_date)
+    agg_base = filter_between(agg_base, Quotation.date, start_date, end_date)
 
     start_ts = time.time()
     total = agg_base.count()
@@ -5,9 +5,10 @@ from typing import List, Optional
 from datetime import datetime, timedelta, date
 import json
 
-from ..database import get_db, User
+from ..database import get_read_db, User
 from ..database import Invoice, InvoiceItem, InvoicePayment, Quotation, Product, Client
 from ..auth import get_current_user
+from ..date_ranges import between_clauses
 
 router = APIRouter(prefix="/api/reports", tags=["reports"])
 
@@ -15,7 +16,7 @@ router = APIRouter(prefix="/api/reports", tags=["reports"])
 async def get_overview_report(
     period: str = "month",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Rapport de vue d'ensemble"""
     try:
@@ -62,7 +63,7 @@ async def get_overview_report(
 @router.get("/dashboard")
 async def get_dashboard_metrics(
     days: int = 30,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """KPI réels pour le tableau de bord, calculés depuis SQLite.
@@ -81,13 +82,13 @@ async def get_dashboard_metrics(
         paid_statuses = ["payée", "PAID"]
         invoices_q = (
             db.query(Invoice)
-            .filter(func.date(Invoice.date) >= since.date())
+            .filter(*between_clauses(Invoice.date, since.date()))
             .filter(Invoice.status.in_(paid_statuses))
         )
         num_invoices = invoices_q.count()
         total_revenue = float(
             db.query(func.coalesce(func.sum(Invoice.total), 0))
-            .filter(func.date(Invoice.date) >= since.date())
+            .filter(*between_clauses(Invoice.date, since.date()))
             .filter(Invoice.status.in_(paid_statuses))
             .scalar()
             or 0
@@ -95,11 +96,11 @@ async def get_dashboard_metrics(
         avg_ticket = float(total_revenue / num_invoices) if num_invoices else 0.0
 
         # Conversion devis -> factures (N jours)
-        quotes_total = db.query(func.count(Quotation.quotation_id)).filter(func.date(Quotation.date) >= since.date()).scalar() or 0
+        quotes_total = db.query(func.count(Quotation.quotation_id)).filter(*between_clauses(Quotation.date, since.date())).scalar() or 0
         converted_quotes = (
             db.query(func.count(func.distinct(Invoice.quotation_id)))
             .filter(Invoice.quotation_id.isnot(None))
-            .filter(func.date(Invoice.date) >= since.date())
+            .filter(*between_clauses(Invoice.date, since.date()))
             .scalar()
             or 0
         )
@@ -114,7 +115,7 @@ async def get_dashboard_metrics(
         active_customers = (
             db.query(func.count(func.distinct(Invoice.client_id)))
             .filter(Invoice.client_id.isnot(None))
-            .filter(func.date(Invoice.date) >= since_90.date())
+            .filter(*between_clauses(Invoice.date, since_90.date()))
             .scalar()
             or 0
         )
@@ -122,7 +123,7 @@ async def get_dashboard_metrics(
         # Répartition des paiements (N jours)
         payments = (
             db.query(InvoicePayment.payment_method, func.coalesce(func.sum(InvoicePayment.amount), 0).label("amount"))
-            .filter(func.date(InvoicePayment.payment_date) >= since.date())
+            .filter(*between_clauses(InvoicePayment.payment_date, since.date()))
             .group_by(InvoicePayment.payment_method)
             .order_by(desc("amount"))
             .all()
@@ -138,7 +139,7 @@ async def get_dashboard_metrics(
                 func.coalesce(func.sum(InvoiceItem.total), 0).label("revenue"),
             )
             .join(Invoice, InvoiceItem.invoice_id == Invoice.invoice_id)
-            .filter(func.date(Invoice.date) >= since.date())
+            .filter(*between_clauses(Invoice.date, since.date()))
             .group_by(InvoiceItem.product_name)
             .order_by(desc("revenue"))
             .limit(5)
@@ -170,7 +171,7 @@ async def get_sales_report(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Rapport des ventes"""
     try:
@@ -214,7 +215,7 @@ async def get_sales_report(
 @router.get("/stock")
 async def get_stock_report(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Rapport de stock"""
     try:
@@ -249,7 +250,7 @@ async def get_stock_report(
 async def get_financial_report(
     period: str = "month",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Rapport financier"""
     try:
@@ -291,7 +292,7 @@ async def get_financial_report(
 @router.get("/customers")
 async def get_customers_report(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Rapport clients"""
     try:
@@ -0,0 +1,185 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import desc
+from typing import Optional
+
+from ..database import get_db, Product, StockCountChunk, StockCountExpected, StockCountSession
+from ..auth import get_current_user, require_any_role
+from ..schemas import StockCountChunkUpload, StockCountClose, StockCountCreate
+from ..services import stock_count
+from .products import _cache as products_cache
+
+router = APIRouter(prefix="/api/stock-counts", tags=["stock-counts"])
+
+
+def _get_session(db: Session, session_id: int, open_only: bool = False) -> StockCountSession:
+    session = db.query(StockCountSession).filter(StockCountSession.session_id == session_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Inventaire non trouvé")
+    if open_only and session.status != "open":
+        raise HTTPException(status_code=409, detail=f"Inventaire {session.status}")
+    return session
+
+
+def _session_dict(session: StockCountSession) -> dict:
+    return {
+        "session_id": session.session_id,
+        "name": session.name,
+        "category": session.category,
+        "status": session.status,
+        "notes": session.notes,
+        "created_by": session.created_by,
+        "created_at": session.created_at,
+        "closed_at": session.closed_at,
+        "adjustments_count": session.adjustments_count or 0,
+    }
+
+
+@router.post("/")
+async def create_stock_count(
+    payload: StockCountCreate,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_any_role(["manager"]))
+):
+    """Ouvrir un inventaire: fige les quantités attendues du périmètre"""
+    name = (payload.name or "").strip()
+    if not name or len(name) > 200:
+        raise HTTPException(status_code=400, detail="Nom d'inventaire invalide")
+    session = stock_count.open_session(db, name, (payload.category or "").strip() or None, payload.notes,
+                                       getattr(current_user, "user_id", None))
+    expected = db.query(StockCountExpected).filter(StockCountExpected.session_id == session.session_id).count()
+    return {**_session_dict(session), "expected_products": expected}
+
+
+@router.get("/")
+async def list_stock_counts(
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Lister les inventaires (plus récents d'abord)"""
+    query = db.query(StockCountSession)
+    if status:
+        query = query.filter(StockCountSession.status == status)
+    sessions = query.order_by(desc(StockCountSession.session_id)).limit(limit).all()
+    return [_session_dict(s) for s in sessions]
+
+
+@router.get("/{session_id}")
+async def get_stock_count(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Détail d'un inventaire et progression du comptage"""
+    session = _get_session(db, session_id)
+    tally = stock_count.stock_count_manager.sync(db, session_id)
+    return {**_session_dict(session), "progress": stock_count.progress(tally)}
+
+
+@router.get("/{session_id}/expected")
+async def get_stock_count_expected(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Quantités attendues figées (téléchargées par les clients pour compter hors ligne)"""
+    _get_session(db, session_id)
+    rows = (
+        db.query(StockCountExpected.product_id, Product.name, Product.barcode,
+                 StockCountExpected.expected_quantity, StockCountExpected.has_variants)
+        .join(Product, Product.product_id == StockCountExpected.product_id)
+        .filter(StockCountExpected.session_id == session_id)
+        .order_by(StockCountExpected.product_id)
+        .all()
+    )
+    return [
+        {"product_id": pid, "product_name": name, "barcode": barcode,
+         "expected_quantity": int(qty or 0), "has_variants": bool(has_variants)}
+        for pid, name, barcode, qty, has_variants in rows
+    ]
+
+
+@router.post("/{session_id}/chunks")
+async def upload_stock_count_chunk(
+    session_id: int,
+    payload: StockCountChunkUpload,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Envoyer un lot de codes scannés (renvoi du même chunk_id sans effet)"""
+    session = _get_session(db, session_id, open_only=True)
+    chunk_id = (payload.chunk_id or "").strip()
+    if not chunk_id or len(chunk_id) > 64:
+        raise HTTPException(status_code=400, detail="chunk_id invalide")
+    if len(payload.codes) > stock_count.MAX_CHUNK_CODES:
+        raise HTTPException(status_code=400, detail=f"Maximum {stock_count.MAX_CHUNK_CODES} codes par lot")
+    device_id = (payload.device_id or "").strip()[:64] or None
+    return stock_count.upload_chunk(db, session, chunk_id, payload.codes, device_id,
+                                    getattr(current_user, "user_id", None))
+
+
+@router.get("/{session_id}/chunks")
+async def list_stock_count_chunks(
+    session_id: int,
+    device_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Lots déjà reçus (reprise d'un envoi interrompu)"""
+    _get_session(db, session_id)
+    query = db.query(StockCountChunk.chunk_id, StockCountChunk.device_id, StockCountChunk.code_count,
+                     StockCountChunk.received_at).filter(StockCountChunk.session_id == session_id)
+    if device_id:
+        query = query.filter(StockCountChunk.device_id == device_id)
+    return [
+        {"chunk_id": cid, "device_id": dev, "code_count": count, "received_at": received}
+        for cid, dev, count, received in query.order_by(StockCountChunk.received_at).all()
+    ]
+
+
+@router.get("/{session_id}/reconciliation")
+async def get_stock_count_reconciliation(
+    session_id: int,
+    only_differences: bool = False,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Attendu vs compté par produit"""
+    session = _get_session(db, session_id)
+    if session.status != "open":
+        raise HTTPException(status_code=409, detail=f"Inventaire {session.status}: consulter les mouvements INVENTORY")
+    return stock_count.reconcile(db, session, only_differences)
+
+
+@router.post("/{session_id}/close")
+async def close_stock_count(
+    session_id: int,
+    payload: Optional[StockCountClose] = None,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_any_role(["manager"]))
+):
+    """Clôturer: écrit les mouvements d'ajustement et met à jour les quantités"""
+    session = _get_session(db, session_id, open_only=True)
+    try:
+        result = stock_count.close_session(db, session, (payload or StockCountClose()).apply_adjustments)
+    except stock_count.SessionNotOpen as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Clôture de l'inventaire échouée: {e}")
+    products_cache.clear()
+    return result
+
+
+@router.post("/{session_id}/cancel")
+async def cancel_stock_count(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_any_role(["manager"]))
+):
+    """Annuler un inventaire ouvert (aucun ajustement)"""
+    session = _get_session(db, session_id, open_only=True)
+    stock_count.cancel_session(db, session)
+    return _session_dict(session)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, func, and_
 from typing import List, Optional
@@ -6,13 +6,37 @@ from datetime import datetime, date, timedelta, time
 from ..database import get_db, StockMovement, Product, ProductVariant
 from ..schemas import StockMovementCreate, StockMovementResponse
 from ..auth import get_current_user
+from ..conditional import conditional_get
+from ..date_ranges import filter_between
 from ..services.google_sheets_sync_helper import sync_product_stock_to_sheets
+from ..services import resource_versions, row_counters, stock_ledger
 import logging
 
 router = APIRouter(prefix="/api/stock-movements", tags=["stock-movements"])
 
+def apply_movement_filters(
+    query,
+    movement_type: Optional[str] = None,
+    product_id: Optional[int] = None,
+    reference_type: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """Filtres de la liste des mouvements (partagés avec l'export)"""
+    if movement_type:
+        query = query.filter(StockMovement.movement_type == movement_type)
+    if product_id:
+        query = query.filter(StockMovement.product_id == product_id)
+    if reference_type:
+        query = query.filter(StockMovement.reference_type == reference_type)
+    # Utiliser des bornes temporelles pour bénéficier des index (évite func.date)
+    # Si seule la date de début est fournie, on se limite à ce jour
+    return filter_between(query, StockMovement.created_at, start_date, end_date or start_date)
+
 @router.get("/", response_model=List[StockMovementResponse])
 async def list_stock_movements(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     movement_type: Optional[str] = None,
@@ -24,6 +48,12 @@ async def list_stock_movements(
     current_user = Depends(get_current_user)
 ):
     """Lister les mouvements de stock avec filtres"""
+    # Mouvements et noms de produits inchangés: 304 sans requête de page
+    cond = conditional_get(request, db, ("stock_movements", "products"))
+    if cond.not_modified:
+        db.rollback()
+        return cond.not_modified_response()
+    response.headers.update(cond.headers)
     try:
         # Exclure les lignes orphelines où product_id est NULL (héritage de données)
         query = (
@@ -32,23 +62,7 @@ async def list_stock_movements(
             .order_by(desc(StockMovement.created_at))
         )
         
-        if movement_type:
-            query = query.filter(StockMovement.movement_type == movement_type)
-        
-        if product_id:
-            query = query.filter(StockMovement.product_id == product_id)
-        
-        if reference_type:
-            query = query.filter(StockMovement.reference_type == reference_type)
-        
-        # Utiliser des bornes temporelles pour bénéficier des index (évite func.date)
-        if start_date or end_date:
-            # Si une seule borne est fournie, l'autre est déduite/faible impact
-            period_start = start_date or date.min
-            period_end = end_date or start_date or date.max
-            start_dt = datetime.combine(period_start, time.min)
-            next_dt = datetime.combine(period_end + timedelta(days=1), time.min)
-            query = query.filter(StockMovement.created_at >= start_dt, StockMovement.created_at < next_dt)
+        query = apply_movement_filters(query, movement_type, product_id, reference_type, start_date, end_date)
         
         movements = query.offset(skip).limit(limit).all()
 
@@ -179,8 +193,8 @@ async def get_stock_stats(
                 StockMovement.product_id.isnot(None)
             )
 
-        # Totaux globaux (toutes dates) pour la tuile « Total Mouvements »
-        total_movements = db.query(StockMovement).filter(StockMovement.product_id.isnot(None)).count()
+        # Totaux globaux (toutes dates) pour la tuile « Total Mouvements »: compteur maintenu (pas de COUNT(*))
+        total_movements = row_counters.get_row_count(db.connection(), "stock_movements")
 
         # Mouvements sur la période
         period_movements = db.query(StockMovement).filter(period_filter).count()
@@ -309,11 +323,8 @@ async def cleanup_stock_movements(
         if reference_type and reference_type != "ANY":
             q = q.filter(StockMovement.reference_type == reference_type)
             has_filter = True
-        if start_date:
-            q = q.filter(func.date(StockMovement.created_at) >= start_date)
-            has_filter = True
-        if end_date:
-            q = q.filter(func.date(StockMovement.created_at) <= end_date)
+        if start_date or end_date:
+            q = filter_between(q, StockMovement.created_at, start_date, end_date)
             has_filter = True
 
         # Si aucun filtre, exiger reference_type=ANY pour autoriser effacement total
@@ -325,6 +336,10 @@ async def cleanup_stock_movements(
         if to_delete <= 0:
             return {"deleted": 0}
         q.delete(synchronize_session=False)
+        # Les points de contrôle couvrant des mouvements supprimés ne sont plus valides
+        stock_ledger.invalidate_checkpoints(db.connection(), [product_id] if product_id is not None else None)
+        row_counters.bump(db.connection(), "stock_movements", -to_delete)
+        resource_versions.bump(db.connection(), "stock_movements")
         db.commit()
         return {"deleted": to_delete}
     except HTTPException:
@@ -344,6 +359,7 @@ async def recompute_product_quantities(
     """Recalculer les quantités produits à partir des mouvements restants.
 
     ATTENTION: Ne reflète que l'historique présent dans la table des mouvements.
+    Une seule requête groupée (point de contrôle + queue du journal) puis une mise à jour groupée.
     """
     try:
         # Admin seulement
@@ -352,29 +368,36 @@ async def recompute_product_quantities(
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permissions insuffisantes")
         except Exception:
             pass
-
-        products_q = db.query(Product)
-        if product_id is not None:
-            products_q = products_q.filter(Product.product_id == product_id)
-        products_list = products_q.all()
-
-        updated = 0
-        for p in products_list:
-            ins = db.query(func.coalesce(func.sum(StockMovement.quantity), 0)).filter(StockMovement.product_id == p.product_id, StockMovement.movement_type == "IN").scalar() or 0
-            outs = db.query(func.coalesce(func.sum(StockMovement.quantity), 0)).filter(StockMovement.product_id == p.product_id, StockMovement.movement_type == "OUT").scalar() or 0
-            try:
-                # outs est positif dans le modèle actuel, on fait ins - outs
-                new_qty = int(ins) - int(outs)
-            except Exception:
-                new_qty = (p.quantity or 0)
-            if new_qty != (p.quantity or 0):
-                p.quantity = new_qty
-                updated += 1
-        db.commit()
-        return {"updated_products": updated}
+        return stock_ledger.recompute_quantities(db, product_id)
     except HTTPException:
         raise
     except Exception as e:
         db.rollback()
         logging.error(f"Erreur lors du recalcul des quantités: {e}")
         raise HTTPException(status_code=500, detail="Erreur serveur")
+
+
+@router.get("/ledger/drift")
+async def get_ledger_drift(
+    refresh: bool = False,
+    product_id: Optional[int] = None,
+    limit: int = Query(200, ge=1, le=5000),
+    current_user = Depends(get_current_user)
+):
+    """Écarts entre products.quantity et le journal des mouvements (lecture seule, sans verrou)"""
+    if getattr(current_user, "role", None) not in ["admin", "manager"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permissions insuffisantes")
+    if not refresh and product_id is None and stock_ledger.ledger_drift_monitor.last_report is not None:
+        return {**stock_ledger.ledger_drift_monitor.last_report, "cached": True}
+    report = stock_ledger.detect_drift(product_ids=[product_id] if product_id is not None else None, limit=limit)
+    return {**report, "cached": False}
+
+
+@router.post("/ledger/checkpoints")
+async def advance_ledger_checkpoints(
+    current_user = Depends(get_current_user)
+):
+    """Figer le solde de chaque produit jusqu'au dernier mouvement (accélère les recalculs)"""
+    if getattr(current_user, "role", None) not in ["admin"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permissions insuffisantes")
+    return stock_ledger.advance_checkpoints()
@@ -8,6 +8,7 @@ from datetime import datetime
 from ..database import get_db, UserSettings, ScanHistory, AppCache
 from ..auth import get_current_user
 from ..schemas import UserResponse
+from ..services.settings_cache import settings_cache
 
 router = APIRouter(prefix="/api/user-settings", tags=["user-settings"])
 
@@ -153,64 +154,7 @@ async def get_invoice_payment_methods(
       2) rétrocompatibilité: `appSettings.invoice.invoicePaymentMethods`
     """
     try:
-        methods: List[str] = []
-
-        # 1) Clef dédiée
-        # Chercher d'abord pour l'utilisateur, puis global (user_id NULL)
-        setting_user = (
-            db.query(UserSettings)
-            .filter(
-                and_(
-                    UserSettings.setting_key == 'INVOICE_PAYMENT_METHODS',
-                    UserSettings.user_id == current_user.user_id
-                )
-            ).first()
-        )
-        setting_global = (
-            db.query(UserSettings)
-            .filter(
-                and_(
-                    UserSettings.setting_key == 'INVOICE_PAYMENT_METHODS',
-                    UserSettings.user_id.is_(None)
-                )
-            ).first()
-        )
-        setting = setting_user or setting_global
-        if setting and setting.setting_value:
-            try:
-                data = json.loads(setting.setting_value)
-                if isinstance(data, list):
-                    methods = [str(x).strip() for x in data if str(x).strip()]
-            except Exception:
-                pass
-
-        # 2) Fallback ancien stockage
-        if not methods:
-            legacy = (
-                db.query(UserSettings)
-                .filter(
-                    and_(
-                        UserSettings.setting_key == 'appSettings',
-                        UserSettings.user_id == current_user.user_id
-                    )
-                )
-                .order_by(UserSettings.updated_at.desc())
-                .first()
-            )
-            if legacy and legacy.setting_value:
-                try:
-                    data = json.loads(legacy.setting_value)
-                except Exception:
-                    data = {}
-                raw = (data or {}).get('invoice', {}).get('invoicePaymentMethods')
-                if isinstance(raw, list):
-                    methods = [str(x).strip() for x in raw if str(x).strip()]
-                elif isinstance(raw, str):
-                    methods = [s.strip() for s in raw.splitlines() if s.strip()]
-
-        if not methods:
-            methods = ["Espèces", "Virement bancaire", "Mobile Money", "Chèque", "Carte bancaire"]
-        return {"data": methods}
+        return {"data": settings_cache.payment_methods(db, current_user.user_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -184,6 +184,50 @@ class ProductUpdate(BaseModel):
     image_path: Optional[str] = None  # Chemin vers l'image du produit
     variants: Optional[List[ProductVariantCreate]] = None
 
+class ProductBulkItem(ProductCreate):
+    # Clé d'idempotence fournie par le client (ex: référence de ligne du bon de réception)
+    client_key: str
+
+class ProductBulkItemResult(BaseModel):
+    index: int
+    client_key: Optional[str] = None
+    status: Literal["created", "updated", "unchanged", "error"]
+    product_id: Optional[int] = None
+    variants_created: int = 0
+    variants_existing: int = 0
+    errors: List[str] = []
+
+class ProductBulkResponse(BaseModel):
+    total: int
+    created: int
+    updated: int
+    unchanged: int
+    errors: int
+    stock_movements: int
+    results: List[ProductBulkItemResult]
+
+class ProductScanBatchRequest(BaseModel):
+    codes: List[str]
+    # Ajouter l'écart comptage / stock système par produit
+    report: bool = False
+
+# Inventaires (comptage physique)
+class StockCountCreate(BaseModel):
+    name: str
+    # Périmètre optionnel: une catégorie (sinon tous les produits)
+    category: Optional[str] = None
+    notes: Optional[str] = None
+
+class StockCountChunkUpload(BaseModel):
+    # Identifiant du lot choisi par le client: un renvoi du même lot est ignoré
+    chunk_id: str
+    codes: List[str]
+    device_id: Optional[str] = None
+
+class StockCountClose(BaseModel):
+    # False: clôturer sans écrire de mouvements d'ajustement
+    apply_adjustments: bool = True
+
 class ProductResponse(BaseModel):
     product_id: int
     name: str
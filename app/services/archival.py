@@ -0,0 +1,439 @@
+"""
+Rétention et archivage des tables en ajout seul: stock_movements, daily_sales,
+scan_history, migration_logs.
+
+- Politique par table (mois conservés, variable d'environnement; 0 = jamais):
+  les mois entiers antérieurs à la limite sont exportés en JSON lignes
+  compressé (ARCHIVE_DIR/<table>/<table>-AAAA-MM-<horodatage>.jsonl.gz) puis
+  retirés de la table. stock_movements et daily_sales restent consultables
+  en SQL dans <table>_archive; scan_history et migration_logs sont purgés.
+- Un mois est traité par transaction; le fichier n'est publié (renommé)
+  qu'après validation de celle-ci.
+- stock_movements: la somme des mouvements retirés est reportée dans la base
+  du journal de stock, les soldes et recompute-quantities restent exacts.
+- PostgreSQL: partitionnement déclaratif par mois. partition_table()
+  convertit une table existante (opération de maintenance, verrou exclusif),
+  ensure_partitions() crée les mois à venir. Un mois archivé d'une table
+  partitionnée est retiré par DROP de sa partition au lieu d'un DELETE, et
+  les requêtes filtrées par date n'ouvrent que les partitions concernées.
+- SQLite: compaction après archivage (incremental_vacuum si activé, sinon
+  VACUUM quand l'espace libre dépasse PAGES_FREE_RATIO).
+- Les compteurs de lignes sont ajustés à chaque lot puis recalés en fin
+  d'exécution.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Column, DateTime, Index, MetaData, Table, and_, func, select, text
+from sqlalchemy.schema import AddConstraint
+
+from ..database import DailySale, MigrationLog, ScanHistory, StockMovement, background_engine, engine
+from . import resource_versions, row_counters, stock_ledger
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join("backups", "archives"))
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PAGES_FREE_RATIO = float(os.getenv("SQLITE_VACUUM_FREE_RATIO", "0.2"))
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    table: str
+    model: Any
+    column: str
+    env: str
+    default_months: int
+    # True: lignes archivées conservées dans <table>_archive (sinon purge après export)
+    keep_archive_table: bool
+
+    @property
+    def months(self) -> int:
+        try:
+            return max(0, int(os.getenv(self.env, str(self.default_months))))
+        except ValueError:
+            return self.default_months
+
+
+POLICIES: Dict[str, RetentionPolicy] = {
+    p.table: p
+    for p in (
+        RetentionPolicy("stock_movements", StockMovement, "created_at", "STOCK_MOVEMENTS_RETENTION_MONTHS", 0, True),
+        RetentionPolicy("daily_sales", DailySale, "sale_date", "DAILY_SALES_RETENTION_MONTHS", 0, True),
+        RetentionPolicy("scan_history", ScanHistory, "scanned_at", "SCAN_HISTORY_RETENTION_MONTHS", 6, False),
+        RetentionPolicy("migration_logs", MigrationLog, "timestamp", "MIGRATION_LOGS_RETENTION_MONTHS", 3, False),
+    )
+}
+
+
+# ===================== Mois =====================
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, n: int) -> date:
+    idx = month.year * 12 + month.month - 1 + n
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def retention_cutoff(policy: RetentionPolicy, today: Optional[date] = None) -> Optional[date]:
+    """Premier jour du plus ancien mois conservé (None: rétention désactivée)."""
+    if policy.months <= 0:
+        return None
+    return _add_months(_month_start(today or date.today()), -policy.months)
+
+
+def _bound(policy: RetentionPolicy, day: date):
+    col = policy.model.__table__.c[policy.column]
+    return datetime.combine(day, datetime.min.time()) if isinstance(col.type, DateTime) else day
+
+
+def _month_clause(policy: RetentionPolicy, start: date, end: date):
+    col = policy.model.__table__.c[policy.column]
+    return and_(col >= _bound(policy, start), col < _bound(policy, end))
+
+
+# ===================== Tables d'archive =====================
+
+_archive_metadata = MetaData()
+
+
+def archive_table(policy: RetentionPolicy) -> Table:
+    """<table>_archive: mêmes colonnes, sans clés étrangères ni valeurs par défaut."""
+    name = f"{policy.table}_archive"
+    if name in _archive_metadata.tables:
+        return _archive_metadata.tables[name]
+    src = policy.model.__table__
+    columns = [Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False) for c in src.columns]
+    return Table(name, _archive_metadata, *columns, Index(f"idx_{name}_{policy.column}", policy.column))
+
+
+# ===================== PostgreSQL: partitions =====================
+
+def _is_postgres(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+def is_partitioned(conn, table_name: str) -> bool:
+    if not _is_postgres(conn):
+        return False
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+             "WHERE c.relname = :t AND pg_table_is_visible(c.oid)"),
+        {"t": table_name},
+    ).first() is not None
+
+
+def _partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_p{month:%Y%m}"
+
+
+def _monthly_partition(conn, table_name: str, month: date) -> Optional[str]:
+    """Nom de la partition couvrant exactement `month`, si elle existe."""
+    name = _partition_name(table_name, month)
+    found = conn.execute(
+        text("SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+             "WHERE c.relname = :n AND p.relname = :t"),
+        {"n": name, "t": table_name},
+    ).first()
+    return name if found else None
+
+
+def _create_partition(conn, parent: str, table_name: str, month: date) -> None:
+    q = conn.dialect.identifier_preparer.quote
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {q(_partition_name(table_name, month))} PARTITION OF {q(parent)} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+    )
+
+
+def ensure_partitions(bind=None, months_ahead: Optional[int] = None) -> List[str]:
+    """Crée les partitions du mois courant et des `months_ahead` suivants (tables partitionnées seulement)."""
+    bind = bind or engine
+    if not _is_postgres(bind):
+        return []
+    ahead = PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = _month_start(date.today())
+    created: List[str] = []
+    for policy in POLICIES.values():
+        with bind.connect() as conn:
+            if not is_partitioned(conn, policy.table):
+                continue
+        for i in range(ahead + 1):
+            month = _add_months(current, i)
+            try:
+                with bind.begin() as conn:
+                    if _monthly_partition(conn, policy.table, month):
+                        continue
+                    _create_partition(conn, policy.table, policy.table, month)
+                    created.append(_partition_name(policy.table, month))
+            except Exception as e:
+                # Ex.: lignes de ce mois déjà présentes dans la partition par défaut
+                logging.warning(f"Partition {_partition_name(policy.table, month)} non créée: {e}")
+    return created
+
+
+def partition_table(table_name: str, bind=None, months_ahead: Optional[int] = None) -> Dict[str, Any]:
+    """Convertit une table en table partitionnée par mois (PostgreSQL).
+
+    Copie complète sous verrou exclusif dans une seule transaction: à lancer
+    en maintenance (scripts/archive_tables.py --partition).
+    """
+    bind = bind or engine
+    if not _is_postgres(bind):
+        raise RuntimeError("Partitionnement disponible uniquement sous PostgreSQL")
+    policy = POLICIES[table_name]
+    src = policy.model.__table__
+    pk = next(iter(src.primary_key.columns)).name
+    ahead = PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    with bind.begin() as conn:
+        q = conn.dialect.identifier_preparer.quote
+        if is_partitioned(conn, table_name):
+            return {"table": table_name, "already_partitioned": True}
+        t, new, col = q(table_name), q(f"{table_name}_partitioned"), q(policy.column)
+        conn.exec_driver_sql(f"LOCK TABLE {t} IN ACCESS EXCLUSIVE MODE")
+        oldest = conn.execute(select(func.min(src.c[policy.column]))).scalar()
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, :c)"), {"t": table_name, "c": pk}).scalar()
+        conn.exec_driver_sql(f"CREATE TABLE {new} (LIKE {t} INCLUDING DEFAULTS) PARTITION BY RANGE ({col})")
+        # La clé de partitionnement doit faire partie de la clé primaire
+        conn.exec_driver_sql(f"ALTER TABLE {new} ADD PRIMARY KEY ({q(pk)}, {col})")
+        month = _month_start(oldest or date.today())
+        last = _add_months(_month_start(date.today()), ahead)
+        partitions = 0
+        while month <= last:
+            _create_partition(conn, f"{table_name}_partitioned", table_name, month)
+            partitions += 1
+            month = _add_months(month, 1)
+        conn.exec_driver_sql(f"CREATE TABLE {q(table_name + '_pdefault')} PARTITION OF {new} DEFAULT")
+        names = [c.name for c in src.columns]
+        # Lignes sans date: partition par défaut
+        values = [f"COALESCE({q(n)}, '1970-01-01')" if n == policy.column else q(n) for n in names]
+        copied = conn.exec_driver_sql(
+            f"INSERT INTO {new} ({', '.join(q(n) for n in names)}) SELECT {', '.join(values)} FROM {t}"
+        ).rowcount
+        if sequence:
+            conn.exec_driver_sql(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+        conn.exec_driver_sql(f"DROP TABLE {t}")
+        conn.exec_driver_sql(f"ALTER TABLE {new} RENAME TO {t}")
+        if sequence:
+            conn.exec_driver_sql(f"ALTER SEQUENCE {sequence} OWNED BY {t}.{q(pk)}")
+        for idx in src.indexes:
+            idx.create(conn)
+        for fk in src.foreign_key_constraints:
+            conn.execute(AddConstraint(fk))
+    with bind.connect() as conn:
+        conn.exec_driver_sql(f"ANALYZE {conn.dialect.identifier_preparer.quote(table_name)}")
+    print(f"✅ {table_name} partitionnée par mois ({partitions} partitions, {copied} lignes)")
+    return {"table": table_name, "partitions": partitions, "rows": copied}
+
+
+# ===================== Archivage =====================
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return str(value)
+
+
+def _months_to_archive(conn, policy: RetentionPolicy, cutoff: date) -> List[date]:
+    col = policy.model.__table__.c[policy.column]
+    oldest = conn.execute(select(func.min(col)).where(col < _bound(policy, cutoff))).scalar()
+    if oldest is None:
+        return []
+    months, month = [], _month_start(oldest)
+    while month < cutoff:
+        months.append(month)
+        month = _add_months(month, 1)
+    return months
+
+
+def _archive_month(bind, policy: RetentionPolicy, month: date, stamp: str) -> Dict[str, Any]:
+    table = policy.model.__table__
+    end = _add_months(month, 1)
+    where = _month_clause(policy, month, end)
+    directory = os.path.join(ARCHIVE_DIR, policy.table)
+    os.makedirs(directory, exist_ok=True)
+    final_path = os.path.join(directory, f"{policy.table}-{month:%Y-%m}-{stamp}.jsonl.gz")
+    tmp_path = final_path + ".part"
+    rows = 0
+    try:
+        with bind.begin() as conn:
+            stmt = select(table).where(where).order_by(*table.primary_key.columns)
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+                for row in conn.execute(stmt.execution_options(stream_results=True, yield_per=2000)).mappings():
+                    fh.write(json.dumps(dict(row), default=_json_default, ensure_ascii=False))
+                    fh.write("\n")
+                    rows += 1
+            if rows == 0:
+                os.remove(tmp_path)
+                return {"month": f"{month:%Y-%m}", "rows": 0}
+            counted = rows
+            if policy.table == "stock_movements":
+                counted = stock_ledger.fold_archived_movements(conn, where)["movements"]
+            if policy.keep_archive_table:
+                archive = archive_table(policy)
+                archive.create(conn, checkfirst=True)
+                names = [c.name for c in table.columns]
+                conn.execute(archive.insert().from_select(names, select(*[table.c[n] for n in names]).where(where)))
+            partition = _monthly_partition(conn, policy.table, month) if _is_postgres(conn) else None
+            if partition:
+                conn.exec_driver_sql(f"DROP TABLE {conn.dialect.identifier_preparer.quote(partition)}")
+            else:
+                conn.execute(table.delete().where(where))
+            row_counters.bump(conn, policy.table, -counted)
+            if policy.table in resource_versions.TABLE_RESOURCES:
+                resource_versions.bump(conn, resource_versions.TABLE_RESOURCES[policy.table])
+        os.replace(tmp_path, final_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {"month": f"{month:%Y-%m}", "rows": rows, "file": final_path, "dropped_partition": bool(partition)}
+
+
+def compact_sqlite(bind=None) -> Optional[Dict[str, Any]]:
+    """Rend l'espace libéré au système de fichiers (SQLite uniquement)."""
+    bind = bind or engine
+    if bind.dialect.name != "sqlite":
+        return None
+    with bind.connect() as conn:
+        auto_vacuum = int(conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() or 0)
+        free = int(conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0)
+        pages = int(conn.exec_driver_sql("PRAGMA page_count").scalar() or 0)
+    action = None
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if auto_vacuum == 2 and free:
+            conn.exec_driver_sql("PRAGMA incremental_vacuum")
+            action = "incremental_vacuum"
+        elif pages and free / pages >= PAGES_FREE_RATIO:
+            conn.exec_driver_sql("VACUUM")
+            action = "vacuum"
+    return {"free_pages": free, "page_count": pages, "action": action}
+
+
+def retention_plan(bind=None) -> List[Dict[str, Any]]:
+    """Ce que ferait une exécution (sans écriture)."""
+    bind = bind or engine
+    plan = []
+    with bind.connect() as conn:
+        for policy in POLICIES.values():
+            cutoff = retention_cutoff(policy)
+            entry = {
+                "table": policy.table,
+                "retention_months": policy.months,
+                "cutoff": cutoff,
+                "mode": "archive" if policy.keep_archive_table else "purge",
+                "partitioned": is_partitioned(conn, policy.table),
+                "rows": row_counters.get_row_count(conn, policy.table),
+                "rows_to_archive": 0,
+            }
+            if cutoff is not None:
+                col = policy.model.__table__.c[policy.column]
+                entry["rows_to_archive"] = int(conn.execute(
+                    select(func.count()).select_from(policy.model.__table__).where(col < _bound(policy, cutoff))
+                ).scalar() or 0)
+            plan.append(entry)
+        conn.commit()
+    return plan
+
+
+class RetentionManager:
+    """Exécute la rétention (une à la fois), à la demande ou périodiquement."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._interval_seconds = int(os.getenv("RETENTION_INTERVAL_SECONDS", "86400"))
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def is_running(self) -> bool:
+        return self._running.locked()
+
+    def run_once(self, bind=None, tables: Optional[List[str]] = None, compact: bool = True) -> Dict[str, Any]:
+        if not self._running.acquire(blocking=False):
+            return {"already_running": True}
+        bind = bind or background_engine
+        report: Dict[str, Any] = {"started_at": datetime.now().isoformat(), "tables": {}, "errors": []}
+        try:
+            stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+            report["partitions_created"] = ensure_partitions(bind)
+            for policy in POLICIES.values():
+                if tables and policy.table not in tables:
+                    continue
+                cutoff = retention_cutoff(policy)
+                if cutoff is None:
+                    continue
+                with bind.connect() as conn:
+                    months = _months_to_archive(conn, policy, cutoff)
+                done = []
+                for month in months:
+                    try:
+                        result = _archive_month(bind, policy, month, stamp)
+                        if result["rows"]:
+                            done.append(result)
+                    except Exception as e:
+                        report["errors"].append(f"{policy.table} {month:%Y-%m}: {e}")
+                        break
+                report["tables"][policy.table] = {
+                    "cutoff": cutoff.isoformat(),
+                    "archived": sum(r["rows"] for r in done),
+                    "months": done,
+                }
+            with bind.begin() as conn:
+                report["row_counts"] = {name: row_counters.recount(conn, name) for name in row_counters.TRACKED.values()}
+            if compact:
+                report["compaction"] = compact_sqlite(bind)
+            archived = sum(t["archived"] for t in report["tables"].values())
+            print(f"🗄️ Rétention: {archived} lignes archivées, {len(report['errors'])} erreur(s)")
+        except Exception as e:
+            report["errors"].append(str(e))
+            print(f"❌ Erreur rétention: {e}")
+        finally:
+            report["finished_at"] = datetime.now().isoformat()
+            with self._lock:
+                self.last_report = report
+            self._running.release()
+        return report
+
+    def start(self, tables: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Lance une exécution dans un thread (sans effet si une exécution est en cours)."""
+        if self.is_running():
+            return {"already_running": True}
+        threading.Thread(target=self.run_once, kwargs={"tables": tables}, name="RetentionRun", daemon=True).start()
+        return {"started": True}
+
+    def start_background(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="RetentionManager", daemon=True)
+        self._thread.start()
+
+    def stop_background(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[RetentionManager] Error in tick: {e}")
+            self._stop.wait(self._interval_seconds)
+
+
+retention_manager = RetentionManager()
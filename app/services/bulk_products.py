@@ -0,0 +1,521 @@
+"""
+Création / mise à jour de produits et de variantes en masse (réceptions de stock).
+
+1. Tout le lot est validé avant la moindre écriture: schéma, conditions,
+   doublons de clés, de codes-barres et d'IMEI à l'intérieur du lot.
+2. Une seule requête ensembliste (UNION ALL, par paquets de codes) retrouve
+   les codes-barres et IMEI déjà en base et le produit qui les porte: un code
+   appartenant à un autre produit que celui visé est un conflit.
+3. Écriture par blocs de `chunk_size` éléments, une transaction par bloc:
+   INSERT ... RETURNING pour les produits, INSERT ... ON CONFLICT pour les
+   variantes (IMEI) et les clés d'idempotence, mouvements IN en masse.
+
+Idempotence: chaque élément porte une `client_key` associée (table
+product_import_keys) au produit créé et à l'empreinte du contenu appliqué.
+Un renvoi identique est « unchanged » sans écriture; un contenu modifié met à
+jour le même produit (variantes connues conservées, nouvelles ajoutées).
+Avant de créer un produit, le bloc réserve sa clé (INSERT ... ON CONFLICT DO
+NOTHING RETURNING, product_id encore NULL): deux requêtes simultanées portant
+la même clé ne créent qu'un seul produit, la perdante retrouve celui du gagnant.
+
+Les écritures passent par le Core SQLAlchemy (pas d'objets ORM): le résumé de
+stock et les compteurs produits sont donc mis à jour explicitement par bloc.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import exists, func, inspect, literal, select, union_all, update
+from sqlalchemy.orm import Session
+
+from ..database import (
+    Product,
+    ProductImportKey,
+    ProductVariant,
+    ProductVariantAttribute,
+    StockMovement,
+    engine,
+)
+from ..schemas import ProductBulkItem
+from . import product_stats, resource_versions, row_counters, stock_summary
+
+REFERENCE_TYPE = "BULK_IMPORT"
+MAX_ITEMS = 10_000
+_CODE_CHUNK = 500
+_keys_table_ready = False
+
+# Champs produit recopiés tels quels (hors quantité, gérée à part)
+_PRODUCT_FIELDS = ("name", "description", "price", "wholesale_price", "purchase_price", "category", "brand",
+                   "model", "condition", "has_unique_serial", "entry_date", "notes", "image_path")
+
+
+@dataclass
+class _Item:
+    index: int
+    key: Optional[str] = None
+    data: Optional[ProductBulkItem] = None
+    barcode: Optional[str] = None
+    condition: Optional[str] = None
+    variants: List[Dict[str, Any]] = field(default_factory=list)
+    payload_hash: Optional[str] = None
+    # Produit déjà associé à la clé (mise à jour) / produit écrit dans ce run
+    existing_id: Optional[int] = None
+    existing_hash: Optional[str] = None
+    product_id: Optional[int] = None
+    new_variants: List[Dict[str, Any]] = field(default_factory=list)
+    variants_existing: int = 0
+    status: str = "created"
+    errors: List[str] = field(default_factory=list)
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "client_key": self.key,
+            "status": self.status,
+            "product_id": self.product_id if self.status != "error" else self.existing_id,
+            "variants_created": len(self.new_variants) if self.status in ("created", "updated") else 0,
+            "variants_existing": self.variants_existing,
+            "errors": self.errors,
+        }
+
+    def fail(self, message: str) -> None:
+        self.status = "error"
+        self.errors.append(message)
+
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    return value.strip() or None
+
+
+def _chunks(values: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def ensure_import_keys_table(bind=None) -> bool:
+    global _keys_table_ready
+    if _keys_table_ready:
+        return True
+    try:
+        ProductImportKey.__table__.create(bind=bind or engine, checkfirst=True)
+        _relax_key_product_id(bind or engine)
+        _keys_table_ready = True
+    except Exception as e:
+        logging.warning(f"Table product_import_keys indisponible: {e}")
+    return _keys_table_ready
+
+
+def _relax_key_product_id(bind) -> None:
+    """Tables créées avant la réservation des clés: product_id devient nullable."""
+    t = ProductImportKey.__table__
+    cols = {c["name"]: c for c in inspect(bind).get_columns(t.name)}
+    if cols.get("product_id", {}).get("nullable", True):
+        return
+    with bind.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            # SQLite ne sait pas modifier une contrainte: reconstruction de la table (quelques lignes)
+            conn.exec_driver_sql(f"ALTER TABLE {t.name} RENAME TO {t.name}_old")
+            for index in t.indexes:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+            t.create(bind=conn)
+            names = ", ".join(c.name for c in t.columns)
+            conn.exec_driver_sql(f"INSERT INTO {t.name} ({names}) SELECT {names} FROM {t.name}_old")
+            conn.exec_driver_sql(f"DROP TABLE {t.name}_old")
+        else:
+            conn.exec_driver_sql(f"ALTER TABLE {t.name} ALTER COLUMN product_id DROP NOT NULL")
+    print("🔧 product_import_keys.product_id rendu nullable (réservation des clés)")
+
+
+# ===================== Validation =====================
+
+def _validate(raw_items: List[Any], allowed: Set[str], default_condition: str) -> List[_Item]:
+    items: List[_Item] = []
+    seen_keys: Dict[str, int] = {}
+    seen_barcodes: Dict[str, int] = {}
+    seen_imeis: Dict[str, int] = {}
+    for index, raw in enumerate(raw_items):
+        item = _Item(index=index)
+        items.append(item)
+        try:
+            data = raw if isinstance(raw, ProductBulkItem) else ProductBulkItem.model_validate(raw)
+        except ValidationError as e:
+            for err in e.errors():
+                loc = ".".join(str(x) for x in err.get("loc", ()))
+                item.fail(f"{loc}: {err.get('msg')}")
+            if isinstance(raw, dict):
+                item.key = _clean(str(raw.get("client_key") or "")) or None
+            continue
+        item.data = data
+        item.key = _clean(data.client_key)
+        if not item.key or len(item.key) > 128:
+            item.fail("client_key obligatoire (128 caractères max)")
+        elif item.key in seen_keys:
+            item.fail(f"client_key en double dans le lot (élément {seen_keys[item.key]})")
+        else:
+            seen_keys[item.key] = index
+
+        if not _clean(data.name):
+            item.fail("Nom obligatoire")
+        if data.price is not None and data.price < 0:
+            item.fail("Prix invalide")
+        if data.quantity < 0:
+            item.fail("Quantité invalide")
+        item.condition = data.condition or default_condition
+        if item.condition and item.condition.lower() not in allowed:
+            item.fail("Condition de produit invalide")
+
+        item.barcode = _clean(data.barcode)
+        codes = [item.barcode] if item.barcode else []
+        for v in data.variants or []:
+            imei = _clean(v.imei_serial)
+            if not imei:
+                item.fail("Chaque variante doit avoir un IMEI/numéro de série")
+                continue
+            v_barcode = _clean(v.barcode)
+            if imei in seen_imeis:
+                item.fail(f"IMEI {imei} en double dans le lot (élément {seen_imeis[imei]})")
+            else:
+                seen_imeis[imei] = index
+            if v_barcode:
+                codes.append(v_barcode)
+            item.variants.append({
+                "imei_serial": imei,
+                "barcode": v_barcode,
+                "condition": v.condition or item.condition,
+                "attributes": [(a.attribute_name, a.attribute_value) for a in (v.attributes or [])],
+            })
+        # Codes-barres uniques sur l'ensemble produits + variantes
+        for code in codes:
+            if code in seen_barcodes:
+                item.fail(f"Code-barres {code} en double dans le lot (élément {seen_barcodes[code]})")
+            else:
+                seen_barcodes[code] = index
+        item.payload_hash = hashlib.sha256(data.model_dump_json().encode("utf-8")).hexdigest()
+    return items
+
+
+# ===================== Lectures ensemblistes =====================
+
+def _load_keys(conn, keys: List[str]) -> Dict[str, Tuple[int, str]]:
+    t = ProductImportKey.__table__
+    out: Dict[str, Tuple[int, str]] = {}
+    for chunk in _chunks(keys, _CODE_CHUNK):
+        for key, pid, digest in conn.execute(select(t.c.client_key, t.c.product_id, t.c.payload_hash)
+                                             .where(t.c.client_key.in_(chunk))):
+            out[key] = (pid, digest)
+    return out
+
+
+def _existing_codes(conn, barcodes: List[str], imeis: List[str]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """{code-barres: product_id} (produits et variantes) et {IMEI: product_id}."""
+    p = Product.__table__
+    v = ProductVariant.__table__
+    barcode_owner: Dict[str, int] = {}
+    imei_owner: Dict[str, int] = {}
+    rounds = max(len(barcodes), len(imeis))
+    for start in range(0, rounds, _CODE_CHUNK):
+        bc = barcodes[start:start + _CODE_CHUNK]
+        im = imeis[start:start + _CODE_CHUNK]
+        parts = []
+        if bc:
+            parts.append(select(literal("b").label("kind"), p.c.barcode.label("code"), p.c.product_id).where(p.c.barcode.in_(bc)))
+            parts.append(select(literal("b"), v.c.barcode, v.c.product_id).where(v.c.barcode.in_(bc)))
+        if im:
+            parts.append(select(literal("i"), v.c.imei_serial, v.c.product_id).where(v.c.imei_serial.in_(im)))
+        if not parts:
+            continue
+        for kind, code, pid in conn.execute(union_all(*parts)):
+            (barcode_owner if kind == "b" else imei_owner)[code] = pid
+    return barcode_owner, imei_owner
+
+
+def _resolve_conflicts(items: List[_Item], barcode_owner: Dict[str, int], imei_owner: Dict[str, int]) -> None:
+    for item in items:
+        if item.status == "error" or item.status == "unchanged":
+            continue
+        target = item.existing_id
+        if item.barcode and barcode_owner.get(item.barcode, target) != target:
+            item.fail(f"Code-barres {item.barcode} déjà utilisé par le produit {barcode_owner[item.barcode]}")
+        new_variants = []
+        for v in item.variants:
+            owner = imei_owner.get(v["imei_serial"])
+            if owner is not None:
+                if owner == target:
+                    item.variants_existing += 1
+                else:
+                    item.fail(f"IMEI {v['imei_serial']} déjà utilisé par le produit {owner}")
+                continue
+            if v["barcode"] and v["barcode"] in barcode_owner:
+                item.fail(f"Code-barres {v['barcode']} déjà utilisé par le produit {barcode_owner[v['barcode']]}")
+                continue
+            new_variants.append(v)
+        item.new_variants = new_variants
+
+
+# ===================== Écritures =====================
+
+def _dialect_insert(conn, table):
+    name = conn.dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
+def _product_row(item: _Item) -> Dict[str, Any]:
+    data = item.data
+    row = {f: getattr(data, f) for f in _PRODUCT_FIELDS}
+    row.update(name=data.name.strip(), barcode=item.barcode, condition=item.condition,
+               quantity=0 if item.variants else data.quantity)
+    if row["purchase_price"] is None:
+        row["purchase_price"] = 0
+    return row
+
+
+def _claim_keys(conn, items: List[_Item], now: datetime) -> Set[str]:
+    """Réserve les clés des produits à créer: INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Sous PostgreSQL, une clé réservée par une transaction concurrente non validée
+    fait attendre l'INSERT jusqu'à sa fin; elle n'est alors pas retournée.
+    """
+    k = ProductImportKey.__table__
+    rows = [{"client_key": it.key, "product_id": None, "payload_hash": it.payload_hash,
+             "created_at": now, "updated_at": now} for it in items]
+    stmt = _dialect_insert(conn, k)
+    if stmt is None:
+        # Autres bases: une clé déjà prise fait échouer le bloc (violation de clé primaire)
+        conn.execute(k.insert(), rows)
+        return {it.key for it in items}
+    stmt = stmt.on_conflict_do_nothing(index_elements=["client_key"]).returning(k.c.client_key)
+    return {key for (key,) in conn.execute(stmt, rows)}
+
+
+def _write_chunk(conn, chunk: List[_Item], now: datetime) -> int:
+    p = Product.__table__
+    v = ProductVariant.__table__
+    a = ProductVariantAttribute.__table__
+    m = StockMovement.__table__
+    k = ProductImportKey.__table__
+
+    # 0. Réservation des clés avant toute création: seules les clés obtenues par cette requête créent un produit
+    new_items = [it for it in chunk if not it.existing_id]
+    if new_items:
+        claimed = _claim_keys(conn, new_items, now)
+        lost = [it for it in new_items if it.key not in claimed]
+        if lost:
+            winners = _load_keys(conn, [it.key for it in lost])
+            for it in lost:
+                pid, digest = winners.get(it.key, (None, None))
+                if pid is not None and digest == it.payload_hash:
+                    # Même contenu déjà importé par la requête concurrente
+                    it.existing_id = it.product_id = pid
+                    it.status = "unchanged"
+                else:
+                    it.fail("client_key importée au même moment par une autre requête: renvoyer l'élément")
+            chunk = [it for it in chunk if it.status in ("created", "updated")]
+            new_items = [it for it in new_items if it.key in claimed]
+            if not chunk:
+                return 0
+
+    existing_ids = [it.existing_id for it in chunk if it.existing_id]
+    before_stats = product_stats.aggregate_by_category(conn, existing_ids) if existing_ids else {}
+    movements: List[Dict[str, Any]] = []
+
+    # Quantités actuelles des produits mis à jour (écart => mouvement) et présence de variantes en base
+    old_qty: Dict[int, int] = {}
+    with_variants: Set[int] = set()
+    has_variant = exists().where(v.c.product_id == p.c.product_id)
+    for ids in _chunks(existing_ids, _CODE_CHUNK):
+        for pid, qty, flag in conn.execute(select(p.c.product_id, p.c.quantity, has_variant)
+                                           .where(p.c.product_id.in_(ids))):
+            old_qty[pid] = int(qty or 0)
+            if flag:
+                with_variants.add(pid)
+
+    # 1. Produits nouveaux (clés réservées): INSERT multi-lignes avec RETURNING (ordre des paramètres conservé)
+    if new_items:
+        stmt = p.insert().returning(p.c.product_id, sort_by_parameter_order=True)
+        for it, (pid,) in zip(new_items, conn.execute(stmt, [_product_row(it) for it in new_items])):
+            it.product_id = pid
+            # Produits à variantes: mouvement IN après l'insertion des variantes (étape 3)
+            if not it.variants and it.data.quantity > 0:
+                movements.append({"product_id": pid, "quantity": it.data.quantity, "movement_type": "IN",
+                                  "reference_type": REFERENCE_TYPE, "unit_price": it.data.purchase_price or 0,
+                                  "notes": f"Import en masse ({it.key})", "created_at": now})
+
+    # 2. Produits existants: seuls les champs fournis sont mis à jour
+    for it in chunk:
+        if not it.existing_id:
+            continue
+        it.product_id = it.existing_id
+        provided = it.data.model_fields_set
+        values = {f: getattr(it.data, f) for f in _PRODUCT_FIELDS if f in provided}
+        if "name" in values:
+            values["name"] = it.data.name.strip()
+        if "barcode" in provided:
+            values["barcode"] = it.barcode
+        if "condition" in provided:
+            values["condition"] = it.condition
+        has_variants = bool(it.variants) or it.product_id in with_variants
+        if not has_variants and "quantity" in provided:
+            values["quantity"] = it.data.quantity
+            delta = it.data.quantity - old_qty.get(it.product_id, 0)
+            if delta:
+                movements.append({"product_id": it.product_id, "quantity": abs(delta),
+                                  "movement_type": "IN" if delta > 0 else "OUT", "reference_type": REFERENCE_TYPE,
+                                  "unit_price": it.data.purchase_price or 0,
+                                  "notes": f"Import en masse ({it.key})", "created_at": now})
+        if values:
+            conn.execute(update(p).where(p.c.product_id == it.product_id).values(**values))
+
+    # 3. Variantes: INSERT ... ON CONFLICT (imei_serial) DO NOTHING
+    variant_rows = [
+        {"product_id": it.product_id, "imei_serial": nv["imei_serial"], "barcode": nv["barcode"],
+         "condition": nv["condition"], "is_sold": False, "created_at": now}
+        for it in chunk for nv in it.new_variants
+    ]
+    inserted: Dict[str, int] = {}
+    if variant_rows:
+        stmt = _dialect_insert(conn, v)
+        stmt = stmt.on_conflict_do_nothing(index_elements=["imei_serial"]) if stmt is not None else v.insert()
+        for vid, imei in conn.execute(stmt.returning(v.c.variant_id, v.c.imei_serial), variant_rows):
+            inserted[imei] = vid
+        for it in chunk:
+            lost = [nv["imei_serial"] for nv in it.new_variants if nv["imei_serial"] not in inserted]
+            if lost:
+                # Créées entre la vérification et l'écriture par une autre requête
+                it.errors.extend(f"IMEI {imei} déjà utilisé (ignoré)" for imei in lost)
+                it.new_variants = [nv for nv in it.new_variants if nv["imei_serial"] in inserted]
+        # Une entrée en stock par variante réellement créée
+        for it in chunk:
+            if it.new_variants:
+                movements.append({"product_id": it.product_id, "quantity": len(it.new_variants), "movement_type": "IN",
+                                  "reference_type": REFERENCE_TYPE, "unit_price": it.data.purchase_price or 0,
+                                  "notes": f"Import en masse ({it.key})", "created_at": now})
+
+    # 4. Attributs des variantes créées
+    attr_rows = [
+        {"variant_id": inserted[nv["imei_serial"]], "attribute_name": name, "attribute_value": value}
+        for it in chunk for nv in it.new_variants for name, value in nv["attributes"]
+    ]
+    if attr_rows:
+        conn.execute(a.insert(), attr_rows)
+
+    # 5. Quantité des produits à variantes = variantes non vendues
+    variant_pids = [it.product_id for it in chunk if it.variants or it.product_id in with_variants]
+    if variant_pids:
+        available = (
+            select(func.count()).select_from(v)
+            .where(v.c.product_id == p.c.product_id, v.c.is_sold == False)  # noqa: E712
+            .scalar_subquery()
+        )
+        for ids in _chunks(variant_pids, _CODE_CHUNK):
+            conn.execute(update(p).where(p.c.product_id.in_(ids)).values(quantity=available))
+
+    # 6. Mouvements IN/OUT en masse
+    if movements:
+        conn.execute(m.insert(), movements)
+        row_counters.bump(conn, "stock_movements", len(movements))
+
+    # 7. Clés d'idempotence: INSERT ... ON CONFLICT (client_key) DO UPDATE (rattache aussi les clés réservées)
+    key_rows = [{"client_key": it.key, "product_id": it.product_id, "payload_hash": it.payload_hash,
+                 "created_at": now, "updated_at": now} for it in chunk]
+    stmt = _dialect_insert(conn, k)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["client_key"],
+            set_={"product_id": stmt.excluded.product_id, "payload_hash": stmt.excluded.payload_hash,
+                  "updated_at": stmt.excluded.updated_at},
+        )
+        conn.execute(stmt, key_rows)
+    else:
+        conn.execute(k.delete().where(k.c.client_key.in_([r["client_key"] for r in key_rows])))
+        conn.execute(k.insert(), key_rows)
+
+    # 8. Tables dérivées (les listeners de session ne voient pas les écritures Core)
+    touched = [it.product_id for it in chunk]
+    if stock_summary.is_ready():
+        stock_summary.refresh_products(conn, touched)
+    product_stats.apply_stats_delta(conn, before_stats, touched)
+    resource_versions.bump(conn, "products", *(("stock_movements",) if movements else ()))
+    return len(movements)
+
+
+def bulk_upsert_products(
+    db: Session,
+    raw_items: List[Any],
+    allowed_conditions: Set[str],
+    default_condition: str,
+    chunk_size: int = 200,
+    can_update: bool = True,
+    is_locked: Optional[Callable[[int], bool]] = None,
+) -> Dict[str, Any]:
+    """Valide puis crée/met à jour les produits du lot. Retourne les résultats par élément.
+
+    `can_update`: l'appelant peut modifier un produit existant (mêmes droits que
+    PUT /api/products/id/{id}); `is_locked(product_id)`: produit non modifiable
+    (utilisé dans des transactions). Un élément refusé est en erreur.
+    """
+    stock_summary.ensure_stock_summary_table()
+    product_stats.ensure_product_stats_table()
+    ensure_import_keys_table(db.get_bind())
+
+    items = _validate(raw_items, {c.lower() for c in allowed_conditions}, default_condition)
+    conn = db.connection()
+    keys = _load_keys(conn, [it.key for it in items if it.status != "error" and it.key])
+    for it in items:
+        if it.status == "error" or it.key not in keys:
+            continue
+        it.existing_id, it.existing_hash = keys[it.key]
+        it.product_id = it.existing_id
+        it.status = "unchanged" if it.existing_hash == it.payload_hash else "updated"
+        if it.status != "updated":
+            continue
+        if not can_update:
+            it.fail("Mise à jour d'un produit existant réservée aux managers")
+        elif is_locked is not None and is_locked(it.existing_id):
+            it.fail("Ce produit ne peut pas être modifié car il est déjà utilisé dans des factures, devis ou bons de livraison")
+
+    pending = [it for it in items if it.status in ("created", "updated")]
+    barcodes = sorted({c for it in pending for c in [it.barcode] + [v["barcode"] for v in it.variants] if c})
+    imeis = sorted({v["imei_serial"] for it in pending for v in it.variants})
+    barcode_owner, imei_owner = _existing_codes(conn, barcodes, imeis)
+    _resolve_conflicts(pending, barcode_owner, imei_owner)
+    db.commit()
+
+    movements = 0
+    now = datetime.now()
+    writable = [it for it in pending if it.status != "error"]
+    for chunk in _chunks(writable, max(1, chunk_size)):
+        try:
+            movements += _write_chunk(db.connection(), chunk, now)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Import en masse: bloc de {len(chunk)} produits annulé: {e}")
+            for it in chunk:
+                it.product_id = it.existing_id
+                it.fail("Bloc annulé: " + str(getattr(e, "orig", e)).splitlines()[0][:200])
+
+    results = [it.result() for it in items]
+    print(f"📦 Import en masse: {len(items)} éléments, {len(writable)} écrits, {movements} mouvements")
+    return {
+        "total": len(items),
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "updated": sum(1 for r in results if r["status"] == "updated"),
+        "unchanged": sum(1 for r in results if r["status"] == "unchanged"),
+        "errors": sum(1 for r in results if r["status"] == "error"),
+        "stock_movements": movements,
+        "results": results,
+    }
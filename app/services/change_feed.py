@@ -0,0 +1,220 @@
+"""
+Flux des changements (bus d'événements en mémoire) diffusé aux onglets ouverts
+par Server-Sent Events (app/routers/events.py).
+
+- Source: les incréments de services/resource_versions. Chaque bump() note les
+  ressources touchées sur la connexion; une fois le COMMIT terminé, l'événement
+  {"resources": [...]} est publié. Après un ROLLBACK, rien n'est publié.
+  L'événement "commit" de SQLAlchemy précède le COMMIT DBAPI: les ressources
+  y sont mises de côté, puis publiées quand la connexion est rendue au pool
+  ou commence sa transaction suivante (le COMMIT a alors réussi).
+- Abonnés: une file asyncio par flux SSE (bornée: un onglet lent perd des
+  événements mais se resynchronise au suivant, les ETag évitant les
+  rechargements inutiles), et des écouteurs en processus (ex.: cache du
+  tableau de bord), appelés depuis la boucle asyncio.
+- Plusieurs workers (PostgreSQL): CHANGE_FEED_PG_NOTIFY=true (par défaut sur
+  PostgreSQL) ajoute un pg_notify() dans la transaction et un thread écoute le
+  canal: chaque worker reçoit les changements de tous, uniquement s'ils sont
+  validés. Si l'écoute est coupée, publication locale en repli.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from ..database import DATABASE_URL
+from .resource_versions import CHANGED_KEY
+
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "100"))
+CHANGE_FEED_CHANNEL = os.getenv("CHANGE_FEED_CHANNEL", "powerclasss_changes")
+_COMMITTING_KEY = "_change_feed_committing"
+_PG_NOTIFY_DEFAULT = "true" if DATABASE_URL.startswith("postgresql") else "false"
+CHANGE_FEED_PG_NOTIFY = os.getenv("CHANGE_FEED_PG_NOTIFY", _PG_NOTIFY_DEFAULT).lower() == "true"
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[asyncio.Queue, Tuple[asyncio.AbstractEventLoop, Optional[Set[str]]]] = {}
+        self._listeners: List[Callable[[Set[str]], None]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._seq = 0
+        self.published = 0
+        self.dropped = 0
+        # Écoute LISTEN/NOTIFY (multi-workers)
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self.pg_listening = False
+
+    # ---- abonnés ----
+
+    def subscribe(self, resources: Optional[Iterable[str]] = None) -> asyncio.Queue:
+        """File d'événements pour un flux SSE (à appeler depuis la boucle asyncio)"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CHANGE_FEED_QUEUE_SIZE)
+        with self._lock:
+            self._loop = loop
+            self._subscribers[queue] = (loop, set(resources) if resources else None)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def add_listener(self, callback: Callable[[Set[str]], None]) -> None:
+        """Écouteur en processus, appelé avec l'ensemble des ressources modifiées"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    # ---- publication ----
+
+    def publish(self, resources: Iterable[str], **extra: Any) -> None:
+        """Publie un changement (appelable depuis n'importe quel thread)"""
+        names = set(resources)
+        if not names:
+            return
+        with self._lock:
+            self._seq += 1
+            self.published += 1
+            event_data = {"id": self._seq, "resources": sorted(names), "ts": time.time(), **extra}
+            subscribers = list(self._subscribers.items())
+            listeners = list(self._listeners)
+            loop = self._loop
+        for queue, (sub_loop, wanted) in subscribers:
+            if wanted is None or wanted & names:
+                try:
+                    sub_loop.call_soon_threadsafe(self._offer, queue, event_data)
+                except RuntimeError:
+                    # Boucle fermée: abonné orphelin
+                    self.unsubscribe(queue)
+        for callback in listeners:
+            try:
+                if loop is not None and loop.is_running():
+                    loop.call_soon_threadsafe(callback, names)
+                else:
+                    callback(names)
+            except Exception as e:
+                logging.warning(f"Écouteur du flux de changements en erreur: {e}")
+
+    def _offer(self, queue: asyncio.Queue, event_data: Dict[str, Any]) -> None:
+        try:
+            queue.put_nowait(event_data)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Boucle de l'application (livraison des écouteurs en processus)"""
+        with self._lock:
+            self._loop = loop
+
+    # ---- LISTEN / NOTIFY ----
+
+    def start_pg_listener(self) -> bool:
+        if not CHANGE_FEED_PG_NOTIFY or not DATABASE_URL.startswith("postgresql"):
+            return False
+        if self._thread and self._thread.is_alive():
+            return False
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._listen_loop, name="ChangeFeedListener", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop_pg_listener(self) -> None:
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.pg_listening = False
+
+    def _listen_loop(self) -> None:
+        try:
+            import psycopg  # type: ignore
+        except ImportError:
+            print("⚠️ psycopg absent: flux de changements limité à ce processus")
+            return
+        dsn = DATABASE_URL.replace("postgresql+psycopg://", "postgresql://", 1)
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            try:
+                with psycopg.connect(dsn, autocommit=True) as conn:
+                    conn.execute(f'LISTEN "{CHANGE_FEED_CHANNEL}"')
+                    self.pg_listening = True
+                    backoff = 1.0
+                    print(f"✅ Flux de changements: écoute du canal {CHANGE_FEED_CHANNEL}")
+                    while not self._stop_event.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            try:
+                                self.publish(json.loads(notify.payload).get("resources") or [])
+                            except ValueError:
+                                continue
+            except Exception as e:
+                if self.pg_listening:
+                    logging.warning(f"Écoute {CHANGE_FEED_CHANNEL} interrompue: {e}")
+            self.pg_listening = False
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "listeners": len(self._listeners),
+                "published": self.published,
+                "dropped": self.dropped,
+                "pg_notify": CHANGE_FEED_PG_NOTIFY,
+                "pg_listening": self.pg_listening,
+            }
+
+
+change_feed = ChangeFeed()
+
+
+@event.listens_for(Engine, "commit")
+def _prepare_committed_changes(conn) -> None:
+    changed: Optional[Set[str]] = conn.info.pop(CHANGED_KEY, None)
+    if not changed:
+        return
+    if change_feed.pg_listening and conn.dialect.name == "postgresql":
+        # Dans la transaction en cours de validation: livré à tous les workers après le COMMIT
+        try:
+            payload = json.dumps({"resources": sorted(changed)})
+            with conn.connection.dbapi_connection.cursor() as cur:
+                cur.execute("SELECT pg_notify(%s, %s)", (CHANGE_FEED_CHANNEL, payload))
+            return
+        except Exception as e:
+            logging.warning(f"pg_notify échoué, publication locale: {e}")
+    # Le COMMIT DBAPI n'a pas encore eu lieu: publication différée
+    conn.info.setdefault(_COMMITTING_KEY, set()).update(changed)
+
+
+def _publish_committed(info) -> None:
+    changed: Optional[Set[str]] = info.pop(_COMMITTING_KEY, None)
+    if changed:
+        change_feed.publish(changed)
+
+
+@event.listens_for(Engine, "begin")
+def _publish_before_next_transaction(conn) -> None:
+    _publish_committed(conn.info)
+
+
+@event.listens_for(Pool, "checkin")
+def _publish_on_checkin(dbapi_connection, connection_record) -> None:
+    if connection_record is not None:
+        _publish_committed(connection_record.info)
+
+
+@event.listens_for(Engine, "rollback")
+def _discard_uncommitted_changes(conn) -> None:
+    conn.info.pop(CHANGED_KEY, None)
+    # COMMIT en échec (ROLLBACK qui suit l'événement "commit"): rien à publier
+    conn.info.pop(_COMMITTING_KEY, None)
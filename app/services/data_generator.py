@@ -0,0 +1,461 @@
+"""
+Générateur rapide de jeux de données synthétiques (tests de charge, benchmarks).
+
+Contrairement à init_db.seed_large_test_data (un objet ORM à la fois), les
+lignes sont générées par blocs, colonne par colonne, puis insérées en masse:
+COPY sur PostgreSQL, executemany sur SQLite, INSERT multi-lignes ailleurs.
+
+Les clés primaires sont attribuées à l'avance à partir du MAX(id) existant:
+chaque bloc est donc indépendant (génération parallélisable) tout en gardant
+des clés étrangères cohérentes. Chaque bloc a sa propre graine dérivée de
+(seed, table, n° de bloc): le résultat est identique quel que soit le nombre
+de processus.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, select, text, update
+from sqlalchemy.engine import Engine
+
+from ..database import (
+    Category,
+    Client,
+    DailySale,
+    Invoice,
+    InvoiceItem,
+    InvoicePayment,
+    Product,
+    ProductVariant,
+    SalesDailyRollup,
+    StockMovement,
+)
+from .sales_rollup import ensure_rollup_table
+from .product_stats import ensure_product_stats_table, recompute_product_stats
+from .stock_summary import ensure_stock_summary_table, rebuild_stock_summary
+from . import resource_versions, row_counters
+
+# Catégories générées (nom, variantes obligatoires)
+CATEGORIES: Tuple[Tuple[str, bool], ...] = (
+    ("Smartphones", True),
+    ("Ordinateurs portables", True),
+    ("Tablettes", True),
+    ("Accessoires", False),
+    ("Montres connectées", True),
+)
+BRANDS = ("Samsung", "Apple", "Xiaomi", "Infinix", "Tecno", "HP", "Dell", "Lenovo")
+SERIES = ("S", "Note", "Pro", "Air", "Plus", "Max")
+MODELS = ("A1", "A2", "M2", "G5", "Z10", "2023", "2024")
+CONDITIONS = ("neuf", "occasion", "venant")
+CITIES = ("Dakar", "Thies", "Saint-Louis", "Touba", "Kaolack")
+PAYMENT_METHODS = ("espèces", "carte", "virement", "mobile")
+INVOICE_STATUSES = ("payée", "payée", "payée", "partiellement payée", "en attente", "annulée")
+
+# Nombre max de lignes par facture / variantes par produit (réservation d'ids)
+MAX_ITEMS = 4
+MAX_VARIANTS = 3
+
+TABLE_ORDER = ("clients", "products", "product_variants", "stock_movements",
+               "invoices", "invoice_items", "invoice_payments", "daily_sales")
+
+COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "clients": ("client_id", "name", "contact", "email", "phone", "address", "city", "country"),
+    "products": ("product_id", "name", "description", "quantity", "price", "wholesale_price", "purchase_price",
+                 "category", "brand", "model", "barcode", "condition", "has_unique_serial", "entry_date", "created_at"),
+    "product_variants": ("variant_id", "product_id", "imei_serial", "barcode", "condition", "is_sold", "created_at"),
+    "stock_movements": ("movement_id", "product_id", "quantity", "movement_type", "reference_type", "reference_id",
+                        "unit_price", "created_at"),
+    "invoices": ("invoice_id", "invoice_number", "client_id", "date", "due_date", "status", "payment_method",
+                 "subtotal", "tax_rate", "tax_amount", "total", "paid_amount", "remaining_amount", "show_tax",
+                 "price_display", "created_at"),
+    "invoice_items": ("item_id", "invoice_id", "product_id", "product_name", "quantity", "price", "total"),
+    "invoice_payments": ("payment_id", "invoice_id", "amount", "payment_date", "payment_method"),
+    "daily_sales": ("sale_id", "client_id", "client_name", "product_id", "product_name", "quantity", "unit_price",
+                    "total_amount", "sale_date", "payment_method", "invoice_id", "created_at"),
+}
+
+PRIMARY_KEYS = {
+    "clients": Client.client_id,
+    "products": Product.product_id,
+    "product_variants": ProductVariant.variant_id,
+    "stock_movements": StockMovement.movement_id,
+    "invoices": Invoice.invoice_id,
+    "invoice_items": InvoiceItem.item_id,
+    "invoice_payments": InvoicePayment.payment_id,
+    "daily_sales": DailySale.sale_id,
+}
+
+# Tailles pour scale=1.0
+BASE_SIZES = {"clients": 2_000, "products": 10_000, "invoices": 20_000, "daily_sales": 20_000}
+
+
+@dataclass
+class GeneratorConfig:
+    clients: int = BASE_SIZES["clients"]
+    products: int = BASE_SIZES["products"]
+    invoices: int = BASE_SIZES["invoices"]
+    daily_sales: int = BASE_SIZES["daily_sales"]
+    seed: int = 42
+    days: int = 365
+    chunk_size: int = 5_000
+    workers: int = 1
+    # Rempli par prepare(): premier id libre de chaque table
+    bases: Dict[str, int] = field(default_factory=dict)
+    # Date d'ancrage: les dates sont tirées dans les `days` jours qui précèdent (minuit => reproductible dans la journée)
+    now: datetime = field(default_factory=lambda: datetime.combine(date.today(), datetime.min.time()))
+
+    @classmethod
+    def scaled(cls, scale: float = 1.0, **overrides: Any) -> "GeneratorConfig":
+        sizes = {k: max(0, int(v * scale)) for k, v in BASE_SIZES.items()}
+        sizes.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**sizes)
+
+    def validate(self) -> None:
+        """Les lignes générées ne référencent que des lignes générées: pas de vente sans produit."""
+        for kind in ("clients", "products", "invoices", "daily_sales"):
+            if getattr(self, kind) < 0:
+                raise ValueError(f"{kind} doit être positif ou nul")
+        if self.products == 0 and (self.invoices or self.daily_sales):
+            raise ValueError("Factures et ventes journalières exigent au moins un produit généré (products > 0)")
+
+
+# ===================== Fonctions déterministes par id =====================
+
+def _mix(value: int, seed: int) -> int:
+    """Hachage entier bon marché et déterministe (attributs dérivés d'un id)."""
+    h = (value * 2654435761 + seed * 40503 + 0x9E3779B9) & 0xFFFFFFFF
+    h ^= h >> 15
+    h = (h * 2246822519) & 0xFFFFFFFF
+    return h ^ (h >> 13)
+
+
+def product_category(pid: int, seed: int) -> Tuple[str, bool]:
+    return CATEGORIES[_mix(pid, seed) % len(CATEGORIES)]
+
+
+def product_name(pid: int, seed: int) -> str:
+    h = _mix(pid, seed + 1)
+    return f"{BRANDS[h % len(BRANDS)]} {SERIES[(h >> 4) % len(SERIES)]}-{pid}"
+
+
+def product_price(pid: int, seed: int) -> int:
+    # 5 000 à 1 500 000 FCFA, arrondi à la centaine
+    return 5_000 + (_mix(pid, seed + 2) % 14_950) * 100
+
+
+def _luhn_digit(digits: str) -> int:
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        d = int(ch)
+        if i % 2 == 0:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return (10 - total % 10) % 10
+
+
+def variant_imei(variant_id: int) -> str:
+    """IMEI à 15 chiffres (clé de contrôle Luhn), unique par variant_id."""
+    body = f"35{variant_id:012d}"
+    return body + str(_luhn_digit(body))
+
+
+def product_barcode(pid: int) -> str:
+    """EAN-13 interne (préfixe 2 = usage interne), unique par product_id."""
+    body = f"2{pid:011d}"
+    total = sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(body))
+    return body + str((10 - total % 10) % 10)
+
+
+# ===================== Génération des blocs =====================
+
+def _chunk_rng(seed: int, table: str, chunk: int) -> random.Random:
+    return random.Random(f"{seed}:{table}:{chunk}")
+
+
+def _pick_clients(rng: random.Random, cfg: GeneratorConfig, count: int) -> List[Optional[int]]:
+    """Clients générés uniquement; sans client généré, vente au comptoir (client_id NULL)."""
+    if not cfg.clients:
+        return [None] * count
+    base = cfg.bases["clients"]
+    return rng.choices(range(base, base + cfg.clients), k=count)
+
+
+def _dates(rng: random.Random, now: datetime, days: int, n: int) -> List[datetime]:
+    seconds = rng.choices(range(days * 86_400), k=n)
+    return [now - timedelta(seconds=s) for s in seconds]
+
+
+def _gen_clients(cfg: GeneratorConfig, chunk: int, start: int, count: int) -> Dict[str, List[tuple]]:
+    rng = _chunk_rng(cfg.seed, "clients", chunk)
+    base = cfg.bases["clients"]
+    phones = rng.choices(range(1_000_000, 10_000_000), k=count)
+    cities = rng.choices(CITIES, k=count)
+    rows = []
+    for i in range(count):
+        cid = base + start + i
+        rows.append((cid, f"Client {cid}", f"Contact {cid}", f"client{cid}@example.com",
+                     f"+221 77 {phones[i]}", f"Adresse {cid}", cities[i], "Sénégal"))
+    return {"clients": rows}
+
+
+def _gen_products(cfg: GeneratorConfig, chunk: int, start: int, count: int) -> Dict[str, List[tuple]]:
+    rng = _chunk_rng(cfg.seed, "products", chunk)
+    seed, now = cfg.seed, cfg.now
+    pbase, vbase, mbase = cfg.bases["products"], cfg.bases["product_variants"], cfg.bases["stock_movements"]
+    models = rng.choices(MODELS, k=count)
+    conditions = rng.choices(CONDITIONS, k=count)
+    in_qty = rng.choices(range(20, 201), k=count)
+    nvars = rng.choices(range(1, MAX_VARIANTS + 1), k=count)
+    entry = _dates(rng, now, cfg.days, count)
+    # ~15 % des variantes déjà vendues
+    sold_flags = [r < 0.15 for r in (rng.random() for _ in range(count * MAX_VARIANTS))]
+
+    products, variants, movements = [], [], []
+    for i in range(count):
+        offset = start + i
+        pid = pbase + offset
+        category, serial = product_category(pid, seed)
+        name = product_name(pid, seed)
+        price = product_price(pid, seed)
+        purchase = price * 7 // 10
+        products.append((pid, name, f"Produit généré {name}", 0, price, price * 9 // 10, purchase, category,
+                         name.split(" ", 1)[0], models[i], None if serial else product_barcode(pid),
+                         conditions[i], serial, entry[i], entry[i]))
+        if serial:
+            for j in range(nvars[i]):
+                vid = vbase + offset * MAX_VARIANTS + j
+                variants.append((vid, pid, variant_imei(vid), f"VB{vid:010d}", conditions[i],
+                                 sold_flags[i * MAX_VARIANTS + j], entry[i]))
+            qty = nvars[i]
+        else:
+            qty = in_qty[i]
+        movements.append((mbase + offset, pid, qty, "IN", "SEED", None, purchase, entry[i]))
+    return {"products": products, "product_variants": variants, "stock_movements": movements}
+
+
+def _gen_invoices(cfg: GeneratorConfig, chunk: int, start: int, count: int) -> Dict[str, List[tuple]]:
+    rng = _chunk_rng(cfg.seed, "invoices", chunk)
+    seed = cfg.seed
+    b = cfg.bases
+    pbase, nprod = b["products"], cfg.products
+    # Les mouvements OUT suivent les mouvements IN (un par produit généré)
+    out_base = b["stock_movements"] + cfg.products
+    clients = _pick_clients(rng, cfg, count)
+    dates = _dates(rng, cfg.now, cfg.days, count)
+    statuses = rng.choices(INVOICE_STATUSES, k=count)
+    methods = rng.choices(PAYMENT_METHODS, k=count)
+    nitems = rng.choices(range(1, MAX_ITEMS + 1), k=count)
+    picks = rng.choices(range(pbase, pbase + nprod), k=count * MAX_ITEMS)
+    qtys = rng.choices((1, 1, 1, 2, 3), k=count * MAX_ITEMS)
+
+    invoices, items, payments, movements = [], [], [], []
+    for i in range(count):
+        offset = start + i
+        inv_id = b["invoices"] + offset
+        subtotal = 0
+        for j in range(nitems[i]):
+            pid = picks[i * MAX_ITEMS + j]
+            serial = product_category(pid, seed)[1]
+            qty = 1 if serial else qtys[i * MAX_ITEMS + j]
+            price = product_price(pid, seed)
+            total = price * qty
+            subtotal += total
+            slot = offset * MAX_ITEMS + j
+            items.append((b["invoice_items"] + slot, inv_id, pid, product_name(pid, seed)[:100], qty, price, total))
+            if not serial:
+                movements.append((out_base + slot, pid, qty, "OUT", "INVOICE", inv_id, price, dates[i]))
+        tax = round(subtotal * 0.18)
+        total = subtotal + tax
+        status = statuses[i]
+        paid = total if status == "payée" else (total // 2 if status == "partiellement payée" else 0)
+        invoices.append((inv_id, f"GEN-{seed}-{inv_id:08d}", clients[i], dates[i], dates[i] + timedelta(days=30),
+                         status, methods[i], subtotal, 18, tax, total, paid, total - paid, True, "TTC", dates[i]))
+        if paid:
+            payments.append((b["invoice_payments"] + offset, inv_id, paid, dates[i], methods[i]))
+    return {"invoices": invoices, "invoice_items": items, "invoice_payments": payments, "stock_movements": movements}
+
+
+def _gen_daily_sales(cfg: GeneratorConfig, chunk: int, start: int, count: int) -> Dict[str, List[tuple]]:
+    rng = _chunk_rng(cfg.seed, "daily_sales", chunk)
+    seed, b = cfg.seed, cfg.bases
+    clients = _pick_clients(rng, cfg, count)
+    products = rng.choices(range(b["products"], b["products"] + cfg.products), k=count)
+    qtys = rng.choices((1, 1, 1, 2, 3), k=count)
+    methods = rng.choices(("espece", "mobile", "virement", "cheque"), k=count)
+    dates = _dates(rng, cfg.now, cfg.days, count)
+    linked = rng.choices(range(b["invoices"], b["invoices"] + cfg.invoices), k=count) if cfg.invoices else None
+    rows = []
+    for i in range(count):
+        pid = products[i]
+        price = product_price(pid, seed)
+        invoice_id = linked[i] if linked is not None and i % 2 == 0 else None
+        client_name = f"Client {clients[i]}" if clients[i] is not None else "Client comptoir"
+        rows.append((b["daily_sales"] + start + i, clients[i], client_name, pid,
+                     product_name(pid, seed), qtys[i], price, price * qtys[i], dates[i].date(),
+                     methods[i], invoice_id, dates[i]))
+    return {"daily_sales": rows}
+
+
+GENERATORS: Dict[str, Tuple[Callable[..., Dict[str, List[tuple]]], str]] = {
+    "clients": (_gen_clients, "clients"),
+    "products": (_gen_products, "products"),
+    "invoices": (_gen_invoices, "invoices"),
+    "daily_sales": (_gen_daily_sales, "daily_sales"),
+}
+
+
+def _run_task(task: Tuple[str, GeneratorConfig, int, int, int]) -> Dict[str, List[tuple]]:
+    kind, cfg, chunk, start, count = task
+    return GENERATORS[kind][0](cfg, chunk, start, count)
+
+
+# ===================== Écriture en masse =====================
+
+def _sqlite_value(v: Any) -> Any:
+    # sqlite3 n'adapte pas nativement date/datetime de façon stable: format texte SQLAlchemy
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S.%f")
+    if hasattr(v, "isoformat") and not isinstance(v, str):
+        return v.isoformat()
+    return v
+
+
+def _write_rows(conn, table: str, rows: List[tuple]) -> None:
+    if not rows:
+        return
+    cols = COLUMNS[table]
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        raw = conn.connection.driver_connection
+        with raw.cursor() as cur:
+            with cur.copy(f"COPY {table} ({', '.join(cols)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+    elif dialect == "sqlite":
+        placeholders = ", ".join("?" for _ in cols)
+        sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({placeholders})"
+        conn.exec_driver_sql(sql, [tuple(_sqlite_value(v) for v in row) for row in rows])
+    else:
+        tbl = PRIMARY_KEYS[table].class_.__table__
+        conn.execute(tbl.insert(), [dict(zip(cols, row)) for row in rows])
+    if table in row_counters.TRACKED.values():
+        row_counters.bump(conn, table, len(rows))
+    if table in resource_versions.TABLE_RESOURCES:
+        resource_versions.bump(conn, resource_versions.TABLE_RESOURCES[table])
+
+
+def _ensure_categories(engine: Engine) -> None:
+    cat = Category.__table__
+    with engine.begin() as conn:
+        existing = {n for (n,) in conn.execute(select(cat.c.name))}
+        missing = [{"name": n, "description": f"Catégorie {n}", "requires_variants": rv}
+                   for n, rv in CATEGORIES if n not in existing]
+        if missing:
+            conn.execute(cat.insert(), missing)
+
+
+def prepare(engine: Engine, cfg: GeneratorConfig) -> GeneratorConfig:
+    """Réserve les plages d'ids (à partir du MAX existant) pour chaque table."""
+    with engine.connect() as conn:
+        for table, pk in PRIMARY_KEYS.items():
+            current = conn.execute(select(func.max(pk))).scalar() or 0
+            cfg.bases[table] = int(current) + 1
+    return cfg
+
+
+def _tasks(cfg: GeneratorConfig) -> Iterable[Tuple[str, GeneratorConfig, int, int, int]]:
+    for kind in ("clients", "products", "invoices", "daily_sales"):
+        total = getattr(cfg, kind)
+        for chunk, start in enumerate(range(0, total, cfg.chunk_size)):
+            yield (kind, cfg, chunk, start, min(cfg.chunk_size, total - start))
+
+
+def recompute_generated_quantities(engine: Engine, cfg: GeneratorConfig) -> None:
+    """Quantités des produits générés: variantes non vendues, sinon IN - OUT (borné à 0)."""
+    p = Product.__table__
+    v = ProductVariant.__table__
+    m = StockMovement.__table__
+    available = (
+        select(func.count()).select_from(v)
+        .where(v.c.product_id == p.c.product_id, v.c.is_sold == False)  # noqa: E712
+        .scalar_subquery()
+    )
+    net = (
+        select(func.coalesce(func.sum(case((m.c.movement_type == "IN", m.c.quantity), else_=-m.c.quantity)), 0))
+        .where(m.c.product_id == p.c.product_id)
+        .scalar_subquery()
+    )
+    with engine.begin() as conn:
+        clamp = func.greatest if conn.dialect.name == "postgresql" else func.max
+        lo = cfg.bases["products"]
+        hi = lo + cfg.products
+        conn.execute(
+            update(p)
+            .where(p.c.product_id >= lo, p.c.product_id < hi)
+            .values(quantity=case((p.c.has_unique_serial == True, available), else_=clamp(net, 0)))  # noqa: E712
+        )
+
+
+def _reset_sequences(engine: Engine) -> None:
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for table, pk in PRIMARY_KEYS.items():
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{pk.key}'), "
+                f"COALESCE((SELECT MAX({pk.key}) FROM {table}), 1))"
+            ))
+
+
+def generate(engine: Engine, cfg: GeneratorConfig, progress: Optional[Callable[[str], None]] = print) -> Dict[str, int]:
+    """Génère et insère le jeu de données. Retourne le nombre de lignes écrites par table."""
+    say = progress or (lambda _msg: None)
+    cfg.validate()
+    _ensure_categories(engine)
+    ensure_stock_summary_table(engine)
+    ensure_product_stats_table(engine)
+    # Avant la transaction d'écriture: créées ensuite, elles ouvriraient une
+    # seconde connexion pendant le verrou d'écriture (SQLite: database is locked)
+    resource_versions.ensure_resource_versions_table(engine)
+    row_counters.ensure_row_counters_table(engine)
+    prepare(engine, cfg)
+    counts = {t: 0 for t in TABLE_ORDER}
+    started = time.perf_counter()
+
+    tasks = list(_tasks(cfg))
+    pool = multiprocessing.Pool(cfg.workers) if cfg.workers > 1 else None
+    try:
+        chunks = pool.imap(_run_task, tasks) if pool else map(_run_task, tasks)
+        with engine.begin() as conn:
+            for (kind, _cfg, chunk, _start, _count), tables in zip(tasks, chunks):
+                # Ordre parent -> enfant pour respecter les clés étrangères
+                for table in TABLE_ORDER:
+                    rows = tables.get(table)
+                    if rows:
+                        _write_rows(conn, table, rows)
+                        counts[table] += len(rows)
+                say(f"  {kind} bloc {chunk + 1}: {sum(len(r) for r in tables.values())} lignes")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    recompute_generated_quantities(engine, cfg)
+    rebuild_stock_summary(engine, cfg.bases["products"], cfg.bases["products"] + cfg.products - 1)
+    recompute_product_stats(engine)
+    _reset_sequences(engine)
+    # L'agrégat du CA journalier est dérivé des factures: repartir de zéro
+    ensure_rollup_table(engine)
+    with engine.begin() as conn:
+        conn.execute(SalesDailyRollup.__table__.delete())
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    say(f"✅ {total} lignes générées en {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} lignes/s)")
+    return counts
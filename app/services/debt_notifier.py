@@ -12,7 +12,7 @@ from urllib import parse as _urlparse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
-from ..database import get_db, Invoice, Client, ClientDebt, AppCache, SessionLocal
+from ..database import Invoice, Client, ClientDebt, AppCache, BackgroundSessionLocal
 
 class DebtNotifier:
     def __init__(self):
@@ -44,7 +44,7 @@ class DebtNotifier:
             self._stop.wait(self._interval_seconds)
 
     def _tick(self):
-        db: Session = SessionLocal()
+        db: Session = BackgroundSessionLocal()
         try:
             today = date.today()
             # Collect clients with overdue invoices
@@ -0,0 +1,141 @@
+"""
+Exports CSV/XLSX en flux (mémoire constante quel que soit le nombre de lignes).
+
+Les lignes proviennent d'une requête SQLAlchemy exécutée avec un curseur côté
+serveur (`yield_per`, qui active `stream_results`): seuls `EXPORT_CHUNK_ROWS`
+enregistrements sont en mémoire à la fois côté Python.
+
+- CSV: écrit ligne à ligne dans un petit tampon, envoyé par blocs
+  (séparateur ";" et BOM UTF-8 pour une ouverture directe dans Excel).
+- XLSX: openpyxl en mode write-only écrit les lignes au fil de l'eau dans un
+  fichier temporaire; le classeur (format zip, non diffusable avant sa
+  fermeture) est ensuite envoyé par blocs puis supprimé.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, List, Sequence
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+_FILE_CHUNK_BYTES = 64 * 1024
+
+FORMATS = {
+    "csv": "text/csv",  # Starlette ajoute "; charset=utf-8"
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def stream_query(query, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[Any]:
+    """Itère une requête avec un curseur côté serveur, par lots de `chunk_rows`."""
+    yield from query.execution_options(stream_results=True).yield_per(chunk_rows)
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "oui" if value else "non"
+    return value
+
+
+def _xlsx_value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def iter_csv(header: Sequence[str], rows: Iterable[Sequence[Any]], delimiter: str = ";") -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter)
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow([_csv_value(v) for v in row])
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+
+def iter_xlsx(header: Sequence[str], rows: Iterable[Sequence[Any]], sheet_title: str = "Export") -> Iterator[bytes]:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    sheet.append(list(header))
+    for row in rows:
+        sheet.append([_xlsx_value(v) for v in row])
+
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, "rb") as fh:
+            while True:
+                chunk = fh.read(_FILE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _guarded(chunks: Iterator[bytes], label: str) -> Iterator[bytes]:
+    try:
+        yield from chunks
+    except Exception as e:
+        # Les en-têtes sont déjà partis: on ne peut que journaliser et couper le flux
+        logging.error(f"Erreur pendant l'export {label}: {e}")
+        raise
+
+
+def export_response(
+    fmt: str,
+    basename: str,
+    header: List[str],
+    rows: Iterable[Sequence[Any]],
+    sheet_title: str = "Export",
+) -> StreamingResponse:
+    """Réponse en flux au format demandé (csv | xlsx)."""
+    fmt = (fmt or "csv").lower()
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail="Format d'export invalide (csv ou xlsx)")
+    if fmt == "xlsx":
+        # Vérifié avant l'envoi des en-têtes
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=500, detail="Bibliothèque openpyxl non disponible - installez avec: pip install openpyxl")
+    chunks = iter_csv(header, rows) if fmt == "csv" else iter_xlsx(header, rows, sheet_title)
+    filename = f"{basename}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return StreamingResponse(
+        _guarded(chunks, basename),
+        media_type=FORMATS[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+        },
+    )
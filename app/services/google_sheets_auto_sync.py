@@ -8,7 +8,7 @@ from typing import Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy.orm import Session
-from app.database import get_db, Product
+from app.database import BackgroundSessionLocal, Product
 from app.services.google_sheets_service import GoogleSheetsService
 
 # Configuration du logger
@@ -82,7 +82,7 @@ class GoogleSheetsAutoSync:
             rows = service.get_sheet_data(spreadsheet_id, worksheet_name)
             
             # Créer une session de base de données
-            db = next(get_db())
+            db = BackgroundSessionLocal()
             
             try:
                 stats = {
@@ -11,7 +11,7 @@ import requests
 import hashlib
 import os
 
-from ..database import get_db, Migration, MigrationLog, Product, Client, Supplier
+from ..database import BackgroundSessionLocal, Migration, MigrationLog, Product, Client, Supplier
 from ..routers.cache import set_cache_item
 
 class MigrationProcessor:
@@ -41,7 +41,7 @@ class MigrationProcessor:
         """Worker en arrière-plan qui traite les migrations"""
         while not self.should_stop:
             try:
-                db = next(get_db())
+                db = BackgroundSessionLocal()
                 
                 # Chercher les migrations en attente de traitement
                 pending_migrations = db.query(Migration).filter(
@@ -71,7 +71,7 @@ class MigrationProcessor:
     
     def _process_migration(self, migration_id: int):
         """Traite une migration spécifique"""
-        db = next(get_db())
+        db = BackgroundSessionLocal()
         
         try:
             migration = db.query(Migration).get(migration_id)
@@ -0,0 +1,258 @@
+"""
+Statistiques de la page Produits: calcul en un seul parcours et compteurs incrémentaux.
+
+Les compteurs (total, avec variantes, en stock, en rupture, avec code-barres)
+sont stockés par catégorie dans product_stats_counters. Le calcul complet est
+une seule requête groupée par catégorie avec agrégats conditionnels
+(COUNT(*) FILTER (WHERE ...) sur PostgreSQL, SUM(CASE ...) ailleurs) sur
+products LEFT JOIN product_stock_summary.
+
+Lors d'un flush qui touche des produits ou des variantes, la même requête est
+exécutée restreinte aux produits concernés avant (état en base) et après
+l'écriture; la différence est appliquée aux compteurs par incréments
+atomiques. L'endpoint lit donc une petite table au lieu de parcourir les
+produits. check_product_stats() compare les compteurs au recalcul complet.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import case, event, func, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from ..database import Category, Product, ProductStatsCounter, ProductStockSummary, ProductVariant, engine
+# Importé avant l'enregistrement de nos listeners: le résumé de stock est rafraîchi
+# dans after_flush avant que les compteurs ne relisent l'état des produits.
+from .stock_summary import ensure_stock_summary_table
+
+FIELDS = ("total", "with_variants", "in_stock", "out_of_stock", "with_barcode")
+_PENDING_KEY = "_product_stats_pending"
+_CHUNK = 500
+_table_ready = False
+
+
+def ensure_product_stats_table(bind=None) -> bool:
+    """Crée la table des compteurs et l'initialise (recalcul complet) si elle est vide."""
+    global _table_ready
+    if _table_ready:
+        return True
+    bind = bind or engine
+    try:
+        ensure_stock_summary_table(bind)
+        ProductStatsCounter.__table__.create(bind=bind, checkfirst=True)
+        with bind.connect() as conn:
+            has_rows = conn.execute(select(ProductStatsCounter.category).limit(1)).first() is not None
+            has_products = conn.execute(select(Product.product_id).limit(1)).first() is not None
+        _table_ready = True
+        if has_products and not has_rows:
+            recompute_product_stats(bind)
+            print("✅ Compteurs produits initialisés")
+    except Exception as e:
+        logging.warning(f"Table product_stats_counters indisponible: {e}")
+    return _table_ready
+
+
+def _count_if(condition, dialect: str):
+    if dialect == "postgresql":
+        return func.count().filter(condition)
+    return func.sum(case((condition, 1), else_=0))
+
+
+def aggregate_by_category(conn, product_ids: Optional[List[int]] = None) -> Dict[str, Dict[str, int]]:
+    """Un seul parcours de products (⟕ résumé de stock), groupé par catégorie."""
+    p = Product.__table__
+    s = ProductStockSummary.__table__
+    dialect = conn.dialect.name
+    available = func.coalesce(s.c.available_variants, 0)
+    category_key = func.coalesce(p.c.category, "")
+    stmt = (
+        select(
+            category_key.label("category"),
+            func.count().label("total"),
+            _count_if(s.c.product_id.isnot(None), dialect).label("with_variants"),
+            _count_if(or_(p.c.quantity > 0, available > 0), dialect).label("in_stock"),
+            _count_if(or_(p.c.quantity <= 0, p.c.quantity.is_(None)) & (available <= 0), dialect).label("out_of_stock"),
+            _count_if(p.c.barcode.isnot(None) & (func.length(func.trim(p.c.barcode)) > 0), dialect).label("with_barcode"),
+        )
+        .select_from(p.outerjoin(s, s.c.product_id == p.c.product_id))
+        .group_by(category_key)
+    )
+    out: Dict[str, Dict[str, int]] = {}
+    chunks = [None] if product_ids is None else [product_ids[i:i + _CHUNK] for i in range(0, len(product_ids), _CHUNK)]
+    for chunk in chunks:
+        q = stmt if chunk is None else stmt.where(p.c.product_id.in_(chunk))
+        for row in conn.execute(q).mappings():
+            entry = out.setdefault(row["category"], {f: 0 for f in FIELDS})
+            for f in FIELDS:
+                entry[f] += int(row[f] or 0)
+    return out
+
+
+def recompute_product_stats(bind=None) -> Dict[str, Dict[str, int]]:
+    """Recalcul complet des compteurs (un seul parcours) et remplacement de la table."""
+    bind = bind or engine
+    table = ProductStatsCounter.__table__
+    with bind.begin() as conn:
+        counts = aggregate_by_category(conn)
+        conn.execute(table.delete())
+        if counts:
+            conn.execute(table.insert(), [{"category": c, **v} for c, v in counts.items()])
+    return counts
+
+
+def _apply_delta(conn, before: Dict[str, Dict[str, int]], after: Dict[str, Dict[str, int]]) -> None:
+    table = ProductStatsCounter.__table__
+    zero = {f: 0 for f in FIELDS}
+    for category in set(before) | set(after):
+        old, new = before.get(category, zero), after.get(category, zero)
+        delta = {f: new[f] - old[f] for f in FIELDS}
+        if not any(delta.values()):
+            continue
+        res = conn.execute(
+            table.update()
+            .where(table.c.category == category)
+            .values({f: getattr(table.c, f) + d for f, d in delta.items() if d})
+        )
+        if res.rowcount == 0:
+            conn.execute(table.insert().values(category=category, **delta))
+
+
+def apply_stats_delta(conn, before: Dict[str, Dict[str, int]], product_ids: Iterable[int]) -> None:
+    """Écritures hors ORM: applique l'écart entre `before` (aggregate_by_category avant) et l'état actuel."""
+    if not _table_ready:
+        return
+    ids = sorted({int(pid) for pid in product_ids if pid is not None})
+    after = aggregate_by_category(conn, ids) if ids else {}
+    _apply_delta(conn, before, after)
+
+
+def read_counters(db: Session) -> Dict[str, Dict[str, int]]:
+    rows = db.query(ProductStatsCounter).all()
+    return {r.category: {f: int(getattr(r, f) or 0) for f in FIELDS} for r in rows}
+
+
+def get_product_stats(db: Session) -> Dict[str, Any]:
+    """Totaux et comptes par catégorie lus dans les compteurs (temps constant)."""
+    ensure_product_stats_table()
+    counters = read_counters(db)
+    totals = {f: sum(c[f] for c in counters.values()) for f in FIELDS}
+    categories = [
+        {
+            "id": str(cat.category_id),
+            "name": str(cat.name),
+            "requires_variants": bool(getattr(cat, "requires_variants", False)),
+            "product_count": int(counters.get(cat.name, {}).get("total", 0)),
+        }
+        for cat in db.query(Category.category_id, Category.name, Category.requires_variants).all()
+    ]
+    return {
+        "total_products": totals["total"],
+        "with_variants": totals["with_variants"],
+        "without_variants": totals["total"] - totals["with_variants"],
+        "in_stock": totals["in_stock"],
+        "out_of_stock": totals["out_of_stock"],
+        "with_barcode": totals["with_barcode"],
+        "without_barcode": totals["total"] - totals["with_barcode"],
+        "categories": categories,
+    }
+
+
+def check_product_stats(db: Session, repair: bool = False) -> Dict[str, Any]:
+    """Compare les compteurs au recalcul complet; `repair` réécrit les compteurs en cas d'écart."""
+    ensure_product_stats_table()
+    stored = read_counters(db)
+    actual = aggregate_by_category(db.connection())
+    differences = []
+    for category in sorted(set(stored) | set(actual)):
+        s = stored.get(category, {})
+        a = actual.get(category, {})
+        for f in FIELDS:
+            if int(s.get(f, 0)) != int(a.get(f, 0)):
+                differences.append({"category": category, "field": f, "stored": int(s.get(f, 0)), "actual": int(a.get(f, 0))})
+    repaired = False
+    if differences and repair:
+        db.commit()
+        recompute_product_stats()
+        repaired = True
+    return {"consistent": not differences, "differences": differences, "repaired": repaired}
+
+
+# ===================== Maintenance incrémentale =====================
+
+_PRODUCT_FIELDS = ("quantity", "barcode", "category")
+_VARIANT_FIELDS = ("is_sold", "product_id")
+
+
+def _history_changed(obj, names: Iterable[str], collect_old: Optional[Set[int]] = None) -> bool:
+    state = inspect(obj)
+    changed = False
+    for name in names:
+        hist = state.attrs[name].history
+        if hist.has_changes():
+            changed = True
+            if collect_old is not None and name == "product_id":
+                collect_old.update(x for x in (hist.deleted or ()) if x is not None)
+    return changed
+
+
+@event.listens_for(Session, "before_flush")
+def _snapshot_product_stats(session: Session, flush_context, instances) -> None:
+    if not _table_ready:
+        return
+    ids: Set[int] = set()
+    objects: List[Any] = []
+    for obj in session.new:
+        if isinstance(obj, (Product, ProductVariant)):
+            objects.append(obj)
+            if isinstance(obj, ProductVariant):
+                # Produit existant rattaché par la relation (variant.product = p): son état avant compte
+                pid = obj.product_id
+                if pid is None and obj.product is not None:
+                    pid = obj.product.product_id
+                if pid is not None:
+                    ids.add(pid)
+    for obj in session.dirty:
+        if isinstance(obj, Product) and _history_changed(obj, _PRODUCT_FIELDS):
+            ids.add(obj.product_id)
+        elif isinstance(obj, ProductVariant) and _history_changed(obj, _VARIANT_FIELDS, ids):
+            objects.append(obj)
+            if obj.product_id is not None:
+                ids.add(obj.product_id)
+    for obj in session.deleted:
+        if isinstance(obj, (Product, ProductVariant)) and obj.product_id is not None:
+            ids.add(obj.product_id)
+    if not ids and not objects:
+        return
+    try:
+        before = aggregate_by_category(session.connection(), sorted(ids)) if ids else {}
+    except Exception as e:
+        logging.warning(f"Snapshot compteurs produits échoué: {e}")
+        return
+    session.info[_PENDING_KEY] = {"ids": ids, "objects": objects, "before": before}
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_product_stats(session: Session, flush_context) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or not _table_ready:
+        return
+    ids: Set[int] = set(pending["ids"])
+    for obj in pending["objects"]:
+        pid = getattr(obj, "product_id", None)
+        if pid is None and isinstance(obj, ProductVariant) and getattr(obj, "product", None) is not None:
+            pid = obj.product.product_id
+        if pid is not None:
+            ids.add(pid)
+    try:
+        conn = session.connection()
+        after = aggregate_by_category(conn, sorted(ids)) if ids else {}
+        _apply_delta(conn, pending["before"], after)
+    except Exception as e:
+        logging.warning(f"Mise à jour compteurs produits échouée: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_product_stats(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
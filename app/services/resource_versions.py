@@ -0,0 +1,148 @@
+"""
+Vecteur de versions des ressources de l'API (produits, factures, clients,
+mouvements de stock, ...), base des requêtes conditionnelles (app/conditional.py).
+
+Une ligne par ressource dans resource_versions: compteur + date de dernière
+modification (UTC), lus en une requête sur la clé primaire.
+- écritures ORM: les ressources touchées sont relevées à chaque flush et le
+  compteur est incrémenté une seule fois par transaction, juste avant le
+  COMMIT, dans un ordre fixe (verrous de ligne tenus le moins longtemps
+  possible, pas d'interblocage entre transactions);
+- écritures hors ORM (imports en masse, inventaire, archivage, ...): bump()
+  dans la même transaction que l'écriture.
+Une ressource absente de la table est lue comme version 0. Les ressources
+incrémentées sont notées sur la connexion (CHANGED_KEY) pour le flux des
+changements (services/change_feed), publié après le COMMIT.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from ..database import (
+    Category, CategoryAttribute, CategoryAttributeValue, Client, ClientDebt, ClientDebtPayment,
+    Invoice, InvoiceItem, InvoicePayment, Product, ProductSerialNumber, ProductVariant,
+    ProductVariantAttribute, ResourceVersion, RevokedToken, StockMovement, Supplier, SupplierDebt,
+    SupplierDebtPayment, SupplierInvoice, SupplierInvoicePayment, UserTokenWatermark, engine,
+)
+
+TRACKED = {
+    Product: "products",
+    ProductVariant: "products",
+    ProductVariantAttribute: "products",
+    ProductSerialNumber: "products",
+    Category: "categories",
+    CategoryAttribute: "categories",
+    CategoryAttributeValue: "categories",
+    StockMovement: "stock_movements",
+    Client: "clients",
+    Invoice: "invoices",
+    InvoiceItem: "invoices",
+    InvoicePayment: "invoices",
+    ClientDebt: "debts",
+    ClientDebtPayment: "debts",
+    SupplierDebt: "debts",
+    SupplierDebtPayment: "debts",
+    SupplierInvoice: "debts",
+    SupplierInvoicePayment: "debts",
+    Supplier: "suppliers",
+    # Révocations des tokens (services/token_revocation), non diffusées aux navigateurs
+    RevokedToken: "auth",
+    UserTokenWatermark: "auth",
+}
+RESOURCES = tuple(sorted(set(TRACKED.values())))
+# Nom de table -> ressource (écritures hors ORM identifiées par leur table)
+TABLE_RESOURCES = {model.__tablename__: name for model, name in TRACKED.items()}
+_PENDING_KEY = "_resource_versions_pending"
+CHANGED_KEY = "_resource_versions_changed"
+_table_ready = False
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def ensure_resource_versions_table(bind=None) -> bool:
+    """Crée la table et une ligne par ressource (une fois par processus)."""
+    global _table_ready
+    if _table_ready:
+        return True
+    table = ResourceVersion.__table__
+    try:
+        with (bind or engine).begin() as conn:
+            table.create(bind=conn, checkfirst=True)
+            existing = {r for (r,) in conn.execute(select(table.c.resource))}
+            missing = [{"resource": r, "version": 0, "updated_at": _utcnow()} for r in RESOURCES if r not in existing]
+            if missing:
+                conn.execute(table.insert(), missing)
+        _table_ready = True
+    except Exception as e:
+        logging.warning(f"Table resource_versions indisponible: {e}")
+    return _table_ready
+
+
+def get_versions(conn, resources: Iterable[str]) -> Dict[str, Tuple[int, Optional[datetime]]]:
+    """{ressource: (version, dernière modification UTC)} en une requête (Session ou Connection)."""
+    names = sorted(set(resources))
+    table = ResourceVersion.__table__
+    rows = conn.execute(
+        select(table.c.resource, table.c.version, table.c.updated_at).where(table.c.resource.in_(names))
+    ).all()
+    found = {r: (int(v or 0), ts) for r, v, ts in rows}
+    return {name: found.get(name, (0, None)) for name in names}
+
+
+def bump(conn, *resources: str) -> None:
+    """Écritures hors ORM: incrémente la version des ressources (même transaction que l'écriture)."""
+    if not resources or not ensure_resource_versions_table():
+        return
+    table = ResourceVersion.__table__
+    now = _utcnow()
+    for name in sorted(set(resources)):
+        conn.execute(
+            table.update().where(table.c.resource == name).values(version=table.c.version + 1, updated_at=now)
+        )
+    conn.info.setdefault(CHANGED_KEY, set()).update(resources)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_resource_changes(session: Session, flush_context, instances) -> None:
+    if not _table_ready:
+        return
+    touched: Set[str] = set()
+    for obj in (*session.new, *session.deleted):
+        name = TRACKED.get(type(obj))
+        if name:
+            touched.add(name)
+    for obj in session.dirty:
+        name = TRACKED.get(type(obj))
+        if name and name not in touched and session.is_modified(obj, include_collections=False):
+            touched.add(name)
+    if touched:
+        session.info.setdefault(_PENDING_KEY, set()).update(touched)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_resource_changes(session: Session) -> None:
+    if not _table_ready:
+        return
+    if session.new or session.dirty or session.deleted:
+        # Dernier flush avant le COMMIT: ses changements doivent être comptés ici
+        session.flush()
+    pending: Optional[Set[str]] = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    try:
+        bump(session.connection(), *pending)
+    except Exception as e:
+        logging.warning(f"Mise à jour des versions de ressources échouée: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_resource_changes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,125 @@
+"""
+Compteurs de lignes des tables en ajout seul (stock_movements, daily_sales,
+scan_history, migration_logs).
+
+Un compteur absent est initialisé par un COUNT(*) unique, puis maintenu:
+- écritures ORM: listener (objets ajoutés / supprimés lors du flush);
+- écritures hors ORM (insertions en masse, nettoyage, archivage): bump()
+  dans la même transaction que l'écriture.
+recount() recale un compteur (exécuté par la tâche de rétention).
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from typing import Dict, Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from ..database import DailySale, MigrationLog, ScanHistory, StockMovement, TableRowCounter, engine
+
+TRACKED = {
+    StockMovement: "stock_movements",
+    DailySale: "daily_sales",
+    ScanHistory: "scan_history",
+    MigrationLog: "migration_logs",
+}
+_PENDING_KEY = "_row_counters_pending"
+_table_ready = False
+
+
+def ensure_row_counters_table(bind=None) -> bool:
+    """Crée la table des compteurs si nécessaire (une fois par processus)."""
+    global _table_ready
+    if _table_ready:
+        return True
+    try:
+        TableRowCounter.__table__.create(bind=bind or engine, checkfirst=True)
+        _table_ready = True
+    except Exception as e:
+        logging.warning(f"Table table_row_counters indisponible: {e}")
+    return _table_ready
+
+
+def _count_query(table_name: str):
+    model = next(m for m, name in TRACKED.items() if name == table_name)
+    stmt = select(func.count()).select_from(model.__table__)
+    if model is StockMovement:
+        # Même périmètre que la liste: lignes orphelines exclues
+        stmt = stmt.where(StockMovement.__table__.c.product_id.isnot(None))
+    return stmt
+
+
+def recount(conn, table_name: str) -> int:
+    table = TableRowCounter.__table__
+    count = int(conn.execute(_count_query(table_name)).scalar() or 0)
+    res = conn.execute(table.update().where(table.c.table_name == table_name).values(row_count=count))
+    if res.rowcount == 0:
+        conn.execute(table.insert().values(table_name=table_name, row_count=count))
+    return count
+
+
+def get_row_count(conn, table_name: str) -> int:
+    """Nombre de lignes maintenu (COUNT(*) seulement à l'initialisation du compteur)."""
+    if not ensure_row_counters_table():
+        return int(conn.execute(_count_query(table_name)).scalar() or 0)
+    table = TableRowCounter.__table__
+    value = conn.execute(select(table.c.row_count).where(table.c.table_name == table_name)).scalar()
+    if value is None:
+        return recount(conn, table_name)
+    return int(value)
+
+
+def bump(conn, table_name: str, delta: int) -> None:
+    """Écritures hors ORM: ajuste le compteur (sans effet s'il n'est pas encore initialisé)."""
+    if not delta or not ensure_row_counters_table():
+        return
+    table = TableRowCounter.__table__
+    conn.execute(
+        table.update().where(table.c.table_name == table_name).values(row_count=table.c.row_count + int(delta))
+    )
+
+
+def _counted_table(obj) -> Optional[str]:
+    name = TRACKED.get(type(obj))
+    if name == "stock_movements" and obj.product_id is None and getattr(obj, "product", None) is None:
+        return None
+    return name
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_row_changes(session: Session, flush_context, instances) -> None:
+    if not _table_ready:
+        return
+    delta: Counter = Counter()
+    for obj in session.new:
+        name = _counted_table(obj)
+        if name:
+            delta[name] += 1
+    for obj in session.deleted:
+        name = _counted_table(obj)
+        if name:
+            delta[name] -= 1
+    if delta:
+        pending: Counter = session.info.setdefault(_PENDING_KEY, Counter())
+        pending.update(delta)
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_row_changes(session: Session, flush_context) -> None:
+    pending: Optional[Dict[str, int]] = session.info.pop(_PENDING_KEY, None)
+    if not pending or not _table_ready:
+        return
+    try:
+        conn = session.connection()
+        for name, delta in pending.items():
+            bump(conn, name, delta)
+    except Exception as e:
+        logging.warning(f"Mise à jour des compteurs de lignes échouée: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_row_changes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,244 @@
+"""
+Agrégat journalier du chiffre d'affaires (factures payées).
+
+Les jours clos (strictement avant aujourd'hui) sont servis depuis la table
+`sales_daily_rollup`; les jours manquants et le jour courant sont calculés en
+une seule requête GROUP BY sur un intervalle semi-ouvert [début, fin).
+Toute écriture sur une facture invalide les jours concernés (listener
+`before_flush`), y compris les factures antidatées.
+
+Invalider = écrire une ligne marqueur (invoice_count = -1) par upsert, et non
+supprimer: la ligne (verrouillée jusqu'au COMMIT de l'écriture) ordonne la
+lecture qui voudrait enregistrer ce jour. Une lecture n'enregistre un jour
+calculé que par INSERT ... ON CONFLICT DO NOTHING (jour absent) ou par UPDATE
+conditionné au marqueur qu'elle a lu (même computed_at): si une facture du
+jour a été écrite entre le calcul et l'enregistrement, la valeur calculée,
+périmée, n'est pas conservée.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, inspect, update
+from sqlalchemy.orm import Session
+
+from ..database import Invoice, SalesDailyRollup, engine
+from ..date_ranges import between_clauses
+
+PAID_STATUSES = ["payée", "PAID"]
+BUCKETS = ("day", "week", "month")
+# invoice_count d'un jour invalidé, à recalculer
+STALE = -1
+
+_table_ready = False
+
+
+def ensure_rollup_table(bind=None) -> bool:
+    """Crée la table d'agrégat si nécessaire (une fois par processus)."""
+    global _table_ready
+    if _table_ready:
+        return True
+    try:
+        SalesDailyRollup.__table__.create(bind=bind or engine, checkfirst=True)
+        _table_ready = True
+    except Exception as e:
+        logging.warning(f"Table sales_daily_rollup indisponible: {e}")
+    return _table_ready
+
+
+def day_bucket(bind, column):
+    """Expression SQL tronquant une colonne DateTime au jour, selon le dialecte."""
+    if bind is not None and bind.dialect.name == "postgresql":
+        return func.date_trunc("day", column)
+    return func.date(column)
+
+
+def _as_date(value) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def compute_daily_revenue(db: Session, start_day: date, end_day: date) -> Dict[date, Tuple[Decimal, int]]:
+    """CA payé par jour sur [start_day, end_day] en une seule requête groupée."""
+    bucket = day_bucket(db.get_bind(), Invoice.date).label("day")
+    rows = (
+        db.query(
+            bucket,
+            func.coalesce(func.sum(Invoice.total), 0),
+            func.count(Invoice.invoice_id),
+        )
+        .filter(
+            *between_clauses(Invoice.date, start_day, end_day),
+            Invoice.status.in_(PAID_STATUSES),
+        )
+        .group_by(bucket)
+        .all()
+    )
+    result: Dict[date, Tuple[Decimal, int]] = {}
+    for day_value, revenue, count in rows:
+        d = _as_date(day_value)
+        if d is not None:
+            result[d] = (Decimal(str(revenue or 0)), int(count or 0))
+    return result
+
+
+def _dialect_insert(bind, table):
+    name = bind.dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
+def _store_days(db: Session, computed: Dict[date, Tuple[Decimal, int]], missing: List[date],
+                stale: Dict[date, datetime]) -> None:
+    """Enregistre les jours calculés sans écraser une invalidation postérieure au calcul."""
+    table = SalesDailyRollup.__table__
+    now = datetime.now()
+    conn = db.connection()
+    absent = [d for d in missing if d not in stale]
+    if absent:
+        rows = [
+            {"day": d, "revenue": computed.get(d, (Decimal("0"), 0))[0],
+             "invoice_count": computed.get(d, (Decimal("0"), 0))[1], "computed_at": now}
+            for d in absent
+        ]
+        stmt = _dialect_insert(conn, table)
+        if stmt is None:
+            conn.execute(table.insert(), rows)
+        else:
+            conn.execute(stmt.on_conflict_do_nothing(index_elements=[table.c.day]), rows)
+    for d, marked_at in stale.items():
+        revenue, count = computed.get(d, (Decimal("0"), 0))
+        conn.execute(
+            update(table)
+            .where(table.c.day == d, table.c.invoice_count == STALE, table.c.computed_at == marked_at)
+            .values(revenue=revenue, invoice_count=count, computed_at=now)
+        )
+
+
+def get_daily_revenue_series(db: Session, start_day: date, end_day: date) -> List[Tuple[date, float]]:
+    """Série journalière complète (jours sans vente à 0) sur [start_day, end_day]."""
+    today = date.today()
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+    closed_end = min(end_day, today - timedelta(days=1))
+
+    stored: Dict[date, Decimal] = {}
+    stale: Dict[date, datetime] = {}
+    use_rollup = ensure_rollup_table(db.get_bind())
+    if use_rollup and start_day <= closed_end:
+        try:
+            for row in (
+                db.query(SalesDailyRollup)
+                .filter(SalesDailyRollup.day >= start_day, SalesDailyRollup.day <= closed_end)
+                .all()
+            ):
+                if row.invoice_count == STALE:
+                    stale[row.day] = row.computed_at
+                else:
+                    stored[row.day] = Decimal(str(row.revenue or 0))
+        except Exception as e:
+            logging.warning(f"Lecture sales_daily_rollup impossible: {e}")
+            db.rollback()
+            stored, stale = {}, {}
+            use_rollup = False
+
+    missing = [d for d in days if d <= closed_end and d not in stored]
+    live_start = missing[0] if missing else (max(start_day, today) if end_day >= today else None)
+
+    computed: Dict[date, Tuple[Decimal, int]] = {}
+    if live_start is not None:
+        computed = compute_daily_revenue(db, live_start, end_day)
+
+    if use_rollup and missing:
+        try:
+            _store_days(db, computed, missing, stale)
+            db.commit()
+        except Exception as e:
+            # Les valeurs calculées restent valides pour cette réponse
+            logging.info(f"Agrégat journalier non enregistré: {e}")
+            db.rollback()
+
+    series: List[Tuple[date, float]] = []
+    for d in days:
+        if d in stored:
+            series.append((d, float(stored[d])))
+        else:
+            series.append((d, float(computed.get(d, (Decimal("0"), 0))[0])))
+    return series
+
+
+def bucket_series(series: Iterable[Tuple[date, float]], bucket: str = "day") -> List[Dict[str, object]]:
+    """Regroupe une série journalière par jour, semaine (lundi) ou mois."""
+    totals: Dict[date, float] = {}
+    for d, revenue in series:
+        if bucket == "week":
+            key = d - timedelta(days=d.weekday())
+        elif bucket == "month":
+            key = d.replace(day=1)
+        else:
+            key = d
+        totals[key] = totals.get(key, 0.0) + float(revenue or 0)
+    return [{"date": k.isoformat(), "revenue": v} for k, v in sorted(totals.items())]
+
+
+def invalidate_days(db: Session, days: Iterable[date]) -> None:
+    """Marque les jours donnés à recalculer (ligne marqueur, voir l'en-tête du module)."""
+    # Aujourd'hui compris: une facture du jour validée après minuit ne doit pas
+    # laisser enregistrer la journée close sans elle
+    targets = sorted({d for d in days if d is not None and d <= date.today()})
+    if not targets or not _table_ready:
+        return
+    table = SalesDailyRollup.__table__
+    conn = db.connection()
+    stmt = _dialect_insert(conn, table)
+    if stmt is None:
+        conn.execute(table.delete().where(table.c.day.in_(targets)))
+        return
+    now = datetime.now()
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.day],
+            set_={"revenue": 0, "invoice_count": STALE, "computed_at": now},
+        ),
+        [{"day": d, "revenue": 0, "invoice_count": STALE, "computed_at": now} for d in targets],
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _invalidate_rollup_on_invoice_write(session: Session, flush_context, instances) -> None:
+    if not _table_ready:
+        return
+    touched: Set[date] = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Invoice):
+            continue
+        touched.add(_as_date(obj.date))
+        try:
+            hist = inspect(obj).attrs.date.history
+            for old in (hist.deleted or ()):
+                touched.add(_as_date(old))
+        except Exception:
+            pass
+    if touched:
+        try:
+            invalidate_days(session, touched)
+        except Exception as e:
+            # Sous PostgreSQL la transaction est déjà annulée: l'erreur doit remonter au flush
+            logging.error(f"Invalidation sales_daily_rollup échouée: {e}")
+            raise
@@ -0,0 +1,178 @@
+"""
+Scan par lot pour les inventaires: des milliers de codes résolus en quelques requêtes.
+
+Les codes sont normalisés (espaces retirés) puis recherchés par paquets sur
+les clés normalisées trim(products.barcode), trim(product_variants.barcode)
+et trim(product_variants.imei_serial) — toutes indexées — en une requête
+UNION ALL par paquet, suivie d'une requête de détail des produits trouvés
+(avec le stock précalculé du résumé de stock).
+
+Contrairement à GET /scan/{code}, il n'y a pas de recherche partielle (ILIKE):
+un code absent est rapporté comme inconnu.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import func, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from ..database import Product, ProductStockSummary, ProductVariant
+
+MAX_CODES = 20_000
+# 3 listes IN par paquet: 6000 paramètres, sous les limites SQLite et PostgreSQL
+_CHUNK = 2_000
+
+
+def normalize_code(value: Any) -> str:
+    return str(value if value is not None else "").strip()
+
+
+def _chunks(values: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _lookup(db: Session, codes: List[str]) -> Dict[str, tuple]:
+    """{code: (rang, code, product_id, variant_id, imei, code-barres variante, vendue, condition)}.
+
+    Rang 0 = code-barres produit, prioritaire sur une variante (comme le scan unitaire).
+    """
+    p = Product.__table__
+    v = ProductVariant.__table__
+    found: Dict[str, tuple] = {}
+    for chunk in _chunks(codes, _CHUNK):
+        product_code = func.trim(p.c.barcode)
+        variant_code = func.trim(v.c.barcode)
+        imei_code = func.trim(v.c.imei_serial)
+        stmt = union_all(
+            select(literal(0).label("match_rank"), product_code.label("code"), p.c.product_id,
+                   null().label("variant_id"), null().label("imei_serial"), null().label("variant_barcode"),
+                   null().label("is_sold"), null().label("condition"))
+            .where(product_code.in_(chunk)),
+            select(literal(1), variant_code, v.c.product_id, v.c.variant_id, v.c.imei_serial, v.c.barcode,
+                   v.c.is_sold, v.c.condition)
+            .where(variant_code.in_(chunk)),
+            select(literal(2), imei_code, v.c.product_id, v.c.variant_id, v.c.imei_serial, v.c.barcode,
+                   v.c.is_sold, v.c.condition)
+            .where(imei_code.in_(chunk)),
+        )
+        for row in db.execute(stmt):
+            current = found.get(row[1])
+            if current is None or row[0] < current[0]:
+                found[row[1]] = tuple(row)
+    return found
+
+
+def _load_products(db: Session, product_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    out: Dict[int, Dict[str, Any]] = {}
+    for chunk in _chunks(product_ids, _CHUNK):
+        rows = (
+            db.query(
+                Product.product_id, Product.name, Product.price, Product.category, Product.barcode,
+                Product.quantity, ProductStockSummary.available_variants,
+            )
+            .outerjoin(ProductStockSummary, ProductStockSummary.product_id == Product.product_id)
+            .filter(Product.product_id.in_(chunk))
+        )
+        for pid, name, price, category, barcode, quantity, available in rows:
+            out[pid] = {
+                "product_name": name,
+                "price": float(price or 0),
+                "category_name": category,
+                "barcode": barcode,
+                "has_variants": available is not None,
+                # Stock système: variantes disponibles, sinon quantité
+                "system_quantity": int(available if available is not None else (quantity or 0)),
+            }
+    return out
+
+
+def scan_codes(db: Session, raw_codes: List[Any], report: bool = False) -> Dict[str, Any]:
+    codes = [normalize_code(c) for c in raw_codes]
+    counts = Counter(c for c in codes if c)
+    unique = list(counts)
+    found = _lookup(db, unique)
+    products = _load_products(db, sorted({m[2] for m in found.values() if m[2] is not None}))
+
+    matched: List[Dict[str, Any]] = []
+    unknown: List[str] = []
+    for code in unique:
+        m = found.get(code)
+        info = products.get(m[2]) if m else None
+        if info is None:
+            unknown.append(code)
+            continue
+        rank, _code, product_id, variant_id, imei, variant_barcode, is_sold, condition = m
+        entry = {
+            "code": code,
+            "count": counts[code],
+            "type": "product" if rank == 0 else "variant",
+            "product_id": product_id,
+            "product_name": info["product_name"],
+            "price": info["price"],
+            "category_name": info["category_name"],
+        }
+        if rank == 0:
+            entry["stock_quantity"] = info["system_quantity"]
+            entry["barcode"] = info["barcode"]
+        else:
+            entry["stock_quantity"] = 0 if is_sold else 1
+            entry["variant"] = {
+                "variant_id": variant_id,
+                "imei_serial": imei,
+                "barcode": variant_barcode,
+                "condition": condition,
+                "is_sold": bool(is_sold),
+            }
+        matched.append(entry)
+
+    result: Dict[str, Any] = {
+        "total_codes": len(codes),
+        "empty_codes": len(codes) - sum(counts.values()),
+        "unique_codes": len(unique),
+        "matched_count": len(matched),
+        "unknown_count": len(unknown),
+        "matched": matched,
+        "unknown": unknown,
+        # Un même IMEI scanné deux fois est une erreur; un code-barres produit répété compte des unités
+        "duplicates": [
+            {"code": e["code"], "count": e["count"], "type": e["type"]} for e in matched if e["count"] > 1
+        ] + [{"code": c, "count": counts[c], "type": None} for c in unknown if counts[c] > 1],
+        "report": discrepancy_report(matched, products) if report else None,
+    }
+    return result
+
+
+def discrepancy_report(matched: List[Dict[str, Any]], products: Optional[Dict[int, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Écart comptage / système par produit scanné.
+
+    Compté = occurrences des codes-barres produit + variantes non vendues distinctes.
+    Une variante vendue scannée est signalée à part (sold_variants_scanned).
+    """
+    per_product: Dict[int, Dict[str, Any]] = {}
+    for e in matched:
+        row = per_product.setdefault(e["product_id"], {
+            "product_id": e["product_id"],
+            "product_name": e["product_name"],
+            "category_name": e["category_name"],
+            "counted": 0,
+            "sold_variants_scanned": 0,
+        })
+        if e["type"] == "product":
+            row["counted"] += e["count"]
+        elif e["variant"]["is_sold"]:
+            row["sold_variants_scanned"] += 1
+        else:
+            row["counted"] += 1
+    report = []
+    for pid, row in per_product.items():
+        system = (products or {}).get(pid, {}).get("system_quantity", 0)
+        diff = row["counted"] - system
+        row.update(system_quantity=system, difference=diff,
+                   status="ok" if diff == 0 else ("surplus" if diff > 0 else "manquant"))
+        report.append(row)
+    report.sort(key=lambda r: (-abs(r["difference"]), r["product_id"]))
+    return report
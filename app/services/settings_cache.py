@@ -0,0 +1,314 @@
+"""
+Cache processus des paramètres applicatifs (table user_settings).
+
+Les pages HTML et les impressions lisent les informations de l'entreprise à
+chaque rendu: jusqu'à trois requêtes et le décodage JSON de valeurs parfois
+volumineuses (logo en base64). Ici chaque valeur est chargée une fois puis
+servie depuis la mémoire:
+- company(): INVOICE_COMPANY, sinon appSettings.company, sinon table legacy;
+- app_settings(): dernier appSettings enregistré;
+- payment_methods(user_id): INVOICE_PAYMENT_METHODS (utilisateur puis global),
+  sinon appSettings.invoice.invoicePaymentMethods;
+- product_conditions(): états produits autorisés (product_conditions).
+
+Invalidation: toute écriture ORM sur user_settings (POST /api/user-settings/{key},
+méthodes de paiement, fond d'écran, favicon, états produits) vide le cache au
+commit. Les autres workers se recalent au plus tard après SETTINGS_CACHE_TTL.
+
+Le logo en data URL / base64 est décodé une fois et publié comme fichier
+statique nommé par son empreinte (static/uploads/logos/logo-<hash>.<ext>):
+les pages référencent une URL immuable au lieu d'embarquer l'image.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, event
+from sqlalchemy.orm import Session
+
+from ..database import UserSettings
+
+try:
+    # Modèle legacy (template-application) pour les infos société / logo
+    from ..models.models import Settings as LegacySettings  # type: ignore
+except Exception:
+    LegacySettings = None  # type: ignore
+
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "60"))
+LOGO_DIR = Path("static/uploads/logos")
+LOGO_URL_PREFIX = "/static/uploads/logos"
+
+COMPANY_KEY = "INVOICE_COMPANY"
+APP_SETTINGS_KEY = "appSettings"
+PAYMENT_METHODS_KEY = "INVOICE_PAYMENT_METHODS"
+DEFAULT_CONDITION_KEY = "product_conditions"
+DEFAULT_CONDITIONS = ["neuf", "occasion", "venant"]
+DEFAULT_PAYMENT_METHODS = ["Espèces", "Virement bancaire", "Mobile Money", "Chèque", "Carte bancaire"]
+
+_LOGO_EXTENSIONS = {
+    "image/png": "png", "image/jpeg": "jpg", "image/jpg": "jpg", "image/gif": "gif",
+    "image/webp": "webp", "image/svg+xml": "svg", "image/x-icon": "ico",
+}
+_PENDING_KEY = "_settings_cache_dirty"
+
+
+def _loads(raw: Optional[str]) -> Any:
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
+
+
+def normalize_logo(logo_value: Optional[str]) -> Optional[str]:
+    """URL, data URI ou base64 brut (enveloppé en PNG par défaut)"""
+    try:
+        if not logo_value:
+            return None
+        s = str(logo_value).strip()
+        if not s:
+            return None
+        # Déjà une URL ou un data URI
+        if s.startswith("data:image") or s.startswith("http://") or s.startswith("https://") or s.startswith("/"):
+            return s
+        # Heuristique: base64 sans en-tête → PNG par défaut
+        if len(s) > 64:
+            return f"data:image/png;base64,{s}"
+        return s
+    except Exception:
+        return logo_value
+
+
+def publish_logo(logo_value: Optional[str]) -> Optional[str]:
+    """Publie un logo data URI / base64 comme fichier statique nommé par son empreinte.
+
+    Les URL sont renvoyées telles quelles; en cas d'échec (disque en lecture
+    seule, base64 invalide), le data URI normalisé est conservé.
+    """
+    value = normalize_logo(logo_value)
+    if not value or not value.startswith("data:image"):
+        return value
+    try:
+        header, _, payload = value.partition(",")
+        if ";base64" not in header:
+            return value
+        mime = header[5:].split(";", 1)[0].lower()
+        data = base64.b64decode(payload, validate=False)
+        if not data:
+            return value
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        name = f"logo-{digest}.{_LOGO_EXTENSIONS.get(mime, 'png')}"
+        target = LOGO_DIR / name
+        if not target.exists():
+            LOGO_DIR.mkdir(parents=True, exist_ok=True)
+            # Écriture atomique: plusieurs workers peuvent publier le même logo
+            tmp = LOGO_DIR / f".{name}.{os.getpid()}.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, target)
+        return f"{LOGO_URL_PREFIX}/{name}"
+    except (binascii.Error, ValueError, OSError) as e:
+        logging.warning(f"Publication du logo impossible, data URL conservée: {e}")
+        return value
+
+
+class SettingsCache:
+    """Valeurs décodées de user_settings, partagées par le processus"""
+
+    def __init__(self, ttl: float = SETTINGS_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Any, tuple] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: Any, loader: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl <= 0 or now - entry[0] < self.ttl):
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            self.misses += 1
+        value = loader()
+        with self._lock:
+            self._entries[key] = (now, value)
+        # Copie: les appelants peuvent enrichir le résultat sans altérer le cache
+        return copy.deepcopy(value)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl_s": self.ttl}
+
+    # ---- Accesseurs ----
+
+    def app_settings(self, db: Session) -> Dict[str, Any]:
+        """Dernier appSettings enregistré (tous utilisateurs)"""
+        return self._get(APP_SETTINGS_KEY, lambda: self._load_app_settings(db))
+
+    def company(self, db: Session) -> Dict[str, Any]:
+        """Informations société pour les pages et impressions (logo publié en fichier statique)"""
+        return self._get(COMPANY_KEY, lambda: self._load_company(db))
+
+    def payment_methods(self, db: Session, user_id: Optional[int]) -> List[str]:
+        return self._get((PAYMENT_METHODS_KEY, user_id), lambda: self._load_payment_methods(db, user_id))
+
+    def product_conditions(self, db: Session) -> Dict[str, Any]:
+        """{options: [...], default: str}"""
+        return self._get(DEFAULT_CONDITION_KEY, lambda: self._load_product_conditions(db))
+
+    # ---- Chargement ----
+
+    @staticmethod
+    def _load_app_settings(db: Session) -> Dict[str, Any]:
+        try:
+            record = (
+                db.query(UserSettings)
+                .filter(UserSettings.setting_key == APP_SETTINGS_KEY)
+                .order_by(UserSettings.updated_at.desc())
+                .first()
+            )
+            data = _loads(record.setting_value) if record else None
+            return data if isinstance(data, dict) else {}
+        except Exception:
+            return {}
+
+    def _load_company(self, db: Session) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+
+        try:
+            s = db.query(UserSettings).filter(UserSettings.setting_key == COMPANY_KEY).order_by(UserSettings.updated_at.desc()).first()
+            data = _loads(s.setting_value) if s else None
+            if isinstance(data, dict):
+                result = data
+        except Exception:
+            pass
+
+        app_data = self.app_settings(db)
+        # Repli: appSettings.company
+        if not result:
+            comp = app_data.get("company") or {}
+            if comp:
+                result = {
+                    "name": comp.get("companyName") or comp.get("name"),
+                    "address": comp.get("companyAddress") or comp.get("address"),
+                    "email": comp.get("companyEmail") or comp.get("email"),
+                    "phone": comp.get("companyPhone") or comp.get("phone"),
+                    "website": comp.get("companyWebsite") or comp.get("website"),
+                    "logo": comp.get("logo"),  # DataURL support
+                }
+
+        favicon_url = (app_data.get("general") or {}).get("faviconUrl")
+        if favicon_url:
+            result["favicon"] = favicon_url
+
+        # Repli: table Settings legacy (seulement si rien d'autre)
+        if not result:
+            try:
+                if LegacySettings is not None:
+                    legacy = db.query(LegacySettings).first()
+                    if legacy:
+                        result = {
+                            "name": getattr(legacy, "company_name", None),
+                            "address": getattr(legacy, "address", None),
+                            "city": getattr(legacy, "city", None),
+                            "email": getattr(legacy, "email", None),
+                            "phone": getattr(legacy, "phone", None),
+                            "phone2": getattr(legacy, "phone2", None),
+                            "whatsapp": getattr(legacy, "whatsapp", None),
+                            "instagram": getattr(legacy, "instagram", None),
+                            "website": getattr(legacy, "website", None),
+                            "logo": getattr(legacy, "logo_path", None),
+                            "logo_path": getattr(legacy, "logo_path", None),
+                            "footer_text": getattr(legacy, "footer_text", None),
+                        }
+            except Exception:
+                pass
+
+        logo = result.get("logo") or result.get("logo_path")
+        if logo:
+            result["logo"] = publish_logo(logo)
+        return result
+
+    def _load_payment_methods(self, db: Session, user_id: Optional[int]) -> List[str]:
+        methods: List[str] = []
+        try:
+            # Clef dédiée: utilisateur puis global (user_id NULL)
+            setting = None
+            if user_id is not None:
+                setting = db.query(UserSettings).filter(
+                    and_(UserSettings.setting_key == PAYMENT_METHODS_KEY, UserSettings.user_id == user_id)
+                ).first()
+            if setting is None:
+                setting = db.query(UserSettings).filter(
+                    and_(UserSettings.setting_key == PAYMENT_METHODS_KEY, UserSettings.user_id.is_(None))
+                ).first()
+            data = _loads(setting.setting_value) if setting else None
+            if isinstance(data, list):
+                methods = [str(x).strip() for x in data if str(x).strip()]
+
+            # Ancien stockage: appSettings de l'utilisateur
+            if not methods and user_id is not None:
+                legacy = (
+                    db.query(UserSettings)
+                    .filter(and_(UserSettings.setting_key == APP_SETTINGS_KEY, UserSettings.user_id == user_id))
+                    .order_by(UserSettings.updated_at.desc())
+                    .first()
+                )
+                data = _loads(legacy.setting_value) if legacy else None
+                raw = (data or {}).get("invoice", {}).get("invoicePaymentMethods") if isinstance(data, dict) else None
+                if isinstance(raw, list):
+                    methods = [str(x).strip() for x in raw if str(x).strip()]
+                elif isinstance(raw, str):
+                    methods = [s.strip() for s in raw.splitlines() if s.strip()]
+        except Exception as e:
+            logging.warning(f"Lecture des méthodes de paiement impossible: {e}")
+        return methods or list(DEFAULT_PAYMENT_METHODS)
+
+    @staticmethod
+    def _load_product_conditions(db: Session) -> Dict[str, Any]:
+        setting = db.query(UserSettings).filter(
+            UserSettings.user_id.is_(None), UserSettings.setting_key == DEFAULT_CONDITION_KEY
+        ).first()
+        data = _loads(setting.setting_value) if setting else None
+        if isinstance(data, dict):
+            options = data.get("options") or DEFAULT_CONDITIONS
+            return {"options": options, "default": data.get("default") or options[0]}
+        return {"options": list(DEFAULT_CONDITIONS), "default": DEFAULT_CONDITIONS[0]}
+
+
+settings_cache = SettingsCache()
+
+
+@event.listens_for(Session, "before_flush")
+def _mark_settings_dirty(session: Session, flush_context, instances) -> None:
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, UserSettings):
+            session.info[_PENDING_KEY] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_settings(session: Session) -> None:
+    if session.info.pop(_PENDING_KEY, False):
+        settings_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_settings_changes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
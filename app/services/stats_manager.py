@@ -6,6 +6,7 @@ from sqlalchemy import func
 from datetime import date
 
 from ..database import AppCache, Invoice, SupplierInvoice, Quotation
+from ..date_ranges import in_month
 
 
 def _get_cache(db: Session, key: str) -> Optional[Dict[str, Any]]:
@@ -53,14 +54,12 @@ def recompute_invoices_stats(db: Session) -> Dict[str, Any]:
 
     # Revenus
     monthly_revenue_gross = db.query(func.coalesce(func.sum(Invoice.total), 0)).filter(
-        func.extract('month', Invoice.date) == today.month,
-        func.extract('year', Invoice.date) == today.year,
+        in_month(Invoice.date, today),
         Invoice.status.in_(["payée", "PAID"])  # payées uniquement
     ).scalar() or 0
 
     monthly_supplier_payments = db.query(func.coalesce(func.sum(SupplierInvoice.paid_amount), 0)).filter(
-        func.extract('month', SupplierInvoice.invoice_date) == today.month,
-        func.extract('year', SupplierInvoice.invoice_date) == today.year
+        in_month(SupplierInvoice.invoice_date, today)
     ).scalar() or 0
 
     monthly_revenue = float(monthly_revenue_gross) - float(monthly_supplier_payments)
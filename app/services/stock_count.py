@@ -0,0 +1,342 @@
+"""
+Inventaires (comptage physique): sessions, lots de scans et réconciliation.
+
+- Ouverture: les quantités attendues du périmètre (tous les produits ou une
+  catégorie) sont figées en un INSERT ... SELECT depuis products et le résumé
+  de stock (variantes disponibles, sinon quantité).
+- Scans: les clients (éventuellement hors ligne) envoient des lots de codes
+  identifiés par un chunk_id. Un lot déjà reçu est ignoré: le renvoi est sans
+  effet et GET /chunks permet de reprendre un envoi interrompu.
+- Réconciliation: chaque processus garde en mémoire un décompte par session
+  (unités par produit, variantes déjà vues, codes inconnus). Les lots sont
+  résolus par scan_batch (requêtes ensemblistes) et appliqués au fil de l'eau;
+  avant chaque lecture, les lots reçus par d'autres processus sont rattrapés
+  (le décompte se reconstruit aussi après un redémarrage).
+- Clôture: les écarts des produits sans variantes deviennent des mouvements
+  d'ajustement (IN/OUT, reference_type INVENTORY) écrits avec les quantités
+  et le statut de la session dans une seule transaction. L'écart est calculé
+  par rapport à l'attendu figé et appliqué à la quantité courante, de sorte
+  que les ventes faites pendant le comptage restent comptabilisées. Les
+  produits à variantes sont rapportés (IMEI manquants / vendus scannés) mais
+  non ajustés: leur stock découle des variantes elles-mêmes.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import bindparam, func, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..database import (
+    Product,
+    ProductStockSummary,
+    StockCountChunk,
+    StockCountExpected,
+    StockCountSession,
+    StockMovement,
+    engine,
+)
+from . import product_stats, resource_versions, row_counters
+from .scan_batch import _lookup, normalize_code
+from .stock_summary import ensure_stock_summary_table
+
+REFERENCE_TYPE = "INVENTORY"
+MAX_CHUNK_CODES = 5_000
+_tables_ready = False
+
+
+class SessionNotOpen(Exception):
+    """Inventaire déjà clôturé ou annulé (par exemple par une clôture concurrente)"""
+
+
+def ensure_stock_count_tables(bind=None) -> bool:
+    """Crée les tables des inventaires si nécessaire (une fois par processus)."""
+    global _tables_ready
+    if _tables_ready:
+        return True
+    try:
+        with (bind or engine).begin() as conn:
+            for model in (StockCountSession, StockCountExpected, StockCountChunk):
+                model.__table__.create(bind=conn, checkfirst=True)
+        _tables_ready = True
+    except Exception as e:
+        logging.warning(f"Tables des inventaires indisponibles: {e}")
+    return _tables_ready
+
+
+class _Tally:
+    """Décompte d'une session (un par processus)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.applied_chunks: Set[str] = set()
+        self.counted: Counter = Counter()          # product_id -> unités comptées
+        self.sold_scanned: Counter = Counter()     # product_id -> variantes vendues scannées
+        self.variants_seen: Set[int] = set()
+        self.unknown: Counter = Counter()
+        self.duplicate_variant_scans = 0
+        self.codes = 0
+
+    def apply(self, chunk_id: str, codes: List[str], found: Dict[str, tuple]) -> None:
+        if chunk_id in self.applied_chunks:
+            return
+        self.applied_chunks.add(chunk_id)
+        for code in codes:
+            if not code:
+                continue
+            self.codes += 1
+            m = found.get(code)
+            if m is None:
+                self.unknown[code] += 1
+                continue
+            rank, _code, product_id, variant_id, _imei, _vbarcode, is_sold, _cond = m
+            if rank == 0:
+                # Code-barres produit: chaque scan est une unité
+                self.counted[product_id] += 1
+            elif variant_id in self.variants_seen:
+                self.duplicate_variant_scans += 1
+            else:
+                self.variants_seen.add(variant_id)
+                if is_sold:
+                    self.sold_scanned[product_id] += 1
+                else:
+                    self.counted[product_id] += 1
+
+
+class StockCountManager:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tallies: Dict[int, _Tally] = {}
+
+    def _tally(self, session_id: int) -> _Tally:
+        with self._lock:
+            tally = self._tallies.get(session_id)
+            if tally is None:
+                tally = self._tallies[session_id] = _Tally()
+            return tally
+
+    def forget(self, session_id: int) -> None:
+        with self._lock:
+            self._tallies.pop(session_id, None)
+
+    def sync(self, db: Session, session_id: int) -> _Tally:
+        """Applique les lots présents en base mais pas encore dans le décompte de ce processus."""
+        tally = self._tally(session_id)
+        with tally.lock:
+            received = [cid for (cid,) in db.query(StockCountChunk.chunk_id).filter(StockCountChunk.session_id == session_id)]
+            missing = [cid for cid in received if cid not in tally.applied_chunks]
+            for i in range(0, len(missing), 200):
+                rows = (
+                    db.query(StockCountChunk.chunk_id, StockCountChunk.codes)
+                    .filter(StockCountChunk.session_id == session_id, StockCountChunk.chunk_id.in_(missing[i:i + 200]))
+                    .order_by(StockCountChunk.received_at)
+                    .all()
+                )
+                decoded = [(cid, [normalize_code(c) for c in json.loads(codes or "[]")]) for cid, codes in rows]
+                found = _lookup(db, list({c for _cid, codes in decoded for c in codes if c}))
+                for cid, codes in decoded:
+                    tally.apply(cid, codes, found)
+        return tally
+
+
+stock_count_manager = StockCountManager()
+
+
+# ===================== Sessions =====================
+
+def open_session(db: Session, name: str, category: Optional[str], notes: Optional[str], user_id: Optional[int]) -> StockCountSession:
+    ensure_stock_summary_table()
+    ensure_stock_count_tables()
+    session = StockCountSession(name=name, category=category or None, notes=notes, status="open", created_by=user_id)
+    db.add(session)
+    db.flush()
+    p = Product.__table__
+    s = ProductStockSummary.__table__
+    snapshot = (
+        select(
+            literal(session.session_id),
+            p.c.product_id,
+            func.coalesce(s.c.available_variants, p.c.quantity, 0),
+            s.c.product_id.isnot(None),
+        )
+        .select_from(p.outerjoin(s, s.c.product_id == p.c.product_id))
+    )
+    if category:
+        snapshot = snapshot.where(p.c.category == category)
+    e = StockCountExpected.__table__
+    db.execute(e.insert().from_select(["session_id", "product_id", "expected_quantity", "has_variants"], snapshot))
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def upload_chunk(db: Session, session: StockCountSession, chunk_id: str, codes: List[str],
+                 device_id: Optional[str], user_id: Optional[int]) -> Dict[str, Any]:
+    """Enregistre un lot (ignoré s'il est déjà reçu) et l'applique au décompte."""
+    duplicate = db.get(StockCountChunk, (session.session_id, chunk_id)) is not None
+    if not duplicate:
+        db.add(StockCountChunk(session_id=session.session_id, chunk_id=chunk_id, device_id=device_id,
+                               codes=json.dumps(codes, ensure_ascii=False), code_count=len(codes), user_id=user_id))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Reçu en parallèle (autre requête / autre processus)
+            db.rollback()
+            duplicate = True
+    tally = stock_count_manager.sync(db, session.session_id)
+    return {"chunk_id": chunk_id, "duplicate": duplicate, "accepted": 0 if duplicate else len(codes),
+            **progress(tally)}
+
+
+def progress(tally: _Tally) -> Dict[str, Any]:
+    return {
+        "chunks": len(tally.applied_chunks),
+        "codes": tally.codes,
+        "products_counted": len(tally.counted),
+        "variants_seen": len(tally.variants_seen),
+        "unknown_codes": len(tally.unknown),
+        "duplicate_variant_scans": tally.duplicate_variant_scans,
+    }
+
+
+def reconcile(db: Session, session: StockCountSession, only_differences: bool = False) -> Dict[str, Any]:
+    """Attendu (figé) vs compté, par produit du périmètre ou scanné."""
+    tally = stock_count_manager.sync(db, session.session_id)
+    expected = {
+        pid: (int(qty or 0), bool(has_variants))
+        for pid, qty, has_variants in db.query(
+            StockCountExpected.product_id, StockCountExpected.expected_quantity, StockCountExpected.has_variants
+        ).filter(StockCountExpected.session_id == session.session_id)
+    }
+    with tally.lock:
+        counted = dict(tally.counted)
+        sold_scanned = dict(tally.sold_scanned)
+        unknown = dict(tally.unknown)
+    product_ids = sorted(set(expected) | set(counted) | set(sold_scanned))
+    names: Dict[int, tuple] = {}
+    for i in range(0, len(product_ids), 2_000):
+        for pid, name, category in db.query(Product.product_id, Product.name, Product.category).filter(
+            Product.product_id.in_(product_ids[i:i + 2_000])
+        ):
+            names[pid] = (name, category)
+
+    rows = []
+    totals = Counter()
+    for pid in product_ids:
+        in_scope = pid in expected
+        exp, has_variants = expected.get(pid, (0, False))
+        got = counted.get(pid, 0)
+        diff = got - exp
+        if not in_scope:
+            status = "hors_perimetre"
+        else:
+            status = "ok" if diff == 0 else ("surplus" if diff > 0 else "manquant")
+        totals[status] += 1
+        if only_differences and status == "ok":
+            continue
+        name, category = names.get(pid, (None, None))
+        rows.append({
+            "product_id": pid,
+            "product_name": name,
+            "category_name": category,
+            "has_variants": has_variants,
+            "expected_quantity": exp if in_scope else None,
+            "counted": got,
+            "difference": diff if in_scope else None,
+            "sold_variants_scanned": sold_scanned.get(pid, 0),
+            "status": status,
+            "adjustable": in_scope and not has_variants and diff != 0,
+        })
+    rows.sort(key=lambda r: (-(abs(r["difference"] or 0)), r["product_id"]))
+    return {
+        "session_id": session.session_id,
+        "status": session.status,
+        "progress": progress(tally),
+        "summary": {
+            "products": len(product_ids),
+            "ok": totals["ok"],
+            "surplus": totals["surplus"],
+            "manquant": totals["manquant"],
+            "hors_perimetre": totals["hors_perimetre"],
+        },
+        "unknown_codes": sorted(unknown, key=lambda c: -unknown[c])[:500],
+        "rows": rows,
+    }
+
+
+def close_session(db: Session, session: StockCountSession, apply_adjustments: bool = True) -> Dict[str, Any]:
+    """Clôture: mouvements d'ajustement, quantités et statut dans une même transaction.
+
+    Le passage open -> closed est pris en premier par un UPDATE conditionnel: une
+    clôture concurrente ne le trouve plus ouvert et lève SessionNotOpen, les
+    ajustements ne sont donc appliqués qu'une fois.
+    """
+    now = datetime.now()
+    conn = db.connection()
+    t = StockCountSession.__table__
+    claimed = conn.execute(
+        update(t)
+        .where(t.c.session_id == session.session_id, t.c.status == "open")
+        .values(status="closed", closed_at=now)
+    ).rowcount
+    if claimed != 1:
+        db.rollback()
+        raise SessionNotOpen(f"Inventaire {session.session_id} déjà clôturé ou annulé")
+    result = reconcile(db, session, only_differences=True)
+    adjustments = [r for r in result["rows"] if r["adjustable"]] if apply_adjustments else []
+    written = 0
+    if adjustments:
+        p = Product.__table__
+        ids = [r["product_id"] for r in adjustments]
+        before = product_stats.aggregate_by_category(conn, ids)
+        current = {pid: int(q or 0) for pid, q in conn.execute(select(p.c.product_id, p.c.quantity).where(p.c.product_id.in_(ids)))}
+        updates, movements = [], []
+        for r in adjustments:
+            old = current.get(r["product_id"])
+            if old is None:
+                continue
+            new = max(0, old + r["difference"])
+            delta = new - old
+            if delta == 0:
+                continue
+            updates.append({"b_pid": r["product_id"], "b_qty": new})
+            movements.append({
+                "product_id": r["product_id"],
+                "quantity": abs(delta),
+                "movement_type": "IN" if delta > 0 else "OUT",
+                "reference_type": REFERENCE_TYPE,
+                "reference_id": session.session_id,
+                "notes": f"Inventaire « {session.name} »: attendu {r['expected_quantity']}, compté {r['counted']}",
+                "unit_price": 0,
+                "created_at": now,
+            })
+        if updates:
+            conn.execute(update(p).where(p.c.product_id == bindparam("b_pid")).values(quantity=bindparam("b_qty")), updates)
+            conn.execute(StockMovement.__table__.insert(), movements)
+            row_counters.bump(conn, "stock_movements", len(movements))
+            resource_versions.bump(conn, "products", "stock_movements")
+            product_stats.apply_stats_delta(conn, before, ids)
+        written = len(movements)
+    session.status = "closed"
+    session.closed_at = now
+    session.adjustments_count = written
+    db.commit()
+    stock_count_manager.forget(session.session_id)
+    print(f"📋 Inventaire {session.session_id} clôturé: {written} ajustements")
+    result["status"] = "closed"
+    result["adjustments"] = written
+    return result
+
+
+def cancel_session(db: Session, session: StockCountSession) -> None:
+    session.status = "cancelled"
+    session.closed_at = datetime.now()
+    db.commit()
+    stock_count_manager.forget(session.session_id)
@@ -0,0 +1,374 @@
+"""
+Journal de stock: les mouvements (IN/OUT) sont la source de vérité des quantités.
+
+- Solde d'un produit = solde du point de contrôle + somme signée des
+  mouvements postérieurs (movement_id > last_movement_id). Le calcul est une
+  seule requête groupée (products ⟕ points de contrôle ⟕ queue agrégée),
+  servie par l'index (product_id, movement_id): seule la queue est parcourue.
+- advance_checkpoints() fige périodiquement le solde de chaque produit
+  jusqu'à un horizon sûr (upsert par paquets). Sous PostgreSQL, un
+  mouvement d'id plus petit peut être validé après un id plus grand
+  (séquence attribuée à l'INSERT, visibilité au COMMIT): l'horizon est le
+  dernier mouvement créé il y a plus de LEDGER_CHECKPOINT_LAG_SECONDS.
+  SQLite sérialise les écritures: le dernier mouvement validé suffit.
+- Les mouvements archivés (retirés de la table, voir archival) sont cumulés
+  par produit dans stock_ledger_archive_balances: base du solde en l'absence
+  de point de contrôle, ajoutée au point de contrôle lorsqu'ils étaient
+  encore dans la queue.
+- Un point de contrôle devient faux si un mouvement déjà couvert est supprimé
+  ou modifié: les suppressions/modifications ORM l'invalident (listener) et
+  le nettoyage des mouvements appelle invalidate_checkpoints().
+- detect_drift() compare products.quantity au journal en simple lecture
+  (aucun verrou, instantané REPEATABLE READ en lecture seule sous
+  PostgreSQL); LedgerDriftMonitor l'exécute en arrière-plan si activé.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import bindparam, case, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from ..database import Product, StockLedgerArchiveBalance, StockLedgerCheckpoint, StockMovement, background_engine, engine
+from . import product_stats, resource_versions
+
+_CHUNK = 500
+LEDGER_CHECKPOINT_LAG_SECONDS = int(os.getenv("LEDGER_CHECKPOINT_LAG_SECONDS", "300"))
+_PENDING_KEY = "_stock_ledger_invalidate"
+_table_ready = False
+
+
+def ensure_ledger_table(bind=None) -> bool:
+    """Crée les tables du journal (points de contrôle, base archivée) si nécessaire."""
+    global _table_ready
+    if _table_ready:
+        return True
+    try:
+        StockLedgerCheckpoint.__table__.create(bind=bind or engine, checkfirst=True)
+        StockLedgerArchiveBalance.__table__.create(bind=bind or engine, checkfirst=True)
+        _table_ready = True
+    except Exception as e:
+        logging.warning(f"Tables du journal de stock indisponibles: {e}")
+    return _table_ready
+
+
+def _signed_quantity():
+    m = StockMovement.__table__
+    return case(
+        (m.c.movement_type == "IN", m.c.quantity),
+        (m.c.movement_type == "OUT", -m.c.quantity),
+        else_=0,
+    )
+
+
+def _chunks(values: Optional[List[int]]):
+    if values is None:
+        yield None
+        return
+    for i in range(0, len(values), _CHUNK):
+        yield values[i:i + _CHUNK]
+
+
+def ledger_balances(conn, product_ids: Optional[List[int]] = None, upto_movement_id: Optional[int] = None) -> Dict[int, Dict[str, int]]:
+    """{product_id: {quantity, ledger, checkpoint_id}} en une requête groupée (par paquet d'ids)."""
+    p = Product.__table__
+    m = StockMovement.__table__
+    c = StockLedgerCheckpoint.__table__
+    a = StockLedgerArchiveBalance.__table__
+    tail_filter = [m.c.movement_id > func.coalesce(c.c.last_movement_id, 0)]
+    if upto_movement_id is not None:
+        tail_filter.append(m.c.movement_id <= upto_movement_id)
+    tail = (
+        select(m.c.product_id, func.sum(_signed_quantity()).label("delta"))
+        .select_from(m.outerjoin(c, c.c.product_id == m.c.product_id))
+        .where(*tail_filter)
+        .group_by(m.c.product_id)
+    )
+    out: Dict[int, Dict[str, int]] = {}
+    for chunk in _chunks(product_ids):
+        t = (tail if chunk is None else tail.where(m.c.product_id.in_(chunk))).subquery()
+        stmt = (
+            select(p.c.product_id, p.c.quantity, c.c.last_movement_id,
+                   func.coalesce(c.c.balance, a.c.balance, 0) + func.coalesce(t.c.delta, 0))
+            .select_from(
+                p.outerjoin(c, c.c.product_id == p.c.product_id)
+                .outerjoin(a, a.c.product_id == p.c.product_id)
+                .outerjoin(t, t.c.product_id == p.c.product_id)
+            )
+        )
+        if chunk is not None:
+            stmt = stmt.where(p.c.product_id.in_(chunk))
+        for pid, quantity, checkpoint_id, ledger in conn.execute(stmt):
+            out[pid] = {"quantity": int(quantity or 0), "ledger": int(ledger or 0), "checkpoint_id": checkpoint_id}
+    return out
+
+
+def _upsert_checkpoints(conn, rows: List[Dict[str, Any]]) -> None:
+    table = StockLedgerCheckpoint.__table__
+    name = conn.dialect.name
+    if name in ("postgresql", "sqlite"):
+        if name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.product_id],
+            set_={"last_movement_id": stmt.excluded.last_movement_id, "balance": stmt.excluded.balance,
+                  "updated_at": stmt.excluded.updated_at},
+        ), rows)
+        return
+    conn.execute(table.delete().where(table.c.product_id.in_([r["product_id"] for r in rows])))
+    conn.execute(table.insert(), rows)
+
+
+def _checkpoint_horizon(conn) -> Optional[int]:
+    """Plus grand movement_id qu'aucune transaction en cours ne peut encore précéder."""
+    m = StockMovement.__table__
+    if conn.dialect.name == "sqlite":
+        return conn.execute(select(func.max(m.c.movement_id))).scalar()
+    # Horloge de la base (created_at vaut now() à l'insertion); parcours de l'index
+    # primaire à rebours jusqu'au premier mouvement assez ancien
+    now = conn.execute(select(func.now())).scalar()
+    if getattr(now, "tzinfo", None) is not None:
+        now = now.replace(tzinfo=None)
+    cutoff = now - timedelta(seconds=LEDGER_CHECKPOINT_LAG_SECONDS)
+    return conn.execute(
+        select(m.c.movement_id).where(m.c.created_at <= cutoff).order_by(m.c.movement_id.desc()).limit(1)
+    ).scalar()
+
+
+def advance_checkpoints(bind=None, product_ids: Optional[List[int]] = None) -> Dict[str, int]:
+    """Fige le solde de chaque produit jusqu'à l'horizon sûr (voir _checkpoint_horizon)."""
+    ensure_ledger_table()
+    bind = bind or engine
+    with bind.begin() as conn:
+        upto = _checkpoint_horizon(conn)
+        if upto is None:
+            return {"checkpoints": 0, "upto_movement_id": 0}
+        balances = ledger_balances(conn, product_ids, upto_movement_id=upto)
+        now = datetime.now()
+        rows = [
+            {"product_id": pid, "last_movement_id": upto, "balance": b["ledger"], "updated_at": now}
+            for pid, b in balances.items()
+            if b["checkpoint_id"] is None or b["checkpoint_id"] < upto
+        ]
+        for i in range(0, len(rows), _CHUNK):
+            _upsert_checkpoints(conn, rows[i:i + _CHUNK])
+    return {"checkpoints": len(rows), "upto_movement_id": int(upto)}
+
+
+def invalidate_checkpoints(conn, product_ids: Optional[Iterable[int]] = None) -> None:
+    """Supprime les points de contrôle (tous si product_ids est None): le prochain calcul repart de zéro."""
+    if not _table_ready:
+        return
+    table = StockLedgerCheckpoint.__table__
+    if product_ids is None:
+        conn.execute(table.delete())
+        return
+    ids = sorted({int(pid) for pid in product_ids if pid is not None})
+    for chunk in _chunks(ids):
+        conn.execute(table.delete().where(table.c.product_id.in_(chunk)))
+
+
+def fold_archived_movements(conn, condition) -> Dict[str, int]:
+    """Avant de retirer de stock_movements les lignes vérifiant `condition`: reporte
+    leur somme signée dans la base archivée (et dans le point de contrôle pour la
+    part postérieure à celui-ci), de sorte que le solde du journal est inchangé."""
+    ensure_ledger_table()
+    m = StockMovement.__table__
+    c = StockLedgerCheckpoint.__table__
+    a = StockLedgerArchiveBalance.__table__
+    signed = _signed_quantity()
+    stmt = (
+        select(
+            m.c.product_id,
+            func.count(),
+            func.sum(signed),
+            func.sum(case((m.c.movement_id > func.coalesce(c.c.last_movement_id, 0), signed), else_=0)),
+            c.c.product_id.isnot(None),
+        )
+        .select_from(m.outerjoin(c, c.c.product_id == m.c.product_id))
+        .where(condition, m.c.product_id.isnot(None))
+        .group_by(m.c.product_id, c.c.product_id)
+    )
+    rows = conn.execute(stmt).all()
+    if not rows:
+        return {"products": 0, "movements": 0}
+    existing = set()
+    ids = [r[0] for r in rows]
+    for chunk in _chunks(ids):
+        existing.update(pid for (pid,) in conn.execute(select(a.c.product_id).where(a.c.product_id.in_(chunk))))
+    now = datetime.now()
+    updates, inserts, checkpoint_updates = [], [], []
+    for pid, count, total, tail, has_checkpoint in rows:
+        row = {"b_pid": pid, "b_balance": int(total or 0), "b_count": int(count or 0)}
+        (updates if pid in existing else inserts).append(row)
+        if has_checkpoint and tail:
+            checkpoint_updates.append({"b_pid": pid, "b_delta": int(tail)})
+    if updates:
+        conn.execute(
+            update(a).where(a.c.product_id == bindparam("b_pid")).values(
+                balance=a.c.balance + bindparam("b_balance"),
+                archived_movements=a.c.archived_movements + bindparam("b_count"),
+                updated_at=now,
+            ),
+            updates,
+        )
+    if inserts:
+        conn.execute(a.insert(), [
+            {"product_id": r["b_pid"], "balance": r["b_balance"], "archived_movements": r["b_count"], "updated_at": now}
+            for r in inserts
+        ])
+    if checkpoint_updates:
+        # Mouvements encore dans la queue: leur somme passe dans le point de contrôle
+        conn.execute(
+            update(c).where(c.c.product_id == bindparam("b_pid")).values(balance=c.c.balance + bindparam("b_delta")),
+            checkpoint_updates,
+        )
+    return {"products": len(rows), "movements": sum(int(r[1] or 0) for r in rows)}
+
+
+def recompute_quantities(db: Session, product_id: Optional[int] = None) -> Dict[str, int]:
+    """Aligne products.quantity sur le journal (une requête de lecture + une écriture groupée)."""
+    ensure_ledger_table()
+    conn = db.connection()
+    balances = ledger_balances(conn, [product_id] if product_id is not None else None)
+    changed = [{"b_pid": pid, "b_qty": b["ledger"]} for pid, b in balances.items() if b["ledger"] != b["quantity"]]
+    if changed:
+        ids = [r["b_pid"] for r in changed]
+        before = product_stats.aggregate_by_category(conn, ids)
+        p = Product.__table__
+        for i in range(0, len(changed), _CHUNK):
+            conn.execute(update(p).where(p.c.product_id == bindparam("b_pid")).values(quantity=bindparam("b_qty")),
+                         changed[i:i + _CHUNK])
+        product_stats.apply_stats_delta(conn, before, ids)
+        resource_versions.bump(conn, "products")
+    db.commit()
+    return {"updated_products": len(changed), "scanned_products": len(balances)}
+
+
+def detect_drift(bind=None, product_ids: Optional[List[int]] = None, limit: int = 200) -> Dict[str, Any]:
+    """Écarts products.quantity / journal, en lecture seule et sans verrou."""
+    ensure_ledger_table()
+    bind = bind or engine
+    started = datetime.now()
+    with bind.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # Instantané cohérent sans bloquer les écritures
+            conn = conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+        balances = ledger_balances(conn, product_ids)
+        drifted = [
+            {"product_id": pid, "quantity": b["quantity"], "ledger": b["ledger"], "drift": b["quantity"] - b["ledger"]}
+            for pid, b in balances.items()
+            if b["quantity"] != b["ledger"]
+        ]
+        drifted.sort(key=lambda r: (-abs(r["drift"]), r["product_id"]))
+        shown = drifted[:limit]
+        names = {}
+        if shown:
+            p = Product.__table__
+            names = dict(conn.execute(select(p.c.product_id, p.c.name).where(p.c.product_id.in_([r["product_id"] for r in shown]))).all())
+        conn.rollback()
+    for r in shown:
+        r["product_name"] = names.get(r["product_id"])
+    return {
+        "checked_at": started,
+        "duration_ms": round((datetime.now() - started).total_seconds() * 1000, 1),
+        "products": len(balances),
+        "drifted": len(drifted),
+        "items": shown,
+    }
+
+
+# ===================== Tâche de fond =====================
+
+class LedgerDriftMonitor:
+    """Avance les points de contrôle puis mesure la dérive à intervalle régulier."""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._interval_seconds = int(os.getenv("LEDGER_DRIFT_INTERVAL_SECONDS", "3600"))
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def start_background(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="LedgerDriftMonitor", daemon=True)
+        self._thread.start()
+
+    def stop_background(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[LedgerDriftMonitor] Error in tick: {e}")
+            self._stop.wait(self._interval_seconds)
+
+    def run_once(self) -> Dict[str, Any]:
+        advanced = advance_checkpoints(background_engine)
+        report = detect_drift(background_engine)
+        report["checkpoints"] = advanced
+        self.last_report = report
+        if report["drifted"]:
+            print(f"⚠️ Journal de stock: {report['drifted']} produit(s) en écart avec les mouvements")
+        return report
+
+
+ledger_drift_monitor = LedgerDriftMonitor()
+
+
+# ===================== Invalidation (ORM) =====================
+
+_MOVEMENT_FIELDS = ("quantity", "movement_type", "product_id")
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_rewritten_movements(session: Session, flush_context, instances) -> None:
+    if not _table_ready:
+        return
+    ids: Set[int] = set()
+    for obj in session.deleted:
+        if isinstance(obj, StockMovement) and obj.product_id is not None:
+            ids.add(obj.product_id)
+    for obj in session.dirty:
+        if not isinstance(obj, StockMovement):
+            continue
+        state = inspect(obj)
+        for name in _MOVEMENT_FIELDS:
+            hist = state.attrs[name].history
+            if hist.has_changes():
+                if obj.product_id is not None:
+                    ids.add(obj.product_id)
+                if name == "product_id":
+                    ids.update(x for x in (hist.deleted or ()) if x is not None)
+    if ids:
+        session.info.setdefault(_PENDING_KEY, set()).update(ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_rewritten_movements(session: Session, flush_context) -> None:
+    ids = session.info.pop(_PENDING_KEY, None)
+    if not ids or not _table_ready:
+        return
+    try:
+        invalidate_checkpoints(session.connection(), ids)
+    except Exception as e:
+        logging.warning(f"Invalidation des points de contrôle échouée: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rewritten_movements(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,240 @@
+"""
+Résumé de stock précalculé des produits à variantes (table product_stock_summary).
+
+Une ligne par produit ayant au moins une variante: nombre total de variantes,
+variantes disponibles (non vendues) et répartition des disponibles par
+condition. L'absence de ligne signifie "pas de variantes"; le stock affiché
+d'un produit est donc COALESCE(available_variants, products.quantity).
+
+Les écritures ORM sur ProductVariant (création, vente, annulation de vente,
+changement de condition, suppression) et les suppressions de Product sont
+captées par un listener de session: les produits touchés sont recalculés
+dans la même transaction après le flush. Les écritures en masse hors ORM
+(générateur de données, imports SQL) doivent appeler rebuild_stock_summary().
+
+Sous PostgreSQL, deux transactions peuvent toucher les variantes d'un même
+produit: refresh_products() verrouille d'abord les lignes products concernées
+(FOR UPDATE, ordre des ids), puis agrège et écrit par upsert. La seconde
+transaction attend la première et son agrégat, lu après le verrou, inclut
+les variantes validées entre-temps (ni conflit de clé, ni valeur périmée).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from ..database import Product, ProductStockSummary, ProductVariant, engine
+
+_table_ready = False
+_PENDING_KEY = "_stock_summary_pending"
+_CHUNK = 500
+
+
+def ensure_stock_summary_table(bind=None) -> bool:
+    """Crée la table si nécessaire et la remplit si elle est vide alors que des variantes existent."""
+    global _table_ready
+    if _table_ready:
+        return True
+    bind = bind or engine
+    try:
+        ProductStockSummary.__table__.create(bind=bind, checkfirst=True)
+        with bind.connect() as conn:
+            has_rows = conn.execute(select(ProductStockSummary.product_id).limit(1)).first() is not None
+            has_variants = conn.execute(select(ProductVariant.variant_id).limit(1)).first() is not None
+        _table_ready = True
+        if has_variants and not has_rows:
+            rebuilt = rebuild_stock_summary(bind)
+            print(f"✅ Résumé de stock initialisé ({rebuilt} produits à variantes)")
+    except Exception as e:
+        logging.warning(f"Table product_stock_summary indisponible: {e}")
+    return _table_ready
+
+
+def is_ready() -> bool:
+    return _table_ready
+
+
+def _condition_key(value: Optional[str]) -> str:
+    return (value or "").strip().lower() or "inconnu"
+
+
+def _summary_rows(conn, product_ids: Optional[List[int]] = None, min_id: Optional[int] = None,
+                  max_id: Optional[int] = None) -> List[dict]:
+    """Agrège les variantes (par produit et condition) et construit les lignes du résumé."""
+    v = ProductVariant.__table__
+    stmt = (
+        select(
+            v.c.product_id,
+            v.c.condition,
+            func.count().label("total"),
+            func.sum(case((v.c.is_sold == False, 1), else_=0)).label("available"),  # noqa: E712
+        )
+        .where(v.c.product_id.isnot(None))
+        .group_by(v.c.product_id, v.c.condition)
+    )
+    if product_ids is not None:
+        stmt = stmt.where(v.c.product_id.in_(product_ids))
+    if min_id is not None:
+        stmt = stmt.where(v.c.product_id >= min_id)
+    if max_id is not None:
+        stmt = stmt.where(v.c.product_id <= max_id)
+
+    acc: Dict[int, dict] = {}
+    for pid, condition, total, available in conn.execute(stmt):
+        entry = acc.setdefault(pid, {"product_id": pid, "total_variants": 0, "available_variants": 0, "counts": {}})
+        entry["total_variants"] += int(total or 0)
+        avail = int(available or 0)
+        entry["available_variants"] += avail
+        if avail:
+            key = _condition_key(condition)
+            entry["counts"][key] = entry["counts"].get(key, 0) + avail
+    rows = []
+    for entry in acc.values():
+        counts = entry.pop("counts")
+        entry["condition_counts"] = json.dumps(counts, ensure_ascii=False, sort_keys=True)
+        rows.append(entry)
+    return rows
+
+
+def _upsert_rows(conn, rows: List[dict]) -> None:
+    table = ProductStockSummary.__table__
+    name = conn.dialect.name
+    if name in ("postgresql", "sqlite"):
+        if name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.product_id],
+            set_={"total_variants": stmt.excluded.total_variants, "available_variants": stmt.excluded.available_variants,
+                  "condition_counts": stmt.excluded.condition_counts, "updated_at": func.now()},
+        ), rows)
+        return
+    conn.execute(table.delete().where(table.c.product_id.in_([r["product_id"] for r in rows])))
+    conn.execute(table.insert(), rows)
+
+
+def refresh_products(conn, product_ids: Iterable[int]) -> None:
+    """Recalcule le résumé des produits donnés (supprime la ligne s'il n'ont plus de variantes)."""
+    ids = sorted({int(pid) for pid in product_ids if pid is not None})
+    table = ProductStockSummary.__table__
+    p = Product.__table__
+    for i in range(0, len(ids), _CHUNK):
+        chunk = ids[i:i + _CHUNK]
+        if conn.dialect.name == "postgresql":
+            # Sérialise les recalculs d'un même produit (voir l'en-tête du module)
+            conn.execute(
+                select(p.c.product_id).where(p.c.product_id.in_(chunk)).order_by(p.c.product_id).with_for_update()
+            ).all()
+        rows = _summary_rows(conn, product_ids=chunk)
+        if rows:
+            _upsert_rows(conn, rows)
+        kept = {r["product_id"] for r in rows}
+        gone = [pid for pid in chunk if pid not in kept]
+        if gone:
+            conn.execute(table.delete().where(table.c.product_id.in_(gone)))
+
+
+def rebuild_stock_summary(bind=None, min_id: Optional[int] = None, max_id: Optional[int] = None) -> int:
+    """Reconstruit le résumé (tout, ou la plage de product_id donnée). Retourne le nombre de lignes."""
+    bind = bind or engine
+    table = ProductStockSummary.__table__
+    with bind.begin() as conn:
+        delete = table.delete()
+        if min_id is not None:
+            delete = delete.where(table.c.product_id >= min_id)
+        if max_id is not None:
+            delete = delete.where(table.c.product_id <= max_id)
+        conn.execute(delete)
+        rows = _summary_rows(conn, min_id=min_id, max_id=max_id)
+        for i in range(0, len(rows), _CHUNK * 10):
+            conn.execute(table.insert(), rows[i:i + _CHUNK * 10])
+    return len(rows)
+
+
+def load_summaries(db: Session, product_ids: Iterable[int]) -> Dict[int, dict]:
+    """Résumés des produits donnés: {product_id: {has_variants, available, by_condition}}."""
+    ids = list({pid for pid in product_ids if pid is not None})
+    out: Dict[int, dict] = {}
+    if not ids:
+        return out
+    rows = (
+        db.query(ProductStockSummary.product_id, ProductStockSummary.available_variants, ProductStockSummary.condition_counts)
+        .filter(ProductStockSummary.product_id.in_(ids))
+        .all()
+    )
+    for pid, available, counts in rows:
+        try:
+            by_condition = json.loads(counts or "{}")
+        except Exception:
+            by_condition = {}
+        out[pid] = {"has_variants": True, "available": int(available or 0), "by_condition": by_condition}
+    return out
+
+
+# ===================== Maintenance incrémentale =====================
+
+_VARIANT_FIELDS = ("is_sold", "condition", "product_id")
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_stock_summary_changes(session: Session, flush_context, instances) -> None:
+    if not _table_ready:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, {"objects": [], "ids": set()})
+    for obj in session.new:
+        if isinstance(obj, ProductVariant):
+            # product_id peut n'être connu qu'après le flush (variant.product = p)
+            pending["objects"].append(obj)
+    for obj in session.dirty:
+        if not isinstance(obj, ProductVariant):
+            continue
+        state = inspect(obj)
+        changed = False
+        for name in _VARIANT_FIELDS:
+            hist = state.attrs[name].history
+            if hist.has_changes():
+                changed = True
+                if name == "product_id":
+                    pending["ids"].update(x for x in (hist.deleted or ()) if x is not None)
+        if changed:
+            pending["objects"].append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, ProductVariant):
+            pending["ids"].add(obj.product_id)
+        elif isinstance(obj, Product):
+            pending["ids"].add(obj.product_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_stock_summary_changes(session: Session, flush_context) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or not _table_ready:
+        return
+    ids: Set[int] = set(pending["ids"])
+    for obj in pending["objects"]:
+        pid = getattr(obj, "product_id", None)
+        if pid is None and getattr(obj, "product", None) is not None:
+            pid = obj.product.product_id
+        if pid is not None:
+            ids.add(pid)
+    ids.discard(None)
+    if not ids:
+        return
+    try:
+        refresh_products(session.connection(), ids)
+    except Exception as e:
+        # Sous PostgreSQL la transaction est déjà annulée: l'erreur doit remonter au flush
+        logging.error(f"Mise à jour product_stock_summary échouée: {e}")
+        raise
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stock_summary_changes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
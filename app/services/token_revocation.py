@@ -0,0 +1,206 @@
+"""
+Révocation des tokens JWT sans requête base par requête HTTP.
+
+L'authentification fait confiance aux claims du token (app/auth.py): pour
+couper l'accès avant l'expiration, deux structures sont gardées en mémoire
+et consultées en O(1) à chaque requête:
+- les jti révoqués (déconnexion), jusqu'à l'expiration de leur token;
+- par utilisateur, un seuil « tokens émis avant » (not_before, comparé au
+  claim iat): désactivation, suppression, changement de mot de passe ou de
+  rôle, révocation des sessions par un admin.
+La source de vérité est en base (revoked_tokens, user_token_watermarks).
+Ces tables sont suivies par resource_versions (ressource "auth"): chaque
+révocation validée est publiée par le flux des changements (LISTEN/NOTIFY
+entre workers sous PostgreSQL), ce qui déclenche le rechargement. Un contrôle
+de la version toutes les AUTH_REVOCATION_REFRESH_SECONDS (une lecture sur clé
+primaire) rattrape un événement manqué. Le worker qui révoque applique la
+révocation en mémoire dès le COMMIT.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session
+
+from ..database import RevokedToken, UserTokenWatermark, background_engine, engine
+from . import resource_versions
+from .change_feed import change_feed
+
+AUTH_REVOCATION_REFRESH_SECONDS = float(os.getenv("AUTH_REVOCATION_REFRESH_SECONDS", "30"))
+RESOURCE = "auth"
+_PENDING_KEY = "_token_revocations_pending"
+_table_ready = False
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def ensure_token_revocation_tables(bind=None) -> bool:
+    """Crée revoked_tokens et user_token_watermarks (une fois par processus)."""
+    global _table_ready
+    if _table_ready:
+        return True
+    try:
+        with (bind or engine).begin() as conn:
+            RevokedToken.__table__.create(bind=conn, checkfirst=True)
+            UserTokenWatermark.__table__.create(bind=conn, checkfirst=True)
+        _table_ready = True
+    except Exception as e:
+        logging.warning(f"Tables de révocation des tokens indisponibles: {e}")
+    return _table_ready
+
+
+class TokenRevocations:
+    """jti révoqués et seuils par utilisateur, rechargés quand la version "auth" change"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis: Dict[str, float] = {}
+        self._not_before: Dict[int, float] = {}
+        self._version: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.reloads = 0
+        self.rejected = 0
+
+    # ---- contrôle (chaque requête authentifiée) ----
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        jti = claims.get("jti")
+        if jti and jti in self._jtis:
+            self.rejected += 1
+            return True
+        not_before = self._not_before.get(claims.get("user_id"))
+        if not_before is not None:
+            iat = claims.get("iat")
+            # Token sans iat: émis avant la mise en place des seuils, donc avant celui-ci
+            if not isinstance(iat, (int, float)) or iat < not_before:
+                self.rejected += 1
+                return True
+        return False
+
+    # ---- application locale (après COMMIT) ----
+
+    def _apply(self, items: List[Tuple[str, Any, float]]) -> None:
+        with self._lock:
+            for kind, key, value in items:
+                if kind == "jti":
+                    self._jtis[key] = value
+                else:
+                    self._not_before[key] = max(value, self._not_before.get(key, 0.0))
+
+    # ---- rechargement ----
+
+    def refresh(self, force: bool = False) -> bool:
+        """Recharge depuis la base si la version "auth" a changé (True si rechargé)"""
+        if not ensure_token_revocation_tables() or not resource_versions.ensure_resource_versions_table():
+            return False
+        now = time.time()
+        with background_engine.begin() as conn:
+            version = resource_versions.get_versions(conn, [RESOURCE])[RESOURCE][0]
+            if not force and version == self._version:
+                return False
+            conn.execute(delete(RevokedToken.__table__).where(RevokedToken.expires_at < _utcnow()))
+            jtis = {
+                jti: expires_at.replace(tzinfo=timezone.utc).timestamp()
+                for jti, expires_at in conn.execute(select(RevokedToken.jti, RevokedToken.expires_at))
+            }
+            not_before = {
+                user_id: float(nb)
+                for user_id, nb in conn.execute(select(UserTokenWatermark.user_id, UserTokenWatermark.not_before))
+            }
+        with self._lock:
+            self._jtis = {jti: exp for jti, exp in jtis.items() if exp > now}
+            self._not_before = not_before
+            self._version = version
+            self.reloads += 1
+        return True
+
+    def notify_changed(self, resources) -> None:
+        """Écouteur du flux des changements: réveille le rechargement"""
+        if RESOURCE in resources:
+            self._wake.set()
+
+    def start_background(self) -> None:
+        try:
+            self.refresh(force=True)
+        except Exception as e:
+            print(f"⚠️ Révocations des tokens non chargées: {e}")
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="TokenRevocations", daemon=True)
+        self._thread.start()
+
+    def stop_background(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(AUTH_REVOCATION_REFRESH_SECONDS)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[TokenRevocations] Error in refresh: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "revoked_tokens": len(self._jtis),
+                "user_watermarks": len(self._not_before),
+                "version": self._version,
+                "reloads": self.reloads,
+                "rejected": self.rejected,
+            }
+
+
+token_revocations = TokenRevocations()
+change_feed.add_listener(token_revocations.notify_changed)
+
+
+def revoke_token(db: Session, claims: Dict[str, Any]) -> bool:
+    """Révoque un token (claims jti/exp requis), effectif au COMMIT de la session"""
+    jti, exp = claims.get("jti"), claims.get("exp")
+    if not jti or not isinstance(exp, (int, float)) or not ensure_token_revocation_tables():
+        return False
+    expires_at = datetime.fromtimestamp(exp, tz=timezone.utc).replace(tzinfo=None)
+    db.merge(RevokedToken(jti=jti, user_id=claims.get("user_id"), expires_at=expires_at, revoked_at=_utcnow()))
+    db.info.setdefault(_PENDING_KEY, []).append(("jti", jti, float(exp)))
+    return True
+
+
+def revoke_user_tokens(db: Session, user_id: int) -> bool:
+    """Refuse tous les tokens déjà émis pour cet utilisateur, effectif au COMMIT de la session"""
+    if user_id is None or not ensure_token_revocation_tables():
+        return False
+    now = time.time()
+    db.merge(UserTokenWatermark(user_id=user_id, not_before=now, updated_at=_utcnow()))
+    db.info.setdefault(_PENDING_KEY, []).append(("user", user_id, now))
+    return True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_revocations(session: Session) -> None:
+    items = session.info.pop(_PENDING_KEY, None)
+    if items:
+        token_revocations._apply(items)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_revocations(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,443 @@
+"""
+Chaîne des assets statiques: minification, empreintes, pré-compression.
+
+Build (scripts/build_assets.py, à lancer au déploiement):
+- chaque fichier de static/js et static/css est minifié (rjsmin / rcssmin,
+  dans requirements.txt; à défaut, minifieur prudent intégré: commentaires et
+  indentation retirés, sauts de ligne conservés pour l'insertion automatique
+  de `;`);
+- écrit sous static/dist/<type>/<nom>.<empreinte>.min.<ext>, avec les
+  variantes .gz et .br (si le module brotli est disponible);
+- BUNDLES concatène les scripts communs chargés par base.html;
+- static/dist/manifest.json: fichier logique → fichier publié, tailles.
+
+Service:
+- asset_manifest.url("js/http.js") renvoie le fichier à empreinte si le
+  manifeste est à jour pour cette source (empreinte de la source vérifiée au
+  chargement), sinon /static/js/http.js?v=<version>: une source modifiée
+  après le build n'est jamais masquée par un fichier périmé;
+- PrecompressedStaticFiles sert la variante .br / .gz selon Accept-Encoding,
+  valeurs q comprises (br;q=0 refuse br), avec Vary: Accept-Encoding.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+
+from .compression import accepted_encodings
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    brotli = None  # type: ignore
+
+try:
+    import rjsmin  # type: ignore
+except ImportError:  # pragma: no cover
+    rjsmin = None  # type: ignore
+
+try:
+    import rcssmin  # type: ignore
+except ImportError:  # pragma: no cover
+    rcssmin = None  # type: ignore
+
+STATIC_DIR = Path("static")
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+SOURCE_DIRS = {"js": ".js", "css": ".css"}
+# Scripts communs de base.html servis en un seul fichier (ordre d'exécution conservé)
+BUNDLES: Dict[str, List[str]] = {
+    "js/core.bundle.js": ["js/http.js", "js/auth.js", "js/utils.js", "js/live.js"],
+}
+COMPRESSIONS = {"br": ".br", "gzip": ".gz"}
+
+
+# ==================== MINIFICATION ====================
+
+_JS_WS = " \t\r\n\f\v\u00a0\ufeff"
+_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+    "throw", "case", "do", "else", "yield", "await",
+}
+# `if (x) /re/.test(s)`: après la parenthèse d'un en-tête de contrôle, `/` ouvre une regex
+_PAREN_HEAD_KEYWORDS = {"if", "while", "for", "with"}
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c in "_$\\" or ord(c) > 127
+
+
+def _needs_space(prev: str, nxt: str) -> bool:
+    if _is_word_char(prev) and _is_word_char(nxt):
+        return True
+    # a - -b, a + +b, a / /re/
+    return (prev in "+-" and nxt in "+-") or (prev == "/" and nxt in "/*")
+
+
+def _scan_string(src: str, i: int) -> int:
+    quote, n = src[i], len(src)
+    i += 1
+    while i < n:
+        c = src[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == quote or c == "\n":
+            return i + 1
+        i += 1
+    return n
+
+
+def _scan_template(src: str, i: int):
+    """Depuis l'intérieur d'un littéral `...`: renvoie (fin, ouvre_substitution)"""
+    n = len(src)
+    while i < n:
+        c = src[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "`":
+            return i + 1, False
+        if c == "$" and i + 1 < n and src[i + 1] == "{":
+            return i + 2, True
+        i += 1
+    return n, False
+
+
+def _scan_regex(src: str, i: int) -> int:
+    n = len(src)
+    i += 1
+    in_class = False
+    while i < n:
+        c = src[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "\n":
+            return i
+        if in_class:
+            if c == "]":
+                in_class = False
+        elif c == "[":
+            in_class = True
+        elif c == "/":
+            i += 1
+            while i < n and _is_word_char(src[i]):
+                i += 1
+            return i
+        i += 1
+    return n
+
+
+def _minify_js_builtin(src: str) -> str:
+    out: List[str] = []
+    pending: Optional[str] = None  # espace en attente: " " ou "\n"
+    last_word = ""
+    braces: List[str] = []
+    parens: List[bool] = []  # True: parenthèse d'un en-tête if/while/for/with
+    closed_head = False
+    i, n = 0, len(src)
+
+    def emit(token: str, word: bool = False) -> None:
+        nonlocal pending, last_word, closed_head
+        if out and pending:
+            if pending == "\n":
+                out.append("\n")
+            elif _needs_space(out[-1][-1], token[0]):
+                out.append(" ")
+        pending = None
+        out.append(token)
+        last_word = token if word else ""
+        closed_head = False
+
+    def space(kind: str) -> None:
+        nonlocal pending
+        if pending != "\n":
+            pending = kind
+
+    while i < n:
+        c = src[i]
+        nxt = src[i + 1] if i + 1 < n else ""
+        if c in _JS_WS:
+            j = i
+            while j < n and src[j] in _JS_WS:
+                j += 1
+            space("\n" if "\n" in src[i:j] else " ")
+            i = j
+        elif c == "/" and nxt == "/":
+            j = src.find("\n", i)
+            i = n if j < 0 else j
+        elif c == "/" and nxt == "*":
+            j = src.find("*/", i + 2)
+            j = n if j < 0 else j + 2
+            if src.startswith("/*!", i):
+                emit(src[i:j])
+            else:
+                space("\n" if "\n" in src[i:j] else " ")
+            i = j
+        elif c in "'\"":
+            j = _scan_string(src, i)
+            emit(src[i:j])
+            i = j
+        elif c == "`" or (c == "}" and braces and braces[-1] == "tpl"):
+            if c == "}":
+                braces.pop()
+            j, opens = _scan_template(src, i + 1)
+            if opens:
+                braces.append("tpl")
+            emit(src[i:j])
+            i = j
+        elif c == "/":
+            prev = out[-1][-1] if out else ""
+            if not prev or prev in _REGEX_AFTER or last_word in _REGEX_KEYWORDS or closed_head:
+                j = _scan_regex(src, i)
+                emit(src[i:j])
+                i = j
+            else:
+                emit(c)
+                i += 1
+        elif _is_word_char(c):
+            j = i
+            while j < n and (_is_word_char(src[j]) or (src[j] == "." and src[j - 1].isdigit())):
+                j += 1
+            emit(src[i:j], word=True)
+            i = j
+        else:
+            if c == "{":
+                braces.append("code")
+            elif c == "}" and braces:
+                braces.pop()
+            elif c == "(":
+                parens.append(last_word in _PAREN_HEAD_KEYWORDS)
+            head = c == ")" and bool(parens) and parens.pop()
+            emit(c)
+            closed_head = head
+            i += 1
+    return "".join(out).strip() + "\n"
+
+
+def _minify_css_builtin(src: str) -> str:
+    out: List[str] = []
+    pending = False
+    i, n = 0, len(src)
+    while i < n:
+        c = src[i]
+        if c.isspace():
+            pending = True
+            i += 1
+        elif c == "/" and src.startswith("/*", i):
+            j = src.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            pending = True
+        elif c in "'\"":
+            j = _scan_string(src, i)
+            if pending and out and out[-1][-1] not in "{};,":
+                out.append(" ")
+            pending = False
+            out.append(src[i:j])
+            i = j
+        else:
+            if c == "}" and out and out[-1] == ";":
+                out.pop()
+            if c in "{};,>":
+                pending = False
+            elif pending and out and out[-1][-1] not in "{};,>":
+                out.append(" ")
+            pending = False
+            out.append(c)
+            i += 1
+    return "".join(out).strip() + "\n"
+
+
+def minify_js(src: str) -> str:
+    if rjsmin is not None:
+        return rjsmin.jsmin(src) + "\n"
+    return _minify_js_builtin(src)
+
+
+def minify_css(src: str) -> str:
+    if rcssmin is not None:
+        return rcssmin.cssmin(src) + "\n"
+    return _minify_css_builtin(src)
+
+
+# ==================== BUILD ====================
+
+def _digest(data: bytes, length: int = 10) -> str:
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def _write(path: Path, data: bytes) -> Dict[str, int]:
+    """Écrit le fichier et ses variantes compressées; renvoie les tailles"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    sizes = {"raw": len(data)}
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    Path(f"{path}.gz").write_bytes(gz)
+    sizes["gzip"] = len(gz)
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        Path(f"{path}.br").write_bytes(br)
+        sizes["br"] = len(br)
+    return sizes
+
+
+def build(static_dir: Path = STATIC_DIR, bundles: bool = True) -> Dict[str, Any]:
+    """Minifie, empreinte et pré-compresse static/js et static/css; écrit le manifeste"""
+    dist = static_dir / DIST_DIR
+    entries: Dict[str, Any] = {}
+    minified: Dict[str, bytes] = {}
+    for kind, ext in SOURCE_DIRS.items():
+        src_dir = static_dir / kind
+        if not src_dir.is_dir():
+            continue
+        for src in sorted(src_dir.glob(f"*{ext}")):
+            logical = f"{kind}/{src.name}"
+            raw = src.read_bytes()
+            text = raw.decode("utf-8")
+            data = (minify_js(text) if kind == "js" else minify_css(text)).encode("utf-8")
+            minified[logical] = data
+            out = dist / kind / f"{src.stem}.{_digest(data)}.min{ext}"
+            entries[logical] = {
+                "file": f"{DIST_DIR}/{kind}/{out.name}",
+                "source_hash": _digest(raw, 16),
+                "source_bytes": len(raw),
+                "sizes": _write(out, data),
+            }
+
+    bundle_entries: Dict[str, Any] = {}
+    if bundles:
+        for logical, members in BUNDLES.items():
+            if not all(m in minified for m in members):
+                continue
+            # ';' entre les fichiers: une instruction non terminée ne déborde pas sur le suivant
+            data = b";\n".join(minified[m].rstrip() for m in members) + b";\n"
+            kind, name = logical.split("/", 1)
+            stem = name.rsplit(".", 1)[0]
+            out = dist / kind / f"{stem}.{_digest(data)}.min.js"
+            bundle_entries[logical] = {
+                "file": f"{DIST_DIR}/{kind}/{out.name}",
+                "members": members,
+                "sizes": _write(out, data),
+            }
+
+    # Anciennes versions retirées (fichiers non référencés par le nouveau manifeste)
+    keep = {e["file"] for e in (*entries.values(), *bundle_entries.values())}
+    for kind in SOURCE_DIRS:
+        for old in (dist / kind).glob("*") if (dist / kind).is_dir() else []:
+            base = old.name[:-3] if old.name.endswith((".gz", ".br")) else old.name
+            if f"{DIST_DIR}/{kind}/{base}" not in keep:
+                old.unlink()
+
+    manifest = {"files": entries, "bundles": bundle_entries, "brotli": brotli is not None}
+    (dist / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    return manifest
+
+
+# ==================== MANIFESTE (templates) ====================
+
+class AssetManifest:
+    """URL publiques des assets pour les templates (fichiers à empreinte si à jour)"""
+
+    def __init__(self, static_dir: Path = STATIC_DIR, version=None):
+        self.static_dir = static_dir
+        self.version = version
+        self._lock = threading.Lock()
+        self._files: Dict[str, str] = {}
+        self._bundles: Dict[str, Dict[str, Any]] = {}
+        self._loaded_version: Optional[str] = None
+        self.enabled = os.getenv("USE_ASSET_MANIFEST", "true").lower() == "true"
+        self.bundles_enabled = os.getenv("USE_ASSET_BUNDLES", "true").lower() == "true"
+
+    def load(self) -> int:
+        """Charge le manifeste; seules les entrées dont la source n'a pas changé sont retenues"""
+        loaded_version = self.version() if self.version else None
+        files: Dict[str, str] = {}
+        bundles: Dict[str, Dict[str, Any]] = {}
+        path = self.static_dir / DIST_DIR / MANIFEST_NAME
+        if self.enabled and path.exists():
+            try:
+                manifest = json.loads(path.read_text(encoding="utf-8"))
+                for logical, entry in (manifest.get("files") or {}).items():
+                    src = self.static_dir / logical
+                    target = self.static_dir / entry["file"]
+                    try:
+                        if target.exists() and _digest(src.read_bytes(), 16) == entry.get("source_hash"):
+                            files[logical] = entry["file"]
+                    except OSError:
+                        pass
+                for logical, entry in (manifest.get("bundles") or {}).items():
+                    if all(m in files for m in entry.get("members") or []) and (self.static_dir / entry["file"]).exists():
+                        bundles[logical] = entry
+            except Exception as e:
+                print(f"⚠️ Manifeste des assets illisible: {e}")
+        with self._lock:
+            self._files, self._bundles = files, bundles
+            self._loaded_version = loaded_version
+        return len(files)
+
+    def _refresh(self) -> None:
+        # Version des assets changée (watcher en développement): revérifier le manifeste
+        if self.version and self.version() != self._loaded_version:
+            self.load()
+
+    def url(self, logical: str) -> str:
+        self._refresh()
+        logical = logical.lstrip("/")
+        target = self._files.get(logical)
+        if target:
+            return f"/static/{target}"
+        return f"/static/{logical}?v={self.version() if self.version else ''}"
+
+    def bundle(self, logical: str) -> List[str]:
+        """URL du bundle si construit et à jour, sinon URL de chacun de ses fichiers"""
+        self._refresh()
+        entry = self._bundles.get(logical) if self.bundles_enabled else None
+        if entry:
+            return [f"/static/{entry['file']}"]
+        return [self.url(m) for m in BUNDLES.get(logical, [])]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "files": len(self._files),
+            "bundles": sorted(self._bundles) if self.bundles_enabled else [],
+            "brotli": brotli is not None,
+        }
+
+
+# ==================== SERVICE ====================
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles servant la variante .br / .gz pré-générée selon Accept-Encoding"""
+
+    async def get_response(self, path: str, scope) -> Any:
+        response = await super().get_response(path, scope)
+        if response.status_code != 200 or not isinstance(response, FileResponse):
+            return response
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        for encoding in accepted_encodings(accept, COMPRESSIONS):
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + COMPRESSIONS[encoding])
+            if stat_result is None:
+                continue
+            return FileResponse(
+                full_path,
+                stat_result=stat_result,
+                media_type=response.media_type,
+                headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+            )
+        if os.path.exists(f"{response.path}.gz"):
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
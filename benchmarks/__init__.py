@@ -0,0 +1 @@
+"""Suite de benchmarks de performance (voir benchmarks/README.md)."""
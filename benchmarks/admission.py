@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Contrôle d'admission: calculs partagés entre requêtes identiques et doubles clics.
+
+Scénarios, avec puis sans le middleware (app.admission):
+- N onglets ouvrent le tableau de bord au même moment (--tabs), --rounds fois:
+  statistiques et rapports demandés en parallèle; compte les requêtes SQL
+  exécutées, les réponses partagées (single-flight), les erreurs et la durée.
+  Sans contrôle, au-delà de la taille du pool DB (DB_POOL_SIZE +
+  DB_MAX_OVERFLOW), les endpoints async bloquent la boucle en attendant une
+  connexion jusqu'à DB_POOL_TIMEOUT: prévoir plusieurs minutes;
+- double clic sur « Recalculer les quantités » (--clicks requêtes simultanées
+  du même utilisateur): nombre d'exécutions réelles.
+
+Exemples:
+  python benchmarks/admission.py
+  python benchmarks/admission.py --tabs 8 --rounds 5 --scale 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Dict
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+DASHBOARD_URLS = ("/api/reports/dashboard", "/api/dashboard/sales-trend", "/api/products/stats")
+
+
+def seed(scale: float) -> None:
+    from sqlalchemy import func, select
+    from app.database import Invoice, create_tables, engine
+    from app.services.data_generator import GeneratorConfig, generate
+    from app.services.resource_versions import ensure_resource_versions_table
+
+    create_tables()
+    ensure_resource_versions_table()
+    with engine.connect() as conn:
+        have = conn.execute(select(func.count()).select_from(Invoice.__table__)).scalar() or 0
+    if not have:
+        print(f"🧪 Génération du jeu de données (échelle {scale})")
+        generate(engine, GeneratorConfig.scaled(scale), progress=None)
+
+
+async def run(tabs: int, rounds: int, clicks: int, enabled: bool) -> Dict[str, float]:
+    import httpx
+    from sqlalchemy import event
+    import main  # type: ignore
+    from app.admission import admission_control
+    from app.auth import create_access_token
+    from app.database import engine
+
+    admission_control.enabled = enabled
+    for state in admission_control.states:
+        state.counts = dict.fromkeys(state.counts, 0)
+        state.user_buckets.clear()
+    counter = {"sql": 0}
+
+    def count(*_args):
+        counter["sql"] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    # Un token par onglet: utilisateurs distincts, même rôle
+    headers = [{"Authorization": "Bearer " + create_access_token({"sub": f"tab{i}", "user_id": 1000 + i, "role": "user"})}
+               for i in range(tabs)]
+    admin = {"Authorization": "Bearer " + create_access_token({"sub": "admin", "user_id": 1, "role": "admin"})}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=120) as client:
+            started = time.perf_counter()
+            errors = 0
+            for _ in range(rounds):
+                responses = await asyncio.gather(*(
+                    client.get(url, headers=h) for h in headers for url in DASHBOARD_URLS
+                ))
+                errors += sum(1 for r in responses if r.status_code != 200)
+            elapsed = time.perf_counter() - started
+            dashboard_sql = counter["sql"]
+            shared = sum(s.counts["shared"] for s in admission_control.states)
+
+            counter["sql"] = 0
+            clicks_before = admission_control.states[1].counts["admitted"] if enabled else 0
+            responses = await asyncio.gather(*(
+                client.post("/api/stock-movements/recompute-quantities", headers=admin) for _ in range(clicks)
+            ))
+            executions = (admission_control.states[1].counts["admitted"] - clicks_before) if enabled else clicks
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+        admission_control.enabled = True
+    return {
+        "requests": tabs * rounds * len(DASHBOARD_URLS),
+        "sql": dashboard_sql,
+        "shared": shared,
+        "errors": errors,
+        "seconds": elapsed,
+        "click_status": ",".join(str(r.status_code) for r in responses),
+        "executions": executions,
+        "click_sql": counter["sql"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Contrôle d'admission: partage et doubles clics")
+    parser.add_argument("--tabs", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--clicks", type=int, default=2)
+    parser.add_argument("--scale", type=float, default=0.1, help="Taille du jeu de données (1.0 = 20 000 factures)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(ROOT_DIR, 'benchmarks', '.data', 'admission.db')}")
+    os.environ.setdefault("GOOGLE_SHEETS_AUTO_SYNC", "false")
+    os.makedirs(os.path.join(ROOT_DIR, "benchmarks", ".data"), exist_ok=True)
+    seed(args.scale)
+
+    print(f"{args.tabs} onglets x {len(DASHBOARD_URLS)} requêtes, {args.rounds} tours; {args.clicks} clics simultanés")
+    print(f"{'admission':<10} {'requêtes':>9} {'SQL':>7} {'partagées':>10} {'erreurs':>8} {'durée':>9}   "
+          f"{'clics':>10} {'exécutions':>11}")
+    for enabled in (False, True):
+        res = asyncio.run(run(args.tabs, args.rounds, args.clicks, enabled))
+        print(f"{'oui' if enabled else 'non':<10} {res['requests']:>9} {res['sql']:>7} {res['shared']:>10} {res['errors']:>8} "
+              f"{res['seconds']:>7.2f} s   {res['click_status']:>10} {res['executions']:>11}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Coût de l'authentification par requête et blocage de la boucle pendant les connexions.
+
+1. Vérification du token: jwt.decode à chaque requête contre le cache des tokens
+   vérifiés (app.auth.token_cache), en direct puis à travers l'application ASGI
+   (/api/auth/verify, rôle exigé sur /api/events/status).
+2. Coût bcrypt selon BCRYPT_ROUNDS.
+3. Connexions simultanées (--logins): retard maximal de la boucle asyncio quand
+   bcrypt tourne dans la boucle (ancien login) ou dans le pool de threads.
+
+Exemples:
+  python benchmarks/auth.py
+  python benchmarks/auth.py --requests 2000 --logins 10 --rounds 10,11,12
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+
+def _per_call_us(fn: Callable[[], object], n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def bench_decode(n: int) -> None:
+    from app import auth
+
+    token = auth.create_access_token({"sub": "bench", "user_id": 1, "role": "admin"})
+    auth.token_cache.clear()
+    decode = _per_call_us(lambda: auth.jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]), n)
+    auth.decode_token_claims(token)
+    cached = _per_call_us(lambda: auth.decode_token_claims(token), n)
+    print(f"{'jwt.decode':<28} {decode:>8.1f} µs")
+    print(f"{'cache des tokens (hit)':<28} {cached:>8.1f} µs")
+
+
+async def bench_requests(n: int) -> None:
+    import httpx
+    import main  # type: ignore
+    from app import auth
+
+    token = auth.create_access_token({"sub": "bench", "user_id": 1, "role": "admin"})
+    headers = {"Authorization": "Bearer " + token}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'endpoint':<24} {'sans cache':>11} {'avec cache':>11}")
+        for url in ("/api/auth/verify", "/api/events/status"):
+            timings = []
+            for size in (0, auth.AUTH_TOKEN_CACHE_SIZE):
+                auth.token_cache.maxsize = size
+                auth.token_cache.clear()
+                await client.get(url, headers=headers)
+                start = time.perf_counter()
+                for _ in range(n):
+                    r = await client.get(url, headers=headers)
+                    assert r.status_code == 200, r.status_code
+                timings.append((time.perf_counter() - start) / n * 1e6)
+            print(f"{url:<24} {timings[0]:>8.0f} µs {timings[1]:>8.0f} µs")
+        auth.token_cache.maxsize = auth.AUTH_TOKEN_CACHE_SIZE
+
+
+def bench_rounds(rounds: List[int]) -> None:
+    from passlib.context import CryptContext
+
+    for r in rounds:
+        ctx = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=r)
+        hashed = ctx.hash("bench-password")
+        start = time.perf_counter()
+        ctx.verify("bench-password", hashed)
+        print(f"BCRYPT_ROUNDS={r:<3} vérification {(time.perf_counter() - start) * 1000:>7.0f} ms")
+
+
+async def _loop_lag(stop: asyncio.Event, lags: List[float]) -> None:
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append((time.perf_counter() - t - 0.005) * 1000)
+
+
+async def bench_logins(logins: int) -> None:
+    from starlette.concurrency import run_in_threadpool
+    from app.auth import get_password_hash, verify_and_update_password
+
+    hashed = get_password_hash("bench-password")
+
+    async def inline_login():
+        verify_and_update_password("bench-password", hashed)
+
+    async def threaded_login():
+        await run_in_threadpool(verify_and_update_password, "bench-password", hashed)
+
+    print(f"{logins} connexions simultanées")
+    for label, login in (("dans la boucle", inline_login), ("pool de threads", threaded_login)):
+        stop, lags = asyncio.Event(), []
+        probe = asyncio.create_task(_loop_lag(stop, lags))
+        await asyncio.sleep(0.02)
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        total = (time.perf_counter() - start) * 1000
+        stop.set()
+        await probe
+        print(f"  {label:<16} durée {total:>6.0f} ms, retard boucle max {max(lags):>6.0f} ms, "
+              f"médian {statistics.median(lags):>5.1f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Coût de l'authentification")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--logins", type=int, default=8)
+    parser.add_argument("--rounds", default="10,11,12", help="Coûts bcrypt à mesurer")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(ROOT_DIR, 'benchmarks', '.data', 'auth.db')}")
+    os.environ.setdefault("GOOGLE_SHEETS_AUTO_SYNC", "false")
+    os.makedirs(os.path.join(ROOT_DIR, "benchmarks", ".data"), exist_ok=True)
+
+    bench_decode(args.requests * 10)
+    asyncio.run(bench_requests(args.requests))
+    bench_rounds([int(r) for r in args.rounds.split(",") if r.strip()])
+    asyncio.run(bench_logins(args.logins))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Requêtes émises par N onglets ouverts: polling contre flux des changements (SSE).
+
+Démarre l'application (uvicorn, port local) et simule pendant --seconds:
+- un poste qui enregistre un mouvement de stock toutes les --write-every s;
+- N onglets « Mouvements de stock »:
+  * polling: version des assets toutes les 2 s (ancien script de base.html)
+    et rechargement de la liste toutes les --poll-seconds s;
+  * push: un flux /api/events/stream par onglet, liste rechargée à chaque
+    événement stock_movements (avec If-None-Match).
+Affiche requêtes/minute, réponses 304 et délai moyen entre l'écriture et le
+rechargement (fraîcheur).
+
+Exemples:
+  python benchmarks/change_feed.py
+  python benchmarks/change_feed.py --tabs 50 --seconds 60 --write-every 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from typing import Dict, List
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+LIST_URL = "/api/stock-movements/?limit=20"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port: int):
+    import uvicorn
+    import main  # type: ignore
+
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+class Stats:
+    def __init__(self):
+        self.requests = 0
+        self.not_modified = 0
+        self.lag_ms: List[float] = []
+        self.writes: List[float] = []
+
+
+async def _writer(client, headers, stats: Stats, product_id: int, every: float, until: float) -> int:
+    writes = 0
+    while time.monotonic() < until:
+        await asyncio.sleep(every)
+        r = await client.post("/api/stock-movements/", headers=headers, json={
+            "product_id": product_id, "quantity": 1, "movement_type": "IN", "reference_type": "BENCH",
+        })
+        if r.status_code == 200:
+            writes += 1
+            stats.writes.append(time.monotonic())
+    return writes
+
+
+async def _get_list(client, headers, stats: Stats, etag: Dict[str, str]) -> None:
+    h = dict(headers)
+    if etag.get("v"):
+        h["If-None-Match"] = etag["v"]
+    r = await client.get(LIST_URL, headers=h)
+    stats.requests += 1
+    if r.status_code == 304:
+        stats.not_modified += 1
+    elif r.headers.get("etag"):
+        etag["v"] = r.headers["etag"]
+
+
+async def _polling_tab(client, headers, stats: Stats, poll_seconds: float, until: float) -> None:
+    etag: Dict[str, str] = {}
+    await _get_list(client, headers, stats, etag)
+    last_refresh = time.monotonic()
+    next_list = last_refresh + poll_seconds
+    while time.monotonic() < until:
+        await asyncio.sleep(2)
+        await client.get("/__live/version")
+        stats.requests += 1
+        if time.monotonic() >= next_list:
+            await _get_list(client, headers, stats, etag)
+            now = time.monotonic()
+            # Écritures visibles seulement à ce rechargement
+            stats.lag_ms.extend((now - w) * 1000 for w in stats.writes if last_refresh < w <= now)
+            last_refresh = now
+            next_list += poll_seconds
+
+
+async def _push_tab(client, headers, stats: Stats, until: float) -> None:
+    etag: Dict[str, str] = {}
+    await _get_list(client, headers, stats, etag)
+    stats.requests += 1  # ouverture du flux
+    try:
+        async with client.stream("GET", "/api/events/stream?resources=stock_movements", headers=headers,
+                                 timeout=None) as resp:
+            event = None
+            async for line in resp.aiter_lines():
+                if time.monotonic() >= until:
+                    break
+                if line.startswith("event:"):
+                    event = line.split(":", 1)[1].strip()
+                elif line == "" and event == "change":
+                    await _get_list(client, headers, stats, etag)
+                    if stats.writes:
+                        stats.lag_ms.append((time.monotonic() - stats.writes[-1]) * 1000)
+                    event = None
+    except Exception:
+        pass
+
+
+async def run(base_url: str, mode: str, tabs: int, seconds: float, write_every: float, poll_seconds: float) -> Dict[str, float]:
+    import httpx
+    from app.auth import create_access_token
+
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": "bench", "user_id": 1, "role": "admin"})}
+    stats = Stats()
+    limits = httpx.Limits(max_connections=tabs * 2 + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        r = await client.post("/api/products/", headers=headers, json={"name": f"Bench {mode}", "price": "1", "quantity": 0})
+        product_id = r.json()["product_id"]
+        until = time.monotonic() + seconds
+        if mode == "polling":
+            tasks = [_polling_tab(client, headers, stats, poll_seconds, until) for _ in range(tabs)]
+        else:
+            tasks = [_push_tab(client, headers, stats, until) for _ in range(tabs)]
+        tab_tasks = [asyncio.create_task(t) for t in tasks]
+        writes = await _writer(client, headers, stats, product_id, write_every, until)
+        await asyncio.wait(tab_tasks, timeout=5)
+        for t in tab_tasks:
+            t.cancel()
+    return {
+        "writes": writes,
+        "requests": stats.requests,
+        "per_minute": stats.requests / seconds * 60,
+        "not_modified": stats.not_modified,
+        "lag_ms": statistics.mean(stats.lag_ms) if stats.lag_ms else 0.0,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Polling contre flux des changements")
+    parser.add_argument("--tabs", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--write-every", type=float, default=5, help="Secondes entre deux mouvements enregistrés")
+    parser.add_argument("--poll-seconds", type=float, default=30, help="Rechargement de la liste en mode polling")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(ROOT_DIR, 'benchmarks', '.data', 'change-feed.db')}")
+    os.environ.setdefault("GOOGLE_SHEETS_AUTO_SYNC", "false")
+    os.makedirs(os.path.join(ROOT_DIR, "benchmarks", ".data"), exist_ok=True)
+    from app.database import create_tables
+    create_tables()
+
+    port = _free_port()
+    server, thread = _start_server(port)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        print(f"{args.tabs} onglets, {args.seconds:.0f} s, une écriture toutes les {args.write_every:.0f} s")
+        print(f"{'mode':<8} {'requêtes':>9} {'req/min':>9} {'304':>6} {'fraîcheur':>11}")
+        for mode in ("polling", "push"):
+            res = asyncio.run(run(base_url, mode, args.tabs, args.seconds, args.write_every, args.poll_seconds))
+            print(f"{mode:<8} {res['requests']:>9} {res['per_minute']:>9.0f} {res['not_modified']:>6} {res['lag_ms']:>8.0f} ms")
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
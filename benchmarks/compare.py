@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Comparaison de deux résultats de benchmark (JSON produits par benchmarks/run.py).
+
+Une régression est signalée quand, pour un scénario présent des deux côtés:
+  - le p95 augmente de plus de `threshold` (relatif) ET de plus de `min_delta_ms` (bruit), ou
+  - le nombre moyen de requêtes SQL augmente (déterministe: toute hausse est une régression).
+
+Exemple:
+  python benchmarks/compare.py benchmarks/results/base.json benchmarks/results/new.json --threshold 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.2, min_delta_ms: float = 2.0) -> List[Dict[str, Any]]:
+    """Retourne une ligne par scénario commun, avec `regression` à True si le seuil est dépassé."""
+    rows = []
+    base_scenarios = baseline.get("scenarios", {})
+    for name, cur in current.get("scenarios", {}).items():
+        base = base_scenarios.get(name)
+        if not base:
+            continue
+        b95 = float(base["latency_ms"]["p95"])
+        c95 = float(cur["latency_ms"]["p95"])
+        bq = float(base["queries"]["avg"])
+        cq = float(cur["queries"]["avg"])
+        slower = c95 > b95 * (1 + threshold) and (c95 - b95) > min_delta_ms
+        more_queries = cq > bq + 0.01
+        rows.append({
+            "scenario": name,
+            "p95_base": b95,
+            "p95_current": c95,
+            "p95_change": round((c95 - b95) / b95, 3) if b95 else None,
+            "queries_base": bq,
+            "queries_current": cq,
+            "regression": bool(slower or more_queries),
+            "reasons": [r for r, hit in (("latence p95", slower), ("requêtes SQL", more_queries)) if hit],
+        })
+    return rows
+
+
+def print_report(rows: List[Dict[str, Any]]) -> None:
+    print(f"{'scénario':<28} {'p95 base':>10} {'p95 actuel':>10} {'Δ':>8} {'SQL base':>9} {'SQL actuel':>10}")
+    for r in rows:
+        change = f"{r['p95_change'] * 100:+.0f}%" if r["p95_change"] is not None else "n/a"
+        flag = "  ❌ " + ", ".join(r["reasons"]) if r["regression"] else ""
+        print(f"{r['scenario']:<28} {r['p95_base']:>10.2f} {r['p95_current']:>10.2f} {change:>8} "
+              f"{r['queries_base']:>9.1f} {r['queries_current']:>10.1f}{flag}")
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Comparer deux résultats de benchmark")
+    parser.add_argument("baseline", help="JSON de référence")
+    parser.add_argument("current", help="JSON à comparer")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Hausse relative tolérée du p95 (défaut: 0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Hausse absolue minimale du p95 pour être signalée")
+    args = parser.parse_args(argv)
+
+    rows = compare(load(args.baseline), load(args.current), args.threshold, args.min_delta_ms)
+    print_report(rows)
+    regressions = [r for r in rows if r["regression"]]
+    if regressions:
+        print(f"❌ {len(regressions)} régression(s) détectée(s)")
+        return 1
+    print("✅ Aucune régression")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
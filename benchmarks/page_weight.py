@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Octets transférés par chargement de page (HTML + JS/CSS locaux), cache vide.
+
+Charge chaque page via l'application ASGI, relève les <script src> et
+<link href> servis par /static, puis les télécharge:
+- "sources": fichiers de static/js et static/css, sans compression;
+- "construits": manifeste static/dist (scripts/build_assets.py), avec
+  Accept-Encoding br/gzip comme un navigateur.
+Les ressources CDN (Bootstrap, polices) ne sont pas comptées.
+
+Exemples:
+  python scripts/build_assets.py && python benchmarks/page_weight.py
+  python benchmarks/page_weight.py --pages /,/products,/invoices --encoding gzip
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+from typing import Dict, List, Tuple
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+DEFAULT_PAGES = "/,/products,/invoices,/clients,/stock-movements,/daily-recap,/settings,/desktop"
+_ASSET_RE = re.compile(r"""<(?:script[^>]+src|link[^>]+href)=["'](/static/[^"']+)["']""")
+
+
+async def _page_bytes(client, path: str, encoding: str) -> Tuple[int, int, int, Dict[str, int]]:
+    """(octets HTML, octets assets, nombre d'assets, détail par asset)"""
+    headers = {"Accept-Encoding": encoding}
+    page = await client.get(path, headers=headers)
+    html_bytes = len(page.content)
+    per_asset: Dict[str, int] = {}
+    for url in dict.fromkeys(_ASSET_RE.findall(page.text)):
+        # Octets sur le fil: corps tel qu'envoyé (compressé si négocié)
+        async with client.stream("GET", url, headers=headers) as resp:
+            size = 0
+            async for chunk in resp.aiter_raw():
+                size += len(chunk)
+        per_asset[url] = size
+    return html_bytes, sum(per_asset.values()), len(per_asset), per_asset
+
+
+async def measure(pages: List[str], encoding: str) -> Dict[str, Dict[str, Tuple[int, int, int]]]:
+    import httpx
+    import main  # type: ignore
+
+    results: Dict[str, Dict[str, Tuple[int, int, int]]] = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode, use_manifest, enc in (("sources", False, "identity"), ("construits", True, encoding)):
+            main.asset_manifest.enabled = use_manifest
+            main.asset_manifest.load()
+            main.page_shells.clear()
+            results[mode] = {}
+            for path in pages:
+                html, assets, count, _ = await _page_bytes(client, path, enc)
+                results[mode][path] = (html, assets, count)
+    return results
+
+
+def _kb(n: int) -> str:
+    return f"{n / 1024:8.1f} Ko"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Octets transférés par chargement de page")
+    parser.add_argument("--pages", default=DEFAULT_PAGES, help="Chemins séparés par des virgules")
+    parser.add_argument("--encoding", default="br, gzip", help="Accept-Encoding du mode construit")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(ROOT_DIR, 'benchmarks', '.data', 'page-weight.db')}")
+    os.environ.setdefault("GOOGLE_SHEETS_AUTO_SYNC", "false")
+    os.makedirs(os.path.join(ROOT_DIR, "benchmarks", ".data"), exist_ok=True)
+    from app.database import create_tables
+    create_tables()
+
+    pages = [p.strip() for p in args.pages.split(",") if p.strip()]
+    results = asyncio.run(measure(pages, args.encoding))
+    if not results["construits"] or all(v[1] == results["sources"][k][1] for k, v in results["construits"].items()):
+        print("ℹ️ Aucun asset construit: lancer d'abord python scripts/build_assets.py")
+
+    print(f"{'page':<20} {'assets':>6} {'sources':>12} {'construits':>12} {'gain':>7}")
+    total_src = total_built = 0
+    for path in pages:
+        html_s, assets_s, count_s = results["sources"][path]
+        html_b, assets_b, count_b = results["construits"][path]
+        src, built = html_s + assets_s, html_b + assets_b
+        total_src += src
+        total_built += built
+        gain = (1 - built / src) * 100 if src else 0.0
+        print(f"{path:<20} {count_s:>2} → {count_b:<2} {_kb(src)} {_kb(built)} {gain:6.1f}%")
+    if total_src:
+        print(f"{'total':<20} {'':>6} {_kb(total_src)} {_kb(total_built)} {(1 - total_built / total_src) * 100:6.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
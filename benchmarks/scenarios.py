@@ -0,0 +1,146 @@
+"""
+Scénarios de benchmark: endpoints clés appelés en process via l'application ASGI.
+
+Chaque scénario construit sa requête à partir d'un contexte d'échantillons
+tirés de la base (codes-barres, IMEI, factures, clients...) pour que les
+appels touchent des données réelles et varient d'une itération à l'autre.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.database import Client, Invoice, Product, ProductVariant
+
+
+@dataclass
+class BenchContext:
+    """Échantillons de la base utilisés pour paramétrer les requêtes"""
+    product_barcodes: List[str] = field(default_factory=list)
+    variant_imeis: List[str] = field(default_factory=list)
+    search_terms: List[str] = field(default_factory=list)
+    invoice_ids: List[int] = field(default_factory=list)
+    client_ids: List[int] = field(default_factory=list)
+    sellable_products: List[Dict[str, Any]] = field(default_factory=list)
+    # Lot de codes pour le scan d'inventaire (IMEI, codes-barres produits, inconnus)
+    scan_codes: List[str] = field(default_factory=list)
+    # Factures créées pendant le run (supprimées ensuite pour garder la base stable)
+    created_invoice_ids: List[int] = field(default_factory=list)
+    rng: random.Random = field(default_factory=random.Random)
+
+    def pick(self, seq: List[Any]) -> Any:
+        return seq[self.rng.randrange(len(seq))] if seq else None
+
+
+def build_context(db: Session, seed: int, sample_size: int = 200) -> BenchContext:
+    ctx = BenchContext(rng=random.Random(seed))
+    ctx.product_barcodes = [b for (b,) in db.query(Product.barcode).filter(Product.barcode.isnot(None)).order_by(Product.product_id).limit(sample_size)]
+    ctx.variant_imeis = [i for (i,) in db.query(ProductVariant.imei_serial).order_by(ProductVariant.variant_id).limit(sample_size)]
+    ctx.search_terms = sorted({(b or "").split()[0] for (b,) in db.query(Product.brand).distinct().limit(50) if b}) or ["a"]
+    ctx.invoice_ids = [i for (i,) in db.query(Invoice.invoice_id).order_by(Invoice.invoice_id.desc()).limit(sample_size)]
+    ctx.client_ids = [i for (i,) in db.query(Client.client_id).order_by(Client.client_id).limit(sample_size)]
+    ctx.sellable_products = [
+        {"product_id": pid, "name": name, "price": str(price or 0)}
+        for (pid, name, price) in (
+            db.query(Product.product_id, Product.name, Product.price)
+            .filter(Product.has_unique_serial == False, Product.quantity > 5)  # noqa: E712
+            .order_by(Product.product_id)
+            .limit(sample_size)
+        )
+    ]
+    ctx.scan_codes = build_scan_codes(db, seed)
+    return ctx
+
+
+def build_scan_codes(db: Session, seed: int, size: int = 10_000) -> List[str]:
+    """~80 % d'IMEI, ~15 % de codes-barres produits (avec répétitions), ~5 % de codes inconnus."""
+    rng = random.Random(seed)
+    imeis = [i for (i,) in db.query(ProductVariant.imei_serial).order_by(ProductVariant.variant_id).limit(size * 8 // 10)]
+    barcodes = [b for (b,) in db.query(Product.barcode).filter(Product.barcode.isnot(None)).order_by(Product.product_id).limit(size // 10)]
+    codes = list(imeis)
+    while barcodes and len(codes) < size * 95 // 100:
+        codes.append(rng.choice(barcodes))
+    codes.extend(f"UNKNOWN{i:08d}" for i in range(size - len(codes)))
+    rng.shuffle(codes)
+    return codes
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: Callable[[BenchContext], Optional[str]]
+    body: Optional[Callable[[BenchContext], Dict[str, Any]]] = None
+    # Appelé avec la réponse JSON (ex: mémoriser l'id créé pour le nettoyage)
+    on_response: Optional[Callable[[BenchContext, Any], None]] = None
+
+
+def _invoice_payload(ctx: BenchContext) -> Dict[str, Any]:
+    p = ctx.pick(ctx.sellable_products)
+    price = Decimal(p["price"])
+    subtotal = price
+    tax = (subtotal * Decimal("0.18")).quantize(Decimal("1."))
+    return {
+        "invoice_number": "AUTO",
+        "client_id": ctx.pick(ctx.client_ids),
+        "date": datetime.now().isoformat(),
+        "payment_method": "espèces",
+        "subtotal": str(subtotal),
+        "tax_rate": "18.00",
+        "tax_amount": str(tax),
+        "total": str(subtotal + tax),
+        "items": [{
+            "product_id": p["product_id"],
+            "product_name": p["name"],
+            "quantity": 1,
+            "price": str(price),
+            "total": str(price),
+        }],
+    }
+
+
+def _remember_invoice(ctx: BenchContext, data: Any) -> None:
+    if isinstance(data, dict) and data.get("invoice_id"):
+        ctx.created_invoice_ids.append(int(data["invoice_id"]))
+
+
+def _scan_path(ctx: BenchContext) -> Optional[str]:
+    # Alterner code-barres produit et IMEI de variante
+    code = ctx.pick(ctx.variant_imeis) if ctx.variant_imeis and ctx.rng.random() < 0.5 else ctx.pick(ctx.product_barcodes)
+    return f"/api/products/scan/{code}" if code else None
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("products_list", "GET", lambda c: "/api/products/paginated?page=1&page_size=50"),
+    Scenario("products_list_in_stock", "GET", lambda c: "/api/products/paginated?page=2&page_size=50&in_stock=true&sort_by=stock"),
+    Scenario("products_search", "GET", lambda c: f"/api/products/paginated?page=1&page_size=20&search={c.pick(c.search_terms)}"),
+    Scenario("products_scan", "GET", _scan_path),
+    Scenario("products_scan_batch_10k", "POST", lambda c: "/api/products/scan/batch" if c.scan_codes else None,
+             body=lambda c: {"codes": c.scan_codes, "report": True}),
+    Scenario("products_stats", "GET", lambda c: "/api/products/stats"),
+    Scenario("invoices_list", "GET", lambda c: f"/api/invoices/paginated?page={c.rng.randint(1, 5)}&page_size=50"),
+    Scenario("invoices_list_month", "GET", lambda c: f"/api/invoices/paginated?page=1&page_size=50&start_date={date.today().replace(day=1).isoformat()}"),
+    Scenario("invoice_create", "POST", lambda c: "/api/invoices/" if c.sellable_products and c.client_ids else None,
+             body=_invoice_payload, on_response=_remember_invoice),
+    Scenario("invoice_print", "GET", lambda c: f"/invoices/print/{c.pick(c.invoice_ids)}" if c.invoice_ids else None),
+    Scenario("dashboard_stats", "GET", lambda c: "/api/dashboard/stats?force_refresh=true"),
+    Scenario("dashboard_sales_trend", "GET", lambda c: "/api/dashboard/sales-trend?days=90"),
+    Scenario("debts_list", "GET", lambda c: "/api/debts/?limit=20"),
+    Scenario("client_debts", "GET", lambda c: f"/api/clients/{c.pick(c.client_ids)}/debts" if c.client_ids else None),
+    Scenario("daily_recap", "GET", lambda c: "/api/daily-recap/stats"),
+]
+
+
+def get_scenarios(names: Optional[List[str]] = None) -> List[Scenario]:
+    if not names:
+        return list(SCENARIOS)
+    wanted = set(names)
+    unknown = wanted - {s.name for s in SCENARIOS}
+    if unknown:
+        raise ValueError(f"Scénarios inconnus: {', '.join(sorted(unknown))}")
+    return [s for s in SCENARIOS if s.name in wanted]
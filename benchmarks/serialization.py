@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Coût de sérialisation et taille des listes JSON volumineuses.
+
+Pour une page de N produits (variantes et attributs chargés):
+- "pydantic": chemin d'origine, validation par le response_model
+  (List[ProductResponse]) puis jsonable_encoder + json.dumps;
+- "léger": dicts construits par l'endpoint (_product_payload) encodés par
+  orjson (FastJSONResponse).
+Affiche le temps CPU médian par page, puis la taille du corps en identity,
+gzip et brotli (niveaux de app/compression.py).
+
+Exemples:
+  python benchmarks/serialization.py
+  python benchmarks/serialization.py --rows 500 --repeat 30
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+
+def _median_ms(fn: Callable[[], bytes], repeat: int) -> float:
+    samples: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def _kb(n: int) -> str:
+    return f"{n / 1024:8.1f} Ko"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sérialisation des listes JSON")
+    parser.add_argument("--rows", type=int, default=200, help="Produits par page")
+    parser.add_argument("--repeat", type=int, default=20, help="Répétitions par mesure")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(ROOT_DIR, 'benchmarks', '.data', 'serialization.db')}")
+    os.environ.setdefault("GOOGLE_SHEETS_AUTO_SYNC", "false")
+    os.makedirs(os.path.join(ROOT_DIR, "benchmarks", ".data"), exist_ok=True)
+
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from sqlalchemy.orm import selectinload
+
+    from app.compression import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL, brotli
+    from app.database import Product, ProductVariant, SessionLocal, create_tables, engine
+    from app.responses import FastJSONResponse
+    from app.routers.products import _product_payload
+    from app.schemas import ProductResponse
+    from app.services.data_generator import GeneratorConfig, generate
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        if db.query(Product).count() < args.rows:
+            print(f"🌱 Génération de {args.rows} produits...")
+            generate(engine, GeneratorConfig(clients=10, products=args.rows, invoices=0, daily_sales=0, seed=7), progress=None)
+        products = (
+            db.query(Product)
+            .options(selectinload(Product.variants).selectinload(ProductVariant.attributes))
+            .order_by(Product.created_at.desc())
+            .limit(args.rows)
+            .all()
+        )
+        adapter = TypeAdapter(List[ProductResponse])
+
+        def pydantic_path() -> bytes:
+            models = adapter.validate_python(products, from_attributes=True)
+            return json.dumps(jsonable_encoder(models), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        def lean_path() -> bytes:
+            payload = [_product_payload(p, False, p.variants or []) for p in products]
+            return FastJSONResponse(payload).body
+
+        if json.loads(pydantic_path()) != json.loads(lean_path()):
+            print("⚠️ Les deux chemins ne produisent pas le même JSON")
+
+        body = lean_path()
+        print(f"{len(products)} produits, {sum(len(p.variants or []) for p in products)} variantes")
+        print(f"{'chemin':<10} {'CPU médian':>12}")
+        for label, fn in (("pydantic", pydantic_path), ("léger", lean_path)):
+            print(f"{label:<10} {_median_ms(fn, args.repeat):9.2f} ms")
+
+        print(f"{'encodage':<10} {'taille':>12}")
+        print(f"{'identity':<10} {_kb(len(body))}")
+        print(f"{'gzip':<10} {_kb(len(gzip.compress(body, COMPRESSION_GZIP_LEVEL)))}")
+        if brotli is not None:
+            print(f"{'br':<10} {_kb(len(brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)))}")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
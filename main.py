@@ -1,68 +1,56 @@
 from fastapi import FastAPI, Request, Depends, HTTPException
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from sqlalchemy.orm import joinedload
+import asyncio
 import uvicorn
 import os
 from dotenv import load_dotenv
 import json
 import re
+import time
 from datetime import date, datetime
 
 # Charger les variables d'environnement
 load_dotenv()
 
-# Version d'assets pour bust de cache (commit SHA si fourni par la plateforme, sinon variable ou timestamp)
+# Version d'assets pour bust de cache (commit SHA si fourni par la plateforme, sinon mtime des fichiers),
+# calculée une fois au démarrage et tenue à jour par un watcher en développement
+from app.page_cache import PageShellCache, asset_version
+from app.static_assets import AssetManifest, PrecompressedStaticFiles
+
 def get_asset_version():
-    """Génère une version basée sur le timestamp de modification des fichiers statiques"""
-    # En production, utiliser le commit SHA si disponible
-    commit_sha = os.getenv("GIT_COMMIT_SHA") or os.getenv("KOYEB_COMMIT_SHA") or os.getenv("ASSET_VERSION")
-    if commit_sha:
-        return commit_sha[:12]
-    
-    # En développement, utiliser le timestamp de modification le plus récent parmi static/js, static/css et templates
-    try:
-        latest_mtime = 0
-        for rel, exts in [(os.path.join("static", "js"), (".js",)),
-                          (os.path.join("static", "css"), (".css",)),
-                          ("templates", (".html",))]:
-            if os.path.exists(rel):
-                for fn in os.listdir(rel):
-                    if fn.endswith(exts):
-                        fp = os.path.join(rel, fn)
-                        try:
-                            m = os.path.getmtime(fp)
-                            if m > latest_mtime:
-                                latest_mtime = m
-                        except Exception:
-                            pass
-        if latest_mtime > 0:
-            return str(int(latest_mtime))
-    except Exception:
-        pass
-    
-    # Fallback: timestamp actuel
-    return str(int(datetime.now().timestamp()))
+    return asset_version.value
 
 ASSET_VERSION = get_asset_version()
 
 # Imports de l'application
-from app.database import get_db
+from app.database import get_db, read_engine, DB_READ_STICKY_COOKIE, DB_READ_STICKY_SECONDS
 from app.database import Invoice, UserSettings, Product, DeliveryNote, DeliveryNoteItem, Client
 import re
-try:
-    # Legacy settings model (template-application) for fallback of company info/logo
-    from app.models.models import Settings as LegacySettings  # type: ignore
-except Exception:
-    LegacySettings = None  # type: ignore
-from app.routers import auth, products, clients, stock_movements, invoices, quotations, suppliers, debts, delivery_notes, bank_transactions, reports, user_settings, migrations, cache, dashboard, supplier_invoices, daily_recap, daily_purchases, daily_requests, daily_sales, google_sheets, client_debts
+from app.services.settings_cache import settings_cache, normalize_logo as _normalize_logo
+from app.routers import auth, products, clients, stock_movements, invoices, quotations, suppliers, debts, delivery_notes, bank_transactions, reports, user_settings, migrations, cache, dashboard, supplier_invoices, daily_recap, daily_purchases, daily_requests, daily_sales, google_sheets, client_debts, profiling, exports, stock_counts, events
 from app.init_db import init_database
 from app.auth import get_current_user
+from app.middleware import profiling_middleware
+from app.admission import AdmissionMiddleware
+from app.compression import CompressionMiddleware
+from app.responses import FastJSONResponse
 from app.services.migration_processor import migration_processor
+from app.services.sales_rollup import ensure_rollup_table
+from app.services.stock_summary import ensure_stock_summary_table
+from app.services.product_stats import ensure_product_stats_table
+from app.services.stock_ledger import ensure_ledger_table, ledger_drift_monitor
+from app.services.row_counters import ensure_row_counters_table
+from app.services.resource_versions import ensure_resource_versions_table
+from app.services.stock_count import ensure_stock_count_tables
+from app.services.token_revocation import ensure_token_revocation_tables, token_revocations
+from app.services.change_feed import change_feed
+from app.services.archival import ensure_partitions, retention_manager
+from app.database_optimization import database_optimizer
 try:
     from app.services.debt_notifier import debt_notifier
 except Exception:
@@ -72,7 +60,9 @@ except Exception:
 app = FastAPI(
     title="POWERCLASSS - Gestion de Stock",
     description="Application de gestion de stock et facturation avec FastAPI et Bootstrap",
-    version="1.0.0"
+    version="1.0.0",
+    # JSON encodé par orjson (repli stdlib si absent)
+    default_response_class=FastJSONResponse,
 )
 
 # Configuration CORS pour la boutique en ligne (domaine séparé)
@@ -104,8 +94,9 @@ async def cache_headers_middleware(request, call_next):
         content_type = (response.headers.get("content-type", "") or "").lower()
         if path.startswith("/static/") or path == "/favicon.ico":
             response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
-        elif content_type.startswith("text/html"):
-            response.headers["Cache-Control"] = "no-store"
+        elif content_type.startswith("text/html") or response.status_code == 304:
+            # Coquilles de pages avec ETag: revalidation à chaque navigation, sinon pas de stockage
+            response.headers["Cache-Control"] = "no-cache" if "etag" in response.headers else "no-store"
         # Help browsers auto-upgrade any stray http resources to https and enable HSTS
         # Only apply security headers in production (not on localhost)
         if not (path.startswith("/") and (request.client.host in ["127.0.0.1", "localhost"] or 
@@ -117,6 +108,30 @@ async def cache_headers_middleware(request, call_next):
         pass
     return response
 
+# Réplique en lecture: après une écriture réussie, le client lit sur le primaire quelques secondes
+# (ses propres écritures restent visibles malgré le retard de réplication)
+_WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+@app.middleware("http")
+async def read_your_writes_middleware(request, call_next):
+    response = await call_next(request)
+    if read_engine is not None and request.method in _WRITE_METHODS and response.status_code < 400:
+        until = time.time() + DB_READ_STICKY_SECONDS
+        response.set_cookie(
+            DB_READ_STICKY_COOKIE, f"{until:.3f}",
+            max_age=max(1, int(DB_READ_STICKY_SECONDS + 0.999)), httponly=True, samesite="lax",
+        )
+    return response
+
+# Contrôle d'admission des endpoints coûteux (seaux à jetons, places limitées, single-flight)
+app.add_middleware(AdmissionMiddleware)
+
+# Compression brotli/gzip des réponses au-delà de COMPRESSION_MIN_SIZE (assets pré-compressés et flux SSE exclus)
+app.add_middleware(CompressionMiddleware)
+
+# Profilage (nombre de requêtes SQL, temps DB, Server-Timing): enregistré en dernier = middleware le plus externe
+app.middleware("http")(profiling_middleware)
+
 # Initialiser la base de données au démarrage (désactivé par défaut en déploiement)
 @app.on_event("startup")
 async def startup_event():
@@ -127,6 +142,30 @@ async def startup_event():
             init_database()
         else:
             print("⏭️ INIT_DB_ON_STARTUP!=true → saut de l'initialisation de la base (aucune écriture)")
+        # Table d'agrégat du CA journalier (dérivée, sans risque): nécessaire à l'invalidation
+        ensure_rollup_table()
+        # Résumé de stock des produits à variantes (rempli au premier démarrage)
+        ensure_stock_summary_table()
+        # Compteurs de la page Produits (initialisés par un recalcul complet si vides)
+        ensure_product_stats_table()
+        # Points de contrôle du journal de stock (table dérivée)
+        ensure_ledger_table()
+        # Compteurs de lignes des tables en ajout seul (initialisés à la première lecture)
+        ensure_row_counters_table()
+        # Inventaires (sessions, quantités attendues, lots de scans)
+        ensure_stock_count_tables()
+        # Versions des ressources de l'API (ETag des listes et fiches)
+        ensure_resource_versions_table()
+        # Révocations des tokens: chargées en mémoire, rechargées à chaque changement (flux / contrôle périodique)
+        ensure_token_revocation_tables()
+        token_revocations.start_background()
+        # Partitions mensuelles à venir (tables partitionnées PostgreSQL uniquement)
+        try:
+            ensure_partitions()
+        except Exception as e:
+            print(f"⚠️ Partitions non vérifiées: {e}")
+        # Vérifier les index déclarés (rapport; création si DB_AUTO_CREATE_INDEXES=true)
+        database_optimizer.verify_on_startup()
         # Démarrer le processeur de migrations en arrière-plan (désactivé par défaut)
         if os.getenv("ENABLE_MIGRATIONS_WORKER", "false").lower() == "true":
             migration_processor.start_background_processor()
@@ -137,6 +176,24 @@ async def startup_event():
             if debt_notifier is not None:
                 debt_notifier.start_background()
                 print("✅ Notificateur de créances démarré")
+        # Contrôle périodique des écarts quantités / journal des mouvements
+        if os.getenv("ENABLE_LEDGER_DRIFT_CHECK", "false").lower() == "true":
+            ledger_drift_monitor.start_background()
+            print("✅ Contrôle du journal de stock démarré")
+        # Rétention / archivage des tables en ajout seul
+        if os.getenv("ENABLE_RETENTION", "false").lower() == "true":
+            retention_manager.start_background()
+            print("✅ Rétention des données démarrée")
+        # Templates des pages compilés une fois; version des assets surveillée en développement
+        built = asset_manifest.load()
+        print(f"✅ Assets construits: {built} fichiers à empreinte" if built else "⏭️ Pas d'assets construits (scripts/build_assets.py) → sources servies")
+        compiled = page_shells.precompile(PAGE_TEMPLATES)
+        print(f"✅ {compiled} templates de pages compilés (assets {asset_version.value})")
+        asset_version.start_watcher()
+        # Flux des changements (SSE): livraison via la boucle de l'application, LISTEN/NOTIFY sur PostgreSQL
+        change_feed.bind_loop(asyncio.get_running_loop())
+        if change_feed.start_pg_listener():
+            print("✅ Flux des changements partagé entre workers (LISTEN/NOTIFY)")
         print("✅ Application démarrée avec succès")
     except Exception as e:
         print(f"❌ Erreur lors du démarrage: {e}")
@@ -150,14 +207,29 @@ async def shutdown_event():
             migration_processor.stop_background_processor()
         if os.getenv("ENABLE_DEBT_REMINDERS", "false").lower() == "true" and debt_notifier is not None:
             debt_notifier.stop_background()
+        if os.getenv("ENABLE_LEDGER_DRIFT_CHECK", "false").lower() == "true":
+            ledger_drift_monitor.stop_background()
+        if os.getenv("ENABLE_RETENTION", "false").lower() == "true":
+            retention_manager.stop_background()
+        asset_version.stop_watcher()
+        change_feed.stop_pg_listener()
+        token_revocations.stop_background()
         print("✅ Application arrêtée proprement")
     except Exception as e:
         print(f"❌ Erreur lors de l'arrêt: {e}")
 
 # Configuration des templates et fichiers statiques
 templates = Jinja2Templates(directory="templates")
-# Exposer une fonction globale de version pour le cache-busting des assets (dynamique)
-templates.env.globals["ASSET_VERSION"] = get_asset_version
+# Version des assets pour le cache-busting: {{ ASSET_VERSION() }} (ou {{ ASSET_VERSION }})
+templates.env.globals["ASSET_VERSION"] = asset_version
+# Assets minifiés à empreinte (static/dist, scripts/build_assets.py), repli sur les sources
+asset_manifest = AssetManifest(version=asset_version)
+templates.env.globals["asset_url"] = asset_manifest.url
+templates.env.globals["asset_bundle"] = asset_manifest.bundle
+# Coquilles de pages pré-rendues (HTML + ETag) par version des assets et des paramètres
+page_shells = PageShellCache(templates)
+# Nouvelle version des assets (surveillance en développement): les onglets ouverts se rechargent
+asset_version.on_change(lambda v: change_feed.publish(["assets"], v=v))
 
 # ---- Jinja filters ----
 def _format_number(value) -> str:
@@ -201,23 +273,8 @@ def _format_date_no_time(value) -> str:
 
 templates.env.filters["format_date"] = _format_date_no_time
 
-def _normalize_logo(logo_value: str | None) -> str | None:
-    try:
-        if not logo_value:
-            return None
-        s = str(logo_value).strip()
-        if not s:
-            return None
-        # Already a proper URL or data URI
-        if s.startswith("data:image") or s.startswith("http://") or s.startswith("https://") or s.startswith("/"):
-            return s
-        # Heuristic: base64 without header → wrap as PNG by default
-        if len(s) > 64:
-            return f"data:image/png;base64,{s}"
-        return s
-    except Exception:
-        return logo_value
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Variantes .br / .gz pré-générées servies selon Accept-Encoding
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 # Inclure les routers API de l'application de gestion
 app.include_router(auth.router)
@@ -242,6 +299,10 @@ app.include_router(daily_purchases.router)
 app.include_router(daily_requests.router)
 app.include_router(daily_sales.router)
 app.include_router(google_sheets.router)
+app.include_router(profiling.router)
+app.include_router(exports.router)
+app.include_router(stock_counts.router)
+app.include_router(events.router)
 
 # Inclure les routers API de la boutique en ligne (API publique)
 from boutique.backend.routers import (
@@ -278,45 +339,59 @@ async def live_version():
     return {"v": get_asset_version()}
 
 # Routes pour l'interface web
+PAGE_TEMPLATES = [
+    "bank_transactions.html", "barcode_generator.html", "cache_manager.html", "client_debts.html",
+    "clients.html", "clients_detail.html", "daily_purchases.html", "daily_recap.html",
+    "daily_requests.html", "daily_sales.html", "dashboard.html", "debts.html",
+    "delivery_notes.html", "desktop.html", "google_sheets_sync.html", "guide.html",
+    "invoices.html", "login.html", "migration_manager.html", "products.html", "quotations.html",
+    "reports.html", "scan.html", "settings.html", "stock_movements.html", "supplier_invoices.html",
+    "suppliers.html",
+]
+
+def _render_page(request: Request, name: str, db: Session):
+    # HTML en cache mémoire: la session n'ouvre de connexion que si les paramètres doivent être rechargés
+    return page_shells.render(request, name, _load_company_settings(db))
+
 # Page d'accueil: Dashboard classique avec barre de navigation
 @app.get("/", response_class=HTMLResponse)
 async def dashboard_home(request: Request, db: Session = Depends(get_db)):
-    return templates.TemplateResponse("dashboard.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "dashboard.html", db)
 
 # Interface Desktop accessible via /desktop (interface avec fenêtres type macOS)
 @app.get("/desktop", response_class=HTMLResponse)
 async def desktop_page(request: Request, db: Session = Depends(get_db)):
-    return templates.TemplateResponse("desktop.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "desktop.html", db)
 
 # Alias /dashboard pour compatibilité
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard_alias(request: Request, db: Session = Depends(get_db)):
-    return templates.TemplateResponse("dashboard.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "dashboard.html", db)
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request, db: Session = Depends(get_db)):
     """Page de connexion"""
-    return templates.TemplateResponse("login.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "login.html", db)
 
 @app.get("/products", response_class=HTMLResponse)
 async def products_page(request: Request, db: Session = Depends(get_db)):
     """Page de gestion des produits"""
-    return templates.TemplateResponse("products.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "products.html", db)
 
 @app.get("/clients", response_class=HTMLResponse)
 async def clients_page(request: Request, db: Session = Depends(get_db)):
     """Page de gestion des clients"""
-    return templates.TemplateResponse("clients.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "clients.html", db)
 
 @app.get("/clients/detail", response_class=HTMLResponse)
 async def client_detail_page(request: Request, db: Session = Depends(get_db)):
     """Page de détail d'un client"""
-    return templates.TemplateResponse("clients_detail.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "clients_detail.html", db)
 
 @app.get("/clients/debts", response_class=HTMLResponse)
 async def client_debts_page(request: Request, db: Session = Depends(get_db)):
     """Page des créances d'un client (agrégées)"""
-    return templates.TemplateResponse("client_debts.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "client_debts.html", db)
 
 @app.get("/clients/debts/print/{client_id}", response_class=HTMLResponse)
 async def client_debts_print_page(request: Request, client_id: int, db: Session = Depends(get_db)):
@@ -427,180 +502,108 @@ async def client_debts_print_page(request: Request, client_id: int, db: Session
 @app.get("/stock-movements", response_class=HTMLResponse)
 async def stock_movements_page(request: Request, db: Session = Depends(get_db)):
     """Page des mouvements de stock"""
-    return templates.TemplateResponse("stock_movements.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "stock_movements.html", db)
 
 @app.get("/invoices", response_class=HTMLResponse)
 async def invoices_page(request: Request, db: Session = Depends(get_db)):
     """Page de gestion des factures"""
-    return templates.TemplateResponse("invoices.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "invoices.html", db)
 
 @app.get("/quotations", response_class=HTMLResponse)
 async def quotations_page(request: Request, db: Session = Depends(get_db)):
     """Page de gestion des devis"""
-    return templates.TemplateResponse("quotations.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "quotations.html", db)
 
 @app.get("/scan", response_class=HTMLResponse)
 async def scan_page(request: Request, db: Session = Depends(get_db)):
     """Page de scan de codes-barres"""
-    return templates.TemplateResponse("scan.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "scan.html", db)
 
 @app.get("/settings", response_class=HTMLResponse)
 async def settings_page(request: Request, db: Session = Depends(get_db)):
     """Page des paramètres de l'application"""
-    return templates.TemplateResponse("settings.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "settings.html", db)
 
 @app.get("/suppliers", response_class=HTMLResponse)
 async def suppliers_page(request: Request, db: Session = Depends(get_db)):
     """Page de gestion des fournisseurs"""
-    return templates.TemplateResponse("suppliers.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "suppliers.html", db)
 
 @app.get("/delivery-notes", response_class=HTMLResponse)
 async def delivery_notes_page(request: Request, db: Session = Depends(get_db)):
     """Page de gestion des bons de livraison"""
-    return templates.TemplateResponse("delivery_notes.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "delivery_notes.html", db)
 
 @app.get("/bank-transactions", response_class=HTMLResponse)
 async def bank_transactions_page(request: Request, db: Session = Depends(get_db)):
     """Page de gestion des transactions bancaires"""
-    return templates.TemplateResponse("bank_transactions.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "bank_transactions.html", db)
 
 @app.get("/reports", response_class=HTMLResponse)
 async def reports_page(request: Request, db: Session = Depends(get_db)):
     """Page des rapports"""
-    return templates.TemplateResponse("reports.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "reports.html", db)
 
 @app.get("/supplier-invoices", response_class=HTMLResponse)
 async def supplier_invoices_page(request: Request, db: Session = Depends(get_db)):
     """Page de gestion des factures fournisseur"""
-    return templates.TemplateResponse("supplier_invoices.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "supplier_invoices.html", db)
 
 @app.get("/debts", response_class=HTMLResponse)
 async def debts_page(request: Request, db: Session = Depends(get_db)):
     """Page de gestion des dettes"""
-    return templates.TemplateResponse("debts.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "debts.html", db)
 
 @app.get("/barcode-generator", response_class=HTMLResponse)
 async def barcode_generator_page(request: Request, db: Session = Depends(get_db)):
     """Page du générateur de codes-barres"""
-    return templates.TemplateResponse("barcode_generator.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "barcode_generator.html", db)
 
 @app.get("/guide", response_class=HTMLResponse)
 async def guide_page(request: Request, db: Session = Depends(get_db)):
     """Page du guide utilisateur"""
-    return templates.TemplateResponse("guide.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "guide.html", db)
 
 @app.get("/migration-manager", response_class=HTMLResponse)
 async def migration_manager_page(request: Request, db: Session = Depends(get_db)):
     """Page du gestionnaire de migration"""
-    return templates.TemplateResponse("migration_manager.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "migration_manager.html", db)
 
 @app.get("/cache-manager", response_class=HTMLResponse)
 async def cache_manager_page(request: Request, db: Session = Depends(get_db)):
     """Page du gestionnaire de cache"""
-    return templates.TemplateResponse("cache_manager.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "cache_manager.html", db)
 
 @app.get("/daily-recap", response_class=HTMLResponse)
 async def daily_recap_page(request: Request, db: Session = Depends(get_db)):
     """Page du récap quotidien"""
-    return templates.TemplateResponse("daily_recap.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "daily_recap.html", db)
 
 @app.get("/daily-purchases", response_class=HTMLResponse)
 async def daily_purchases_page(request: Request, db: Session = Depends(get_db)):
     """Page des achats quotidiens"""
-    return templates.TemplateResponse("daily_purchases.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "daily_purchases.html", db)
 
 @app.get("/daily-requests", response_class=HTMLResponse)
 async def daily_requests_page(request: Request, db: Session = Depends(get_db)):
     """Page des demandes quotidiennes des clients"""
-    return templates.TemplateResponse("daily_requests.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "daily_requests.html", db)
 
 @app.get("/daily-sales", response_class=HTMLResponse)
 async def daily_sales_page(request: Request, db: Session = Depends(get_db)):
     """Page des ventes quotidiennes"""
-    return templates.TemplateResponse("daily_sales.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "daily_sales.html", db)
 
 @app.get("/google-sheets-sync", response_class=HTMLResponse)
 async def google_sheets_sync_page(request: Request, db: Session = Depends(get_db)):
     """Page de synchronisation Google Sheets"""
-    return templates.TemplateResponse("google_sheets_sync.html", {"request": request, "global_settings": _load_company_settings(db)})
+    return _render_page(request, "google_sheets_sync.html", db)
 
 # ===================== PRINT ROUTES (Invoice, Delivery Note) =====================
 
 def _load_company_settings(db: Session) -> dict:
-    result = {}
-
-    # Load company settings from INVOICE_COMPANY
-    try:
-        s = db.query(UserSettings).filter(UserSettings.setting_key == "INVOICE_COMPANY").order_by(UserSettings.updated_at.desc()).first()
-        if s and s.setting_value:
-            result = json.loads(s.setting_value)
-    except Exception:
-        pass
-
-    # Fallback: read from consolidated appSettings.company if present
-    if not result:
-        try:
-            legacy_us = (
-                db.query(UserSettings)
-                .filter(UserSettings.setting_key == "appSettings")
-                .order_by(UserSettings.updated_at.desc())
-                .first()
-            )
-            if legacy_us and legacy_us.setting_value:
-                data = json.loads(legacy_us.setting_value)
-                comp = (data or {}).get("company") or {}
-                if comp:
-                    result = {
-                        "name": comp.get("companyName") or comp.get("name"),
-                        "address": comp.get("companyAddress") or comp.get("address"),
-                        "email": comp.get("companyEmail") or comp.get("email"),
-                        "phone": comp.get("companyPhone") or comp.get("phone"),
-                        "website": comp.get("companyWebsite") or comp.get("website"),
-                        "logo": comp.get("logo"),  # DataURL support
-                    }
-        except Exception:
-            pass
-
-    # Load favicon from appSettings.general.faviconUrl
-    try:
-        app_settings_record = (
-            db.query(UserSettings)
-            .filter(UserSettings.setting_key == "appSettings")
-            .order_by(UserSettings.updated_at.desc())
-            .first()
-        )
-        if app_settings_record and app_settings_record.setting_value:
-            app_data = json.loads(app_settings_record.setting_value)
-            general = (app_data or {}).get("general") or {}
-            favicon_url = general.get("faviconUrl")
-            if favicon_url:
-                result["favicon"] = favicon_url
-    except Exception:
-        pass
-    # Fallback: pull from legacy Settings table if available (only if result is still empty)
-    if not result:
-        try:
-            if LegacySettings is not None:
-                legacy = db.query(LegacySettings).first()
-                if legacy:
-                    result = {
-                        "name": getattr(legacy, "company_name", None),
-                        "address": getattr(legacy, "address", None),
-                        "city": getattr(legacy, "city", None),
-                        "email": getattr(legacy, "email", None),
-                        "phone": getattr(legacy, "phone", None),
-                        "phone2": getattr(legacy, "phone2", None),
-                        "whatsapp": getattr(legacy, "whatsapp", None),
-                        "instagram": getattr(legacy, "instagram", None),
-                        "website": getattr(legacy, "website", None),
-                        # Prefer unified key 'logo' for templates; keep 'logo_path' for compatibility
-                        "logo": getattr(legacy, "logo_path", None),
-                        "logo_path": getattr(legacy, "logo_path", None),
-                        "footer_text": getattr(legacy, "footer_text", None),
-                    }
-        except Exception:
-            pass
-    return result
+    # Cache processus (invalidé à l'écriture des paramètres), logo publié en fichier statique
+    return settings_cache.company(db)
 
 
 @app.get("/invoices/print/{invoice_id}", response_class=HTMLResponse)
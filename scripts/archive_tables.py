@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Rétention, archivage et partitionnement des tables en ajout seul
+(stock_movements, daily_sales, scan_history, migration_logs).
+
+Exemples d'utilisation (dans l'hôte):
+  docker exec -it powerclasss_app python scripts/archive_tables.py --plan
+  docker exec -it powerclasss_app python scripts/archive_tables.py --run
+  docker exec -it powerclasss_app python scripts/archive_tables.py --run --table scan_history --no-compact
+  docker exec -it powerclasss_app python scripts/archive_tables.py --partition stock_movements
+  docker exec -it powerclasss_app python scripts/archive_tables.py --ensure-partitions
+
+Durées de conservation (mois, 0 = jamais): STOCK_MOVEMENTS_RETENTION_MONTHS,
+DAILY_SALES_RETENTION_MONTHS, SCAN_HISTORY_RETENTION_MONTHS (6),
+MIGRATION_LOGS_RETENTION_MONTHS (3). Fichiers: ARCHIVE_DIR (backups/archives).
+
+--partition convertit une table existante (PostgreSQL) sous verrou exclusif:
+à lancer pendant une fenêtre de maintenance.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+# Ensure project root is on sys.path when executed as a script (e.g., /app/scripts/archive_tables.py)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from app.services.archival import POLICIES, ensure_partitions, partition_table, retention_manager, retention_plan  # type: ignore
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rétention et archivage des tables en ajout seul")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--plan", action="store_true", help="Afficher les lignes à archiver (aucune écriture)")
+    group.add_argument("--run", action="store_true", help="Archiver/purger selon les politiques")
+    group.add_argument("--partition", choices=sorted(POLICIES), help="Partitionner une table par mois (PostgreSQL)")
+    group.add_argument("--ensure-partitions", action="store_true", help="Créer les partitions des mois à venir")
+    parser.add_argument("--table", choices=sorted(POLICIES), help="Limiter --run à une table")
+    parser.add_argument("--no-compact", action="store_true", help="Ne pas compacter la base SQLite après --run")
+    args = parser.parse_args()
+
+    if args.plan:
+        for entry in retention_plan():
+            print(f"- {entry['table']}: {entry['rows']} lignes, conservation {entry['retention_months'] or '∞'} mois, "
+                  f"{entry['rows_to_archive']} à {entry['mode'] == 'archive' and 'archiver' or 'purger'}"
+                  f"{' (partitionnée)' if entry['partitioned'] else ''}")
+        return 0
+    if args.run:
+        report = retention_manager.run_once(tables=[args.table] if args.table else None, compact=not args.no_compact)
+        print(json.dumps(report, indent=2, default=str, ensure_ascii=False))
+        return 1 if report.get("errors") else 0
+    if args.partition:
+        print(json.dumps(partition_table(args.partition), indent=2, default=str))
+        return 0
+    created = ensure_partitions()
+    print(f"✅ {len(created)} partition(s) créée(s)")
+    for name in created:
+        print(f" - {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Construit les assets statiques: minification, noms à empreinte, variantes
+gzip / brotli et manifeste (static/dist/manifest.json) lu par les templates.
+
+Exemples d'utilisation:
+  python scripts/build_assets.py                 # à lancer à chaque déploiement (Dockerfile)
+  python scripts/build_assets.py --no-bundles    # sans regrouper http.js / auth.js / utils.js
+
+Sans build (ou si une source a changé depuis), les templates servent les
+fichiers sources de static/js et static/css. Poids par page: benchmarks/page_weight.py
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+# Ensure project root is on sys.path when executed as a script (e.g., /app/scripts/build_assets.py)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from pathlib import Path
+
+from app.static_assets import build  # type: ignore
+
+
+def _kb(n: int) -> str:
+    return f"{n / 1024:.1f} Ko"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Minifie, empreinte et pré-compresse les assets statiques")
+    parser.add_argument("--static-dir", default=os.path.join(ROOT_DIR, "static"))
+    parser.add_argument("--no-bundles", action="store_true", help="Ne pas générer les bundles")
+    args = parser.parse_args()
+
+    manifest = build(Path(args.static_dir), bundles=not args.no_bundles)
+    totals = {"source": 0, "raw": 0, "gzip": 0, "br": 0}
+    for logical, entry in sorted(manifest["files"].items()):
+        sizes = entry["sizes"]
+        totals["source"] += entry["source_bytes"]
+        for key in ("raw", "gzip", "br"):
+            totals[key] += sizes.get(key, 0)
+        print(f"- {logical}: {_kb(entry['source_bytes'])} → {_kb(sizes['raw'])} min, "
+              f"{_kb(sizes['gzip'])} gzip" + (f", {_kb(sizes['br'])} br" if "br" in sizes else ""))
+    for logical, entry in manifest["bundles"].items():
+        print(f"📦 {logical} ({', '.join(entry['members'])}) → {entry['file']}")
+    print(f"✅ {len(manifest['files'])} fichiers: {_kb(totals['source'])} sources, {_kb(totals['raw'])} minifiés, "
+          f"{_kb(totals['gzip'])} gzip" + (f", {_kb(totals['br'])} brotli" if manifest["brotli"] else " (brotli non installé)"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
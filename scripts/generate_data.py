@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Génération rapide d'un jeu de données synthétique (tests de charge, benchmarks).
+
+Produits, variantes (IMEI uniques), clients, factures avec lignes et paiements,
+mouvements de stock et ventes journalières, insérés en masse (COPY sur
+PostgreSQL, executemany sur SQLite). Même graine => mêmes données.
+
+Exemples:
+  python scripts/generate_data.py --scale 1                 # 10k produits, 20k factures
+  python scripts/generate_data.py --scale 50 --workers 4    # ~1M lignes de factures
+  python scripts/generate_data.py --products 500 --invoices 0 --seed 7
+  DATABASE_URL=postgresql://... python scripts/generate_data.py --scale 10
+
+Les données sont ajoutées à la base pointée par DATABASE_URL (ou --database-url).
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Ensure project root is on sys.path when executed as a script
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Générer un jeu de données synthétique en masse")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Facteur d'échelle (1.0 = 2k clients, 10k produits, 20k factures, 20k ventes)")
+    parser.add_argument("--clients", type=int, help="Nombre de clients (prioritaire sur --scale)")
+    parser.add_argument("--products", type=int, help="Nombre de produits")
+    parser.add_argument("--invoices", type=int, help="Nombre de factures")
+    parser.add_argument("--daily-sales", type=int, help="Nombre de ventes journalières")
+    parser.add_argument("--seed", type=int, default=42, help="Graine (données reproductibles)")
+    parser.add_argument("--days", type=int, default=365, help="Étalement des dates sur N jours")
+    parser.add_argument("--anchor-date", help="Date de référence AAAA-MM-JJ (défaut: aujourd'hui)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Lignes par bloc")
+    parser.add_argument("--workers", type=int, default=1, help="Processus de génération (1 = pas de parallélisme)")
+    parser.add_argument("--database-url", help="URL de base (sinon DATABASE_URL)")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from app.database import create_tables, engine  # type: ignore
+    from app.services.data_generator import GeneratorConfig, generate  # type: ignore
+
+    cfg = GeneratorConfig.scaled(
+        args.scale,
+        clients=args.clients,
+        products=args.products,
+        invoices=args.invoices,
+        daily_sales=args.daily_sales,
+    )
+    cfg.seed = args.seed
+    cfg.days = max(1, args.days)
+    if args.anchor_date:
+        cfg.now = datetime.strptime(args.anchor_date, "%Y-%m-%d")
+    cfg.chunk_size = max(100, args.chunk_size)
+    cfg.workers = max(1, args.workers)
+    try:
+        cfg.validate()
+    except ValueError as e:
+        parser.error(str(e))
+
+    create_tables()
+    print(f"🧪 Génération: {cfg.clients} clients, {cfg.products} produits, {cfg.invoices} factures, "
+          f"{cfg.daily_sales} ventes (graine {cfg.seed}, {cfg.workers} processus)")
+    counts = generate(engine, cfg)
+    for table, n in counts.items():
+        print(f"  {table:<18} {n:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
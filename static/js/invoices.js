@@ -125,6 +125,8 @@ document.addEventListener('DOMContentLoaded', function() {
     try { loadStats(); } catch(e){}
     // Lazy: clients/products chargés à l'usage
     setupEventListeners();
+    // Rechargement poussé par le serveur quand une facture ou un client change
+    if (window.liveChanges) window.liveChanges.on(['invoices', 'clients'], () => { loadInvoices(); loadStats(); });
     setDefaultDates();
     // Si on vient d'une conversion devis -> facture, ouvrir le formulaire pré-rempli
     try {
@@ -438,8 +440,7 @@ async function loadInvoices() {
             page: currentPage,
             page_size: itemsPerPage,
             sort_by: currentSort.by,
-            sort_dir: currentSort.dir,
-            _ts: Date.now() // cache-buster to avoid stale responses after delete
+            sort_dir: currentSort.dir
         };
         if (statusFilter) params.status_filter = statusFilter;
         if (clientFilter) params.client_search = clientFilter;
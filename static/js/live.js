@@ -0,0 +1,96 @@
+// Flux des changements serveur (Server-Sent Events) : remplace le polling des pages.
+// liveChanges.on(['invoices', 'clients'], loadInvoices) rappelle loadInvoices quand une de ces
+// ressources change (regroupé, et différé tant que l'onglet est masqué).
+(function(){
+  const listeners = [];
+  let source = null;
+  let retryTimer = null;
+  let assetVersion = null;
+
+  function schedule(listener){
+    if (document.visibilityState !== 'visible') { listener.dirty = true; return; }
+    clearTimeout(listener.timer);
+    listener.timer = setTimeout(() => {
+      listener.dirty = false;
+      try { listener.callback(listener.pending); } catch (e) { console.error(e); }
+      listener.pending = new Set();
+    }, listener.delay);
+  }
+
+  function dispatch(resources){
+    listeners.forEach(listener => {
+      const hit = resources.filter(r => listener.resources.has(r));
+      if (!hit.length) return;
+      hit.forEach(r => listener.pending.add(r));
+      schedule(listener);
+    });
+  }
+
+  function reloadWith(v){
+    try {
+      if ('caches' in window) {
+        caches.keys().then(keys => keys.forEach(k => caches.delete(k)));
+      }
+    } catch (e) {}
+    try {
+      const u = new URL(window.location.href);
+      u.searchParams.set('__v', v);
+      window.location.replace(u.toString());
+    } catch (e) { window.location.reload(); }
+  }
+
+  function checkAssets(v){
+    if (v && assetVersion && String(v) !== assetVersion) reloadWith(String(v));
+  }
+
+  function connect(){
+    if (source || typeof EventSource === 'undefined') return;
+    source = new EventSource('/api/events/stream');
+    source.addEventListener('hello', e => {
+      try { checkAssets(JSON.parse(e.data).v); } catch (err) {}
+    });
+    source.addEventListener('change', e => {
+      let data = null;
+      try { data = JSON.parse(e.data); } catch (err) { return; }
+      if (data.v) checkAssets(data.v);
+      dispatch(data.resources || []);
+    });
+    source.onerror = () => {
+      // Coupure réseau: EventSource se reconnecte seul. Refus (401, 503): nouvel essai plus tard
+      if (source && source.readyState === EventSource.CLOSED) {
+        source = null;
+        clearTimeout(retryTimer);
+        retryTimer = setTimeout(connect, 30000);
+      }
+    };
+  }
+
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState !== 'visible') return;
+    listeners.forEach(listener => { if (listener.dirty) schedule(listener); });
+  });
+
+  window.liveChanges = {
+    on(resources, callback, options = {}){
+      const listener = {
+        resources: new Set(Array.isArray(resources) ? resources : [resources]),
+        callback,
+        delay: options.delay ?? 400,
+        pending: new Set(),
+        dirty: false,
+        timer: null,
+      };
+      listeners.push(listener);
+      connect();
+      return () => {
+        const i = listeners.indexOf(listener);
+        if (i >= 0) listeners.splice(i, 1);
+      };
+    },
+    // Rechargement de la page quand la version des assets change (déploiement, fichiers modifiés)
+    watchAssets(version){
+      assetVersion = String(version);
+      connect();
+    },
+  };
+})();
@@ -374,6 +374,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Initialiser immédiatement sans délai pour un chargement instantané
     initProductsPage();
+    // Rechargement poussé par le serveur quand un produit (stock, variantes) change
+    if (window.liveChanges) window.liveChanges.on(['products'], () => loadProducts());
 });
 
 function resetFilters() {
@@ -20,6 +20,8 @@ document.addEventListener('DOMContentLoaded', function() {
         ]).finally(() => {
             setupEventListeners();
             setDefaultDate();
+            // Rechargement poussé par le serveur quand un mouvement est enregistré
+            if (window.liveChanges) window.liveChanges.on(['stock_movements'], () => { loadMovements(); loadStats(); });
         });
     };
 